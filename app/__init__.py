@@ -1,6 +1,16 @@
 from flask import Flask
 from flask_cors import CORS
 from flask_socketio import SocketIO
+import logging
+
+from app.logging_setup import setup_logging, dropped_records
+from app import metrics
+
+# El registro asíncrono se instala antes de cargar modelos e índices
+setup_logging()
+metrics.register_gauge("log_records_dropped", dropped_records)
+
+logger = logging.getLogger(__name__)
 
 socketio = SocketIO(cors_allowed_origins="*")
 
@@ -8,14 +18,20 @@ def create_app():
     app = Flask(__name__)
     app.config['SECRET_KEY'] = 'dev'
     CORS(app, resources={r"/*": {"origins": "*"}})
-    socketio.init_app(app)
+    # Con SOCKETIO_MESSAGE_QUEUE las emisiones llegan a clientes conectados a otros procesos
+    from .socket_queue import socketio_options
+    socketio.init_app(app, **socketio_options())
 
     from .routes import bp as routes_blueprint 
-    print(f"[DEBUG] Registrando blueprint: {routes_blueprint}")
+    logger.debug("Registrando blueprint: %s", routes_blueprint)
     app.register_blueprint(routes_blueprint)
+
+    # Recarga en caliente de la base si cambian los archivos de data/
+    from .kb_watcher import start_watcher
+    start_watcher()
     
-    print("[DEBUG] Rutas registradas después del blueprint:")
-    for rule in app.url_map.iter_rules():
-        print(f"  {rule.rule} -> {rule.endpoint} ({rule.methods})")
+    if logger.isEnabledFor(logging.DEBUG):
+        for rule in app.url_map.iter_rules():
+            logger.debug("Ruta registrada: %s -> %s (%s)", rule.rule, rule.endpoint, rule.methods)
 
     return app
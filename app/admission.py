@@ -0,0 +1,121 @@
+"""Control de admisión delante de query_rag: concurrencia acotada por pool y cola con descarte.
+
+Cada pool (consultas baratas sin LLM y consultas con LLM) admite hasta
+`max_concurrent` ejecuciones; el resto espera en una cola acotada. Una solicitud
+se descarta (Overloaded -> HTTP 429 / evento 'busy' con Retry-After) si:
+
+  - la cola está llena (queue_full);
+  - la espera estimada, con la media móvil del tiempo de servicio del pool,
+    supera lo que puede esperar (predicted_wait), sin llegar a encolarla;
+  - lleva en cola más de lo que puede esperar (queue_timeout).
+
+Lo que puede esperar es ADMISSION_MAX_QUEUE_MS o el presupuesto restante de la
+solicitud si es menor: el tiempo en cola cuenta contra el plazo.
+"""
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+from app import metrics
+from app.config import Config
+from app.tracing import annotate
+
+# Pools: consultas sin LLM (artículo por número, listados) y consultas que llaman al LLM
+CHEAP = "cheap"
+LLM = "llm"
+
+
+class Overloaded(RuntimeError):
+    """Solicitud descartada por el control de admisión."""
+
+    def __init__(self, pool, reason, retry_after_s):
+        super().__init__(f"Pool {pool} saturado ({reason})")
+        self.pool = pool
+        self.reason = reason
+        self.retry_after_s = retry_after_s
+
+
+class AdmissionPool:
+    """Semáforo con cola acotada y descarte según el tiempo de espera estimado."""
+
+    def __init__(self, name, max_concurrent, max_queue, max_queue_ms):
+        self.name = name
+        self.max_concurrent = max(int(max_concurrent), 1)
+        self.max_queue = max(int(max_queue), 0)
+        self.max_queue_ms = max_queue_ms
+        self.active = 0
+        self.waiting = 0
+        # Media móvil del tiempo de servicio en ms; None hasta la primera ejecución
+        self.service_ms = None
+        self._cond = threading.Condition()
+        metrics.register_gauge(f"admission.{name}", self.status)
+
+    def estimated_wait_ms(self, position):
+        """Espera estimada para quien queda en la posición `position` de la cola (1 = el siguiente)."""
+        if self.service_ms is None:
+            return 0.0
+        return math.ceil(position / self.max_concurrent) * self.service_ms
+
+    def _shed(self, reason):
+        metrics.inc(f"admission.{self.name}.shed.{reason}")
+        metrics.inc("admission_shed_total")
+        retry_after = max(1, math.ceil(self.estimated_wait_ms(self.waiting + 1) / 1000.0))
+        raise Overloaded(self.name, reason, retry_after)
+
+    @contextmanager
+    def admit(self, max_wait_ms=None):
+        """Ocupa un lugar del pool durante el bloque; lanza Overloaded si se descarta."""
+        max_wait = self.max_queue_ms if max_wait_ms is None else max(min(self.max_queue_ms, max_wait_ms), 0.0)
+        t0 = time.perf_counter()
+        with self._cond:
+            if self.active >= self.max_concurrent:
+                if self.waiting >= self.max_queue:
+                    self._shed("queue_full")
+                if self.estimated_wait_ms(self.waiting + 1) > max_wait:
+                    self._shed("predicted_wait")
+                self.waiting += 1
+                try:
+                    deadline = t0 + max_wait / 1000.0
+                    while self.active >= self.max_concurrent:
+                        remaining = deadline - time.perf_counter()
+                        if remaining <= 0:
+                            self._shed("queue_timeout")
+                        self._cond.wait(remaining)
+                finally:
+                    self.waiting -= 1
+            self.active += 1
+        queued_ms = (time.perf_counter() - t0) * 1000.0
+        metrics.inc(f"admission.{self.name}.admitted")
+        annotate("admission", {"pool": self.name, "queue_ms": round(queued_ms, 1)})
+
+        started = time.perf_counter()
+        try:
+            yield queued_ms
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000.0
+            with self._cond:
+                self.active -= 1
+                self.service_ms = elapsed if self.service_ms is None else 0.8 * self.service_ms + 0.2 * elapsed
+                self._cond.notify()
+
+    def status(self):
+        return {
+            "active": self.active,
+            "queued": self.waiting,
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "service_ms": round(self.service_ms, 1) if self.service_ms is not None else None,
+        }
+
+
+def build_pools():
+    """Pools configurados, o {} si ADMISSION_ENABLED es False."""
+    if not Config.ADMISSION_ENABLED:
+        return {}
+    return {
+        CHEAP: AdmissionPool(CHEAP, Config.ADMISSION_CHEAP_CONCURRENCY, Config.ADMISSION_CHEAP_QUEUE,
+                             Config.ADMISSION_MAX_QUEUE_MS),
+        LLM: AdmissionPool(LLM, Config.ADMISSION_LLM_CONCURRENCY, Config.ADMISSION_LLM_QUEUE,
+                           Config.ADMISSION_MAX_QUEUE_MS),
+    }
@@ -0,0 +1,123 @@
+"""Interruptor de circuito para dependencias lentas o caídas (el backend LLM).
+
+Estados:
+  - closed: las llamadas pasan; se registra resultado y latencia en una ventana
+    de las últimas `window` llamadas. Con al menos `min_calls`, si la fracción de
+    fallos (errores + llamadas más lentas que `slow_ms`) alcanza `failure_rate`,
+    el circuito se abre.
+  - open: las llamadas se rechazan al instante (CircuitOpenError) y un hilo en
+    segundo plano sondea la dependencia cada `probe_interval_s`; tras
+    `probe_successes` sondeos correctos seguidos el circuito vuelve a cerrarse.
+
+Las solicitudes nunca hacen de sondeo: mientras el circuito está abierto ninguna
+queda esperando el timeout de una dependencia que probablemente no responde.
+"""
+import logging
+import threading
+import time
+from collections import deque
+
+from app import metrics
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+
+
+class CircuitOpenError(RuntimeError):
+    """La llamada se rechazó sin intentarla porque el circuito está abierto."""
+
+
+class CircuitBreaker:
+    """Ventana deslizante de resultados con apertura por tasa de fallos y sondeo en segundo plano."""
+
+    def __init__(self, name, probe, window=20, min_calls=5, failure_rate=0.5, slow_ms=10000.0,
+                 probe_interval_s=5.0, probe_successes=2):
+        self.name = name
+        # probe() -> None; lanza excepción si la dependencia sigue fallando
+        self.probe = probe
+        self.min_calls = max(int(min_calls), 1)
+        self.failure_rate = failure_rate
+        self.slow_ms = slow_ms
+        self.probe_interval_s = probe_interval_s
+        self.probe_successes = max(int(probe_successes), 1)
+        self.state = CLOSED
+        self.opened_at = None
+        self.last_failure = None
+        self._calls = deque(maxlen=max(int(window), self.min_calls))
+        self._lock = threading.Lock()
+        self._prober = None
+        metrics.register_gauge(f"circuit.{name}", self.status)
+
+    def is_open(self):
+        return self.state == OPEN
+
+    def check(self):
+        """Lanza CircuitOpenError si el circuito está abierto."""
+        if self.state == OPEN:
+            metrics.inc(f"circuit.{self.name}.rejected")
+            raise CircuitOpenError(f"Circuito {self.name} abierto: {self.last_failure}")
+
+    def record(self, elapsed_ms, error=None):
+        """Registra una llamada; una llamada lenta cuenta como fallo aunque haya respondido."""
+        failed = error is not None or elapsed_ms >= self.slow_ms
+        with self._lock:
+            if self.state == OPEN:
+                return
+            self._calls.append(failed)
+            if failed:
+                self.last_failure = str(error) if error is not None else f"llamada lenta ({elapsed_ms:.0f} ms)"
+            failures = sum(self._calls)
+            if len(self._calls) < self.min_calls or failures < self.failure_rate * len(self._calls):
+                return
+            calls = len(self._calls)
+            self._open_locked()
+        logger.warning("Circuito %s abierto: %s de %s llamadas fallidas o lentas (%s)",
+                       self.name, failures, calls, self.last_failure)
+
+    def _open_locked(self):
+        self.state = OPEN
+        self.opened_at = time.time()
+        self._calls.clear()
+        metrics.inc(f"circuit.{self.name}.opened")
+        if self._prober is None or not self._prober.is_alive():
+            self._prober = threading.Thread(target=self._probe_loop, name=f"circuit-{self.name}-probe", daemon=True)
+            self._prober.start()
+
+    def _probe_loop(self):
+        successes = 0
+        while successes < self.probe_successes:
+            time.sleep(self.probe_interval_s)
+            t0 = time.perf_counter()
+            try:
+                self.probe()
+                elapsed = (time.perf_counter() - t0) * 1000.0
+                if elapsed >= self.slow_ms:
+                    raise TimeoutError(f"sondeo lento ({elapsed:.0f} ms)")
+            except Exception as e:
+                successes = 0
+                self.last_failure = str(e)
+                metrics.inc(f"circuit.{self.name}.probe_failures")
+                logger.info("Sondeo del circuito %s fallido: %s", self.name, e)
+                continue
+            successes += 1
+        with self._lock:
+            self.state = CLOSED
+            self._calls.clear()
+            open_s = time.time() - self.opened_at
+            self.opened_at = None
+        metrics.inc(f"circuit.{self.name}.closed")
+        logger.warning("Circuito %s cerrado tras %.1f s abierto", self.name, open_s)
+
+    def status(self):
+        with self._lock:
+            calls = len(self._calls)
+            failures = sum(self._calls)
+        return {
+            "state": self.state,
+            "window_calls": calls,
+            "window_failures": failures,
+            "open_for_s": round(time.time() - self.opened_at, 1) if self.opened_at else None,
+            "last_failure": self.last_failure,
+        }
@@ -15,9 +15,152 @@ class Config:
     # Modelo de OpenAI desde variable de entorno
     OPENAI_MODEL = os.getenv('OPENAI_MODEL', 'gpt-4o-mini-2024-07-18')
 
+    # Backend LLM: 'openai', 'local' (endpoint compatible con OpenAI) o 'stub' (determinista en proceso).
+    # Si está vacío se decide por USE_LOCAL_MODEL.
+    LLM_BACKEND = os.getenv('LLM_BACKEND', '').strip().lower()
+    LLM_TIMEOUT_SECONDS = float(os.getenv('LLM_TIMEOUT_SECONDS', '30'))
+
+    # Interruptor de circuito del LLM: se abre cuando, en las últimas LLM_BREAKER_WINDOW llamadas
+    # (mínimo LLM_BREAKER_MIN_CALLS), la fracción de errores o llamadas más lentas que
+    # LLM_BREAKER_SLOW_MS alcanza LLM_BREAKER_FAILURE_RATE. Abierto, se responde con la base de
+    # conocimientos si la recuperación supera LLM_BREAKER_KB_MIN_SIMILARITY y el resto se rechaza;
+    # se cierra tras LLM_BREAKER_PROBE_SUCCESSES sondeos correctos cada LLM_BREAKER_PROBE_INTERVAL_S
+    LLM_BREAKER_ENABLED = os.getenv('LLM_BREAKER_ENABLED', 'True').lower() == 'true'
+    LLM_BREAKER_WINDOW = int(os.getenv('LLM_BREAKER_WINDOW', '20'))
+    LLM_BREAKER_MIN_CALLS = int(os.getenv('LLM_BREAKER_MIN_CALLS', '5'))
+    LLM_BREAKER_FAILURE_RATE = float(os.getenv('LLM_BREAKER_FAILURE_RATE', '0.5'))
+    LLM_BREAKER_SLOW_MS = float(os.getenv('LLM_BREAKER_SLOW_MS', '15000'))
+    LLM_BREAKER_PROBE_INTERVAL_S = float(os.getenv('LLM_BREAKER_PROBE_INTERVAL_S', '5'))
+    LLM_BREAKER_PROBE_SUCCESSES = int(os.getenv('LLM_BREAKER_PROBE_SUCCESSES', '2'))
+    LLM_BREAKER_KB_MIN_SIMILARITY = float(os.getenv('LLM_BREAKER_KB_MIN_SIMILARITY', '0.55'))
+
+    # Endpoint local compatible con OpenAI (vLLM, llama.cpp, Ollama o app/llm_stub_server.py)
+    LOCAL_MODEL_URL = os.getenv('LOCAL_MODEL_URL', 'http://localhost:8089/v1')
+    LOCAL_MODEL_NAME = os.getenv('LOCAL_MODEL_NAME', 'azusena-stub')
+    LOCAL_MODEL_API_KEY = os.getenv('LOCAL_MODEL_API_KEY', 'local')
+
+    # Simulación del stub: latencia fija y velocidad de generación (0 = instantáneo)
+    STUB_LATENCY_MS = float(os.getenv('STUB_LATENCY_MS', '0'))
+    STUB_TOKENS_PER_SECOND = float(os.getenv('STUB_TOKENS_PER_SECOND', '0'))
+
+    # Registro: nivel raíz, niveles por módulo ('app.query=DEBUG,werkzeug=WARNING'),
+    # formato ('json' o 'text'), muestreo de DEBUG y tamaño de la cola asíncrona
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+    LOG_LEVELS = os.getenv('LOG_LEVELS', '')
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'json').lower()
+    LOG_DEBUG_SAMPLE_RATE = float(os.getenv('LOG_DEBUG_SAMPLE_RATE', '1.0'))
+    LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+
+    # Presupuesto de tokens del prompt (estimados con app/context_builder.py):
+    # total, tope para artículos recuperados, tope para historial y número de artículos
+    PROMPT_TOKEN_BUDGET = int(os.getenv('PROMPT_TOKEN_BUDGET', '3000'))
+    CONTEXT_ARTICLES_TOKENS = int(os.getenv('CONTEXT_ARTICLES_TOKENS', '1500'))
+    CONTEXT_HISTORY_TOKENS = int(os.getenv('CONTEXT_HISTORY_TOKENS', '600'))
+    CONTEXT_MAX_ARTICLES = int(os.getenv('CONTEXT_MAX_ARTICLES', '3'))
+
+    # Búsqueda vectorial restringida a la fuente (ley) detectada en la consulta
+    FILTERED_SEARCH = os.getenv('FILTERED_SEARCH', 'True').lower() == 'true'
+
+    # Recarga en caliente: intervalo de sondeo de data/ (0 = desactivado) y token de los
+    # endpoints de administración (cabecera X-Admin-Token; vacío = endpoints deshabilitados)
+    KB_WATCH_INTERVAL_SECONDS = float(os.getenv('KB_WATCH_INTERVAL_SECONDS', '0'))
+    ADMIN_TOKEN = os.getenv('ADMIN_TOKEN', '')
+
+    # Directorio de la base de conocimientos (XLSX/CSV) y de los artefactos del índice
+    # (vacío = data/ del repositorio)
+    DATA_DIR = os.getenv('DATA_DIR', '').strip()
+
+    # Ingesta por bloques: filas codificadas y agregadas al índice por bloque, y lote del modelo
+    INGEST_CHUNK_SIZE = int(os.getenv('INGEST_CHUNK_SIZE', '256'))
+    EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', '32'))
+
+    # Modo del índice: 'article' (un vector por artículo) o 'passage' (pasajes solapados
+    # por artículo, agregados por máximo). Tamaño y solape del pasaje en palabras, y
+    # factor de sobre-muestreo de pasajes al buscar
+    INDEX_MODE = os.getenv('INDEX_MODE', 'article').strip().lower()
+    PASSAGE_WORDS = int(os.getenv('PASSAGE_WORDS', '90'))
+    PASSAGE_OVERLAP_WORDS = int(os.getenv('PASSAGE_OVERLAP_WORDS', '20'))
+    PASSAGE_OVERSAMPLE = int(os.getenv('PASSAGE_OVERSAMPLE', '4'))
+
+    # Compresión de vectores: '' (índice plano float32), 'fp16' o 'int8' para la primera
+    # pasada, con PCA a PCA_DIM dimensiones (0 = sin PCA) y reordenamiento exacto de
+    # top_k * RESCORE_FACTOR candidatos con los vectores completos en memmap
+    VECTOR_COMPRESSION = os.getenv('VECTOR_COMPRESSION', '').strip().lower()
+    PCA_DIM = int(os.getenv('PCA_DIM', '256'))
+    RESCORE_FACTOR = int(os.getenv('RESCORE_FACTOR', '4'))
+
+    # Almacén compacto del corpus (categóricas + arena UTF-8): True lo escribe junto al índice
+    # (data/indexes/<modelo>/corpus.bin) y lo sirve con memmap (páginas compartidas entre
+    # procesos); False lo mantiene en RAM
+    CORPUS_MMAP = os.getenv('CORPUS_MMAP', 'True').lower() == 'true'
+
+    # Modelo de embeddings: clave del registro (app/models/embedding_models.py: mpnet, minilm,
+    # distiluse, e5-small, e5-base) o id de Hugging Face. Los artefactos del índice quedan en
+    # data/indexes/<clave>/; comparar candidatos con python -m tools.compare_embeddings
+    EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'mpnet').strip()
+
+    # Paquete local del modelo de embeddings (python -m app.model_bundle pack). Si se define,
+    # el modelo se carga solo desde esa ruta; MODEL_BUNDLE_VERIFY recalcula el sha256 de cada archivo.
+    # MODEL_BUNDLE_REQUIRED hace fallar el arranque si falta el paquete del modelo de embeddings
+    # o, con RERANKER_MODEL, el del reranker (en vez de usar caché/red); en producción, True
+    MODEL_BUNDLE_PATH = os.getenv('MODEL_BUNDLE_PATH', '')
+    MODEL_BUNDLE_VERIFY = os.getenv('MODEL_BUNDLE_VERIFY', 'True').lower() == 'true'
+    MODEL_BUNDLE_REQUIRED = os.getenv('MODEL_BUNDLE_REQUIRED', 'False').lower() == 'true'
+
+    # Cola de mensajes de Socket.IO para varios procesos (vacío = un solo proceso):
+    # resp://host:puerto (Redis o python -m app.pubsub_broker), redis://, amqp://...
+    SOCKETIO_MESSAGE_QUEUE = os.getenv('SOCKETIO_MESSAGE_QUEUE', '').strip()
+    SOCKETIO_CHANNEL = os.getenv('SOCKETIO_CHANNEL', 'azusena-socketio')
+
+    # Respuestas de /query por Socket.IO: solo a la sala del cliente (X-Client-Id). True difunde
+    # además a todos los clientes las respuestas sin cliente (comportamiento anterior; no recomendado)
+    SOCKET_BROADCAST = os.getenv('SOCKET_BROADCAST', 'False').lower() == 'true'
+    # Secreto con que se firman los tokens de sala (client_id de connection_response). Con varios
+    # procesos todos deben compartirlo; vacío = uno aleatorio por proceso (los tokens no sobreviven reinicios)
+    SOCKET_ROOM_SECRET = os.getenv('SOCKET_ROOM_SECRET', '')
+
+    # Coalescencia: consultas idénticas (normalizadas) en vuelo comparten una sola ejecución
+    QUERY_COALESCING = os.getenv('QUERY_COALESCING', 'True').lower() == 'true'
+
+    # Control de admisión de /query: concurrencia y cola por pool (consultas sin LLM y con LLM)
+    # y espera máxima en cola; lo que no cabe recibe 429 con Retry-After
+    ADMISSION_ENABLED = os.getenv('ADMISSION_ENABLED', 'True').lower() == 'true'
+    ADMISSION_CHEAP_CONCURRENCY = int(os.getenv('ADMISSION_CHEAP_CONCURRENCY', '8'))
+    ADMISSION_CHEAP_QUEUE = int(os.getenv('ADMISSION_CHEAP_QUEUE', '64'))
+    ADMISSION_LLM_CONCURRENCY = int(os.getenv('ADMISSION_LLM_CONCURRENCY', '4'))
+    ADMISSION_LLM_QUEUE = int(os.getenv('ADMISSION_LLM_QUEUE', '32'))
+    ADMISSION_MAX_QUEUE_MS = float(os.getenv('ADMISSION_MAX_QUEUE_MS', '3000'))
+
+    # Presupuesto de latencia por solicitud en ms (0 = sin límite); la cabecera
+    # X-Request-Deadline-Ms lo reemplaza, acotada a REQUEST_BUDGET_MAX_MS
+    REQUEST_BUDGET_MS = float(os.getenv('REQUEST_BUDGET_MS', '0'))
+    REQUEST_BUDGET_MAX_MS = float(os.getenv('REQUEST_BUDGET_MAX_MS', '60000'))
+    # Presupuesto restante mínimo para cada etapa; por debajo se degrada: top_k reducido,
+    # sin pasada de coherencia, o respuesta solo con la base de conocimientos (sin LLM)
+    DEADLINE_FULL_TOP_K_MS = float(os.getenv('DEADLINE_FULL_TOP_K_MS', '1000'))
+    DEADLINE_COHERENCE_MIN_MS = float(os.getenv('DEADLINE_COHERENCE_MIN_MS', '300'))
+    DEADLINE_LLM_MIN_MS = float(os.getenv('DEADLINE_LLM_MIN_MS', '1500'))
+
+    # Perfilado por muestreo de /query (ver app/profiler.py): fracción de consultas perfiladas
+    # (0 = solo a pedido, cabecera X-Profile con X-Admin-Token), intervalo de muestreo de la
+    # pila y perfiles recientes conservados para /admin/profiles
+    PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+    PROFILE_INTERVAL_MS = float(os.getenv('PROFILE_INTERVAL_MS', '5'))
+    PROFILE_MAX_STORED = int(os.getenv('PROFILE_MAX_STORED', '50'))
+
+    # Reordenamiento con cross-encoder (vacío = desactivado), su paquete local verificado
+    # (python -m app.model_bundle pack --cross-encoder), resultados reordenados,
+    # tamaño de la caché de puntuaciones y margen mínimo de presupuesto para ejecutarlo
+    RERANKER_MODEL = os.getenv('RERANKER_MODEL', '')
+    RERANKER_BUNDLE_PATH = os.getenv('RERANKER_BUNDLE_PATH', '')
+    RERANK_TOP_N = int(os.getenv('RERANK_TOP_N', '10'))
+    RERANK_CACHE_SIZE = int(os.getenv('RERANK_CACHE_SIZE', '4096'))
+    RERANK_MIN_REMAINING_MS = float(os.getenv('RERANK_MIN_REMAINING_MS', '50'))
+
     @classmethod
     def validate_config(cls):
-        if not cls.OPENAI_API_KEY or cls.OPENAI_API_KEY == "KEY_NO_DEFINIDA":
+        backend = cls.LLM_BACKEND or ('local' if cls.USE_LOCAL_MODEL else 'openai')
+        if backend == 'openai' and (not cls.OPENAI_API_KEY or cls.OPENAI_API_KEY == "KEY_NO_DEFINIDA"):
             logging.error("API Key de OpenAI no configurada")
             raise ValueError("API Key de OpenAI no configurada")
         logging.info("Configuración validada correctamente")
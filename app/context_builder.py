@@ -0,0 +1,222 @@
+"""Construcción del prompt con presupuesto de tokens.
+
+Los tokens se estiman con un tokenizador aproximado y offline (sin descargar
+vocabularios): cada palabra cuenta ceil(len/4) tokens y cada signo de
+puntuación uno, lo que se acerca a los tokenizadores BPE en español.
+
+El presupuesto total (PROMPT_TOKEN_BUDGET) se reparte así:
+  1. prompt de sistema: fijo, no se recorta (prefijo estático idéntico entre
+     solicitudes para que el caché de prefijos del proveedor acierte);
+  2. pregunta e instrucciones: no se recortan;
+  3. artículos recuperados: hasta CONTEXT_ARTICLES_TOKENS;
+  4. historial: hasta CONTEXT_HISTORY_TOKENS con lo que sobre.
+Los recortes se hacen en límites de oración.
+"""
+import logging
+import math
+import re
+from functools import lru_cache
+
+from app.config import Config
+from app import metrics
+from app.tracing import annotate
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?;:])\s+|\n+")
+_EMPTY_VALUES = ('', 'nan', 'None', 'null')
+
+
+def count_tokens(text) -> int:
+    """Número aproximado de tokens del texto."""
+    if not text:
+        return 0
+    total = 0
+    for piece in _TOKEN_PATTERN.findall(str(text)):
+        total += math.ceil(len(piece) / 4) if piece[0].isalnum() or piece[0] == "_" else 1
+    return total
+
+
+@lru_cache(maxsize=16)
+def _static_tokens(text) -> int:
+    # Los prompts de sistema son constantes: se cuentan una sola vez
+    return count_tokens(text)
+
+
+def truncate_to_tokens(text, max_tokens) -> str:
+    """Recorta el texto a max_tokens terminando en una oración completa.
+
+    Si ni la primera oración cabe, se corta por palabras y se añade '...'.
+    """
+    text = str(text or "").strip()
+    if max_tokens <= 0 or not text:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+
+    kept, used = [], 0
+    for sentence in _SENTENCE_SPLIT.split(text):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        cost = count_tokens(sentence)
+        if used + cost > max_tokens:
+            break
+        kept.append(sentence)
+        used += cost
+    if kept:
+        return " ".join(kept)
+
+    words, used = [], 1  # reserva para '...'
+    for word in text.split():
+        cost = count_tokens(word)
+        if used + cost > max_tokens:
+            break
+        words.append(word)
+        used += cost
+    return " ".join(words) + "..." if words else ""
+
+
+def truncate_lines(text, max_tokens) -> str:
+    """Como truncate_to_tokens, pero conserva los saltos de línea del texto.
+
+    Se mantienen las líneas completas que caben, en orden; la primera que no
+    cabe se recorta en límites de oración y ahí termina. Sirve para recortar un
+    contexto ya armado (separadores y campos por línea) sin volverlo un párrafo.
+    """
+    text = str(text or "").strip()
+    if max_tokens <= 0 or not text:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+
+    kept, used = [], 0
+    for line in text.split("\n"):
+        cost = count_tokens(line)
+        if used + cost > max_tokens:
+            rest = truncate_to_tokens(line, max_tokens - used)
+            # Una etiqueta sola ('Texto del artículo:') no aporta nada
+            if rest and not rest.endswith(":"):
+                kept.append(rest)
+            break
+        kept.append(line)
+        used += cost
+    return "\n".join(kept).strip()
+
+
+def _has_value(value) -> bool:
+    return bool(value) and str(value).strip() not in _EMPTY_VALUES
+
+
+def format_article_context(results, max_tokens=None, max_articles=None) -> str:
+    """Contexto de artículos recuperados dentro del presupuesto de tokens.
+
+    El presupuesto se reparte entre los artículos; lo que un artículo corto no
+    usa pasa a los siguientes. Los metadatos (artículo, fuente, tema) van
+    siempre; el resumen y el texto se recortan en límites de oración.
+    """
+    max_tokens = Config.CONTEXT_ARTICLES_TOKENS if max_tokens is None else max_tokens
+    max_articles = Config.CONTEXT_MAX_ARTICLES if max_articles is None else max_articles
+    results = list(results or [])[:max_articles]
+
+    header = "INFORMACIÓN RELEVANTE DE LA BASE DE DATOS:"
+    parts = [header]
+    remaining = max_tokens - count_tokens(header)
+
+    for i, result in enumerate(results):
+        data = result['data']
+        block = [
+            f"\n--- Resultado {i+1} (Similitud: {result['similarity']:.3f}) ---",
+            f"Artículo: {data.get('articulo', 'N/A')}",
+            f"Fuente: {data.get('fuente', 'N/A')}",
+            f"Tema: {data.get('tema', 'N/A')}",
+            f"Subtema: {data.get('subtema', 'N/A')}",
+        ]
+        block_tokens = count_tokens("\n".join(block))
+        if block_tokens > remaining:
+            break
+        remaining -= block_tokens
+        share = remaining // (len(results) - i)
+
+        if _has_value(data.get('resumen_explicativo')):
+            summary = truncate_to_tokens(data.get('resumen_explicativo'), share // 2)
+            if summary:
+                line = f"Resumen: {summary}"
+                block.append(line)
+                share -= count_tokens(line)
+                remaining -= count_tokens(line)
+
+        if _has_value(data.get('texto_del_articulo')):
+            text = truncate_to_tokens(data.get('texto_del_articulo'), share)
+            if text:
+                line = f"Texto del artículo: {text}"
+                block.append(line)
+                remaining -= count_tokens(line)
+
+        parts.extend(block)
+
+    return "\n".join(parts)
+
+
+def format_history(history, max_tokens=None) -> str:
+    """Historial reciente dentro del presupuesto, recorriendo del mensaje más nuevo al más antiguo."""
+    max_tokens = Config.CONTEXT_HISTORY_TOKENS if max_tokens is None else max_tokens
+    lines, used = [], 0
+    for msg in reversed(history or []):
+        line = f"{'Usuario' if msg['role'] == 'user' else 'Asistente'}: {msg['content']}"
+        cost = count_tokens(line)
+        if used + cost > max_tokens:
+            # El mensaje más reciente se recorta en vez de omitirse
+            if not lines:
+                line = truncate_to_tokens(line, max_tokens)
+                if line:
+                    lines.append(line)
+            break
+        lines.append(line)
+        used += cost
+    return "\n".join(reversed(lines))
+
+
+def build_messages(system_prompt, question, instructions, context="", history=None, kind="llm"):
+    """Arma los mensajes [system, user] respetando el presupuesto y registra su tamaño.
+
+    El mensaje de sistema es siempre el prompt estático sin modificar; todo lo
+    dinámico va en el mensaje de usuario, después del prefijo.
+    """
+    system_tokens = _static_tokens(system_prompt)
+    question_block = f"Pregunta del usuario: {question}"
+    fixed_tokens = system_tokens + count_tokens(question_block) + count_tokens(instructions)
+    available = max(Config.PROMPT_TOKEN_BUDGET - fixed_tokens, 0)
+
+    # El contexto ya viene armado por líneas (format_article_context): se recorta sin perder su estructura
+    context = truncate_lines(context, min(Config.CONTEXT_ARTICLES_TOKENS, available)) if context else ""
+    context_tokens = count_tokens(context)
+    history_text = format_history(history, min(Config.CONTEXT_HISTORY_TOKENS, available - context_tokens))
+    history_tokens = count_tokens(history_text)
+
+    sections = [question_block]
+    if context:
+        sections.append(context)
+    if history_text:
+        sections.append(f"Contexto reciente:\n{history_text}")
+    sections.append(instructions)
+    user_prompt = "\n\n".join(sections)
+
+    usage = {
+        "kind": kind,
+        "system_tokens": system_tokens,
+        "context_tokens": context_tokens,
+        "history_tokens": history_tokens,
+        "prompt_tokens": system_tokens + count_tokens(user_prompt),
+        "budget": Config.PROMPT_TOKEN_BUDGET,
+    }
+    logger.info("Prompt LLM preparado", extra=usage)
+    metrics.inc("prompt_tokens_total", usage["prompt_tokens"])
+    annotate("prompt_tokens", usage["prompt_tokens"])
+
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt},
+    ]
+    return messages, usage
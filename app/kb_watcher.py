@@ -0,0 +1,78 @@
+"""Vigilancia de data/ para recargar la base de conocimientos sin reiniciar.
+
+Sondea periódicamente la firma (mtime, tamaño) de los archivos de datos. Cuando
+cambia, espera a que se mantenga estable un ciclo (el archivo puede estar aún
+copiándose) y lanza vector_db.reload_async(): la base anterior sigue atendiendo
+hasta que la nueva está lista.
+
+Se activa con KB_WATCH_INTERVAL_SECONDS > 0.
+"""
+import logging
+import os
+import threading
+
+from app.config import Config
+from app.models.vector_db import DATA_DIR, vector_db
+
+logger = logging.getLogger(__name__)
+
+# Extensiones que forman parte del corpus (el índice .faiss se regenera y no se vigila)
+WATCHED_EXTENSIONS = (".xlsx", ".csv")
+
+_watcher = None
+
+
+def data_signature(directory=DATA_DIR):
+    """{archivo: (mtime_ns, tamaño)} de los archivos de datos vigilados."""
+    signature = {}
+    try:
+        entries = os.scandir(directory)
+    except OSError:
+        return signature
+    with entries:
+        for entry in entries:
+            if entry.is_file() and entry.name.lower().endswith(WATCHED_EXTENSIONS) and not entry.name.startswith("~$"):
+                stat = entry.stat()
+                signature[entry.name] = (stat.st_mtime_ns, stat.st_size)
+    return signature
+
+
+class KnowledgeBaseWatcher(threading.Thread):
+    """Hilo daemon que detecta cambios en data/ y dispara la recarga."""
+
+    def __init__(self, interval, directory=DATA_DIR):
+        super().__init__(name="kb-watcher", daemon=True)
+        self.interval = interval
+        self.directory = directory
+        self._stop_event = threading.Event()
+
+    def run(self):
+        known = data_signature(self.directory)
+        candidate = None
+        while not self._stop_event.wait(self.interval):
+            current = data_signature(self.directory)
+            if current == known:
+                candidate = None
+                continue
+            if current != candidate:
+                # Primer ciclo con cambios: esperar a que la escritura termine
+                candidate = current
+                continue
+            logger.info("Cambios detectados en %s; iniciando recarga", self.directory)
+            known, candidate = current, None
+            vector_db.reload_async()
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def start_watcher(interval=None):
+    """Arranca el vigilante una sola vez por proceso (no hace nada si el intervalo es 0)."""
+    global _watcher
+    interval = Config.KB_WATCH_INTERVAL_SECONDS if interval is None else interval
+    if interval <= 0 or _watcher is not None:
+        return _watcher
+    _watcher = KnowledgeBaseWatcher(interval)
+    _watcher.start()
+    logger.info("Vigilando %s cada %s s para recarga en caliente", DATA_DIR, interval)
+    return _watcher
@@ -0,0 +1,219 @@
+import hashlib
+import logging
+import re
+import time
+
+import httpx
+from openai import APITimeoutError, OpenAI
+
+from app.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class LLMUnavailableError(RuntimeError):
+    """El LLM no puede atender la llamada; el llamador responde sin él."""
+
+
+class LLMTimeoutError(LLMUnavailableError):
+    """El LLM no respondió dentro del tiempo asignado a la llamada."""
+
+
+class LLMCircuitOpenError(LLMUnavailableError, CircuitOpenError):
+    """Llamada rechazada al instante: el circuito del LLM está abierto."""
+
+
+class LLMBackend:
+    """Interfaz común para los modelos de lenguaje usados por QueryRAGSystem."""
+
+    name = "base"
+
+    def is_available(self) -> bool:
+        """Indica si el backend está configurado para atender solicitudes."""
+        return True
+
+    def is_open(self) -> bool:
+        """Indica si el interruptor de circuito rechaza llamadas en este momento."""
+        return False
+
+    def complete(self, messages, max_tokens=500, temperature=0.7, timeout=None) -> str:
+        """Genera una respuesta de chat a partir de una lista de mensajes {role, content}.
+
+        timeout (segundos) acota esta llamada por debajo del timeout del backend;
+        si se agota se lanza LLMTimeoutError.
+        """
+        raise NotImplementedError
+
+
+class OpenAIBackend(LLMBackend):
+    """Backend para la API de OpenAI o cualquier endpoint compatible (vLLM, llama.cpp, Ollama, stub local)."""
+
+    def __init__(self, api_key, model, base_url=None, timeout=None, name="openai"):
+        self.name = name
+        self.api_key = api_key
+        self.model = model
+        self.base_url = base_url
+        # Cliente HTTP propio sin proxies, con timeout explícito
+        self.client = OpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            http_client=httpx.Client(timeout=timeout),
+        )
+
+    def is_available(self) -> bool:
+        # Un endpoint local no necesita API key real
+        if self.base_url:
+            return True
+        return bool(self.api_key) and self.api_key != "KEY_NO_DEFINIDA"
+
+    def complete(self, messages, max_tokens=500, temperature=0.7, timeout=None) -> str:
+        # Sin reintentos cuando hay plazo: un reintento no cabría en el presupuesto
+        client = self.client if timeout is None else self.client.with_options(timeout=timeout, max_retries=0)
+        try:
+            response = client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                max_tokens=max_tokens,
+                temperature=temperature
+            )
+        except APITimeoutError as e:
+            raise LLMTimeoutError(f"El LLM no respondió en {timeout} s") from e
+        return (response.choices[0].message.content or "").strip()
+
+
+def stub_completion(messages, max_tokens=500) -> str:
+    """Respuesta determinista a partir de los mensajes: mismo prompt, misma respuesta.
+
+    Menciona los artículos presentes en el contexto para ejercitar la validación
+    de artículos de QueryRAGSystem igual que lo haría una respuesta real.
+    """
+    prompt = "\n".join(str(m.get("content", "")) for m in messages)
+    user_text = next((str(m.get("content", "")) for m in reversed(messages) if m.get("role") == "user"), "")
+    match = re.search(r"Pregunta del usuario:\s*(.+)", user_text)
+    question = (match.group(1) if match else user_text).strip()[:200]
+    articles = sorted(set(re.findall(r"Artículo:\s*(\d+)", prompt)), key=int)
+    digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:8]
+
+    words = [f"Respuesta de referencia {digest} sobre '{question}'."]
+    if articles:
+        words.append("Se basa en el " + ", ".join(f"artículo {a}" for a in articles) + ".")
+    words.append("¿Necesitas más información específica?")
+    text = " ".join(words)
+    tokens = text.split()
+    return " ".join(tokens[:max_tokens])
+
+
+class StubBackend(LLMBackend):
+    """Backend en proceso, determinista, con latencia y velocidad de generación configurables."""
+
+    name = "stub"
+
+    def __init__(self, latency_ms=None, tokens_per_second=None):
+        self.latency_ms = Config.STUB_LATENCY_MS if latency_ms is None else latency_ms
+        self.tokens_per_second = Config.STUB_TOKENS_PER_SECOND if tokens_per_second is None else tokens_per_second
+
+    def complete(self, messages, max_tokens=500, temperature=0.7, timeout=None) -> str:
+        text = stub_completion(messages, max_tokens)
+        delay = stub_delay_seconds(text, self.latency_ms, self.tokens_per_second)
+        if timeout is not None and delay > timeout:
+            time.sleep(max(timeout, 0))
+            raise LLMTimeoutError(f"El LLM no respondió en {timeout:.3f} s")
+        time.sleep(delay)
+        return text
+
+
+def stub_delay_seconds(text, latency_ms, tokens_per_second) -> float:
+    """Tiempo simulado: latencia fija más generación a tokens_per_second (0 = instantáneo)."""
+    delay = max(latency_ms, 0) / 1000.0
+    if tokens_per_second and tokens_per_second > 0:
+        delay += len(text.split()) / float(tokens_per_second)
+    return delay
+
+
+class GuardedBackend(LLMBackend):
+    """Envuelve un backend con un interruptor de circuito (ver app/circuit_breaker.py).
+
+    Los errores y las llamadas lentas abren el circuito; mientras está abierto,
+    complete() lanza LLMCircuitOpenError sin llamar al backend y un hilo sondea
+    el backend con una completación mínima hasta cerrarlo.
+    """
+
+    def __init__(self, backend, breaker_options=None):
+        self.backend = backend
+        self.name = backend.name
+        options = dict(breaker_options or {})
+        self.probe_timeout = options.pop("probe_timeout", None)
+        self.breaker = CircuitBreaker(f"llm_{backend.name}", self._probe, **options)
+
+    def is_available(self) -> bool:
+        return self.backend.is_available()
+
+    def is_open(self) -> bool:
+        return self.breaker.is_open()
+
+    def _probe(self):
+        self.backend.complete([{"role": "user", "content": "ping"}], max_tokens=1, temperature=0,
+                              timeout=self.probe_timeout)
+
+    def complete(self, messages, max_tokens=500, temperature=0.7, timeout=None) -> str:
+        try:
+            self.breaker.check()
+        except CircuitOpenError as e:
+            raise LLMCircuitOpenError(str(e)) from e
+        t0 = time.perf_counter()
+        try:
+            text = self.backend.complete(messages, max_tokens=max_tokens, temperature=temperature, timeout=timeout)
+        except LLMTimeoutError:
+            # Un plazo corto del cliente no indica falla del backend: solo cuenta si fue lenta de verdad
+            elapsed = (time.perf_counter() - t0) * 1000.0
+            if elapsed >= self.breaker.slow_ms:
+                self.breaker.record(elapsed)
+            raise
+        except Exception as e:
+            self.breaker.record((time.perf_counter() - t0) * 1000.0, e)
+            raise
+        self.breaker.record((time.perf_counter() - t0) * 1000.0)
+        return text
+
+
+def get_llm_backend() -> LLMBackend:
+    """Backend configurado, protegido por el interruptor de circuito si LLM_BREAKER_ENABLED."""
+    backend = _create_backend()
+    if not Config.LLM_BREAKER_ENABLED:
+        return backend
+    return GuardedBackend(backend, {
+        "window": Config.LLM_BREAKER_WINDOW,
+        "min_calls": Config.LLM_BREAKER_MIN_CALLS,
+        "failure_rate": Config.LLM_BREAKER_FAILURE_RATE,
+        "slow_ms": Config.LLM_BREAKER_SLOW_MS,
+        "probe_interval_s": Config.LLM_BREAKER_PROBE_INTERVAL_S,
+        "probe_successes": Config.LLM_BREAKER_PROBE_SUCCESSES,
+        "probe_timeout": Config.LLM_BREAKER_SLOW_MS / 1000.0,
+    })
+
+
+def _create_backend() -> LLMBackend:
+    """Crea el backend según la configuración (LLM_BACKEND o USE_LOCAL_MODEL)."""
+    backend = Config.LLM_BACKEND or ("local" if Config.USE_LOCAL_MODEL else "openai")
+
+    if backend == "stub":
+        logger.info("Usando backend LLM stub en proceso")
+        return StubBackend()
+    if backend == "local":
+        logger.info("Usando modelo local compatible con OpenAI en %s", Config.LOCAL_MODEL_URL)
+        return OpenAIBackend(
+            api_key=Config.LOCAL_MODEL_API_KEY,
+            model=Config.LOCAL_MODEL_NAME,
+            base_url=Config.LOCAL_MODEL_URL,
+            timeout=Config.LLM_TIMEOUT_SECONDS,
+            name="local",
+        )
+    if backend != "openai":
+        raise ValueError(f"LLM_BACKEND no soportado: {backend}")
+
+    return OpenAIBackend(
+        api_key=Config.OPENAI_API_KEY,
+        model=Config.OPENAI_MODEL,
+        timeout=Config.LLM_TIMEOUT_SECONDS,
+    )
@@ -0,0 +1,121 @@
+"""Servidor local compatible con la API de chat de OpenAI para pruebas de carga y benchmarks.
+
+Responde de forma determinista (ver stub_completion) con latencia fija y velocidad
+de generación configurables. Para usarlo desde el backend:
+
+    python -m app.llm_stub_server --port 8089 --latency-ms 400 --tokens-per-second 40
+    USE_LOCAL_MODEL=True LOCAL_MODEL_URL=http://localhost:8089/v1 python main.py
+"""
+import argparse
+import json
+import logging
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from app.config import Config
+from app.llm_backend import stub_completion, stub_delay_seconds
+
+logger = logging.getLogger(__name__)
+
+
+def _make_handler(latency_ms, tokens_per_second, model_name):
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            logger.debug("stub-llm: " + format, *args)
+
+        def _send_json(self, status, payload):
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path.rstrip("/").endswith("/models"):
+                self._send_json(200, {"object": "list", "data": [{"id": model_name, "object": "model"}]})
+            else:
+                self._send_json(404, {"error": {"message": "Not found"}})
+
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self._send_json(404, {"error": {"message": "Not found"}})
+                return
+            length = int(self.headers.get("Content-Length") or 0)
+            try:
+                request = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                self._send_json(400, {"error": {"message": "JSON inválido"}})
+                return
+
+            messages = request.get("messages") or []
+            max_tokens = int(request.get("max_tokens") or 500)
+            text = stub_completion(messages, max_tokens)
+            time.sleep(stub_delay_seconds(text, latency_ms, tokens_per_second))
+
+            prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in messages)
+            completion_tokens = len(text.split())
+            self._send_json(200, {
+                "id": f"chatcmpl-{uuid.uuid4().hex}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model") or model_name,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": text},
+                    "finish_reason": "stop",
+                }],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+            })
+
+    return StubHandler
+
+
+def start_stub_server(host="127.0.0.1", port=0, latency_ms=None, tokens_per_second=None, model_name=None):
+    """Arranca el servidor en un hilo daemon y devuelve (servidor, url_base)."""
+    handler = _make_handler(
+        Config.STUB_LATENCY_MS if latency_ms is None else latency_ms,
+        Config.STUB_TOKENS_PER_SECOND if tokens_per_second is None else tokens_per_second,
+        model_name or Config.LOCAL_MODEL_NAME,
+    )
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="stub-llm-server", daemon=True)
+    thread.start()
+    base_url = f"http://{host}:{server.server_address[1]}/v1"
+    logger.info("Servidor LLM stub escuchando en %s", base_url)
+    return server, base_url
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servidor LLM stub compatible con OpenAI")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=Config.STUB_LATENCY_MS)
+    parser.add_argument("--tokens-per-second", type=float, default=Config.STUB_TOKENS_PER_SECOND)
+    parser.add_argument("--model", default=Config.LOCAL_MODEL_NAME)
+    args = parser.parse_args(argv)
+
+    handler = _make_handler(args.latency_ms, args.tokens_per_second, args.model)
+    server = ThreadingHTTPServer((args.host, args.port), handler)
+    server.daemon_threads = True
+    print(f"Servidor LLM stub en http://{args.host}:{args.port}/v1 "
+          f"(latencia {args.latency_ms} ms, {args.tokens_per_second} tokens/s)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
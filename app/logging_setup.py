@@ -0,0 +1,145 @@
+"""Registro estructurado de baja sobrecarga.
+
+Los hilos de solicitud solo encolan el LogRecord (sin formatear el mensaje) en
+una cola acotada; un QueueListener en segundo plano formatea (JSON o texto) y
+escribe en la salida. Si la cola se llena, el registro se descarta y se cuenta
+en vez de bloquear la solicitud.
+
+Configuración (variables de entorno, ver app/config.py):
+    LOG_LEVEL=INFO                           nivel raíz
+    LOG_LEVELS=app.query=DEBUG,werkzeug=WARNING   niveles por módulo
+    LOG_FORMAT=json|text
+    LOG_DEBUG_SAMPLE_RATE=0.1                fracción de registros DEBUG que se conservan
+    LOG_QUEUE_SIZE=10000
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import threading
+import time
+
+from app.config import Config
+
+# Atributos estándar de LogRecord; el resto se considera contexto estructurado (extra=...)
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener = None
+_queue_handler = None
+_setup_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """Una línea JSON por registro. El mensaje se interpola aquí, fuera del hilo de la solicitud."""
+
+    def format(self, record):
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created)) + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "thread": record.threadName,
+        }
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class DebugSamplingFilter(logging.Filter):
+    """Conserva solo una fracción de los registros DEBUG; los demás niveles pasan siempre."""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.rate >= 1.0:
+            return True
+        return self.rate > 0.0 and random.random() < self.rate
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Encola el registro sin formatearlo y sin bloquear; si la cola está llena lo descarta."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # El QueueHandler estándar formatea el mensaje en el hilo que registra;
+        # aquí se conserva msg/args para que el listener haga la interpolación.
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _parse_levels(spec):
+    """'app.query=DEBUG,werkzeug=WARNING' -> {'app.query': 'DEBUG', 'werkzeug': 'WARNING'}"""
+    levels = {}
+    for part in (spec or "").split(","):
+        if "=" in part:
+            name, level = part.split("=", 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging(stream=None, force=False):
+    """Instala el handler asíncrono en el logger raíz. Es idempotente salvo con force=True."""
+    global _listener, _queue_handler
+
+    with _setup_lock:
+        if _listener is not None and not force:
+            return _queue_handler
+        if _listener is not None:
+            _listener.stop()
+
+        if Config.LOG_FORMAT == "json":
+            formatter = JsonFormatter()
+        else:
+            formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(name)s - %(message)s')
+        output = logging.StreamHandler(stream or sys.stdout)
+        output.setFormatter(formatter)
+
+        _queue_handler = NonBlockingQueueHandler(queue.Queue(maxsize=Config.LOG_QUEUE_SIZE))
+        _queue_handler.addFilter(DebugSamplingFilter(Config.LOG_DEBUG_SAMPLE_RATE))
+        _listener = logging.handlers.QueueListener(_queue_handler.queue, output, respect_handler_level=False)
+        _listener.start()
+
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(_queue_handler)
+        root.setLevel(Config.LOG_LEVEL)
+        for name, level in _parse_levels(Config.LOG_LEVELS).items():
+            logging.getLogger(name).setLevel(level)
+
+        # Las advertencias de Python también pasan por el registro
+        logging.captureWarnings(True)
+        return _queue_handler
+
+
+def shutdown_logging():
+    """Vacía la cola y detiene el listener (se llama también al salir del proceso)."""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+def dropped_records():
+    """Registros descartados por cola llena desde el arranque."""
+    return _queue_handler.dropped if _queue_handler is not None else 0
+
+
+atexit.register(shutdown_logging)
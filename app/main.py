@@ -1,18 +1,7 @@
-from flask import Flask
-from app.routes import init_app
-from flask_cors import CORS
-from flask_socketio import SocketIO
+from app import create_app, socketio
 
-# Inicialización de la aplicación Flask
-app = Flask(__name__)
-
-# Configuración de SocketIO
-
-CORS(app, resources={r"/*": {"origins": "*"}})
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode="threading")
-
-# Inicializa las rutas y SocketIO
-init_app(app)
+# Inicialización de la aplicación Flask (rutas, CORS y SocketIO en create_app)
+app = create_app()
 
 if __name__ == "__main__":
     # Ejecuta la aplicación con soporte de WebSocket
@@ -0,0 +1,72 @@
+import os
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Contadores y medidores del proceso, expuestos en GET /metrics
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+_started = time.time()
+
+
+def inc(name, value=1):
+    """Incrementa un contador (se crea en 0 si no existe)."""
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def get(name):
+    with _lock:
+        return _counters.get(name, 0)
+
+
+def register_gauge(name, fn):
+    """Registra una función sin argumentos cuyo valor se lee en cada snapshot."""
+    with _lock:
+        _gauges[name] = fn
+
+
+def _rss_bytes():
+    """RSS actual del proceso (Linux); None si no está disponible."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError, IndexError):
+        return None
+
+
+def process_stats():
+    """Uso de recursos del proceso servidor: CPU, memoria e hilos."""
+    stats = {
+        "pid": os.getpid(),
+        "uptime_s": round(time.time() - _started, 3),
+        "threads": threading.active_count(),
+        "rss_bytes": _rss_bytes(),
+    }
+    if resource is not None:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        stats["cpu_user_s"] = usage.ru_utime
+        stats["cpu_system_s"] = usage.ru_stime
+        # ru_maxrss está en KiB en Linux
+        stats["max_rss_bytes"] = usage.ru_maxrss * 1024
+    return stats
+
+
+def snapshot():
+    """Estado completo de métricas para exportar."""
+    with _lock:
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+    gauge_values = {}
+    for name, fn in gauges.items():
+        try:
+            gauge_values[name] = fn()
+        except Exception as e:
+            gauge_values[name] = f"error: {e}"
+    return {"process": process_stats(), "counters": counters, "gauges": gauge_values}
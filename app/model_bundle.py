@@ -0,0 +1,291 @@
+"""Paquetes locales y versionados de los modelos (embeddings y reranker), verificables por checksum.
+
+Un paquete es un directorio <nombre>-<versión>/ con:
+
+    bundle.json   # manifiesto: tipo, modelo de origen, versión, sha256 por archivo y checksum global
+    model/        # SentenceTransformer.save() (o CrossEncoder.save()) del modelo
+    variants/     # opcional: variantes ONNX/cuantizadas copiadas tal cual
+
+Con MODEL_BUNDLE_PATH, vector_db carga el modelo solo desde ese directorio (sin
+caché de Hugging Face ni red) tras verificar los checksums, y falla al arrancar
+con un error claro si el paquete falta, no coincide o se empaquetó desde otro
+modelo que el de EMBEDDING_MODEL. RERANKER_BUNDLE_PATH hace lo mismo con el
+cross-encoder de RERANKER_MODEL. Sin paquete, MODEL_BUNDLE_REQUIRED hace fallar
+el arranque en lugar de recurrir a la caché o a la red.
+
+Uso:
+    python -m app.model_bundle pack --model paraphrase-multilingual-mpnet-base-v2 --version 1 --output models
+    python -m app.model_bundle pack --model ... --version 2 --variant /ruta/onnx
+    python -m app.model_bundle pack --cross-encoder --model cross-encoder/mmarco-mMiniLMv2-L12-H384-v1 --version 1
+    python -m app.model_bundle verify models/paraphrase-multilingual-mpnet-base-v2-1
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "bundle.json"
+MODEL_SUBDIR = "model"
+VARIANTS_SUBDIR = "variants"
+
+# Tipo de modelo del paquete ("kind" en el manifiesto; los paquetes sin él son de embeddings)
+EMBEDDING = "embedding"
+CROSS_ENCODER = "cross-encoder"
+
+
+class ModelBundleError(RuntimeError):
+    """Paquete de modelo ausente, incompleto o con checksums que no coinciden."""
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def tree_checksums(root):
+    """{ruta relativa (con '/'): sha256} de todos los archivos del paquete salvo el manifiesto."""
+    files = {}
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            rel = os.path.relpath(path, root).replace(os.sep, "/")
+            if rel != MANIFEST_NAME:
+                files[rel] = file_sha256(path)
+    return dict(sorted(files.items()))
+
+
+def bundle_checksum(files):
+    """Checksum global: sha256 de las líneas 'ruta\\tsha256' ordenadas."""
+    digest = hashlib.sha256()
+    for rel, sha in sorted(files.items()):
+        digest.update(f"{rel}\t{sha}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def read_manifest(bundle_path):
+    manifest_path = os.path.join(bundle_path, MANIFEST_NAME)
+    if not os.path.isdir(bundle_path):
+        raise ModelBundleError(f"No existe el paquete de modelo {bundle_path}")
+    if not os.path.isfile(manifest_path):
+        raise ModelBundleError(f"El paquete {bundle_path} no tiene {MANIFEST_NAME}")
+    try:
+        with open(manifest_path, encoding="utf-8") as f:
+            return json.load(f)
+    except ValueError as e:
+        raise ModelBundleError(f"Manifiesto inválido en {manifest_path}: {e}") from e
+
+
+def verify_bundle(bundle_path, full=True):
+    """Valida el manifiesto y, con full, el sha256 de cada archivo. Devuelve el manifiesto."""
+    manifest = read_manifest(bundle_path)
+    expected = manifest.get("files") or {}
+    if bundle_checksum(expected) != manifest.get("checksum"):
+        raise ModelBundleError(f"El checksum del manifiesto de {bundle_path} no coincide con su lista de archivos")
+    if not os.path.isdir(os.path.join(bundle_path, MODEL_SUBDIR)):
+        raise ModelBundleError(f"El paquete {bundle_path} no tiene el directorio {MODEL_SUBDIR}/")
+
+    if full:
+        actual = tree_checksums(bundle_path)
+    else:
+        # Verificación rápida: solo presencia de los archivos declarados, sin leerlos
+        actual = {rel: sha for rel, sha in expected.items() if os.path.isfile(os.path.join(bundle_path, rel))}
+    missing = sorted(set(expected) - set(actual))
+    changed = sorted(rel for rel in expected.keys() & actual.keys() if expected[rel] != actual[rel])
+    extra = sorted(set(actual) - set(expected)) if full else []
+    if missing or changed or extra:
+        details = "; ".join(f"{label}: {', '.join(items[:5])}{' ...' if len(items) > 5 else ''}"
+                            for label, items in (("faltan", missing), ("modificados", changed), ("no declarados", extra))
+                            if items)
+        raise ModelBundleError(f"El paquete {bundle_path} no coincide con su manifiesto ({details})")
+    return manifest
+
+
+def bundle_info(manifest, bundle_path):
+    """Resumen del paquete para los manifiestos de índice y /admin."""
+    return {
+        "name": manifest.get("name"),
+        "version": manifest.get("version"),
+        "checksum": manifest.get("checksum"),
+        "path": os.path.abspath(bundle_path),
+    }
+
+
+def _offline_mode():
+    return any(os.getenv(var, "").strip().lower() in ("1", "true", "yes", "on")
+               for var in ("HF_HUB_OFFLINE", "TRANSFORMERS_OFFLINE"))
+
+
+def same_model(a, b):
+    """Si dos ids/rutas nombran el mismo modelo ('org/Modelo' y 'Modelo' o '/ruta/Modelo' coinciden)."""
+    def base(name):
+        return os.path.basename(os.path.normpath(str(name or "").strip())).lower()
+    return bool(base(a)) and base(a) == base(b)
+
+
+def _verified_model_dir(bundle_path, model_name, verify, kind, setting):
+    """(directorio del modelo, manifiesto) de un paquete verificado del tipo y modelo esperados."""
+    manifest = verify_bundle(bundle_path, full=verify)
+    bundle_kind = manifest.get("kind", EMBEDDING)
+    if bundle_kind != kind:
+        raise ModelBundleError(f"El paquete {bundle_path} es de tipo {bundle_kind!r} y se esperaba {kind!r}")
+    source = manifest.get("source_model")
+    if not same_model(source, model_name):
+        raise ModelBundleError(f"El paquete {bundle_path} se creó desde {source!r} y {setting} "
+                               f"resuelve a {model_name!r}")
+    return os.path.join(bundle_path, MODEL_SUBDIR), manifest
+
+
+def _log_loaded(label, manifest, t0):
+    logger.info(
+        "%s cargado desde el paquete %s (versión %s, checksum %s, %.1f s)",
+        label, manifest.get("name"), manifest.get("version"), manifest.get("checksum", "")[:12],
+        time.perf_counter() - t0,
+    )
+
+
+def load_embedding_model(model_name, bundle_path="", verify=True, required=False):
+    """(modelo, info del paquete). Sin bundle_path se resuelve model_name como hasta ahora (caché/red),
+    salvo con required, que exige el paquete."""
+    from sentence_transformers import SentenceTransformer
+
+    if not bundle_path:
+        if required:
+            raise ModelBundleError("MODEL_BUNDLE_REQUIRED está activo y no se definió MODEL_BUNDLE_PATH")
+        if _offline_mode():
+            logger.warning("Modo sin conexión sin MODEL_BUNDLE_PATH: %s se carga de la caché de Hugging Face "
+                           "sin verificar checksums", model_name)
+        return SentenceTransformer(model_name), None
+
+    t0 = time.perf_counter()
+    model_dir, manifest = _verified_model_dir(bundle_path, model_name, verify, EMBEDDING, "EMBEDDING_MODEL")
+    model = SentenceTransformer(model_dir)
+    _log_loaded("Modelo de embeddings", manifest, t0)
+    return model, bundle_info(manifest, bundle_path)
+
+
+def load_cross_encoder(model_name, bundle_path="", verify=True, required=False, **kwargs):
+    """(cross-encoder, info del paquete) para el reranker, con las mismas reglas que load_embedding_model."""
+    from sentence_transformers import CrossEncoder
+
+    if not bundle_path:
+        if required:
+            raise ModelBundleError("MODEL_BUNDLE_REQUIRED está activo y RERANKER_MODEL no tiene "
+                                   "RERANKER_BUNDLE_PATH")
+        if _offline_mode():
+            logger.warning("Modo sin conexión sin RERANKER_BUNDLE_PATH: %s se carga de la caché de Hugging Face "
+                           "sin verificar checksums", model_name)
+        return CrossEncoder(model_name, **kwargs), None
+
+    t0 = time.perf_counter()
+    model_dir, manifest = _verified_model_dir(bundle_path, model_name, verify, CROSS_ENCODER, "RERANKER_MODEL")
+    model = CrossEncoder(model_dir, **kwargs)
+    _log_loaded("Reranker", manifest, t0)
+    return model, bundle_info(manifest, bundle_path)
+
+
+def pack(model_name, version, output_dir, name=None, variants=(), force=False, kind=EMBEDDING):
+    """Empaqueta model_name (id de Hugging Face o ruta) y sus variantes. Devuelve la ruta del paquete.
+
+    kind: EMBEDDING (SentenceTransformer) o CROSS_ENCODER (reranker).
+    """
+    from sentence_transformers import CrossEncoder, SentenceTransformer
+
+    name = name or os.path.basename(os.path.normpath(model_name))
+    bundle_path = os.path.join(output_dir, f"{name}-{version}")
+    if os.path.exists(bundle_path) and not force:
+        raise ModelBundleError(f"Ya existe {bundle_path}; usa otra versión o --force")
+
+    # Directorio temporal único junto al destino: dos empaquetados simultáneos no se pisan
+    os.makedirs(output_dir, exist_ok=True)
+    tmp_path = tempfile.mkdtemp(prefix=f".{name}-{version}.", suffix=".tmp", dir=output_dir)
+    os.chmod(tmp_path, 0o755)  # mkdtemp lo crea 0700; el paquete debe poder leerse como antes
+    try:
+        model = CrossEncoder(model_name) if kind == CROSS_ENCODER else SentenceTransformer(model_name)
+        model.save(os.path.join(tmp_path, MODEL_SUBDIR))
+        for variant in variants:
+            target = os.path.join(tmp_path, VARIANTS_SUBDIR, os.path.basename(os.path.normpath(variant)))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            if os.path.isdir(variant):
+                shutil.copytree(variant, target)
+            else:
+                shutil.copy2(variant, target)
+
+        files = tree_checksums(tmp_path)
+        manifest = {
+            "name": name,
+            "version": str(version),
+            "kind": kind,
+            "source_model": model_name,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "dimension": model.get_sentence_embedding_dimension() if kind == EMBEDDING else None,
+            "max_seq_length": getattr(model, "max_seq_length", None),
+            "variants": sorted(os.listdir(os.path.join(tmp_path, VARIANTS_SUBDIR)))
+            if os.path.isdir(os.path.join(tmp_path, VARIANTS_SUBDIR)) else [],
+            "files": files,
+            "checksum": bundle_checksum(files),
+        }
+        with open(os.path.join(tmp_path, MANIFEST_NAME), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+        if os.path.exists(bundle_path):
+            shutil.rmtree(bundle_path)
+        os.replace(tmp_path, bundle_path)
+    except Exception:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+    return bundle_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Paquetes locales de los modelos de embeddings y reranker")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_pack = sub.add_parser("pack", help="Empaqueta un modelo en <output>/<nombre>-<versión>")
+    p_pack.add_argument("--model", default="paraphrase-multilingual-mpnet-base-v2",
+                        help="Id de Hugging Face o ruta local del modelo")
+    p_pack.add_argument("--version", required=True)
+    p_pack.add_argument("--output", default="models")
+    p_pack.add_argument("--name", help="Nombre del paquete (por defecto, el del modelo)")
+    p_pack.add_argument("--variant", action="append", default=[],
+                        help="Archivo o directorio adicional (ONNX, cuantizado...); se puede repetir")
+    p_pack.add_argument("--force", action="store_true", help="Reemplazar el paquete si ya existe")
+    p_pack.add_argument("--cross-encoder", action="store_true",
+                        help="Empaquetar un cross-encoder (RERANKER_MODEL) en lugar de un modelo de embeddings")
+
+    p_verify = sub.add_parser("verify", help="Verifica los checksums de un paquete")
+    p_verify.add_argument("path")
+    p_verify.add_argument("--quick", action="store_true", help="Solo manifiesto y presencia de archivos")
+
+    args = parser.parse_args(argv)
+    try:
+        if args.command == "pack":
+            kind = CROSS_ENCODER if args.cross_encoder else EMBEDDING
+            path = pack(args.model, args.version, args.output, name=args.name, variants=args.variant,
+                        force=args.force, kind=kind)
+            manifest = read_manifest(path)
+            setting = "RERANKER_BUNDLE_PATH" if kind == CROSS_ENCODER else "MODEL_BUNDLE_PATH"
+            print(f"Paquete creado: {path}")
+            print(f"  archivos: {len(manifest['files'])}  checksum: {manifest['checksum']}")
+            print(f"  {setting}={os.path.abspath(path)}")
+        else:
+            manifest = verify_bundle(args.path, full=not args.quick)
+            print(f"OK {manifest.get('name')} {manifest.get('version')} ({len(manifest['files'])} archivos, "
+                  f"checksum {manifest['checksum']})")
+    except ModelBundleError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
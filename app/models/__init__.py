@@ -1 +1,6 @@
-from .vector_db import vector_db
\ No newline at end of file
+"""Índice vectorial, corpus e ingesta.
+
+El paquete no importa vector_db: importarlo carga el modelo de embeddings y el
+índice, así que se hace explícitamente (from app.models.vector_db import
+vector_db) y los módulos de datos (corpus_store, ingest, ...) se pueden usar solos.
+"""
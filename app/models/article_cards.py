@@ -0,0 +1,211 @@
+"""Fragmentos de respuesta precalculados por artículo ("tarjetas").
+
+Las respuestas de plantilla (listados, respuesta directa) se arman siempre con
+los mismos pedazos de markdown por fila. Aquí se construyen una sola vez al
+cargar la base las líneas cortas (referencia, línea de listado, relacionado), de
+modo que los generadores de respuesta solo concatenan cadenas ya listas. Lo que
+depende del texto o del resumen (extractos, cuerpo de la respuesta directa,
+entrada por tema) se lee del arena del corpus al pedirlo: así las tarjetas no
+duplican en memoria los textos largos. El detalle de un artículo, que repite el
+texto completo, se arma al pedirlo (render_detail).
+"""
+import unicodedata
+
+EMPTY_VALUES = ('', 'nan', 'None', 'null')
+SNIPPET_CHARS = 300
+
+
+def clean_value(value) -> str:
+    """Valor de celda como texto; los vacíos ('', 'nan', 'None', 'null') quedan como ''."""
+    if value is None:
+        return ""
+    text = str(value).strip()
+    return "" if text in EMPTY_VALUES else text
+
+
+def normalize_text(text) -> str:
+    """Minúsculas sin tildes, para comparar fuentes y temas."""
+    return unicodedata.normalize('NFKD', str(text)).encode('ASCII', 'ignore').decode('utf-8').lower()
+
+
+def truncate(text, limit=SNIPPET_CHARS) -> str:
+    return text[:limit] + "..." if len(text) > limit else text
+
+
+class _RowTexts:
+    """Textos de una fila suelta (dict), con la misma lectura que CorpusStore._text."""
+
+    __slots__ = ("values",)
+
+    def __init__(self, texto, resumen):
+        self.values = (texto, resumen)
+
+    def _text(self, pos, j):
+        return self.values[j]
+
+
+class ArticleCard:
+    """Tarjeta de un artículo: etiquetas y líneas cortas precalculadas; extractos leídos del corpus.
+
+    Las etiquetas (fuente, tema, subtema, artículo) son las mismas cadenas
+    internadas del almacén. snippet, text_snippet, direct_body y theme_line se
+    arman en cada acceso a partir del texto y el resumen de la fila.
+    """
+
+    __slots__ = ("articulo", "numero", "fuente", "fuente_norm", "tema", "subtema",
+                 "reference", "related_line", "list_line", "_texts", "_pos")
+
+    def __init__(self, articulo, numero, fuente, fuente_norm, tema, subtema, reference, related_line, list_line,
+                 texts, pos=0):
+        self.articulo = articulo          # número de artículo tal como aparece en la base (texto)
+        self.numero = numero              # número entero para ordenar, o None si no es numérico
+        self.fuente = fuente
+        self.fuente_norm = fuente_norm    # fuente normalizada (normalize_text) para filtrar
+        self.tema = tema
+        self.subtema = subtema
+        self.reference = reference        # "Artículo N - fuente (subtema)"
+        self.related_line = related_line  # "• Art. N - tema (subtema)"
+        self.list_line = list_line        # "• **ARTÍCULO N** — tema (subtema)"
+        self._texts = texts               # CorpusStore (o _RowTexts) del que se leen texto y resumen
+        self._pos = pos
+
+    @property
+    def texto(self):
+        return clean_value(self._texts._text(self._pos, 0))
+
+    @property
+    def resumen(self):
+        return clean_value(self._texts._text(self._pos, 1))
+
+    @property
+    def snippet(self):
+        """Resumen, o texto del artículo, recortado a SNIPPET_CHARS."""
+        return truncate(self.resumen or self.texto)
+
+    @property
+    def text_snippet(self):
+        """Texto del artículo recortado (o snippet si no hay texto)."""
+        texto = self.texto
+        return truncate(texto) if texto else self.snippet
+
+    @property
+    def direct_body(self):
+        """Resumen completo, o extracto del texto."""
+        return self.resumen or truncate(self.texto)
+
+    @property
+    def theme_line(self):
+        """Entrada de search_by_theme: "• **Art. N** (fuente) - *subtema*" y resumen."""
+        line = f"• **Art. {self.articulo}** ({self.fuente})"
+        if self.subtema:
+            line += f" - *{self.subtema}*"
+        return line + f"\n  {self.resumen}\n\n"
+
+    def __repr__(self):
+        return f"ArticleCard({self.articulo!r}, fuente={self.fuente!r})"
+
+
+def _to_number(articulo):
+    try:
+        return int(float(articulo))
+    except (TypeError, ValueError):
+        return None
+
+
+def _render_detail(articulo, fuente, tema, subtema, texto, resumen):
+    """Mismo formato que devolvía get_article_details al armarlo desde la fila."""
+    if not texto:
+        parts = [f"El artículo {articulo} ({fuente}) no tiene disponible su texto completo en la base de datos actual."]
+        if resumen:
+            parts.append(f"En términos generales, trata sobre {resumen}.")
+        elif tema:
+            if subtema:
+                parts.append(f"Su tema es {tema} y aborda el subtema {subtema}.")
+            else:
+                parts.append(f"Su tema principal es {tema}.")
+        parts.append("Para consultar el texto exacto y detalles oficiales, revisa el sitio del Ministerio de Salud o la plataforma de legislación colombiana.")
+        return " ".join(parts)
+
+    response_parts = [f"**Artículo {articulo}**"]
+    if fuente:
+        response_parts.append(f"**Fuente:** {fuente}")
+    if tema:
+        response_parts.append(f"**Tema:** {tema}")
+    if subtema:
+        response_parts.append(f"**Subtema:** {subtema}")
+    response_parts.append(f"**Contenido:**\n{texto}")
+    if resumen:
+        response_parts.append(f"**Resumen:** {resumen}")
+    return "\n\n".join(response_parts)
+
+
+def render_detail(data) -> str:
+    """Respuesta completa de get_article_details para una fila (dict)."""
+    return _render_detail(
+        clean_value(data.get('articulo')),
+        clean_value(data.get('fuente')),
+        clean_value(data.get('tema')),
+        clean_value(data.get('subtema')),
+        clean_value(data.get('texto_del_articulo')),
+        clean_value(data.get('resumen_explicativo')),
+    )
+
+
+def make_card(data, texts=None, pos=0, fuente_norms=None) -> ArticleCard:
+    """Construye la tarjeta de un artículo a partir de una fila (dict o ArticleRecord).
+
+    Con texts (el CorpusStore) y pos, texto y resumen se leen del almacén al
+    pedirlos; sin ellos se toman de la fila. fuente_norms reutiliza la fuente
+    normalizada entre tarjetas de la misma fuente.
+    """
+    articulo = clean_value(data.get('articulo'))
+    fuente = clean_value(data.get('fuente'))
+    tema = clean_value(data.get('tema'))
+    subtema = clean_value(data.get('subtema'))
+    if texts is None:
+        texts = _RowTexts(str(data.get('texto_del_articulo') or ''), str(data.get('resumen_explicativo') or ''))
+
+    numero = _to_number(articulo)
+    subtema_suffix = f" ({subtema})" if subtema else ""
+
+    list_line = f"• **ARTÍCULO {numero if numero is not None else articulo}**"
+    if tema:
+        list_line += f" — {tema}"
+    list_line += subtema_suffix
+
+    fuente_norm = fuente_norms.get(fuente) if fuente_norms is not None else None
+    if fuente_norm is None:
+        fuente_norm = normalize_text(fuente)
+        if fuente_norms is not None:
+            fuente_norms[fuente] = fuente_norm
+
+    return ArticleCard(
+        articulo=articulo,
+        numero=numero,
+        fuente=fuente,
+        fuente_norm=fuente_norm,
+        tema=tema,
+        subtema=subtema,
+        reference=f"Artículo {articulo or 'N/A'} - {fuente or 'N/A'}{subtema_suffix}",
+        related_line=f"• Art. {articulo or 'N/A'} - {tema or 'N/A'}{subtema_suffix}",
+        list_line=list_line,
+        texts=texts,
+        pos=pos,
+    )
+
+
+def build_cards(corpus):
+    """Tarjetas de todas las filas, en el mismo orden posicional que el almacén del corpus.
+
+    Solo se leen las columnas categóricas de cada fila: los textos largos quedan en el arena.
+    """
+    fuente_norms = {}
+    return [make_card(corpus.record(pos), corpus, pos, fuente_norms) for pos in range(len(corpus))]
+
+
+def index_by_article(cards):
+    """Número de artículo -> posiciones de las tarjetas con ese número (en orden de la base)."""
+    positions = {}
+    for pos, card in enumerate(cards):
+        positions.setdefault(card.articulo, []).append(pos)
+    return positions
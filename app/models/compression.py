@@ -0,0 +1,148 @@
+"""Vectores comprimidos para la primera pasada de búsqueda, con reordenamiento exacto.
+
+La primera pasada busca sobre vectores reducidos por PCA y cuantizados (float16
+o int8, IndexScalarQuantizer de FAISS). Una lista corta de candidatos se vuelve
+a puntuar con los vectores originales float32, que quedan en un .npy abierto con
+memmap: solo se leen del disco las filas de los candidatos, no el corpus entero.
+
+La proyección no centra la consulta: <C(x - m), Cq> = <x, CᵀCq> - <m, CᵀCq>, y el
+segundo término es constante para una consulta, así que no altera el orden.
+"""
+import logging
+import os
+import tempfile
+
+import faiss
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+QUANTIZERS = {
+    'fp16': faiss.ScalarQuantizer.QT_fp16,
+    'int8': faiss.ScalarQuantizer.QT_8bit,
+}
+
+
+def learn_projection(vectors, dim, sample=50000, seed=0):
+    """(media, componentes dim x d) por PCA sobre una muestra; None si dim no reduce."""
+    d = vectors.shape[1]
+    if not dim or dim >= d:
+        return None
+    if len(vectors) > sample:
+        rows = np.sort(np.random.default_rng(seed).choice(len(vectors), sample, replace=False))
+        vectors = vectors[rows]
+    vectors = np.asarray(vectors, dtype=np.float64)
+    mean = vectors.mean(axis=0)
+    centered = vectors - mean
+    eigenvalues, eigenvectors = np.linalg.eigh(centered.T @ centered)
+    order = np.argsort(eigenvalues)[::-1][:dim]
+    retained = eigenvalues[order].sum() / max(eigenvalues.sum(), 1e-12)
+    logger.info("PCA %s -> %s dimensiones (varianza retenida %.1f%%)", d, dim, retained * 100)
+    return mean.astype(np.float32), np.ascontiguousarray(eigenvectors[:, order].T, dtype=np.float32)
+
+
+class CompressedStore:
+    """Índice cuantizado (primera pasada) + vectores completos en memmap (reordenamiento)."""
+
+    def __init__(self, index, full, projection=None, rescore_factor=4):
+        self.index = index
+        self.full = full
+        self.projection = projection
+        self.rescore_factor = max(int(rescore_factor), 1)
+
+    @classmethod
+    def build(cls, vectors, vectors_file, dtype='fp16', dim=256, rescore_factor=4):
+        """Entrena proyección y cuantizador, escribe vectors_file y abre el memmap."""
+        if dtype not in QUANTIZERS:
+            raise ValueError(f"Tipo de compresión no soportado: {dtype} (opciones: {', '.join(QUANTIZERS)})")
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        projection = learn_projection(vectors, dim)
+        reduced = cls._reduce(vectors, projection, center=True)
+        index = faiss.IndexScalarQuantizer(reduced.shape[1], QUANTIZERS[dtype], faiss.METRIC_INNER_PRODUCT)
+        index.train(reduced)
+        index.add(reduced)
+        del reduced
+
+        # Reemplazo atómico: una instantánea anterior que tenga el archivo abierto conserva el suyo.
+        # Temporal único en el mismo directorio, para que dos procesos no escriban el mismo.
+        fd, tmp = tempfile.mkstemp(prefix=os.path.basename(vectors_file) + ".", suffix=".tmp",
+                                   dir=os.path.dirname(vectors_file) or ".")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, vectors)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, vectors_file)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        return cls(index, np.load(vectors_file, mmap_mode='r'), projection, rescore_factor)
+
+    @classmethod
+    def load(cls, index, vectors_file, projection_file, rescore_factor=4):
+        full = np.load(vectors_file, mmap_mode='r')
+        with np.load(projection_file) as data:
+            projection = (data['mean'], data['components']) if 'components' in data else None
+        if full.shape[0] != index.ntotal:
+            raise ValueError(f"{os.path.basename(vectors_file)} tiene {full.shape[0]} vectores y el índice {index.ntotal}")
+        return cls(index, full, projection, rescore_factor)
+
+    def save_projection(self, projection_file):
+        if self.projection is None:
+            np.savez(projection_file)
+        else:
+            np.savez(projection_file, mean=self.projection[0], components=self.projection[1])
+
+    @staticmethod
+    def _reduce(vectors, projection, center):
+        if projection is None:
+            return np.ascontiguousarray(vectors, dtype=np.float32)
+        mean, components = projection
+        if center:
+            vectors = vectors - mean
+        return np.ascontiguousarray(vectors @ components.T, dtype=np.float32)
+
+    @property
+    def ntotal(self):
+        return self.index.ntotal
+
+    @property
+    def dim(self):
+        return self.full.shape[1]
+
+    def search(self, query, k, params=None, eligible=None):
+        """Como index.search sobre los vectores completos: primera pasada comprimida y reordenamiento exacto."""
+        eligible = self.index.ntotal if eligible is None else eligible
+        shortlist = min(k * self.rescore_factor, eligible)
+        _, candidates = self.index.search(self._reduce(query, self.projection, center=False), shortlist,
+                                          params=params)
+        ids = np.sort(candidates[0][candidates[0] >= 0])
+        scores = self.full[ids] @ query[0]
+        order = np.argsort(-scores, kind="stable")[:k]
+        return scores[order][None, :].astype(np.float32), ids[order][None, :]
+
+    def memory_report(self):
+        """Bytes en RAM (códigos + proyección) frente al índice plano float32 equivalente."""
+        flat = self.full.shape[0] * self.full.shape[1] * 4
+        compressed = self.index.ntotal * self.index.sa_code_size()
+        if self.projection is not None:
+            compressed += self.projection[0].nbytes + self.projection[1].nbytes
+        return {"flat_bytes": flat, "compressed_bytes": compressed,
+                "saved_pct": round(100.0 * (1 - compressed / flat), 1) if flat else 0.0}
+
+    def sampled_recall(self, k=10, samples=200, seed=0):
+        """recall@k de la búsqueda comprimida frente a la exacta, con vectores del corpus como consultas."""
+        n = self.full.shape[0]
+        if n == 0:
+            return 1.0
+        rows = np.random.default_rng(seed).choice(n, min(samples, n), replace=False)
+        k = min(k, n)
+        queries = np.ascontiguousarray(self.full[np.sort(rows)], dtype=np.float32)
+        # Una sola pasada por el memmap para el top-k exacto de todas las consultas
+        exact = np.argpartition(-(self.full @ queries.T), k - 1, axis=0)[:k].T
+        hits = 0
+        for query, truth in zip(queries, exact):
+            _, approx = self.search(query[None, :], k)
+            hits += len(set(truth.tolist()) & set(approx[0].tolist()))
+        return hits / (len(queries) * k)
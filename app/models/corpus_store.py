@@ -0,0 +1,281 @@
+"""Almacén compacto y de solo lectura del corpus, en lugar del DataFrame al servir.
+
+Las columnas cortas y repetidas (fuente, artículo, tema, subtema, categorías)
+se guardan como categóricas: un código int32 por fila y una sola copia
+(internada) de cada valor distinto. Los textos largos (texto_del_articulo,
+resumen_explicativo) van en un arena UTF-8 contiguo con desplazamientos int64;
+el texto de una fila se decodifica solo cuando se lee.
+
+Formato en disco (un archivo, reemplazo atómico):
+
+    AZCORP01 | largo del encabezado (uint64) | encabezado JSON (esquema, filas,
+    etiquetas) | desplazamientos int64 | códigos int32 | arena
+
+CorpusStore.open lo abre con np.memmap: el arena y los códigos se leen de la
+caché de páginas a demanda y los comparten los procesos que abren el mismo archivo.
+
+La búsqueda entrega cada fila como ArticleRecord: una vista con __slots__ y
+acceso de dict (get, []) en lugar de una Series de pandas o un dict nuevo.
+"""
+import json
+import os
+import struct
+import sys
+import tempfile
+from array import array
+
+import numpy as np
+
+from app.models.ingest import REQUIRED_COLUMNS
+
+CATEGORICAL_COLUMNS = ('fuente', 'articulo', 'tema', 'subtema', 'categorias')
+TEXT_COLUMNS = ('texto_del_articulo', 'resumen_explicativo')
+MAGIC = b"AZCORP01"
+_COLUMN_SET = frozenset(REQUIRED_COLUMNS)
+
+
+class ArticleRecord:
+    """Fila del corpus de solo lectura con la interfaz de dict que usan los consumidores (get, [], in).
+
+    Las columnas categóricas son referencias a las etiquetas del almacén, sin
+    copias; cada texto largo se decodifica del arena la primera vez que se lee
+    (un resultado que no llega a mostrarse no decodifica su resumen).
+    """
+
+    __slots__ = ("index", "fuente", "articulo", "tema", "subtema", "categorias", "_corpus", "_texto", "_resumen")
+
+    def __init__(self, corpus, pos):
+        self.index = pos
+        self._corpus = corpus
+        self.fuente, self.articulo, self.tema, self.subtema, self.categorias = corpus.labels_at(pos)
+        self._texto = self._resumen = None
+
+    @property
+    def texto_del_articulo(self):
+        if self._texto is None:
+            self._texto = self._corpus._text(self.index, 0)
+        return self._texto
+
+    @property
+    def resumen_explicativo(self):
+        if self._resumen is None:
+            self._resumen = self._corpus._text(self.index, 1)
+        return self._resumen
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in _COLUMN_SET else default
+
+    def __getitem__(self, key):
+        if key not in _COLUMN_SET:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key):
+        return key in _COLUMN_SET
+
+    def keys(self):
+        return REQUIRED_COLUMNS
+
+    def to_dict(self):
+        return {column: getattr(self, column) for column in REQUIRED_COLUMNS}
+
+    def __repr__(self):
+        return f"ArticleRecord({self.index}, fuente={self.fuente!r}, articulo={self.articulo!r})"
+
+
+class CorpusBuilder:
+    """Arma un CorpusStore fila a fila, sin conservar las filas.
+
+    Guarda solo lo que queda en el almacén: códigos int32 y desplazamientos int64
+    (array, no listas de int de Python), etiquetas internadas y el arena UTF-8;
+    así la ingesta por bloques no acumula los dicts de todas las filas.
+    """
+
+    def __init__(self):
+        self._ids = {column: {} for column in CATEGORICAL_COLUMNS}
+        self._labels = {column: [] for column in CATEGORICAL_COLUMNS}
+        self._codes = array("i")
+        self._offsets = array("q", [0])
+        self._arena = bytearray()
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def add(self, row):
+        """Agrega una fila {columna: texto}."""
+        for column in CATEGORICAL_COLUMNS:
+            value = row.get(column) or ""
+            code = self._ids[column].get(value)
+            if code is None:
+                code = self._ids[column][value] = len(self._labels[column])
+                self._labels[column].append(sys.intern(value))
+            self._codes.append(code)
+        for column in TEXT_COLUMNS:
+            self._arena += (row.get(column) or "").encode("utf-8")
+            self._offsets.append(len(self._arena))
+        self.size += 1
+
+    def extend(self, rows):
+        for row in rows:
+            self.add(row)
+        return self
+
+    def build(self):
+        """CorpusStore en memoria con las filas agregadas (el constructor no debe reutilizarse)."""
+        return CorpusStore(
+            self.size,
+            self._labels,
+            np.frombuffer(self._codes, dtype=np.int32).reshape(self.size, len(CATEGORICAL_COLUMNS)),
+            np.frombuffer(self._offsets, dtype=np.int64),
+            np.frombuffer(self._arena, dtype=np.uint8),
+        )
+
+
+class CorpusStore:
+    """Filas del corpus por posición (la misma posición que el id en FAISS)."""
+
+    columns = tuple(REQUIRED_COLUMNS)
+
+    def __init__(self, size, labels, codes, offsets, arena, path=None):
+        self.size = size
+        self.labels = labels      # columna categórica -> [valor por código]
+        self.codes = codes        # (filas, columnas categóricas) int32
+        self.offsets = offsets    # filas * columnas de texto + 1, int64; texto (fila, j) = arena[k:k+1], k = fila*T+j
+        self.arena = arena        # uint8, UTF-8
+        self.path = path
+        self._label_lists = tuple(labels[column] for column in CATEGORICAL_COLUMNS)
+        self._layout = {column: (True, j) for j, column in enumerate(CATEGORICAL_COLUMNS)}
+        self._layout.update({column: (False, j) for j, column in enumerate(TEXT_COLUMNS)})
+
+    def __len__(self):
+        return self.size
+
+    @classmethod
+    def build(cls, rows):
+        """Construye el almacén en memoria a partir de filas {columna: texto} (lista o iterador)."""
+        return CorpusBuilder().extend(rows).build()
+
+    def save(self, path):
+        """Escribe el archivo (reemplazo atómico: quien tenga abierto el anterior conserva el suyo)."""
+        header = json.dumps({
+            "rows": self.size,
+            "categorical": list(CATEGORICAL_COLUMNS),
+            "text": list(TEXT_COLUMNS),
+            "labels": self.labels,
+            "arena_bytes": int(len(self.arena)),
+        }, ensure_ascii=False).encode("utf-8")
+        # Las secciones quedan alineadas a 8 bytes para los memmap int64/int32
+        header += b" " * (-(len(MAGIC) + 8 + len(header)) % 8)
+        # Temporal único en el mismo directorio: varios procesos pueden guardar a la vez
+        # y cada uno reemplaza el archivo con uno completo
+        fd, tmp = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp",
+                                   dir=os.path.dirname(path) or ".")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(MAGIC)
+                f.write(struct.pack("<Q", len(header)))
+                f.write(header)
+                np.ascontiguousarray(self.offsets, dtype="<i8").tofile(f)
+                np.ascontiguousarray(self.codes, dtype="<i4").tofile(f)
+                np.ascontiguousarray(self.arena).tofile(f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    @classmethod
+    def open(cls, path):
+        """Abre un archivo escrito por save() con np.memmap (solo lectura)."""
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{os.path.basename(path)} no es un almacén de corpus")
+            (header_size,) = struct.unpack("<Q", f.read(8))
+            header = json.loads(f.read(header_size).decode("utf-8"))
+        if header["categorical"] != list(CATEGORICAL_COLUMNS) or header["text"] != list(TEXT_COLUMNS):
+            raise ValueError(f"{os.path.basename(path)} tiene un esquema de columnas distinto")
+
+        size = header["rows"]
+        buffer = np.memmap(path, dtype=np.uint8, mode="r")
+        start = len(MAGIC) + 8 + header_size
+        end = start + (size * len(TEXT_COLUMNS) + 1) * 8
+        offsets = buffer[start:end].view("<i8")
+        start, end = end, end + size * len(CATEGORICAL_COLUMNS) * 4
+        codes = buffer[start:end].view("<i4").reshape(size, len(CATEGORICAL_COLUMNS))
+        arena = buffer[end:end + header["arena_bytes"]]
+        labels = {column: [sys.intern(value) for value in header["labels"][column]] for column in CATEGORICAL_COLUMNS}
+        return cls(size, labels, codes, offsets, arena, path=path)
+
+    def labels_at(self, pos):
+        """Valores de las columnas categóricas de la fila pos, en el orden de CATEGORICAL_COLUMNS."""
+        return [labels[code] for labels, code in zip(self._label_lists, self.codes[pos].tolist())]
+
+    def texts_at(self, pos):
+        """Textos de la fila pos, en el orden de TEXT_COLUMNS."""
+        k = pos * len(TEXT_COLUMNS)
+        bounds = self.offsets[k:k + len(TEXT_COLUMNS) + 1].tolist()
+        return tuple(self.arena[start:end].tobytes().decode("utf-8") for start, end in zip(bounds, bounds[1:]))
+
+    def record(self, pos):
+        """Fila pos como ArticleRecord."""
+        return ArticleRecord(self, int(pos))
+
+    def _text(self, pos, j):
+        k = pos * len(TEXT_COLUMNS) + j
+        return self.arena[int(self.offsets[k]):int(self.offsets[k + 1])].tobytes().decode("utf-8")
+
+    def value(self, pos, column):
+        """Valor de una columna en la fila pos."""
+        categorical, j = self._layout[column]
+        if categorical:
+            return self.labels[column][self.codes[pos, j]]
+        return self._text(int(pos), j)
+
+    def row(self, pos):
+        """Fila completa como dict {columna: texto}, en el orden de REQUIRED_COLUMNS."""
+        pos = int(pos)
+        values = dict(zip(CATEGORICAL_COLUMNS, self.labels_at(pos)))
+        values.update(zip(TEXT_COLUMNS, self.texts_at(pos)))
+        return {column: values[column] for column in self.columns}
+
+    def column(self, column):
+        """Todos los valores de una columna (lista), en orden de fila."""
+        categorical, j = self._layout[column]
+        if categorical:
+            labels = self.labels[column]
+            return [labels[code] for code in self.codes[:, j].tolist()]
+        return [self._text(pos, j) for pos in range(self.size)]
+
+    def matching(self, regex, columns):
+        """Posiciones (ordenadas) de las filas en que regex (compilado) aparece en alguna de las columnas.
+
+        En las categóricas el patrón se evalúa una vez por valor distinto; en las
+        de texto, fila a fila y solo en las que aún no coincidieron.
+        """
+        mask = np.zeros(self.size, dtype=bool)
+        for column in columns:
+            categorical, j = self._layout[column]
+            if categorical:
+                hits = [code for code, label in enumerate(self.labels[column]) if regex.search(label)]
+                if hits:
+                    mask |= np.isin(self.codes[:, j], hits)
+            else:
+                for pos in np.flatnonzero(~mask).tolist():
+                    if regex.search(self._text(pos, j)):
+                        mask[pos] = True
+        return np.flatnonzero(mask)
+
+    def memory_report(self):
+        """Bytes de los arreglos y de las etiquetas (estas siempre en RAM); mapped=True si vienen de disco."""
+        return {
+            "rows": self.size,
+            "arena_bytes": int(self.arena.nbytes),
+            "offsets_bytes": int(self.offsets.nbytes),
+            "codes_bytes": int(self.codes.nbytes),
+            "label_values": sum(len(labels) for labels in self.labels.values()),
+            "label_bytes": sum(sys.getsizeof(label) for labels in self.labels.values() for label in labels),
+            "mapped": self.path is not None,
+        }
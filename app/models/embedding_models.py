@@ -0,0 +1,52 @@
+"""Registro de modelos de embeddings seleccionables con EMBEDDING_MODEL.
+
+Cada entrada tiene una clave corta (la que se usa en la configuración y en la
+ruta de los artefactos del índice, data/indexes/<clave>/), el id de Hugging Face
+y los prefijos que el modelo espera en consultas y pasajes (los e5 se entrenaron
+con "query: " / "passage: "). EMBEDDING_MODEL también acepta un id o ruta que no
+esté en el registro: se usa tal cual, sin prefijos, con una clave derivada del nombre.
+
+Para comparar candidatos con la batería de consultas: python -m tools.compare_embeddings
+"""
+import re
+from collections import namedtuple
+
+EmbeddingModelSpec = namedtuple("EmbeddingModelSpec", [
+    "key",             # clave del registro y nombre del directorio de artefactos
+    "name",            # id de Hugging Face o ruta local
+    "query_prefix",
+    "passage_prefix",
+    "description",
+])
+
+DEFAULT_MODEL = "mpnet"
+
+REGISTRY = {spec.key: spec for spec in (
+    EmbeddingModelSpec("mpnet", "paraphrase-multilingual-mpnet-base-v2", "", "",
+                       "768 dims, 278M parámetros; modelo actual"),
+    EmbeddingModelSpec("minilm", "paraphrase-multilingual-MiniLM-L12-v2", "", "",
+                       "384 dims, 118M parámetros; ~3x más rápido que mpnet"),
+    EmbeddingModelSpec("distiluse", "distiluse-base-multilingual-cased-v2", "", "",
+                       "512 dims, 135M parámetros"),
+    EmbeddingModelSpec("e5-small", "intfloat/multilingual-e5-small", "query: ", "passage: ",
+                       "384 dims, 118M parámetros; requiere prefijos"),
+    EmbeddingModelSpec("e5-base", "intfloat/multilingual-e5-base", "query: ", "passage: ",
+                       "768 dims, 278M parámetros; requiere prefijos"),
+)}
+
+
+def model_key(name) -> str:
+    """Clave apta para una ruta a partir de un id de modelo ('org/Modelo-v2' -> 'org--modelo-v2')."""
+    key = re.sub(r"[^a-z0-9._-]+", "-", str(name).strip().lower().replace("/", "--")).strip("-.")
+    return key or DEFAULT_MODEL
+
+
+def resolve_model(value) -> EmbeddingModelSpec:
+    """Especificación para EMBEDDING_MODEL: clave del registro, id registrado o cualquier otro id/ruta."""
+    value = (value or DEFAULT_MODEL).strip()
+    if value in REGISTRY:
+        return REGISTRY[value]
+    for spec in REGISTRY.values():
+        if spec.name == value:
+            return spec
+    return EmbeddingModelSpec(model_key(value), value, "", "", "fuera del registro")
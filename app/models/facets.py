@@ -0,0 +1,123 @@
+"""Índice de facetas (fuente, tema, subtema, categorías) con conteos.
+
+Se construye una vez al cargar la base. Cada valor normalizado de una faceta
+tiene su lista de posiciones de fila (ordenada, np.int32), de modo que la
+navegación por tema, la intersección de varias facetas y los conteos
+("... y N más") salen de datos precalculados sin recorrer el corpus.
+"""
+import re
+
+import numpy as np
+
+from app.models.article_cards import clean_value, normalize_text
+
+FACET_FIELDS = ('fuente', 'tema', 'subtema', 'categorias')
+# Facetas con varios valores por fila, separados por comas
+MULTI_VALUED = {'categorias'}
+
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_facet(value) -> str:
+    """Clave de faceta: minúsculas, sin tildes y con espacios colapsados."""
+    return _SPACES.sub(" ", normalize_text(value)).strip()
+
+
+class FacetIndex:
+    """Listas de posiciones por valor de faceta, más pares (fila, valor) para conteos bajo filtro."""
+
+    def __init__(self, rows, size):
+        self.size = size
+        self._labels = {}     # faceta -> [etiqueta por id]
+        self._keys = {}       # faceta -> [clave normalizada por id]
+        self._ids = {}        # faceta -> {clave normalizada: id}
+        self._postings = {}   # faceta -> [np.ndarray de posiciones por id]
+        self._pairs = {}      # faceta -> (filas, ids) alineados, para np.bincount
+
+        for field in FACET_FIELDS:
+            labels, keys, ids = [], [], {}
+            pair_rows, pair_ids = [], []
+            for pos, value in enumerate(rows[field]):
+                value = clean_value(value)
+                parts = value.split(",") if field in MULTI_VALUED else [value]
+                seen = set()
+                for part in parts:
+                    label = part.strip()
+                    key = normalize_facet(label)
+                    if not key or key in seen:
+                        continue
+                    seen.add(key)
+                    if key not in ids:
+                        ids[key] = len(labels)
+                        labels.append(label)
+                        keys.append(key)
+                    pair_rows.append(pos)
+                    pair_ids.append(ids[key])
+
+            pair_rows = np.array(pair_rows, dtype=np.int32)
+            pair_ids = np.array(pair_ids, dtype=np.int32)
+            # Posting lists: agrupar los pares por id conservando el orden de fila
+            order = np.argsort(pair_ids, kind="stable")
+            bounds = np.searchsorted(pair_ids[order], np.arange(len(labels) + 1))
+            sorted_rows = pair_rows[order]
+            self._postings[field] = [sorted_rows[bounds[i]:bounds[i + 1]] for i in range(len(labels))]
+            self._labels[field] = labels
+            self._keys[field] = keys
+            self._ids[field] = ids
+            self._pairs[field] = (pair_rows, pair_ids)
+
+    @classmethod
+    def from_corpus(cls, corpus):
+        rows = {field: corpus.column(field) for field in FACET_FIELDS}
+        return cls(rows, len(corpus))
+
+    def match_ids(self, field, text, contains=False):
+        """Ids de los valores de la faceta iguales al texto (o que lo contienen, con contains=True)."""
+        key = normalize_facet(text)
+        if not key:
+            return []
+        if not contains:
+            value_id = self._ids[field].get(key)
+            return [] if value_id is None else [value_id]
+        return [i for i, value_key in enumerate(self._keys[field]) if key in value_key]
+
+    def positions(self, filters=None, contains=False):
+        """Posiciones (ordenadas) de las filas que cumplen todas las facetas de filters.
+
+        filters: {faceta: texto}; los valores vacíos se ignoran. Sin filtros devuelve todas las filas.
+        """
+        result = None
+        for field, text in (filters or {}).items():
+            if field not in self._postings:
+                raise ValueError(f"Faceta no soportada: {field}")
+            if text is None or not str(text).strip():
+                continue
+            postings = [self._postings[field][i] for i in self.match_ids(field, text, contains)]
+            if not postings:
+                return np.empty(0, dtype=np.int32)
+            matched = postings[0] if len(postings) == 1 else np.unique(np.concatenate(postings))
+            result = matched if result is None else np.intersect1d(result, matched, assume_unique=True)
+            if len(result) == 0:
+                break
+        if result is None:
+            return np.arange(self.size, dtype=np.int32)
+        return result
+
+    def counts(self, field, positions=None, limit=None):
+        """[(etiqueta, conteo)] de la faceta dentro de positions (o de toda la base), de mayor a menor."""
+        pair_rows, pair_ids = self._pairs[field]
+        if positions is not None and len(positions) < self.size:
+            pair_ids = pair_ids[np.isin(pair_rows, positions, assume_unique=False)]
+        totals = np.bincount(pair_ids, minlength=len(self._labels[field]))
+        nonzero = np.flatnonzero(totals)
+        # Mayor conteo primero; a igual conteo, orden alfabético por clave
+        order = sorted(nonzero.tolist(), key=lambda i: (-totals[i], self._keys[field][i]))
+        if limit is not None:
+            order = order[:limit]
+        labels = self._labels[field]
+        return [(labels[i], int(totals[i])) for i in order]
+
+    def browse(self, filters=None, limit=20, contains=False):
+        """Posiciones filtradas y conteos de cada faceta dentro del filtro (para la navegación del frontend)."""
+        positions = self.positions(filters, contains=contains)
+        return positions, {field: self.counts(field, positions, limit) for field in FACET_FIELDS}
@@ -0,0 +1,183 @@
+"""Ingesta por flujo de los archivos de la base de conocimientos.
+
+Lee fila a fila todos los XLSX (openpyxl en modo read_only) y CSV de data/,
+limpia cada fila, arma el texto para embeddings y lo codifica en bloques de
+tamaño fijo que se agregan al índice FAISS a medida que llegan. La memoria
+transitoria queda acotada por el tamaño del bloque, no por el del corpus: no se
+carga el libro completo en pandas ni se codifica la lista entera de una vez.
+"""
+import csv
+import hashlib
+import logging
+import os
+
+import faiss
+import numpy as np
+from openpyxl import load_workbook
+
+from app.config import Config
+
+logger = logging.getLogger(__name__)
+
+REQUIRED_COLUMNS = ['fuente', 'articulo', 'tema', 'subtema', 'texto_del_articulo', 'categorias', 'resumen_explicativo']
+DATA_EXTENSIONS = (".xlsx", ".csv")
+
+
+def normalize_column(name) -> str:
+    return str(name or "").lower().strip().replace(' ', '_')
+
+
+def cell_text(value) -> str:
+    """Celda como texto limpio; los números enteros no llevan '.0'."""
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def embedding_text(row) -> str:
+    """Texto enriquecido para embeddings (texto + resumen + categorías + tema + subtema)."""
+    return (
+        row['texto_del_articulo'] + " " +
+        row['resumen_explicativo'] + " " +
+        "Palabras clave: " + row['categorias'] + " " +
+        "Tema: " + row['tema'] + " " +
+        "Subtema: " + row['subtema']
+    )
+
+
+def passage_texts(row, words, overlap):
+    """Pasajes solapados del texto para embeddings, de `words` palabras con `overlap` de solape.
+
+    El texto que cabe en un pasaje se conserva tal cual (mismo vector que el modo
+    por artículo). En los pasajes que no son el primero se antepone el tema y el
+    subtema para que el fragmento no pierda su contexto.
+    """
+    tokens = embedding_text(row).split()
+    if len(tokens) <= words:
+        return [" ".join(tokens)]
+    stride = max(words - overlap, 1)
+    prefix = f"Tema: {row['tema']} Subtema: {row['subtema']}. "
+    passages = []
+    for start in range(0, len(tokens), stride):
+        chunk = " ".join(tokens[start:start + words])
+        passages.append(chunk if start == 0 else prefix + chunk)
+        if start + words >= len(tokens):
+            break
+    return passages
+
+
+def data_files(directory):
+    """Archivos XLSX/CSV del directorio en orden alfabético (se ignoran los temporales '~$' de Excel)."""
+    names = sorted(
+        name for name in os.listdir(directory)
+        if name.lower().endswith(DATA_EXTENSIONS) and not name.startswith("~$")
+    )
+    return [os.path.join(directory, name) for name in names]
+
+
+def data_fingerprint(directory):
+    """{archivo: sha256} de los archivos de datos: identifica el corpus con el que se construyó un índice."""
+    fingerprint = {}
+    for path in data_files(directory):
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        fingerprint[os.path.basename(path)] = digest.hexdigest()
+    return fingerprint
+
+
+def _iter_raw_rows(path):
+    """(encabezados, filas) de un archivo: primera hoja del XLSX o CSV en UTF-8."""
+    if path.lower().endswith(".csv"):
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            reader = csv.reader(f)
+            header = next(reader, None)
+            if header is None:
+                return
+            yield header, None
+            for values in reader:
+                yield None, values
+        return
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        yield header, None
+        for values in rows:
+            yield None, values
+    finally:
+        workbook.close()
+
+
+def iter_rows(path):
+    """Filas limpias ({columna: texto}) de un archivo, validando las columnas requeridas."""
+    positions = None
+    for header, values in _iter_raw_rows(path):
+        if header is not None:
+            columns = [normalize_column(h) for h in header]
+            missing = [col for col in REQUIRED_COLUMNS if col not in columns]
+            if missing:
+                raise ValueError(f"El archivo {os.path.basename(path)} debe tener las siguientes columnas: {missing}")
+            positions = {col: columns.index(col) for col in REQUIRED_COLUMNS}
+            continue
+        row = {col: cell_text(values[i]) if i < len(values) else "" for col, i in positions.items()}
+        # Filas completamente vacías (frecuentes al final de las hojas)
+        if not any(row.values()):
+            continue
+        yield row
+
+
+def iter_corpus(directory):
+    """Filas de todos los archivos de datos, en orden."""
+    files = data_files(directory)
+    if not files:
+        raise FileNotFoundError(f"No hay archivos XLSX/CSV en {directory}")
+    for path in files:
+        logger.info("Leyendo %s", os.path.basename(path))
+        yield from iter_rows(path)
+
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def ingest(directory, encode, index=None, chunk_size=None, texts=None, on_chunk=None):
+    """Lee, limpia, codifica y agrega al índice por bloques.
+
+    encode(textos) -> np.ndarray float32 (n, dim). texts(fila) -> lista de textos
+    a indexar por fila (por defecto [embedding_text(fila)]; ver passage_texts).
+    Si index es None se crea un IndexFlatIP con la dimensión del primer bloque.
+    on_chunk(filas, vectores_por_fila) recibe cada bloque ya agregado al índice
+    (p. ej. para llevarlo al almacén del corpus); las filas no se acumulan aquí.
+    Devuelve (índice, filas ingeridas).
+    """
+    chunk_size = chunk_size or Config.INGEST_CHUNK_SIZE
+    texts = texts or (lambda row: [embedding_text(row)])
+    total = 0
+    for chunk in _chunks(iter_corpus(directory), chunk_size):
+        per_row = [texts(row) for row in chunk]
+        embeddings = np.ascontiguousarray(encode([text for row_texts in per_row for text in row_texts]),
+                                          dtype="float32")
+        faiss.normalize_L2(embeddings)
+        if index is None:
+            index = faiss.IndexFlatIP(embeddings.shape[1])
+            logger.info("Creando índice FAISS con dimensión %s", embeddings.shape[1])
+        index.add(embeddings)
+        total += len(chunk)
+        if on_chunk is not None:
+            on_chunk(chunk, [len(row_texts) for row_texts in per_row])
+        logger.debug("Bloque ingerido: %s filas (total %s)", len(chunk), total)
+    return index, total
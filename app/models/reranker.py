@@ -0,0 +1,148 @@
+"""Segunda etapa opcional: reordenamiento con un cross-encoder multilingüe.
+
+get_top_results puntúa en un solo lote los pares (consulta, artículo) de los
+primeros RERANK_TOP_N resultados y los reordena por esa puntuación; la similitud
+ponderada se conserva (los umbrales de ruta siguen usándola). Las puntuaciones
+se guardan en caché por (artículo, hash de la consulta), y la etapa se omite si
+el presupuesto restante de la solicitud no alcanza para el costo estimado.
+
+Se activa con RERANKER_MODEL (id de Hugging Face o ruta local). Con
+RERANKER_BUNDLE_PATH el modelo se carga de un paquete verificado, igual que el de
+embeddings (ver app/model_bundle.py).
+"""
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from app import metrics
+from app.config import Config
+from app.model_bundle import ModelBundleError, load_cross_encoder
+from app.tracing import annotate, degrade, remaining_ms, stage
+
+logger = logging.getLogger(__name__)
+
+# Caracteres del artículo enviados al cross-encoder (su ventana es de ~512 tokens)
+PAIR_TEXT_CHARS = 1500
+
+
+def query_hash(query_text):
+    return hashlib.sha1(" ".join(query_text.lower().split()).encode("utf-8")).hexdigest()[:16]
+
+
+def pair_text(data):
+    """Texto del artículo para el par: tema, subtema y texto, acotado."""
+    parts = [str(data.get('tema', '')), str(data.get('subtema', '')), str(data.get('texto_del_articulo', ''))]
+    return ". ".join(p for p in parts if p)[:PAIR_TEXT_CHARS]
+
+
+class ScoreCache:
+    """LRU acotado de puntuaciones por (artículo, hash de consulta), seguro entre hilos."""
+
+    def __init__(self, size):
+        self.size = size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        if self.size <= 0:
+            return
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+    def __len__(self):
+        return len(self._items)
+
+
+class Reranker:
+    """Cross-encoder con caché y estimación de costo por par (media móvil)."""
+
+    def __init__(self, model, top_n=10, cache_size=4096, min_remaining_ms=50.0):
+        self.model = model
+        self.top_n = top_n
+        self.cache = ScoreCache(cache_size)
+        self.min_remaining_ms = min_remaining_ms
+        # ms por par puntuado; None hasta la primera ejecución
+        self.ms_per_pair = None
+
+    def estimated_ms(self, pairs):
+        return 0.0 if self.ms_per_pair is None else self.ms_per_pair * pairs
+
+    def rerank(self, query_text, results, article_id):
+        """Reordena los primeros top_n resultados; devuelve los resultados (sin cambios si se omite).
+
+        article_id(resultado) -> clave estable del artículo para la caché.
+        """
+        head, tail = results[:self.top_n], results[self.top_n:]
+        if len(head) < 2:
+            return results
+
+        qhash = query_hash(query_text)
+        keys = [(article_id(r), qhash) for r in head]
+        scores = [self.cache.get(key) for key in keys]
+        missing = [i for i, score in enumerate(scores) if score is None]
+
+        remaining = remaining_ms()
+        if missing and remaining is not None and remaining < self.estimated_ms(len(missing)) + self.min_remaining_ms:
+            metrics.inc("rerank_skipped_budget")
+            degrade("skip_rerank")
+            annotate("rerank", {"skipped": "budget", "remaining_ms": round(remaining, 1)})
+            logger.info("Reordenamiento omitido: quedan %.0f ms y se estiman %.0f ms",
+                        remaining, self.estimated_ms(len(missing)))
+            return results
+
+        if missing:
+            with stage("rerank"):
+                t0 = time.perf_counter()
+                pairs = [(query_text, pair_text(head[i]['data'])) for i in missing]
+                predicted = np.asarray(self.model.predict(pairs, batch_size=len(pairs), show_progress_bar=False),
+                                       dtype=np.float32).reshape(-1)
+                elapsed = (time.perf_counter() - t0) * 1000.0
+            per_pair = elapsed / len(missing)
+            self.ms_per_pair = per_pair if self.ms_per_pair is None else 0.8 * self.ms_per_pair + 0.2 * per_pair
+            for i, score in zip(missing, predicted.tolist()):
+                scores[i] = score
+                self.cache.put(keys[i], score)
+            metrics.inc("rerank_pairs_scored", len(missing))
+        metrics.inc("rerank_total")
+        metrics.inc("rerank_cache_hits", len(head) - len(missing))
+
+        for result, score in zip(head, scores):
+            result['rerank_score'] = float(score)
+        # Orden estable: a igual puntuación se conserva el orden por similitud ponderada
+        head = sorted(head, key=lambda r: r['rerank_score'], reverse=True)
+        annotate("rerank", {"pairs": len(head), "scored": len(missing)})
+        return head + tail
+
+
+def load_reranker():
+    """Reranker configurado o None si RERANKER_MODEL está vacío o no se puede cargar.
+
+    Un paquete ausente (con MODEL_BUNDLE_REQUIRED) o que no verifica lanza
+    ModelBundleError: el arranque falla igual que con el modelo de embeddings.
+    """
+    if not Config.RERANKER_MODEL:
+        return None
+    try:
+        model, _ = load_cross_encoder(Config.RERANKER_MODEL, Config.RERANKER_BUNDLE_PATH, Config.MODEL_BUNDLE_VERIFY,
+                                      Config.MODEL_BUNDLE_REQUIRED, max_length=512)
+    except ModelBundleError:
+        raise
+    except Exception as e:
+        logger.error("No se pudo cargar el reranker %s: %s", Config.RERANKER_MODEL, e)
+        return None
+    logger.info("Reranker cargado: %s (top %s)", Config.RERANKER_MODEL, Config.RERANK_TOP_N)
+    return Reranker(model, Config.RERANK_TOP_N, Config.RERANK_CACHE_SIZE, Config.RERANK_MIN_REMAINING_MS)
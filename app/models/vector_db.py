@@ -1,132 +1,434 @@
+import json
 import os
+import re
+import tempfile
+import threading
+import time
+from array import array
+from contextlib import contextmanager
 import faiss
-import pandas as pd
-from sentence_transformers import SentenceTransformer
 import logging
 import numpy as np
+from app.config import Config
+from app.tracing import stage, record_retrieval, annotate
+from app import metrics
+from app.model_bundle import load_embedding_model
+from app.models.article_cards import build_cards, index_by_article, make_card, normalize_text, render_detail
+from app.models.corpus_store import CorpusBuilder, CorpusStore
+from app.models.embedding_models import resolve_model
+from app.models.facets import FacetIndex
+from app.models.compression import CompressedStore
+from app.models.reranker import load_reranker
+from app.models.ingest import data_fingerprint, embedding_text, ingest, iter_corpus, passage_texts
 
-# Configuración de logs detallados
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
+logger = logging.getLogger(__name__)
 
-DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../data"))
+DATA_DIR = os.path.abspath(Config.DATA_DIR or os.path.join(os.path.dirname(__file__), "../../data"))
 XLSX_FILE = os.path.join(DATA_DIR, "Compilado_Preguntas_Azusena.xlsx")
-FAISS_INDEX_FILE = os.path.join(DATA_DIR, "index.faiss")
+# Modelo de embeddings (EMBEDDING_MODEL, ver embedding_models.py). Los artefactos del
+# índice van en data/indexes/<clave>/ para que cada modelo conserve los suyos
+EMBEDDING_SPEC = resolve_model(Config.EMBEDDING_MODEL)
+EMBEDDING_MODEL = EMBEDDING_SPEC.name
+INDEX_DIR = os.path.join(DATA_DIR, "indexes", EMBEDDING_SPEC.key)
+FAISS_INDEX_FILE = os.path.join(INDEX_DIR, "index.faiss")
+# Con VECTOR_COMPRESSION: vectores completos float32 (memmap) y proyección PCA
+EMBEDDINGS_FILE = os.path.join(INDEX_DIR, "embeddings.npy")
+PROJECTION_FILE = os.path.join(INDEX_DIR, "index.pca.npz")
+# Cómo se construyó el índice (modelo, paquete, modo, compresión)
+INDEX_MANIFEST_FILE = os.path.join(INDEX_DIR, "index.manifest.json")
+# Almacén compacto del corpus (ver corpus_store.py), abierto con memmap si CORPUS_MMAP. Va junto
+# al índice y queda registrado en su manifiesto: se reutiliza mientras los datos no cambien
+CORPUS_FILE = os.path.join(INDEX_DIR, "corpus.bin")
 
-# Modelo de embeddings mejorado para español
-EMBEDDING_MODEL = "paraphrase-multilingual-mpnet-base-v2"
-model = SentenceTransformer(EMBEDDING_MODEL)
+# Solo desde MODEL_BUNDLE_PATH si está definido
+model, MODEL_BUNDLE = load_embedding_model(EMBEDDING_MODEL, Config.MODEL_BUNDLE_PATH, Config.MODEL_BUNDLE_VERIFY,
+                                           Config.MODEL_BUNDLE_REQUIRED)
+
+
+def encode_queries(texts):
+    """Embeddings de consultas, con el prefijo que espera el modelo (p. ej. 'query: ' en e5)."""
+    if EMBEDDING_SPEC.query_prefix:
+        texts = [EMBEDDING_SPEC.query_prefix + text for text in texts]
+    return model.encode(texts, convert_to_numpy=True)
+
+
+def encode_passages(texts, **kwargs):
+    """Embeddings de artículos o pasajes del corpus, con el prefijo del modelo para documentos."""
+    if EMBEDDING_SPEC.passage_prefix:
+        texts = [EMBEDDING_SPEC.passage_prefix + text for text in texts]
+    return model.encode(texts, convert_to_numpy=True, **kwargs)
+
+
+# Cross-encoder opcional para la segunda etapa de get_top_results (RERANKER_MODEL)
+reranker = load_reranker()
 
 class VectorDB:
     def __init__(self):
+        # Versión de la instantánea; la asigna VectorDBHandle al ponerla en servicio
+        self.version = 1
         self.index = None
-        self.questions = []
-        self.df = None
-        # Forzar recreación del índice
-        if os.path.exists(FAISS_INDEX_FILE):
-            try:
-                os.remove(FAISS_INDEX_FILE)
-                logging.info("Índice FAISS antiguo eliminado. Se creará uno nuevo.")
-            except Exception as e:
-                logging.warning(f"No se pudo eliminar el índice antiguo: {e}")
+        # Filas del corpus por posición (CorpusStore); no se conserva un DataFrame al servir
+        self.corpus = None
+        # Modo 'passage': varios vectores por fila. vector_rows[id] es la fila de cada
+        # vector y row_offsets[fila]:row_offsets[fila+1] sus ids (None en modo 'article')
+        self.mode = Config.INDEX_MODE
+        self.vector_rows = None
+        self.row_offsets = None
+        # Con VECTOR_COMPRESSION, índice cuantizado + vectores completos en memmap
+        self.store = None
+        # Fragmentos de respuesta precalculados por fila (ver article_cards.py)
+        self.cards = []
+        self.article_positions = {}
+        # Por fuente: números de artículo ordenados (np.int64) y posiciones de fila alineadas
+        self.source_articles = {}
+        self.all_articles = self._empty_articles()
+        # Fuentes en orden de aparición y normalizadas, para detectar la ley citada en la consulta
+        self.sources = []
+        self._sources_by_length = []
+        # Facetas fuente/tema/subtema/categorías -> posiciones, con conteos
+        self.facets = None
+        # Selectores de ids de FAISS por filtro (fuente, tema)
+        self._selector_cache = {}
+        # El índice guardado se reutiliza si su manifiesto coincide (modelo, configuración y
+        # datos; ver _index_signature); si no, load_or_create_index lo reconstruye
         self.load_or_create_index()
 
     def load_or_create_index(self):
         """Carga la base de datos FAISS o la crea desde el XLSX si no existe."""
         try:
             if os.path.exists(FAISS_INDEX_FILE):
-                logging.info("Cargando índice FAISS existente...")
+                logger.info("Cargando índice FAISS existente...")
                 self.index = faiss.read_index(FAISS_INDEX_FILE)
-                self.load_questions()
+                manifest = self._check_manifest()
+                if Config.VECTOR_COMPRESSION:
+                    self.store = CompressedStore.load(self.index, EMBEDDINGS_FILE, PROJECTION_FILE,
+                                                      Config.RESCORE_FACTOR)
+                elif self.index.d != model.get_sentence_embedding_dimension():
+                    raise ValueError(f"El índice tiene dimensión {self.index.d} y el modelo "
+                                     f"{model.get_sentence_embedding_dimension()}")
+                self.load_questions(manifest)
             else:
-                logging.info("Creando nuevo índice FAISS...")
+                logger.info("Creando nuevo índice FAISS...")
                 self.create_index_from_xlsx()
         except Exception as e:
-            logging.error(f"Error al cargar/crear índice: {e}")
-            logging.info("Intentando crear nuevo índice...")
+            logger.error("Error al cargar/crear índice: %s", e)
+            logger.info("Intentando crear nuevo índice...")
             self.create_index_from_xlsx()
 
-    def load_questions(self):
-        """Carga los datos desde el XLSX usando la nueva estructura detallada."""
-        if not os.path.exists(XLSX_FILE):
-            raise FileNotFoundError(f"Archivo no encontrado: {XLSX_FILE}")
+    def load_questions(self, manifest):
+        """Carga el corpus de un índice ya existente (manifiesto validado por _check_manifest).
 
-        self.df = pd.read_excel(XLSX_FILE)
-        self.df.columns = [col.lower().strip().replace(' ', '_') for col in self.df.columns]
-        
-        # Verificar que tenga la nueva estructura requerida
-        required_columns = ['fuente', 'articulo', 'tema', 'subtema', 'texto_del_articulo', 'categorias', 'resumen_explicativo']
-        missing_columns = [col for col in required_columns if col not in self.df.columns]
-        
-        if missing_columns:
-            raise ValueError(f"El archivo XLSX debe tener las siguientes columnas: {missing_columns}")
-        
-        # Crear texto completo enriquecido para embeddings
-        self.df['texto_completo'] = (
-            self.df['texto_del_articulo'] + " " + 
-            self.df['resumen_explicativo'] + " " +
-            "Palabras clave: " + self.df['categorias'] + " " +
-            "Tema: " + self.df['tema'] + " " +
-            "Subtema: " + self.df['subtema']
-        )
-        self.questions = self.df['texto_completo'].tolist()
-        logging.info(f"Cargados {len(self.questions)} artículos del archivo XLSX con nueva estructura detallada")
+        Si el manifiesto registra un corpus.bin que sigue intacto se abre con memmap
+        sin releer los XLSX/CSV; si no, se arma desde data/ y se registra.
+        """
+        corpus = self._open_saved_corpus(manifest)
+        if corpus is not None:
+            self.corpus = corpus
+            counts = array("i")
+            if self.mode == 'passage':
+                counts.extend(len(self._texts_for(corpus.row(pos))) for pos in range(len(corpus)))
+            logger.info("Corpus compacto reutilizado desde %s", CORPUS_FILE)
+        else:
+            builder = CorpusBuilder()
+            counts = array("i")
+            for row in iter_corpus(DATA_DIR):
+                builder.add(row)
+                counts.append(len(self._texts_for(row)) if self.mode == 'passage' else 1)
+            self.corpus = self._load_corpus(builder.build())
+            if self.corpus.path is not None:
+                self._save_manifest({**manifest, "corpus": self._corpus_entry()})
+        self._build_vector_map(counts)
+        if self.index.ntotal != self.expected_vectors():
+            raise ValueError(f"El índice tiene {self.index.ntotal} vectores y el corpus {self.expected_vectors()}")
+        self._build_cards()
+        logger.info("Cargados %s artículos desde %s", len(self.corpus), DATA_DIR)
 
     def create_index_from_xlsx(self):
-        """Crea un nuevo índice FAISS basado en los artículos del XLSX usando la nueva estructura detallada."""
-        logging.info("Iniciando creación de nuevo índice FAISS...")
-        self.df = pd.read_excel(XLSX_FILE)
-
-        # Normalizar nombres de columnas
-        self.df.columns = [col.lower().strip().replace(' ', '_') for col in self.df.columns]
-        
-        # Verificar columnas requeridas para la nueva estructura
-        required_columns = ['fuente', 'articulo', 'tema', 'subtema', 'texto_del_articulo', 'categorias', 'resumen_explicativo']
-        missing_columns = [col for col in required_columns if col not in self.df.columns]
-        
-        if missing_columns:
-            raise ValueError(f"El archivo XLSX debe tener las siguientes columnas: {missing_columns}")
-        
-        logging.info("Usando nueva estructura enriquecida...")
-        
-        # Limpiar y preparar datos
-        for col in required_columns:
-            self.df[col] = self.df[col].astype(str).fillna("")
-            self.df[col] = self.df[col].str.strip()
-        
-        # Filtrar filas vacías
-        self.df = self.df[self.df["texto_del_articulo"] != ""]
-        
-        # Crear texto enriquecido para embeddings (texto + resumen + categorías + tema + subtema)
-        # Incluir categorías con mayor peso para mejorar la recuperación semántica
-        self.df['texto_completo'] = (
-            self.df['texto_del_articulo'] + " " + 
-            self.df['resumen_explicativo'] + " " +
-            "Palabras clave: " + self.df['categorias'] + " " +
-            "Tema: " + self.df['tema'] + " " +
-            "Subtema: " + self.df['subtema']
-        )
-        self.questions = self.df['texto_completo'].tolist()
-        
-        logging.info(f"Procesando {len(self.questions)} elementos para crear embeddings...")
-        
-        # Crear embeddings
-        embeddings = model.encode(self.questions, convert_to_numpy=True, show_progress_bar=True)
-        
-        # Normalizar embeddings para mejorar la búsqueda de similitud
-        faiss.normalize_L2(embeddings)
-        
-        # Crear índice FAISS optimizado
-        dimension = embeddings.shape[1]
-        logging.info(f"Creando índice FAISS con dimensión {dimension}")
-        self.index = faiss.IndexFlatIP(dimension)
-        self.index.add(embeddings)
+        """Crea un nuevo índice FAISS con todos los XLSX/CSV de data/.
+
+        La ingesta es por bloques (ver ingest.py): cada bloque se limpia, se
+        codifica, se agrega al índice y pasa al almacén del corpus, sin cargar el
+        libro completo, codificar todo el corpus de una vez ni acumular las filas.
+        """
+        logger.info("Iniciando creación de nuevo índice FAISS...")
+        # La firma se toma antes de leer data/: si los datos cambian durante la
+        # construcción, el manifiesto no los da por incluidos
+        signature = self._index_signature()
+
+        def encode(texts):
+            return encode_passages(texts, batch_size=Config.EMBEDDING_BATCH_SIZE, show_progress_bar=False)
+
+        builder = CorpusBuilder()
+        counts = array("i")
+
+        def collect(chunk, vectors):
+            builder.extend(chunk)
+            counts.extend(vectors)
+
+        os.makedirs(INDEX_DIR, exist_ok=True)
+        self.index, _ = ingest(DATA_DIR, encode, texts=self._texts_for, on_chunk=collect)
+        if self.index is None:
+            raise ValueError(f"No se encontraron artículos en {DATA_DIR}")
+        self.corpus = self._load_corpus(builder.build())
+        self._build_vector_map(counts)
+        if Config.VECTOR_COMPRESSION:
+            self._compress_index()
+        self._build_cards()
+        logger.info("Índice FAISS creado con %s vectores para %s artículos (modo %s)",
+                    self.index.ntotal, len(self.corpus), self.mode)
 
         # Guardar el índice
         faiss.write_index(self.index, FAISS_INDEX_FILE)
-        logging.info(f"Índice FAISS creado y guardado en {FAISS_INDEX_FILE}")
+        self._write_manifest(signature)
+        logger.info("Índice FAISS creado y guardado en %s", FAISS_INDEX_FILE)
+
+    def _index_signature(self):
+        """Lo que determina los vectores del índice: si cambia, el índice guardado no sirve."""
+        return {
+            "embedding_model": EMBEDDING_MODEL,
+            "passage_prefix": EMBEDDING_SPEC.passage_prefix or None,
+            "model_bundle": MODEL_BUNDLE,
+            "index_mode": self.mode,
+            "passage": [Config.PASSAGE_WORDS, Config.PASSAGE_OVERLAP_WORDS] if self.mode == 'passage' else None,
+            "vector_compression": Config.VECTOR_COMPRESSION or None,
+            "pca_dim": Config.PCA_DIM if Config.VECTOR_COMPRESSION else None,
+            # sha256 de cada archivo de data/: si cambian los datos, se reconstruye
+            "data": data_fingerprint(DATA_DIR),
+        }
+
+    def _write_manifest(self, signature):
+        self._save_manifest({
+            **signature,
+            "embedding_key": EMBEDDING_SPEC.key,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "dimension": model.get_sentence_embedding_dimension(),
+            "vectors": self.index.ntotal,
+            "rows": len(self.corpus),
+            "corpus": self._corpus_entry(),
+        })
+
+    def _corpus_entry(self):
+        """corpus.bin servido con memmap (archivo, bytes, filas) para el manifiesto; None si está en RAM."""
+        if self.corpus.path != CORPUS_FILE:
+            return None
+        return {"file": os.path.basename(CORPUS_FILE), "bytes": os.path.getsize(CORPUS_FILE),
+                "rows": len(self.corpus)}
+
+    def _open_saved_corpus(self, manifest):
+        """El corpus.bin registrado en el manifiesto, si sigue intacto; None si hay que armarlo desde data/."""
+        entry = manifest.get("corpus")
+        if not Config.CORPUS_MMAP or not entry or not os.path.exists(CORPUS_FILE):
+            return None
+        try:
+            if os.path.getsize(CORPUS_FILE) != entry["bytes"]:
+                raise ValueError("el tamaño no coincide con el manifiesto")
+            corpus = CorpusStore.open(CORPUS_FILE)
+            if len(corpus) != entry["rows"]:
+                raise ValueError(f"tiene {len(corpus)} filas y el manifiesto {entry['rows']}")
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("No se reutiliza %s (%s); se arma desde los datos", CORPUS_FILE, e)
+            return None
+        return corpus
+
+    def _save_manifest(self, manifest):
+        # Temporal único en el mismo directorio: dos procesos que reconstruyen no comparten archivo
+        fd, tmp = tempfile.mkstemp(prefix=os.path.basename(INDEX_MANIFEST_FILE) + ".", suffix=".tmp", dir=INDEX_DIR)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(manifest, f, ensure_ascii=False, indent=2)
+            os.replace(tmp, INDEX_MANIFEST_FILE)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def _check_manifest(self):
+        """Valida que el índice guardado se construyó con el mismo modelo/paquete, configuración y datos.
+        Devuelve el manifiesto."""
+        if not os.path.exists(INDEX_MANIFEST_FILE):
+            raise ValueError(f"El índice no tiene manifiesto ({os.path.basename(INDEX_MANIFEST_FILE)})")
+        with open(INDEX_MANIFEST_FILE, encoding="utf-8") as f:
+            manifest = json.load(f)
+        expected = self._index_signature()
+        stale = []
+        for key, value in expected.items():
+            saved = manifest.get(key)
+            if key == "model_bundle":
+                # El paquete se identifica por su checksum (la ruta puede cambiar entre despliegues)
+                saved, value = (saved or {}).get("checksum"), (value or {}).get("checksum")
+            if saved != value:
+                stale.append(key)
+        if stale:
+            raise ValueError(f"El índice guardado no corresponde a la configuración actual: {', '.join(stale)}")
+        return manifest
+
+    def _load_corpus(self, corpus):
+        """Almacén compacto del corpus (ya armado en memoria); con CORPUS_MMAP se escribe en CORPUS_FILE
+        y se sirve mapeado."""
+        if not Config.CORPUS_MMAP:
+            return corpus
+        try:
+            corpus.save(CORPUS_FILE)
+            mapped = CorpusStore.open(CORPUS_FILE)
+        except (OSError, ValueError) as e:
+            logger.warning("No se pudo mapear el corpus desde %s (%s); se mantiene en memoria", CORPUS_FILE, e)
+            return corpus
+        report = mapped.memory_report()
+        logger.info("Corpus compacto: %s filas, arena %.1f MB en memmap, %s valores categóricos",
+                    report["rows"], report["arena_bytes"] / 1e6, report["label_values"])
+        return mapped
+
+    def _compress_index(self):
+        """Reemplaza el índice plano por el comprimido y reporta memoria ahorrada y recall."""
+        full = self.index.reconstruct_n(0, self.index.ntotal)
+        self.store = CompressedStore.build(full, EMBEDDINGS_FILE, Config.VECTOR_COMPRESSION, Config.PCA_DIM,
+                                           Config.RESCORE_FACTOR)
+        del full
+        self.store.save_projection(PROJECTION_FILE)
+        self.index = self.store.index
+        report = self.store.memory_report()
+        logger.info(
+            "Vectores comprimidos (%s, PCA %s): %.1f MB -> %.1f MB en RAM (%.1f%% menos), recall@10 muestral %.3f",
+            Config.VECTOR_COMPRESSION, self.index.d, report["flat_bytes"] / 1e6, report["compressed_bytes"] / 1e6,
+            report["saved_pct"], self.store.sampled_recall(k=10),
+        )
+
+    def _index_search(self, query_embedding, k, params=None, eligible=None):
+        """index.search sobre el índice plano o, con compresión, primera pasada + reordenamiento exacto."""
+        if self.store is not None:
+            return self.store.search(query_embedding, k, params, eligible)
+        return self.index.search(query_embedding, k, params=params)
+
+    def _texts_for(self, row):
+        """Textos a indexar por fila según el modo: el artículo completo o sus pasajes."""
+        if self.mode == 'passage':
+            return passage_texts(row, Config.PASSAGE_WORDS, Config.PASSAGE_OVERLAP_WORDS)
+        return [embedding_text(row)]
+
+    def _build_vector_map(self, counts):
+        """Mapa compacto vector -> fila (int32) y desplazamientos por fila, solo en modo 'passage'.
+
+        counts: vectores por fila, en orden (array int32).
+        """
+        if self.mode != 'passage':
+            self.vector_rows = self.row_offsets = None
+            return
+        counts = np.frombuffer(counts, dtype=np.int32) if len(counts) else np.zeros(0, dtype=np.int32)
+        self.row_offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int32)
+        self.vector_rows = np.repeat(np.arange(len(counts), dtype=np.int32), counts)
+
+    def expected_vectors(self):
+        """Vectores que debe tener el índice para el corpus cargado."""
+        if self.vector_rows is not None:
+            return len(self.vector_rows)
+        return len(self.corpus) if self.corpus is not None else 0
+
+    def _vector_ids(self, positions):
+        """Ids de FAISS de un conjunto de filas (en modo 'passage', todos sus pasajes)."""
+        positions = np.asarray(positions, dtype=np.int64)
+        if self.row_offsets is None:
+            return positions
+        starts = self.row_offsets[positions].astype(np.int64)
+        counts = self.row_offsets[positions + 1] - starts
+        group_start = np.cumsum(counts) - counts
+        return np.repeat(starts - group_start, counts) + np.arange(counts.sum(), dtype=np.int64)
+
+    def _search(self, query_embedding, top_k, params=None, eligible=None):
+        """Busca y devuelve (similitudes, filas) de las top_k filas distintas.
+
+        En modo 'passage' se piden top_k * PASSAGE_OVERSAMPLE pasajes y cada fila
+        toma la similitud de su mejor pasaje (los resultados vienen ordenados, así
+        que la primera aparición es el máximo). Si no alcanzan filas distintas se
+        duplica la búsqueda hasta cubrir los vectores elegibles.
+        """
+        eligible = self.index.ntotal if eligible is None else eligible
+        if self.vector_rows is None:
+            distances, indices = self._index_search(query_embedding, min(top_k, eligible), params, eligible)
+            keep = indices[0] >= 0
+            return distances[0][keep], indices[0][keep]
+
+        k = min(top_k * max(Config.PASSAGE_OVERSAMPLE, 1), eligible)
+        while True:
+            distances, indices = self._index_search(query_embedding, k, params, eligible)
+            keep = indices[0] >= 0
+            rows = self.vector_rows[indices[0][keep]]
+            _, first = np.unique(rows, return_index=True)
+            first.sort()
+            if len(first) >= top_k or k >= eligible:
+                first = first[:top_k]
+                return distances[0][keep][first], rows[first].astype(np.int64)
+            k = min(k * 2, eligible)
+
+    def _build_cards(self):
+        """Precalcula las tarjetas de artículo; la posición de cada tarjeta coincide con la fila del corpus."""
+        self.cards = build_cards(self.corpus)
+        self.article_positions = index_by_article(self.cards)
+        self._build_article_arrays()
+        self.facets = FacetIndex.from_corpus(self.corpus)
+        self._selector_cache = {}
+        logger.info("Tarjetas de artículos precalculadas: %s", len(self.cards))
+
+    def _build_article_arrays(self):
+        """Arreglos ordenados por número de artículo, global y por fuente, para listados por rango."""
+        numbered = [(card.numero, pos) for pos, card in enumerate(self.cards) if card.numero is not None]
+        numbers = np.array([n for n, _ in numbered], dtype=np.int64)
+        positions = np.array([p for _, p in numbered], dtype=np.int64)
+        # Orden estable: a igual número se conserva el orden de la base
+        order = np.argsort(numbers, kind="stable")
+        self.all_articles = (numbers[order], positions[order])
+
+        fuentes = np.array([self.cards[p].fuente for p in self.all_articles[1]], dtype=object)
+        self.source_articles = {}
+        for fuente in dict.fromkeys(fuentes):
+            mask = fuentes == fuente
+            self.source_articles[fuente] = (self.all_articles[0][mask], self.all_articles[1][mask])
+
+        self.sources = [(fuente, normalize_text(fuente)) for fuente in dict.fromkeys(card.fuente for card in self.cards)]
+        self._sources_by_length = sorted(self.sources, key=lambda item: len(item[0]), reverse=True)
+
+    def detect_source(self, query_text):
+        """Fuente (ley, decreto...) mencionada en la consulta, o None.
+
+        Primero por patrón normativo con número ("ley 100" coincide con "ley 100 de 1993"
+        pero no con "ley 1000"); si no, por nombre completo de la fuente.
+        """
+        q_norm = normalize_text(query_text)
+        law_pattern = re.search(r'(ley|decreto|resoluci[oó]n|c[oó]digo|estatuto)\s*(\d+)', q_norm)
+        if law_pattern:
+            search_key = re.compile(fr"{law_pattern.group(1)}\s+{law_pattern.group(2)}\b")
+            for fuente, fuente_norm in self.sources:
+                if search_key.search(fuente_norm):
+                    logger.info("Fuente coincidente por patrón numérico: %s", fuente)
+                    return fuente
+        for fuente, fuente_norm in self._sources_by_length:
+            if fuente_norm and fuente_norm in q_norm:
+                logger.info("Fuente coincidente por nombre: %s", fuente)
+                return fuente
+        return None
+
+    def articles_in_range(self, source=None, start=None, end=None, limit=None):
+        """Posiciones de fila de los artículos con número en [start, end], en orden numérico.
+
+        Usa búsqueda binaria sobre los arreglos precalculados: "primeros N" y
+        "del X al Y" son cortes del arreglo, sin recorrer la base.
+        """
+        numbers, positions = self.source_articles.get(source, self._empty_articles()) if source else self.all_articles
+        lo = 0 if start is None else int(np.searchsorted(numbers, start, side="left"))
+        hi = len(numbers) if end is None else int(np.searchsorted(numbers, end, side="right"))
+        if limit is not None:
+            hi = min(hi, lo + max(limit, 0))
+        return positions[lo:hi].tolist()
+
+    @staticmethod
+    def _empty_articles():
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    def card_for(self, result):
+        """Tarjeta de un resultado de búsqueda ({'index', 'data'}); si no trae índice se construye al vuelo."""
+        idx = result.get('index')
+        if idx is not None and 0 <= idx < len(self.cards):
+            return self.cards[idx]
+        return make_card(result.get('data', {}))
 
     def find_similar_question(self, query_text, top_k=5):
         """Encuentra artículos similares en FAISS y devuelve respuestas contextualizadas usando la nueva estructura."""
@@ -140,36 +442,37 @@ class VectorDB:
         enhanced_query = self._enhance_query_with_keywords(query_text)
         
         # Crear embedding de la consulta enriquecida
-        query_embedding = model.encode([enhanced_query], convert_to_numpy=True)
+        query_embedding = encode_queries([enhanced_query])
         faiss.normalize_L2(query_embedding)
 
         # Buscar artículos similares
-        distances, indices = self.index.search(query_embedding, top_k)
+        distances, indices = self._search(query_embedding, top_k)
         
         # Filtrar y ponderar resultados
         valid_results = []
-        for i, (distance, idx) in enumerate(zip(distances[0], indices[0])):
+        for i, (distance, idx) in enumerate(zip(distances, indices)):
             # Aplicar ponderación semántica
-            weighted_score = self._calculate_weighted_similarity(query_text, distance, self.df.iloc[idx])
+            data = self.corpus.record(idx)
+            weighted_score = self._calculate_weighted_similarity(query_text, distance, data)
             
             if weighted_score >= 0.4:  # Umbral reducido para incluir más artículos relevantes de salud
                 valid_results.append({
                     'index': idx,
                     'similarity': float(weighted_score),
                     'original_similarity': float(distance),
-                    'data': self.df.iloc[idx]
+                    'data': data
                 })
         
         # Reordenar por similitud ponderada
         valid_results.sort(key=lambda x: x['similarity'], reverse=True)
         
         if not valid_results:
-            logging.info("No se encontraron resultados por encima del umbral de similitud")
+            logger.info("No se encontraron resultados por encima del umbral de similitud")
             return "No encontré información suficientemente relevante para tu consulta.", 0.0
         
         # Log detallado para debugging
-        logging.info(f"Query: '{query_text}'")
-        logging.info(f"Resultados válidos encontrados: {len(valid_results)}")
+        logger.debug("Query: '%s'", query_text)
+        logger.debug("Resultados válidos encontrados: %s", len(valid_results))
         
         # Generar respuesta contextualizada usando la nueva estructura
         response = self._generate_contextualized_response(valid_results, query_text)
@@ -293,7 +596,7 @@ class VectorDB:
         
         # NUEVA MEJORA: Validar coherencia temática antes de generar respuesta
         if not self._validate_response_coherence(query_text, themes_groups):
-            logging.warning("Coherencia temática insuficiente, generando respuesta conservadora")
+            logger.warning("Coherencia temática insuficiente, generando respuesta conservadora")
             return self._generate_conservative_response(results, query_text)
         
         # Si hay múltiples temas, generar respuesta de clarificación
@@ -346,7 +649,7 @@ class VectorDB:
         coherence_ratio = relevant_themes_found / total_themes if total_themes > 0 else 0
         is_coherent = coherence_ratio >= 0.6
         
-        logging.info(f"Validación de coherencia: {relevant_themes_found}/{total_themes} temas relevantes (ratio: {coherence_ratio:.2f})")
+        logger.info("Validación de coherencia: %s/%s temas relevantes (ratio: %.2f)", relevant_themes_found, total_themes, coherence_ratio)
         
         return is_coherent
 
@@ -430,16 +733,12 @@ class VectorDB:
             for result in subtema_results[:5]:
                 data = result['data']
                 article = data.get('articulo', 'N/A')
-                content = data.get('contenido', 'Sin contenido disponible')
+                card = self.card_for(result)
+                content = card.snippet or 'Sin contenido disponible'
                 source = data.get('fuente', 'Sin fuente')
                 similarity = result.get('similarity', 0)
                 
                 response_parts.append(f"**Artículo {article}** ({source}) - Relevancia: {similarity:.1%}")
-                
-                # Truncar contenido si es muy largo
-                if len(content) > 300:
-                    content = content[:300] + "..."
-                
                 response_parts.append(f"{content}\n")
         
         # Agregar sugerencia para más información
@@ -457,107 +756,88 @@ class VectorDB:
             
             if article_num and article_num.isdigit():
                 # Verificar que el artículo tenga contenido válido
-                content = data.get('contenido', '')
+                # 'contenido' es la columna del esquema anterior; el actual usa texto_del_articulo
+                content = str(data.get('contenido') or data.get('texto_del_articulo') or '')
                 theme = data.get('tema', '')
                 
                 if content and theme and len(content.strip()) > 10:
                     validated_results.append(result)
                 else:
-                    logging.warning(f"Artículo {article_num} descartado por contenido insuficiente")
+                    logger.warning("Artículo %s descartado por contenido insuficiente", article_num)
             else:
-                logging.warning(f"Artículo con número inválido descartado: {article_num}")
+                logger.warning("Artículo con número inválido descartado: %s", article_num)
         
-        logging.info(f"Validación de artículos: {len(validated_results)}/{len(results)} artículos válidos")
+        logger.info("Validación de artículos: %s/%s artículos válidos", len(validated_results), len(results))
         return validated_results
 
     def get_article_details(self, article_number: str, source: str = None) -> tuple:
         """Obtiene los detalles de un artículo específico por su número y opcionalmente fuente."""
         try:
-            if self.df is None:
+            if self.corpus is None:
                 return "La base de datos no está disponible.", 0.0, False
             
-            # Buscar el artículo específico
-            # Primero convertir a string para asegurar coincidencia
-            # Usar normalización básica para robustez
-            df_articles = self.df.copy()
-            df_articles['articulo_str'] = df_articles['articulo'].astype(str).str.strip()
+            # Buscar el artículo en el índice precalculado número -> posiciones
+            positions = self.article_positions.get(str(article_number).strip(), [])
             
-            article_filter = df_articles['articulo_str'] == str(article_number).strip()
-            
-            # Si se especifica fuente, filtrar también por ella
+            # Si se especifica fuente, filtrar también por ella (comparación normalizada)
             if source:
-                # Normalizar fuente para comparación
-                import unicodedata
-                def normalize(text):
-                    return unicodedata.normalize('NFKD', str(text)).encode('ASCII', 'ignore').decode('utf-8').lower()
-                
-                source_norm = normalize(source)
-                
-                # Crear columna normalizada temporal para filtrado
-                df_articles['fuente_norm'] = df_articles['fuente'].apply(normalize)
-                
-                # Filtrar donde la fuente sea exactamente la detectada
-                # (Asumimos que source viene del mismo set de fuentes del DF)
-                source_filter = df_articles['fuente_norm'] == source_norm
-                article_filter = article_filter & source_filter
-            
-            matching_articles = df_articles[article_filter]
+                source_norm = normalize_text(source)
+                positions = [pos for pos in positions if self.cards[pos].fuente_norm == source_norm]
             
-            if matching_articles.empty:
+            if not positions:
                 msg = f"No se encontró el artículo {article_number}"
                 if source:
                     msg += f" de la ley {source}"
                 return msg + " en la base de datos.", 0.0, False
             
-            # Tomar el primer resultado
-            article = matching_articles.iloc[0]
-            
-            # Construir respuesta detallada
-            response_parts = []
-            response_parts.append(f"**Artículo {article_number}**")
-            
-            if article.get('fuente') and str(article.get('fuente')).strip() not in ['', 'nan', 'None', 'null']:
-                response_parts.append(f"**Fuente:** {article.get('fuente')}")
-            
-            if article.get('tema') and str(article.get('tema')).strip() not in ['', 'nan', 'None', 'null']:
-                response_parts.append(f"**Tema:** {article.get('tema')}")
-            
-            if article.get('subtema') and str(article.get('subtema')).strip() not in ['', 'nan', 'None', 'null']:
-                response_parts.append(f"**Subtema:** {article.get('subtema')}")
-            
-            if article.get('texto_del_articulo') and str(article.get('texto_del_articulo')).strip() not in ['', 'nan', 'None', 'null']:
-                response_parts.append(f"**Contenido:**\n{article.get('texto_del_articulo')}")
-            else:
-                tema = article.get('tema') or ''
-                subtema = article.get('subtema') or ''
-                fuente = article.get('fuente') or ''
-                resumen = article.get('resumen_explicativo') or ''
-                parts = []
-                parts.append(f"El artículo {article_number} ({fuente}) no tiene disponible su texto completo en la base de datos actual.")
-                if resumen:
-                    parts.append(f"En términos generales, trata sobre {resumen}.")
-                elif tema:
-                    if subtema:
-                        parts.append(f"Su tema es {tema} y aborda el subtema {subtema}.")
-                    else:
-                        parts.append(f"Su tema principal es {tema}.")
-                parts.append("Para consultar el texto exacto y detalles oficiales, revisa el sitio del Ministerio de Salud o la plataforma de legislación colombiana.")
-                return " ".join(parts), 1.0, True
-            
-            if article.get('resumen_explicativo') and str(article.get('resumen_explicativo')).strip() not in ['', 'nan', 'None', 'null']:
-                response_parts.append(f"**Resumen:** {article.get('resumen_explicativo')}")
-            
-            return "\n\n".join(response_parts), 1.0, True
+            # Tomar el primer resultado; el detalle se arma desde el corpus
+            return render_detail(self.corpus.row(positions[0])), 1.0, True
             
         except Exception as e:
-            logging.error(f"Error obteniendo detalles del artículo {article_number}: {e}")
+            logger.error("Error obteniendo detalles del artículo %s: %s", article_number, e)
             return f"Error al obtener información del artículo {article_number}.", 0.0, False
 
-    def get_top_results(self, query_text, top_k=5):
-        """Obtiene los resultados más relevantes para una consulta sin generar una respuesta formateada."""
+    def _search_params(self, source=None, tema=None):
+        """Parámetros de búsqueda FAISS restringidos a una fuente y/o tema.
+
+        Devuelve (parámetros, vectores elegibles); (None, ntotal) si no hay filtro.
+        El selector se arma desde las listas del índice de facetas (posición de
+        fila == id en FAISS; en modo 'passage', los pasajes de esas filas) y se
+        guarda en caché por filtro.
+        """
+        if not (source or tema) or self.facets is None:
+            return None, self.index.ntotal
+        key = (source, tema)
+        cached = self._selector_cache.get(key)
+        if cached is None:
+            ids = self._vector_ids(self.facets.positions({'fuente': source, 'tema': tema}))
+            selector = faiss.IDSelectorBatch(ids) if len(ids) else None
+            params = faiss.SearchParameters(sel=selector) if selector is not None else None
+            # Se guarda también el selector para que viva mientras se usen los parámetros
+            cached = (params, len(ids), selector)
+            self._selector_cache[key] = cached
+        return cached[0], cached[1]
+
+    def get_top_results(self, query_text, top_k=5, source=None, tema=None, rerank=True):
+        """Obtiene los resultados más relevantes para una consulta sin generar una respuesta formateada.
+
+        Con source/tema solo se puntúan los vectores de esa fuente o tema (selector
+        de ids de FAISS), en vez de buscar en todo el índice y filtrar después.
+        Con RERANKER_MODEL y rerank, los primeros resultados se reordenan con el
+        cross-encoder (ver reranker.py).
+        """
         if self.index is None or self.index.ntotal == 0:
             return []
 
+        if not Config.FILTERED_SEARCH:
+            source = tema = None
+        params, eligible = self._search_params(source, tema)
+        if eligible == 0:
+            logger.info("Sin artículos para el filtro fuente=%s tema=%s", source, tema)
+            return []
+        if params is not None:
+            annotate("retrieval_filter", {"fuente": source, "tema": tema, "eligible": eligible})
+
         # Preprocesar la consulta
         query_text = query_text.strip()
         
@@ -565,32 +845,160 @@ class VectorDB:
         enhanced_query = self._enhance_query_with_keywords(query_text)
         
         # Crear embedding de la consulta enriquecida
-        query_embedding = model.encode([enhanced_query], convert_to_numpy=True)
-        faiss.normalize_L2(query_embedding)
+        with stage("embedding"):
+            query_embedding = encode_queries([enhanced_query])
+            faiss.normalize_L2(query_embedding)
 
-        # Buscar artículos similares
-        distances, indices = self.index.search(query_embedding, top_k)
+        # Buscar artículos similares (solo entre los elegibles si hay filtro)
+        with stage("search"):
+            distances, indices = self._search(query_embedding, top_k, params, eligible)
         
         # Filtrar y ponderar resultados
         valid_results = []
-        for i, (distance, idx) in enumerate(zip(distances[0], indices[0])):
-            # Aplicar ponderación semántica
-            weighted_score = self._calculate_weighted_similarity(query_text, distance, self.df.iloc[idx])
-            
-            if weighted_score >= 0.4:  # Umbral reducido para incluir más artículos relevantes de salud
-                valid_results.append({
-                    'index': idx,
-                    'similarity': float(weighted_score),
-                    'original_similarity': float(distance),
-                    'data': self.df.iloc[idx]
-                })
+        with stage("weighting"):
+            for i, (distance, idx) in enumerate(zip(distances, indices)):
+                # Aplicar ponderación semántica
+                data = self.corpus.record(idx)
+                weighted_score = self._calculate_weighted_similarity(query_text, distance, data)
+                
+                if weighted_score >= 0.4:  # Umbral reducido para incluir más artículos relevantes de salud
+                    valid_results.append({
+                        'index': idx,
+                        'similarity': float(weighted_score),
+                        'original_similarity': float(distance),
+                        'data': data
+                    })
         
         # Reordenar por similitud ponderada
         valid_results.sort(key=lambda x: x['similarity'], reverse=True)
+        if rerank and reranker is not None:
+            # Clave de caché: posición de fila dentro de esta versión de la base
+            valid_results = reranker.rerank(query_text, valid_results, lambda r: (self.version, int(r['index'])))
+        record_retrieval(valid_results)
         
-        logging.info(f"Resultados para consulta '{query_text}': {len(valid_results)} encontrados")
+        logger.debug("Resultados para consulta '%s': %s encontrados", query_text, len(valid_results))
         return valid_results
 
 
+
+class VectorDBHandle:
+    """Referencia única a la base vigente, con recarga en caliente.
+
+    Los consumidores usan `vector_db` como si fuera un VectorDB: los atributos
+    se resuelven contra la instantánea fijada en el hilo (pinned) o, si no hay,
+    contra la vigente. Una recarga construye un VectorDB nuevo en segundo plano
+    mientras el anterior sigue atendiendo y luego reemplaza la referencia (una
+    asignación, atómica). Las solicitudes en curso terminan con la instantánea
+    con la que empezaron.
+    """
+
+    def __init__(self, snapshot):
+        self._current = snapshot
+        self._local = threading.local()
+        self._reload_lock = threading.Lock()
+        # _pending y _reload_worker solo se leen o cambian bajo _reload_state
+        self._reload_state = threading.Lock()
+        self._pending = False
+        self._reload_worker = False
+        self.version = 1
+        self.loaded_at = time.time()
+        self.reloading = False
+        self.last_error = None
+        self.last_reload_ms = None
+
+    @property
+    def current(self):
+        """Instantánea fijada en este hilo o, si no hay, la vigente."""
+        return getattr(self._local, "snapshot", None) or self._current
+
+    def __getattr__(self, name):
+        return getattr(self.current, name)
+
+    @contextmanager
+    def pinned(self):
+        """Fija la instantánea vigente para el hilo actual durante una solicitud (reentrante)."""
+        snapshot = getattr(self._local, "snapshot", None)
+        if snapshot is not None:
+            yield snapshot
+            return
+        self._local.snapshot = self._current
+        try:
+            yield self._local.snapshot
+        finally:
+            self._local.snapshot = None
+
+    def reload(self):
+        """Reconstruye corpus e índice y, si quedan válidos, los pone en servicio. Devuelve True si se cambió."""
+        with self._reload_lock:
+            self.reloading = True
+            t0 = time.perf_counter()
+            try:
+                logger.info("Recargando base de conocimientos (versión actual %s)", self.version)
+                snapshot = VectorDB()
+                if snapshot.index is None or snapshot.index.ntotal == 0 or snapshot.index.ntotal != snapshot.expected_vectors():
+                    raise ValueError("El índice reconstruido está vacío o no coincide con el corpus")
+                snapshot.version = self.version + 1
+                self._current = snapshot
+                self.version = snapshot.version
+                self.loaded_at = time.time()
+                self.last_error = None
+                metrics.inc("kb_reloads_total")
+                logger.info("Base de conocimientos recargada: versión %s, %s artículos", self.version, len(snapshot.corpus))
+                return True
+            except Exception as e:
+                self.last_error = str(e)
+                metrics.inc("kb_reload_errors_total")
+                logger.exception("Error recargando la base de conocimientos; se mantiene la versión %s", self.version)
+                return False
+            finally:
+                self.last_reload_ms = round((time.perf_counter() - t0) * 1000.0, 1)
+                self.reloading = False
+
+    def reload_async(self):
+        """Lanza la recarga en un hilo de fondo. Si ya hay una en curso, se repite al terminar.
+
+        Los pedidos que llegan durante una recarga se agrupan en una sola recarga
+        posterior, que empieza después del último pedido.
+        """
+        with self._reload_state:
+            if self._reload_worker:
+                self._pending = True
+                return False
+            self._reload_worker = True
+        threading.Thread(target=self._run_reloads, name="kb-reload", daemon=True).start()
+        return True
+
+    def _run_reloads(self):
+        """Hilo de recarga: recarga hasta que no queden pedidos pendientes."""
+        try:
+            while True:
+                self.reload()
+                with self._reload_state:
+                    if not self._pending:
+                        self._reload_worker = False
+                        return
+                    self._pending = False
+        except BaseException:
+            with self._reload_state:
+                self._reload_worker = False
+            raise
+
+    def status(self):
+        current = self._current
+        return {
+            "version": self.version,
+            "loaded_at": self.loaded_at,
+            "articles": len(current.corpus) if current.corpus is not None else 0,
+            "index_mode": current.mode,
+            "embedding_model": EMBEDDING_SPEC.key,
+            "model_bundle": MODEL_BUNDLE["version"] if MODEL_BUNDLE else None,
+            "vectors": current.index.ntotal if current.index is not None else 0,
+            "reloading": self.reloading,
+            "last_reload_ms": self.last_reload_ms,
+            "last_error": self.last_error,
+        }
+
+
 # Crear instancia de la base de datos
-vector_db = VectorDB()
+vector_db = VectorDBHandle(VectorDB())
+metrics.register_gauge("kb_version", lambda: vector_db.version)
@@ -0,0 +1,194 @@
+"""Perfilado por muestreo de consultas individuales, a pedido o para una fracción del tráfico.
+
+Mientras una consulta está perfilada, un hilo muestreador lee cada
+PROFILE_INTERVAL_MS la pila del hilo que la atiende (sys._current_frames) y
+acumula pilas "plegadas" (raíz;...;hoja -> muestras), el formato de entrada de
+flamegraph.pl y speedscope. Cada muestra cuenta la pila completa, así que el
+tiempo de espera (LLM, E/S) también aparece, no solo el de CPU.
+
+Los perfiles terminados se guardan por el request_id de la traza (el trace_id que
+asigna el servidor, único por consulta; los PROFILE_MAX_STORED más recientes) y se consultan en /admin/profiles. Sin perfilado activo el costo por
+consulta es una comparación: no se crea el hilo ni se toca la pila.
+"""
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+
+from app import metrics
+from app.config import Config
+
+logger = logging.getLogger(__name__)
+
+
+def _frame_label(code, cache):
+    label = cache.get(code)
+    if label is None:
+        label = cache[code] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    return label
+
+
+class Profile:
+    """Muestras de una consulta: pilas plegadas desde el marco que abrió el perfil hasta la hoja."""
+
+    def __init__(self, request_id, thread_id, root, reason):
+        self.request_id = request_id
+        self.thread_id = thread_id
+        self.reason = reason            # 'header' (a pedido) o 'sampled'
+        self.started_at = time.time()
+        self.started = time.perf_counter()
+        self.duration_ms = None
+        self.samples = 0
+        self.stacks = Counter()
+        self.meta = {}
+        self._root = root
+
+    def add(self, frame, labels):
+        stack = []
+        while frame is not None:
+            stack.append(_frame_label(frame.f_code, labels))
+            if frame is self._root:
+                break
+            frame = frame.f_back
+        stack.reverse()
+        self.stacks[";".join(stack)] += 1
+        self.samples += 1
+
+    def finish(self):
+        self.duration_ms = (time.perf_counter() - self.started) * 1000.0
+        self._root = None
+
+    def folded(self):
+        """Pilas plegadas, una por línea: 'raíz;...;hoja muestras' (flamegraph.pl, speedscope)."""
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+    def top_functions(self, limit=15):
+        """Funciones con más muestras: propias (en la hoja) y acumuladas (en cualquier punto de la pila)."""
+        own, total = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            own[frames[-1]] += count
+            for label in set(frames):
+                total[label] += count
+        samples = max(self.samples, 1)
+        return [
+            {"function": label, "total": count, "total_pct": round(100.0 * count / samples, 1),
+             "own": own[label], "own_pct": round(100.0 * own[label] / samples, 1)}
+            for label, count in total.most_common(limit)
+        ]
+
+    def summary(self):
+        return {
+            "trace_id": self.request_id,
+            "reason": self.reason,
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z", time.localtime(self.started_at)),
+            "duration_ms": round(self.duration_ms, 3) if self.duration_ms is not None else None,
+            "samples": self.samples,
+            **self.meta,
+        }
+
+
+class SamplingProfiler:
+    """Un hilo muestreador compartido por todas las consultas perfiladas del proceso."""
+
+    def __init__(self, interval_ms=5.0, max_stored=50):
+        self.interval_s = max(interval_ms, 0.5) / 1000.0
+        self.max_stored = max_stored
+        self._lock = threading.Lock()
+        self._active = {}               # id del hilo -> Profile en curso
+        self._stored = OrderedDict()    # request_id -> Profile terminado (más reciente al final)
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._labels = {}
+
+    def start(self, request_id, root, reason):
+        profile = Profile(request_id, threading.get_ident(), root, reason)
+        with self._lock:
+            self._active[profile.thread_id] = profile
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profiler-sampler", daemon=True)
+                self._thread.start()
+            self._wakeup.set()
+        return profile
+
+    def stop(self, profile):
+        with self._lock:
+            self._active.pop(profile.thread_id, None)
+            profile.finish()
+            self._stored[profile.request_id] = profile
+            self._stored.move_to_end(profile.request_id)
+            while len(self._stored) > self.max_stored:
+                self._stored.popitem(last=False)
+        metrics.inc("profiles_captured_total")
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            with self._lock:
+                if not self._active:
+                    self._wakeup.clear()
+                    continue
+                frames = sys._current_frames()
+                for thread_id, profile in self._active.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        profile.add(frame, self._labels)
+                del frames
+            time.sleep(self.interval_s)
+
+    def get(self, request_id):
+        with self._lock:
+            return self._stored.get(request_id)
+
+    def recent(self, limit=None):
+        """Resúmenes de los perfiles guardados, del más reciente al más antiguo."""
+        with self._lock:
+            profiles = list(reversed(self._stored.values()))
+        return [p.summary() for p in profiles[:limit]]
+
+
+profiler = SamplingProfiler(Config.PROFILE_INTERVAL_MS, Config.PROFILE_MAX_STORED)
+
+
+def should_profile(requested=False):
+    """Motivo para perfilar esta consulta ('header' o 'sampled') o None."""
+    if requested:
+        return "header"
+    if Config.PROFILE_SAMPLE_RATE > 0 and random.random() < Config.PROFILE_SAMPLE_RATE:
+        return "sampled"
+    return None
+
+
+@contextmanager
+def profiled(trace, reason):
+    """Perfila el bloque si reason no es None (ver should_profile); entrega el Profile o None.
+
+    Al salir anota en el perfil la ruta y las etapas de la traza de la solicitud.
+    """
+    if reason is None:
+        yield None
+        return
+    # Las pilas se cortan en el marco que abre el bloque (p. ej. run_query): este
+    # generador -> __enter__ de contextlib -> quien llama
+    profile = profiler.start(trace.request_id, sys._getframe(2), reason)
+    error = None
+    try:
+        yield profile
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        profile.meta.update({
+            "route": trace.route,
+            "client_request_id": trace.meta.get("client_request_id"),
+            "stages_ms": {name: round(ms, 3) for name, ms in trace.stages.items()},
+            "error": error,
+        })
+        profiler.stop(profile)
+        logger.info("Perfil capturado", extra={"request_id": profile.request_id, "reason": profile.reason,
+                                                "samples": profile.samples,
+                                                "duration_ms": round(profile.duration_ms, 1)})
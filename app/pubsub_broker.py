@@ -0,0 +1,220 @@
+"""Broker pub/sub local compatible con el subconjunto de Redis que usa Socket.IO.
+
+Habla RESP (el protocolo de Redis) y solo implementa PING, SUBSCRIBE,
+UNSUBSCRIBE, PUBLISH y QUIT: lo necesario para que varios procesos del
+servidor compartan sus emisiones de Socket.IO (SOCKETIO_MESSAGE_QUEUE=resp://...)
+en pruebas y en desarrollo sin instalar Redis. No persiste nada y un suscriptor
+lento frena a quien publica; en producción se usa Redis.
+
+También define el cliente RESP mínimo que usa app/socket_queue.py.
+
+Uso:
+    python -m app.pubsub_broker --port 6399
+"""
+import argparse
+import logging
+import socket
+import socketserver
+import sys
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class RespError(RuntimeError):
+    """Respuesta de error (-ERR ...) del servidor RESP."""
+
+
+def encode_command(*args):
+    """Comando RESP: arreglo de cadenas bulk."""
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        data = arg if isinstance(arg, bytes) else str(arg).encode("utf-8")
+        parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+    return b"".join(parts)
+
+
+def read_reply(stream):
+    """Lee una respuesta RESP de un archivo binario; lanza ConnectionError si se cierra la conexión."""
+    line = stream.readline()
+    if not line:
+        raise ConnectionError("Conexión RESP cerrada")
+    kind, body = line[:1], line[1:-2]
+    if kind == b"+":
+        return body
+    if kind == b"-":
+        raise RespError(body.decode("utf-8", "replace"))
+    if kind == b":":
+        return int(body)
+    if kind == b"$":
+        size = int(body)
+        if size < 0:
+            return None
+        data = stream.read(size + 2)
+        if len(data) < size + 2:
+            raise ConnectionError("Conexión RESP cerrada")
+        return data[:-2]
+    if kind == b"*":
+        size = int(body)
+        return None if size < 0 else [read_reply(stream) for _ in range(size)]
+    raise RespError(f"Respuesta RESP inválida: {line[:40]!r}")
+
+
+class RespConnection:
+    """Conexión RESP bloqueante: command() para petición/respuesta, read() para mensajes suscritos."""
+
+    def __init__(self, host, port, timeout=None):
+        self.sock = socket.create_connection((host, port), timeout=10)
+        self.sock.settimeout(timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.stream = self.sock.makefile("rb")
+
+    def send(self, *args):
+        self.sock.sendall(encode_command(*args))
+
+    def read(self):
+        return read_reply(self.stream)
+
+    def command(self, *args):
+        self.send(*args)
+        return self.read()
+
+    def close(self):
+        for closer in (self.stream.close, self.sock.close):
+            try:
+                closer()
+            except OSError:
+                pass
+
+
+class _Subscriber:
+    def __init__(self, wfile):
+        self.wfile = wfile
+        self.lock = threading.Lock()
+        self.channels = set()
+
+    def write(self, data):
+        with self.lock:
+            self.wfile.write(data)
+            self.wfile.flush()
+
+
+def _bulk(value):
+    data = value if isinstance(value, bytes) else str(value).encode("utf-8")
+    return b"$%d\r\n%s\r\n" % (len(data), data)
+
+
+def _push(kind, channel, value):
+    tail = b":%d\r\n" % value if isinstance(value, int) else _bulk(value)
+    return b"*3\r\n" + _bulk(kind) + _bulk(channel) + tail
+
+
+class PubSubBroker(socketserver.ThreadingTCPServer):
+    """Servidor RESP con canales pub/sub en memoria, un hilo por conexión."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address):
+        super().__init__(address, _BrokerHandler)
+        self.channels = {}
+        self.lock = threading.Lock()
+        self.published = 0
+
+    def subscribe(self, subscriber, channel):
+        with self.lock:
+            self.channels.setdefault(channel, set()).add(subscriber)
+            subscriber.channels.add(channel)
+            return len(subscriber.channels)
+
+    def unsubscribe(self, subscriber, channel):
+        with self.lock:
+            members = self.channels.get(channel)
+            if members is not None:
+                members.discard(subscriber)
+                if not members:
+                    del self.channels[channel]
+            subscriber.channels.discard(channel)
+            return len(subscriber.channels)
+
+    def publish(self, channel, message):
+        with self.lock:
+            targets = list(self.channels.get(channel, ()))
+            self.published += 1
+        frame = _push(b"message", channel, message)
+        delivered = 0
+        for target in targets:
+            try:
+                target.write(frame)
+                delivered += 1
+            except OSError:
+                pass
+        return delivered
+
+
+class _BrokerHandler(socketserver.StreamRequestHandler):
+    def setup(self):
+        super().setup()
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.subscriber = _Subscriber(self.wfile)
+
+    def handle(self):
+        broker = self.server
+        while True:
+            try:
+                command = read_reply(self.rfile)
+            except (ConnectionError, OSError, RespError, ValueError):
+                break
+            if not isinstance(command, list) or not command:
+                self.subscriber.write(b"-ERR comando invalido\r\n")
+                continue
+            name, args = command[0].upper(), command[1:]
+            if name == b"PING":
+                self.subscriber.write(b"+PONG\r\n")
+            elif name == b"SUBSCRIBE" and args:
+                for channel in args:
+                    self.subscriber.write(_push(b"subscribe", channel, broker.subscribe(self.subscriber, channel)))
+            elif name == b"UNSUBSCRIBE":
+                for channel in args or sorted(self.subscriber.channels):
+                    self.subscriber.write(_push(b"unsubscribe", channel, broker.unsubscribe(self.subscriber, channel)))
+            elif name == b"PUBLISH" and len(args) == 2:
+                self.subscriber.write(b":%d\r\n" % broker.publish(args[0], args[1]))
+            elif name == b"QUIT":
+                self.subscriber.write(b"+OK\r\n")
+                break
+            else:
+                self.subscriber.write(b"-ERR comando no soportado '%s'\r\n" % name)
+
+    def finish(self):
+        for channel in list(self.subscriber.channels):
+            self.server.unsubscribe(self.subscriber, channel)
+        super().finish()
+
+
+def start_broker(host="127.0.0.1", port=6399):
+    """Inicia el broker en un hilo en segundo plano; devuelve el servidor (server.shutdown() lo detiene)."""
+    broker = PubSubBroker((host, port))
+    threading.Thread(target=broker.serve_forever, name="pubsub-broker", daemon=True).start()
+    return broker
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Broker pub/sub RESP local para Socket.IO multiproceso")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6399)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    broker = PubSubBroker((args.host, args.port))
+    logger.info("Broker pub/sub escuchando en %s:%s (SOCKETIO_MESSAGE_QUEUE=resp://%s:%s)",
+                args.host, args.port, args.host, args.port)
+    try:
+        broker.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        broker.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
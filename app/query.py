@@ -1,33 +1,40 @@
 import os
 import logging
-import traceback
-import openai
-import httpx
 import emoji
-import pandas as pd
-from openai import OpenAI
 from app.config import Config
+from app.llm_backend import LLMCircuitOpenError, LLMTimeoutError, get_llm_backend
 from app.models.vector_db import vector_db
+from app.tracing import start_trace, stage, set_route, annotate, budget_allows, degrade, remaining_ms, current_trace
+from app.single_flight import SingleFlight
+from app import admission
+from app.context_builder import build_messages, format_article_context, format_history, truncate_to_tokens
+from app.prompts import SYSTEM_PROMPT_CONTEXT, SYSTEM_PROMPT_GENERAL, SYSTEM_PROMPT_FULL
+from app import routing
 import re
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
+logger = logging.getLogger(__name__)
 
 conversation_history = []
+
+# Respuesta de la ruta general cuando el plazo de la solicitud no alcanza para el LLM
+NO_TIME_RESPONSE = ("Lo siento, no encontré información sobre tu consulta en la base de conocimientos "
+                    "y no alcancé a generar una respuesta a tiempo. Intenta reformularla o consulta más tarde.")
+# Respuesta inmediata cuando el circuito del LLM está abierto y la base no tiene una coincidencia buena
+LLM_UNAVAILABLE_RESPONSE = ("Lo siento, el servicio de generación de respuestas no está disponible en este momento "
+                            "y no encontré información suficiente en la base de conocimientos. "
+                            "Intenta preguntar por un artículo específico o consulta más tarde.")
 # AGOSTO
 class QueryRAGSystem:
     def __init__(self):
-        logging.info("Inicializando QueryRAGSystem")
-        # Configuración básica del cliente OpenAI sin proxies
-        client = httpx.Client()
-        self.client = OpenAI(
-            api_key=Config.OPENAI_API_KEY,
-            http_client=client
-        )
+        logger.info("Inicializando QueryRAGSystem")
+        # Backend LLM según configuración (OpenAI, endpoint local o stub)
+        self.llm = get_llm_backend()
         self.min_similarity_score = 0.55  # Reducido para incluir más consultas de salud
-        logging.info(f"API Key configurada: {'Presente' if Config.OPENAI_API_KEY else 'No presente'}")
+        # Consultas idénticas concurrentes comparten una sola ejecución del pipeline
+        self.inflight = SingleFlight("query_rag")
+        # Control de admisión por pool (vacío si está desactivado)
+        self.admission = admission.build_pools()
+        logger.info("Backend LLM: %s (%s)", self.llm.name, 'disponible' if self.llm.is_available() else 'no configurado')
 
     def clean_text(self, texto: str) -> str:
         """Limpia y normaliza el texto."""
@@ -41,55 +48,11 @@ class QueryRAGSystem:
 # SEPTIEMBRE
     def is_article_list_query(self, query_text):
         """Detecta si la consulta solicita una lista de artículos."""
-        query_lower = query_text.lower()
-        article_list_patterns = [
-            r'qu[eé]\s+art[ií]culos',
-            r'cu[aá]les\s+art[ií]culos',
-            r'lista\s+de\s+art[ií]culos',
-            r'todos\s+los\s+art[ií]culos',
-            r'art[ií]culos\s+sobre',
-            r'art[ií]culos\s+relacionados',
-            r'qu[eé]\s+normas',
-            r'cu[aá]les\s+normas',
-            r'dime\s+que\s+art[ií]culos',
-            r'muestra\s+art[ií]culos',
-            r'busca\s+art[ií]culos',
-            # Nuevos patrones para consultas por número/rango
-            r'primeros?\s+\d+\s+art[ií]culos',
-            r'\d+\s+primeros?\s+art[ií]culos',
-            r'art[ií]culos?\s+del?\s+\d+\s+al?\s+\d+',
-            r'art[ií]culos?\s+\d+\s+al?\s+\d+',
-            r'muestra\s+los?\s+\d+\s+primeros?\s+art[ií]culos',
-            r'muestra\s+los?\s+primeros?\s+\d+\s+art[ií]culos',
-            r'dame\s+los?\s+\d+\s+primeros?\s+art[ií]culos',
-            r'dame\s+los?\s+primeros?\s+\d+\s+art[ií]culos',
-            r'los?\s+\d+\s+primeros?\s+art[ií]culos',
-            r'los?\s+primeros?\s+\d+\s+art[ií]culos',
-            # Patrones con números escritos en palabras
-            r'diez\s+primeros?\s+art[ií]culos',
-            r'cinco\s+primeros?\s+art[ií]culos',
-            r'veinte\s+primeros?\s+art[ií]culos',
-            r'muestres?\s+los?\s+diez\s+primeros?\s+art[ií]culos',
-            r'muestres?\s+los?\s+cinco\s+primeros?\s+art[ií]culos',
-            r'muestres?\s+los?\s+veinte\s+primeros?\s+art[ií]culos',
-            r'que\s+me\s+muestres?\s+los?\s+diez\s+primeros?\s+art[ií]culos',
-            r'que\s+me\s+muestres?\s+los?\s+cinco\s+primeros?\s+art[ií]culos'
-        ]
-        
-        for pattern in article_list_patterns:
-            if re.search(pattern, query_lower):
-                return True
-        return False
+        return routing.is_article_list_query(query_text)
 # OCTUBRE
     def is_opinion_request(self, query_text: str) -> bool:
         """Detecta si el usuario pide explicación en 'tus palabras' u opinión."""
-        q = query_text.lower()
-        triggers = [
-            "en tus palabras", "con tus palabras", "tu opinión", "qué opinas",
-            "opina", "explicame con tus palabras", "explícame con tus palabras",
-            "dime tu opinión", "en tu criterio", "desde tu perspectiva"
-        ]
-        return any(t in q for t in triggers)
+        return routing.is_opinion_request(query_text)
 
     def _generate_direct_response(self, results, query_text):
         """Genera una respuesta directa basada en los resultados más relevantes."""
@@ -97,51 +60,49 @@ class QueryRAGSystem:
             if not results:
                 return f"No encontré información específica sobre '{query_text}' en mi base de datos."
             
-            # Tomar el resultado más relevante
-            best_result = results[0]['data']
-            
-            # Extraer información relevante
-            article_num = best_result.get('articulo', 'N/A')
-            source = best_result.get('fuente', 'N/A')
-            theme = best_result.get('tema', 'N/A')
-            subtheme = best_result.get('subtema', '')
-            summary = best_result.get('resumen_explicativo', '')
-            full_text = best_result.get('texto_del_articulo', '')
+            # Tomar el resultado más relevante; los fragmentos vienen precalculados
+            best = vector_db.card_for(results[0])
             
             # Construir respuesta directa y clara
-            response = f"**{theme}**\n\n"
+            response = f"**{best.tema or 'N/A'}**\n\n"
             
-            # Añadir información del procedimiento/respuesta
-            if summary and str(summary).strip() not in ['', 'nan', 'None', 'null']:
-                response += f"{summary}\n\n"
-            elif full_text and str(full_text).strip() not in ['', 'nan', 'None', 'null']:
-                # Si no hay resumen pero sí texto completo, usar un extracto
-                extract = full_text[:300] + "..." if len(full_text) > 300 else full_text
-                response += f"{extract}\n\n"
+            # Añadir información del procedimiento/respuesta (resumen o extracto del texto)
+            if best.direct_body:
+                response += f"{best.direct_body}\n\n"
             
             # Añadir referencia al artículo de forma más simple
-            response += f"**Referencia:** Artículo {article_num} - {source}"
-            if subtheme and str(subtheme).strip() not in ['', 'nan', 'None', 'null']:
-                response += f" ({subtheme})"
-            response += "\n\n"
+            response += f"**Referencia:** {best.reference}\n\n"
             
             # Añadir información de artículos relacionados si hay más resultados
             if len(results) > 1:
                 response += "**Artículos relacionados:**\n"
                 for i in range(1, min(4, len(results))):
-                    related = results[i]['data']
-                    response += f"• Art. {related.get('articulo', 'N/A')} - {related.get('tema', 'N/A')}"
-                    if related.get('subtema') and str(related.get('subtema')).strip() not in ['', 'nan', 'None', 'null']:
-                        response += f" ({related.get('subtema')})"
-                    response += "\n"
+                    response += vector_db.card_for(results[i]).related_line + "\n"
             
-            logging.info("Generada respuesta directa estructurada con información legal")
+            logger.info("Generada respuesta directa estructurada con información legal")
             return response
             
         except Exception as e:
-            logging.error(f"Error generando respuesta directa: {e}")
+            logger.error("Error generando respuesta directa: %s", e)
             return f"Encontré información sobre '{query_text}', pero hubo un error al procesarla. Por favor, intenta reformular tu pregunta."
 
+    def _kb_template_response(self, results, query_text):
+        """Respuesta sin LLM con las plantillas de la base: completa si los mejores resultados comparten tema."""
+        theme = results[0]['data'].get('tema')
+        same_theme = [r for r in results if r['data'].get('tema') == theme]
+        if theme and len(same_theme) > 1:
+            return vector_db._generate_complete_response(same_theme, theme, query_text)
+        return self._generate_direct_response(results, query_text)
+
+    def _llm_unavailable_response(self, results, query_text):
+        """(respuesta, usó_kb) con el circuito del LLM abierto: plantilla si la coincidencia es buena, si no rechazo."""
+        if results and results[0]['similarity'] >= Config.LLM_BREAKER_KB_MIN_SIMILARITY:
+            degrade("kb_only")
+            with stage("kb_answer"):
+                return self._kb_template_response(results, query_text), True
+        degrade("rejected")
+        return LLM_UNAVAILABLE_RESPONSE, False
+
     def _validate_article_mentions(self, response_text):
         """Valida que los artículos mencionados en la respuesta existan realmente en la base de datos."""
         import re
@@ -162,18 +123,18 @@ class QueryRAGSystem:
                 
                 if "❌ **Artículo No Encontrado**" in article_response:
                     invalid_articles.append(art_num)
-                    logging.warning(f"Artículo {art_num} mencionado pero no existe en la base de datos")
+                    logger.warning("Artículo %s mencionado pero no existe en la base de datos", art_num)
                 else:
                     validated_articles.append(art_num)
-                    logging.info(f"Artículo {art_num} validado correctamente")
+                    logger.info("Artículo %s validado correctamente", art_num)
                     
             except Exception as e:
-                logging.error(f"Error validando artículo {art_num}: {e}")
+                logger.error("Error validando artículo %s: %s", art_num, e)
                 invalid_articles.append(art_num)
         
         # Si hay artículos inválidos, modificar la respuesta
         if invalid_articles:
-            logging.warning(f"Se encontraron artículos inválidos: {invalid_articles}")
+            logger.warning("Se encontraron artículos inválidos: %s", invalid_articles)
             
             # Crear una respuesta más conservadora
             if validated_articles:
@@ -212,13 +173,13 @@ class QueryRAGSystem:
         
         # Si hay problemas de consistencia significativos, marcar como inconsistente
         if len(consistency_issues) > 1:  # Más de un problema temático
-            logging.warning(f"Problemas de consistencia temática detectados: {consistency_issues}")
+            logger.warning("Problemas de consistencia temática detectados: %s", consistency_issues)
             return False, consistency_issues
         
         return True, []
 
-    def _improve_response_coherence(self, query_text, response_text):
-        """Mejora la coherencia de la respuesta basándose en la consulta."""
+    def _improve_response_coherence(self, query_text, response_text, source=None):
+        """Mejora la coherencia de la respuesta basándose en la consulta (y la fuente detectada, si hay)."""
         
         # 1. Validar artículos mencionados
         response_text, articles_valid = self._validate_article_mentions(response_text)
@@ -228,10 +189,10 @@ class QueryRAGSystem:
         
         # 3. Si hay problemas de consistencia, generar una respuesta más conservadora
         if not is_consistent or not articles_valid:
-            logging.info("Generando respuesta más conservadora debido a problemas de consistencia")
+            logger.info("Generando respuesta más conservadora debido a problemas de consistencia")
             
             # Buscar información relevante de manera más específica
-            top_results = vector_db.get_top_results(query_text, top_k=3)
+            top_results = vector_db.get_top_results(query_text, top_k=3, source=source)
             
             if top_results and top_results[0]['similarity'] >= 0.6:
                 # Crear respuesta basada en resultados verificados
@@ -252,6 +213,58 @@ class QueryRAGSystem:
         
         return response_text
 
+    def _parse_listing_request(self, query_text: str):
+        """Detecta listados por número: devuelve (cantidad_solicitada, (inicio, fin)); ambos pueden ser None."""
+        q = query_text.lower()
+        article_range = routing.detect_article_range(q)
+        if article_range:
+            logger.info("Detectada consulta por rango de artículos: %s-%s", *article_range)
+            return None, article_range
+        
+        # NUEVA LÓGICA: Detectar consultas por número específico (ej: "primeros 10 artículos")
+        number_patterns = [
+            r'primeros?\s+(\d+)\s+art[ií]culos',
+            r'(\d+)\s+primeros?\s+art[ií]culos',
+            r'muestra\s+los?\s+(\d+)\s+primeros?\s+art[ií]culos',
+            r'muestra\s+los?\s+primeros?\s+(\d+)\s+art[ií]culos',
+            r'dame\s+los?\s+(\d+)\s+primeros?\s+art[ií]culos',
+            r'dame\s+los?\s+primeros?\s+(\d+)\s+art[ií]culos',
+            r'los?\s+(\d+)\s+primeros?\s+art[ií]culos',
+            r'los?\s+primeros?\s+(\d+)\s+art[ií]culos'
+        ]
+        
+        # Patrones con números en palabras
+        word_number_patterns = {
+            r'diez\s+primeros?\s+art[ií]culos': 10,
+            r'cinco\s+primeros?\s+art[ií]culos': 5,
+            r'veinte\s+primeros?\s+art[ií]culos': 20,
+            r'muestres?\s+los?\s+diez\s+primeros?\s+art[ií]culos': 10,
+            r'muestres?\s+los?\s+cinco\s+primeros?\s+art[ií]culos': 5,
+            r'muestres?\s+los?\s+veinte\s+primeros?\s+art[ií]culos': 20,
+            r'que\s+me\s+muestres?\s+los?\s+diez\s+primeros?\s+art[ií]culos': 10,
+            r'que\s+me\s+muestres?\s+los?\s+cinco\s+primeros?\s+art[ií]culos': 5
+        }
+        
+        requested_count = None
+        
+        # Primero probar patrones con números
+        for pattern in number_patterns:
+            match = re.search(pattern, q)
+            if match:
+                requested_count = int(match.group(1))
+                logger.info("Detectada consulta por número específico: %s artículos", requested_count)
+                break
+        
+        # Si no encontró, probar patrones con palabras
+        if not requested_count:
+            for pattern, count in word_number_patterns.items():
+                if re.search(pattern, q):
+                    requested_count = count
+                    logger.info("Detectada consulta por número en palabras: %s artículos", requested_count)
+                    break
+        
+        return requested_count, None
+
     def _list_articles_response(self, query_text: str, top_results: list):
         """Genera un listado de artículos coherente con la consulta, con resumen corto por artículo.
         Aplica filtros por concepto (tokens/sinónimos) y valida por tema/subtema/categorías.
@@ -260,51 +273,10 @@ class QueryRAGSystem:
             import re
             q = query_text.lower()
             
-            # NUEVA LÓGICA: Detectar consultas por número específico (ej: "primeros 10 artículos")
-            number_patterns = [
-                r'primeros?\s+(\d+)\s+art[ií]culos',
-                r'(\d+)\s+primeros?\s+art[ií]culos',
-                r'muestra\s+los?\s+(\d+)\s+primeros?\s+art[ií]culos',
-                r'muestra\s+los?\s+primeros?\s+(\d+)\s+art[ií]culos',
-                r'dame\s+los?\s+(\d+)\s+primeros?\s+art[ií]culos',
-                r'dame\s+los?\s+primeros?\s+(\d+)\s+art[ií]culos',
-                r'los?\s+(\d+)\s+primeros?\s+art[ií]culos',
-                r'los?\s+primeros?\s+(\d+)\s+art[ií]culos'
-            ]
-            
-            # Patrones con números en palabras
-            word_number_patterns = {
-                r'diez\s+primeros?\s+art[ií]culos': 10,
-                r'cinco\s+primeros?\s+art[ií]culos': 5,
-                r'veinte\s+primeros?\s+art[ií]culos': 20,
-                r'muestres?\s+los?\s+diez\s+primeros?\s+art[ií]culos': 10,
-                r'muestres?\s+los?\s+cinco\s+primeros?\s+art[ií]culos': 5,
-                r'muestres?\s+los?\s+veinte\s+primeros?\s+art[ií]culos': 20,
-                r'que\s+me\s+muestres?\s+los?\s+diez\s+primeros?\s+art[ií]culos': 10,
-                r'que\s+me\s+muestres?\s+los?\s+cinco\s+primeros?\s+art[ií]culos': 5
-            }
-            
-            requested_count = None
-            
-            # Primero probar patrones con números
-            for pattern in number_patterns:
-                match = re.search(pattern, q)
-                if match:
-                    requested_count = int(match.group(1))
-                    logging.info(f"Detectada consulta por número específico: {requested_count} artículos")
-                    break
-            
-            # Si no encontró, probar patrones con palabras
-            if not requested_count:
-                for pattern, count in word_number_patterns.items():
-                    if re.search(pattern, q):
-                        requested_count = count
-                        logging.info(f"Detectada consulta por número en palabras: {requested_count} artículos")
-                        break
-            
-            # Si es consulta por número específico, usar lógica diferente
-            if requested_count:
-                return self._list_articles_by_number(requested_count, query_text)
+            # Consultas por número o rango ("primeros 10 artículos", "artículos del 10 al 20")
+            requested_count, article_range = self._parse_listing_request(query_text)
+            if requested_count or article_range:
+                return self._list_articles_by_number(requested_count, query_text, article_range)
             
             # Construir tokens/sinónimos a partir de la consulta (lógica original)
             synonyms = []
@@ -347,36 +319,15 @@ class QueryRAGSystem:
                 if any(matches_any(f) for f in fields):
                     selected.append(res)
 
-            # 2) Fallback: escanear el DataFrame si hay pocos seleccionados
-            if len(selected) < 5 and hasattr(vector_db, 'df') and vector_db.df is not None:
-                import pandas as pd
-                df = vector_db.df
+            # 2) Fallback: escanear el corpus si hay pocos seleccionados
+            corpus = getattr(vector_db, 'corpus', None)
+            if len(selected) < 5 and corpus is not None and synonyms:
                 cols = ['tema', 'subtema', 'categorias', 'resumen_explicativo', 'texto_del_articulo']
-                mask = None
-                for rx in synonyms:
-                    part = None
-                    for c in cols:
-                        # str.contains puede fallar si columna no es string; convertir
-                        col_series = df[c].astype(str)
-                        m = col_series.str.contains(rx, case=False, na=False, regex=True)
-                        part = m if part is None else (part | m)
-                    mask = part if mask is None else (mask | part)
-                if mask is not None:
-                    fallback_df = df[mask].copy()
-                    # Limitar tamaño y construir estructura similar a top_results
-                    for _, row in fallback_df.head(20).iterrows():
-                        selected.append({
-                            'similarity': 0.5,
-                            'data': {
-                                'fuente': row.get('fuente', ''),
-                                'articulo': str(row.get('articulo', '')).strip(),
-                                'tema': row.get('tema', ''),
-                                'subtema': row.get('subtema', ''),
-                                'categorias': row.get('categorias', ''),
-                                'resumen_explicativo': row.get('resumen_explicativo', ''),
-                                'texto_del_articulo': row.get('texto_del_articulo', ''),
-                            }
-                        })
+                pattern = re.compile("|".join(synonyms), re.IGNORECASE)
+                positions = corpus.matching(pattern, cols)
+                # Limitar tamaño y construir estructura similar a top_results
+                for pos in positions[:20]:
+                    selected.append({'similarity': 0.5, 'data': corpus.record(pos)})
 
             # 3) Unificar por número de artículo y ordenar
             seen = set()
@@ -429,220 +380,201 @@ class QueryRAGSystem:
             return response_text, max_sim, True
 
         except Exception as e:
-            logging.error(f"Error generando listado de artículos: {e}")
+            logger.error("Error generando listado de artículos: %s", e)
             return f"Ocurrió un error al generar el listado: {str(e)}", 0.0, False
 
-    def _list_articles_by_number(self, requested_count: int, query_text: str):
-        """Genera un listado de artículos específicos por número (ej: primeros 10 artículos)."""
+    def _list_articles_by_number(self, requested_count: int, query_text: str, article_range=None):
+        """Genera un listado de artículos por número: los primeros N o un rango (ej: del 10 al 20).
+
+        Usa los arreglos ordenados por fuente de VectorDB: cada listado es un corte
+        por búsqueda binaria y el texto sale de las tarjetas precalculadas.
+        """
         try:
             # Verificar acceso a la base de datos
-            if not hasattr(vector_db, 'df') or vector_db.df is None:
+            if not getattr(vector_db, 'cards', None):
                 return "❌ La base de datos no está disponible en este momento.", 0.0, False
             
-            articles_df = vector_db.df.copy()
-            
-            if articles_df.empty:
-                return "❌ No se encontraron artículos en la base de datos.", 0.0, False
-            
-            # --- NUEVA LÓGICA DE FILTRADO POR FUENTE ---
-            # Identificar si la consulta menciona una ley específica
             query_lower = query_text.lower()
             
-            # Obtener todas las fuentes únicas
-            all_sources = articles_df['fuente'].unique()
-            matched_source = None
-            
-            # Normalizar para comparación
-            import unicodedata
-            def normalize(text):
-                return unicodedata.normalize('NFKD', str(text)).encode('ASCII', 'ignore').decode('utf-8').lower()
-            
-            q_norm = normalize(query_lower)
-            
-            # ESTRATEGIA 1: Buscar patrones numéricos específicos (ej: "ley 100", "decreto 123")
-            # Esto ayuda cuando el usuario dice "ley 100" pero la fuente es "ley 100 de 1993"
-            import re
-            law_pattern = re.search(r'(ley|decreto|resoluci[oó]n|c[oó]digo|estatuto)\s*(\d+)', q_norm)
-            
-            if law_pattern:
-                law_type = law_pattern.group(1)
-                law_num = law_pattern.group(2)
-                # Crear patrón de búsqueda estricto (word boundary) para evitar que "ley 100" coincida con "ley 1000"
-                # Normalizamos espacios en el regex
-                search_key = fr"{law_type}\s+{law_num}\b"
-                
-                logging.info(f"Buscando patrón normativo: {search_key}")
-                
-                for source in all_sources:
-                    s_norm = normalize(source)
-                    # Usar regex para buscar el patrón en la fuente normalizada
-                    if re.search(search_key, s_norm):
-                        matched_source = source
-                        logging.info(f"Fuente coincidente por patrón numérico: {matched_source}")
-                        break
-            
-            # ESTRATEGIA 2: Si no hubo match numérico, buscar coincidencia de nombre completo
+            # Identificar si la consulta menciona una ley específica
+            matched_source = vector_db.detect_source(query_lower)
             if not matched_source:
-                # Ordenar fuentes por longitud descendente para preferir coincidencias más largas
-                sorted_sources = sorted(all_sources, key=lambda x: len(str(x)), reverse=True)
-                
-                for source in sorted_sources:
-                    s_norm = normalize(source)
-                    # Verificar si la fuente normalizada está en la consulta normalizada
-                    if s_norm in q_norm:
-                        matched_source = source
-                        logging.info(f"Fuente coincidente por nombre: {matched_source}")
-                        break
-            
-            # Filtrar por fuente si se encontró una
-            if matched_source:
-                articles_df = articles_df[articles_df['fuente'] == matched_source]
+                # Sin ley explícita se excluyen los artículos 0, que suelen ser introducciones
+                logger.info("No se detectó fuente específica, usando filtro genérico")
+            
+            if article_range:
+                start, end = article_range
+                if not matched_source:
+                    start = max(start, 1)
+                positions = vector_db.articles_in_range(matched_source, start, end)
             else:
-                # Si no se especifica ley, intentar inferir o usar comportamiento default
-                # Si es una consulta genérica ("primeros 5 articulos"), y no hay ley,
-                # el comportamiento anterior era malo (mezclaba todo).
-                # Por ahora, si no hay ley, excluimos artículos "0" que suelen ser introducciones
-                logging.info("No se detectó fuente específica, usando filtro genérico")
-                # Opcional: filtrar 'introducción' o 'artículo 0' si no se pide explícitamente
-            
-            # -------------------------------------------
-
-            # Convertir números de artículos a enteros para ordenar correctamente
-            articles_df['articulo_num'] = pd.to_numeric(articles_df['articulo'], errors='coerce')
-            
-            # Filtrar artículos válidos y ordenar por número
-            valid_articles = articles_df.dropna(subset=['articulo_num']).sort_values('articulo_num')
-            
-            # Si no se detectó fuente, tratar de evitar artículos 0 si hay muchos (introducciones)
-            if not matched_source:
-                 valid_articles = valid_articles[valid_articles['articulo_num'] > 0]
-
-            # Limitar al número solicitado
-            selected_articles = valid_articles.head(requested_count)
+                positions = vector_db.articles_in_range(matched_source, None if matched_source else 1,
+                                                        limit=requested_count)
             
-            if selected_articles.empty:
-                return f"❌ No se encontraron artículos válidos para mostrar.", 0.0, False
+            if not positions:
+                if article_range:
+                    return f"❌ No se encontraron artículos entre el {article_range[0]} y el {article_range[1]}.", 0.0, False
+                return "❌ No se encontraron artículos válidos para mostrar.", 0.0, False
             
             # Generar respuesta
             title_prefix = f"de {matched_source}" if matched_source else "encontrados"
-            response_lines = [
-                f"📋 **{len(selected_articles)} {'Primeros' if requested_count <= 20 else ''} Artículos {title_prefix}:**\n"
-            ]
+            if article_range:
+                title = f"📋 **Artículos del {article_range[0]} al {article_range[1]} {title_prefix}:**\n"
+            else:
+                title = f"📋 **{len(positions)} {'Primeros' if requested_count <= 20 else ''} Artículos {title_prefix}:**\n"
+            response_lines = [title]
             
             # Preferir texto completo si el usuario lo solicita
             prefer_full_text = any(term in query_lower for term in ['texto', 'texto completo', 'con su texto', 'con el texto'])
             
-            for _, row in selected_articles.iterrows():
-                art_num = int(row['articulo_num'])
-                tema = row.get('tema', '')
-                subtema = row.get('subtema', '')
-                resumen = row.get('resumen_explicativo', '')
-                texto = row.get('texto_del_articulo', '')
-                
+            for pos in positions:
+                card = vector_db.cards[pos]
                 # Elegir contenido según preferencia del usuario
-                if prefer_full_text and texto and str(texto).strip() not in ['', 'nan', 'None', 'null']:
-                    content = texto
-                else:
-                    content = resumen if resumen and str(resumen).strip() not in ['', 'nan', 'None', 'null'] else texto
-                content = str(content or '').strip()
-                
-                # Truncar si es muy largo
-                if len(content) > 300:
-                    content = content[:300] + "..."
-                if not content:
-                    content = "(Contenido no disponible)"
-                
-                # Formatear línea del artículo
-                line = f"• **ARTÍCULO {art_num}**"
-                if tema and str(tema).strip():
-                    line += f" — {tema}"
-                if subtema and str(subtema).strip() not in ['', 'nan', 'None', 'null']:
-                    line += f" ({subtema})"
-                
-                response_lines.append(line)
-                response_lines.append(f"  {content}\n")
+                content = card.text_snippet if prefer_full_text else card.snippet
+                response_lines.append(card.list_line)
+                response_lines.append(f"  {content or '(Contenido no disponible)'}\n")
             
             response_text = "\n".join(response_lines)
             
-            # Calcular similitud promedio (para consistencia con el sistema)
-            similarity = 0.8  # Alta similitud ya que es una consulta específica exitosa
+            # Similitud alta ya que es una consulta específica exitosa
+            similarity = 0.8
             
-            logging.info(f"Generado listado de {len(selected_articles)} artículos por número específico")
+            logger.info("Generado listado de %s artículos por número", len(positions))
             return response_text, similarity, True
             
         except Exception as e:
-            logging.error(f"Error generando listado por número: {e}")
+            logger.error("Error generando listado por número: %s", e)
             return f"❌ Error al generar el listado: {str(e)}", 0.0, False
 
-    def query_rag(self, query_text: str) -> tuple:
-        """Consulta el sistema RAG y devuelve la mejor respuesta disponible con información de similitud."""
+    def _llm_timeout(self):
+        """Segundos que le quedan a la solicitud para la llamada al LLM (None = sin plazo)."""
+        remaining = remaining_ms()
+        return None if remaining is None else max(remaining, 0.0) / 1000.0
+
+    def _top_k(self, full, reduced):
+        """top_k completo o reducido según el presupuesto restante de la solicitud."""
+        if budget_allows(Config.DEADLINE_FULL_TOP_K_MS):
+            return full
+        degrade("reduced_top_k")
+        return reduced
+
+    def query_rag(self, query_text: str, budget_ms=None) -> tuple:
+        """Consulta el sistema RAG y devuelve la mejor respuesta disponible con información de similitud.
+
+        budget_ms fija el plazo de la solicitud (por defecto REQUEST_BUDGET_MS); cada
+        etapa consulta el presupuesto restante y se degrada si no alcanza. Con
+        QUERY_COALESCING, las consultas idénticas (y con el mismo presupuesto) que
+        llegan mientras otra está en vuelo esperan su resultado, a lo sumo hasta su
+        propio plazo, en lugar de ejecutar el pipeline otra vez.
+        """
+        # La traza registra tiempos por etapa y ruta tomada (ver app/tracing.py).
+        # La base queda fijada para toda la solicitud aunque haya una recarga en curso.
+        budget_ms = Config.REQUEST_BUDGET_MS if budget_ms is None else budget_ms
+        with start_trace(budget_ms=budget_ms) as trace:
+            if not Config.QUERY_COALESCING:
+                return self._admitted_query_rag(query_text)[0]
+            # Solo el líder ocupa lugar en el control de admisión; los seguidores no cuestan nada.
+            # Un seguidor cuyo plazo vence antes que el líder ejecuta (degradado) por su cuenta.
+            remaining = remaining_ms()
+            (result, leader), shared = self.inflight.do(self.coalesce_key(query_text, trace.budget_ms),
+                                                        lambda: self._admitted_query_rag(query_text),
+                                                        timeout=None if remaining is None else remaining / 1000.0)
+            if shared:
+                # La traza del seguidor refleja la ejecución que reutilizó
+                set_route(leader["route"])
+                annotate("kb_version", leader["kb_version"])
+                annotate("coalesced_with", leader["request_id"])
+                trace.degradations.extend(d for d in leader["degradations"] if d not in trace.degradations)
+            return result
+
+    def coalesce_key(self, query_text: str, budget_ms=None) -> tuple:
+        """Clave de coalescencia: presupuesto y consulta normalizada (el pipeline no depende de la sesión).
+
+        El presupuesto separa las ejecuciones: una solicitud sin plazo no hereda la
+        respuesta degradada (p. ej. kb_only) de un líder con un plazo corto.
+        """
+        return budget_ms or None, self.clean_text(query_text).lower()
+
+    def admission_pool(self, query_text: str) -> str:
+        """Pool de admisión según la ruta prevista: sin LLM (artículo, listados) o con LLM."""
+        query_text = self.clean_text(query_text)
+        if routing.detect_article_number(query_text):
+            return admission.LLM if self.is_opinion_request(query_text) else admission.CHEAP
+        if self.is_article_list_query(query_text):
+            return admission.CHEAP
+        return admission.LLM
+
+    def _admitted_query_rag(self, query_text: str):
+        """_pinned_query_rag dentro del pool de admisión; lanza admission.Overloaded si se descarta."""
+        if not self.admission:
+            return self._pinned_query_rag(query_text)
+        with self.admission[self.admission_pool(query_text)].admit(max_wait_ms=remaining_ms()):
+            return self._pinned_query_rag(query_text)
+
+    def _pinned_query_rag(self, query_text: str):
+        """(resultado, resumen de la traza) con la base fijada durante toda la ejecución."""
+        with vector_db.pinned() as db:
+            annotate("kb_version", db.version)
+            result = self._run_query_rag(query_text)
+        trace = current_trace()
+        return result, {
+            "request_id": trace.request_id,
+            "route": trace.route,
+            "kb_version": db.version,
+            "degradations": list(trace.degradations),
+        }
+
+    def _run_query_rag(self, query_text: str) -> tuple:
+        """Cuerpo de query_rag, ejecutado dentro de una traza de solicitud."""
         global conversation_history
 
         try:
             # Limpiar y normalizar la consulta
-            query_text = self.clean_text(query_text)
-            logging.info(f"Consulta normalizada: {query_text}")
+            with stage("clean"):
+                query_text = self.clean_text(query_text)
+            logger.info("Consulta normalizada: %s", query_text)
             opinion_mode = self.is_opinion_request(query_text)
 
             # NUEVA LÓGICA: Detectar si se solicita un artículo específico
             import re
-            article_pattern = r'(?:artículo|articulo|art\.?)\s*(\d+)'
-            match = re.search(article_pattern, query_text.lower())
+            article_number = routing.detect_article_number(query_text)
             
-            if match:
-                article_number = match.group(1)
-                logging.info(f"Solicitud de artículo específico detectada: {article_number}")
+            if article_number:
+                logger.info("Solicitud de artículo específico detectada: %s", article_number)
                 
-                # --- NUEVA LÓGICA DE DETECCIÓN DE FUENTE ---
-                matched_source = None
-                if vector_db.df is not None:
-                    all_sources = vector_db.df['fuente'].unique()
-                    
-                    import unicodedata
-                    def normalize(text):
-                        return unicodedata.normalize('NFKD', str(text)).encode('ASCII', 'ignore').decode('utf-8').lower()
-                    
-                    q_norm = normalize(query_text.lower())
-                    
-                    # ESTRATEGIA 1: Buscar patrones numéricos específicos (ej: "ley 100", "decreto 123")
-                    law_pattern = re.search(r'(ley|decreto|resoluci[oó]n|c[oó]digo|estatuto)\s*(\d+)', q_norm)
-                    
-                    if law_pattern:
-                        law_type = law_pattern.group(1)
-                        law_num = law_pattern.group(2)
-                        search_key = fr"{law_type}\s+{law_num}\b"
-                        
-                        for source in all_sources:
-                            s_norm = normalize(source)
-                            if re.search(search_key, s_norm):
-                                matched_source = source
-                                logging.info(f"Fuente detectada para artículo específico: {matched_source}")
-                                break
-                    
-                    # ESTRATEGIA 2: Si no hubo match numérico, buscar coincidencia de nombre completo
-                    if not matched_source:
-                        sorted_sources = sorted(all_sources, key=lambda x: len(str(x)), reverse=True)
-                        for source in sorted_sources:
-                            s_norm = normalize(source)
-                            if s_norm in q_norm:
-                                matched_source = source
-                                logging.info(f"Fuente detectada por nombre para artículo específico: {matched_source}")
-                                break
-                # -------------------------------------------
+                # Detectar la ley mencionada para filtrar el artículo por fuente
+                matched_source = vector_db.detect_source(query_text) if vector_db.cards else None
 
-                resp = vector_db.get_article_details(article_number, source=matched_source)
+                set_route("article_opinion" if opinion_mode else "article")
+                with stage("article_lookup"):
+                    resp = vector_db.get_article_details(article_number, source=matched_source)
                 # Desempaquetar si la base devuelve tupla (texto, similitud, usado_kb)
                 if isinstance(resp, tuple) and len(resp) == 3:
                     resp_text, sim, used_kb = resp
                 else:
                     resp_text, sim, used_kb = resp, 0.95, True
                 # Si el usuario pide opinión/en sus palabras, generar explicación interpretativa
-                if opinion_mode and isinstance(resp_text, str):
+                if opinion_mode and isinstance(resp_text, str) and self.llm.is_open():
+                    # LLM fuera de servicio: se entrega el texto del artículo sin esperar
+                    degrade("llm_circuit_open")
+                    degrade("kb_only")
+                elif opinion_mode and isinstance(resp_text, str) and not budget_allows(Config.DEADLINE_LLM_MIN_MS):
+                    # Sin tiempo para la explicación: se entrega el texto del artículo
+                    degrade("kb_only")
+                elif opinion_mode and isinstance(resp_text, str):
                     import re as _re
                     m = _re.search(r"\*\*Contenido:\*\*\s*(.+?)(?:\n\n|\Z|\*\*Resumen:\*\*)", resp_text, flags=_re.S)
                     content_block = m.group(1).strip() if m else resp_text
                     context_info = f"Texto del artículo para explicar en tus palabras:\n{content_block}"
-                    resp_text = self.query_openai_with_context(query_text, context_info)
+                    try:
+                        with stage("llm"):
+                            resp_text = self.query_openai_with_context(query_text, context_info,
+                                                                       timeout=self._llm_timeout())
+                    except LLMCircuitOpenError:
+                        degrade("llm_circuit_open")
+                        degrade("kb_only")
+                    except LLMTimeoutError:
+                        degrade("llm_timeout")
                 # Actualizar historial y devolver
                 conversation_history.append({"role": "user", "content": query_text})
                 conversation_history.append({"role": "assistant", "content": resp_text})
@@ -652,9 +584,18 @@ class QueryRAGSystem:
             
             # NUEVA LÓGICA: Detectar si es una consulta de lista de artículos
             if self.is_article_list_query(query_text):
-                logging.info("Consulta de listado detectada; generando lista de artículos")
-                top_results = vector_db.get_top_results(query_text, top_k=25)
-                resp_tuple = self._list_articles_response(query_text, top_results)
+                logger.info("Consulta de listado detectada; generando lista de artículos")
+                set_route("list")
+                requested_count, article_range = self._parse_listing_request(query_text)
+                if requested_count or article_range:
+                    # Listados por número o rango: no requieren búsqueda semántica
+                    with stage("list"):
+                        resp_tuple = self._list_articles_by_number(requested_count, query_text, article_range)
+                else:
+                    top_results = vector_db.get_top_results(query_text, top_k=self._top_k(25, 10),
+                                                            source=vector_db.detect_source(query_text))
+                    with stage("list"):
+                        resp_tuple = self._list_articles_response(query_text, top_results)
                 # Actualizar historial
                 conversation_history.append({"role": "user", "content": query_text})
                 conversation_history.append({"role": "assistant", "content": resp_tuple[0]})
@@ -662,16 +603,48 @@ class QueryRAGSystem:
                     conversation_history = conversation_history[-20:]
                 return resp_tuple
             
-            logging.info("Consulta específica detectada - generando respuesta con IA")
+            logger.info("Consulta específica detectada - generando respuesta con IA")
             # Para consultas específicas, usar OpenAI con contexto de la base de datos
-            top_results = vector_db.get_top_results(query_text, top_k=5)
+            # Si la consulta menciona una ley, solo se buscan artículos de esa fuente
+            matched_source = vector_db.detect_source(query_text)
+            top_results = vector_db.get_top_results(query_text, top_k=self._top_k(5, 3), source=matched_source)
             if top_results and top_results[0]['similarity'] >= 0.3:  # Umbral más bajo para contexto
-                # Crear contexto con la información relevante encontrada
-                context_info = self._prepare_context_from_results(top_results)
-                ai_response = self.query_openai_with_context(query_text, context_info)
-                
-                # NUEVA MEJORA: Validar y mejorar coherencia de la respuesta
-                improved_response = self._improve_response_coherence(query_text, ai_response)
+                set_route("llm_context")
+                improved_response = None
+                used_kb = True
+                if self.llm.is_open():
+                    # LLM fuera de servicio: plantilla de la base o rechazo inmediato
+                    degrade("llm_circuit_open")
+                    improved_response, used_kb = self._llm_unavailable_response(top_results, query_text)
+                elif not budget_allows(Config.DEADLINE_LLM_MIN_MS):
+                    # Sin tiempo para el LLM: respuesta armada solo con la base de conocimientos
+                    degrade("kb_only")
+                else:
+                    # Crear contexto con la información relevante encontrada
+                    with stage("context"):
+                        context_info = self._prepare_context_from_results(top_results)
+                    try:
+                        with stage("llm"):
+                            ai_response = self.query_openai_with_context(query_text, context_info,
+                                                                         timeout=self._llm_timeout())
+                    except LLMCircuitOpenError:
+                        degrade("llm_circuit_open")
+                        improved_response, used_kb = self._llm_unavailable_response(top_results, query_text)
+                    except LLMTimeoutError:
+                        degrade("llm_timeout")
+                        degrade("kb_only")
+                    else:
+                        # NUEVA MEJORA: Validar y mejorar coherencia de la respuesta
+                        if budget_allows(Config.DEADLINE_COHERENCE_MIN_MS):
+                            with stage("coherence"):
+                                improved_response = self._improve_response_coherence(query_text, ai_response,
+                                                                                     source=matched_source)
+                        else:
+                            degrade("skip_coherence")
+                            improved_response = ai_response
+                if improved_response is None:
+                    with stage("kb_answer"):
+                        improved_response = self._generate_direct_response(top_results, query_text)
                 
                 # Actualizar historial
                 conversation_history.append({"role": "user", "content": query_text})
@@ -679,12 +652,22 @@ class QueryRAGSystem:
                 if len(conversation_history) > 20:
                     conversation_history = conversation_history[-20:]
                 
-                return improved_response, top_results[0]['similarity'], True
+                return improved_response, top_results[0]['similarity'], used_kb
             else:
                 # Si no hay información relevante, usar OpenAI sin contexto específico
-                logging.info("No se encontró información relevante, consultando OpenAI sin contexto específico")
-                context = self.get_context_from_history()
-                response = self.query_openai(query_text, context)
+                logger.info("No se encontró información relevante, consultando OpenAI sin contexto específico")
+                set_route("llm_general")
+                if self.llm.is_open():
+                    degrade("llm_circuit_open")
+                    degrade("rejected")
+                    response = LLM_UNAVAILABLE_RESPONSE
+                elif budget_allows(Config.DEADLINE_LLM_MIN_MS):
+                    with stage("llm"):
+                        response = self.query_openai(query_text, timeout=self._llm_timeout())
+                else:
+                    # Sin contexto en la base ni tiempo para el LLM no hay respuesta útil que dar
+                    degrade("skip_llm")
+                    response = NO_TIME_RESPONSE
                 # Actualizar historial
                 conversation_history.append({"role": "user", "content": query_text})
                 conversation_history.append({"role": "assistant", "content": response})
@@ -697,14 +680,13 @@ class QueryRAGSystem:
             
             # NUEVA MEJORA: Validar coherencia también para respuestas de la base de conocimientos
             if similarity_score >= self.min_similarity_score:
-                logging.info("Usando respuesta de la base de conocimiento")
+                logger.info("Usando respuesta de la base de conocimiento")
                 improved_response = self._improve_response_coherence(query_text, response)
                 used_kb = True
                 response = improved_response
             else:
-                logging.info(f"Similitud baja ({similarity_score:.3f}), consultando OpenAI...")
-                context = self.get_context_from_history()
-                response = self.query_openai(query_text, context)
+                logger.info("Similitud baja (%.3f), consultando OpenAI...", similarity_score)
+                response = self.query_openai(query_text)
                 used_kb = False
 
             # Actualizar historial
@@ -724,78 +706,61 @@ class QueryRAGSystem:
             return response, similarity_score, used_kb  # Devolver respuesta, similitud y si usó KB
 
         except Exception as e:
-            logging.error(f"Error en query_rag: {str(e)}")
-            logging.error(f"Traceback completo: {traceback.format_exc()}")
+            logger.exception("Error en query_rag: %s", e)
             return f"Lo siento, hubo un problema al procesar tu consulta: {str(e)}", 0.0, False
 
     def search_by_theme(self, theme: str, subtema: str = None) -> str:
         """Busca artículos específicamente por tema y subtema."""
         try:
             # Verificar si tenemos nueva estructura
-            if not hasattr(vector_db, 'df') or vector_db.df is None:
+            if getattr(vector_db, 'corpus', None) is None:
                 return "La base de datos no está disponible."
             
-            has_new_structure = all(col in vector_db.df.columns for col in ['fuente', 'articulo', 'tema', 'subtema', 'texto_del_articulo', 'categorias', 'resumen_explicativo'])
-            
-            if not has_new_structure:
+            if vector_db.facets is None:
                 return "Esta funcionalidad requiere la nueva estructura de base de datos."
             
-            # Filtrar por tema
-            theme_filter = vector_db.df['tema'].str.contains(theme, case=False, na=False)
-            filtered_df = vector_db.df[theme_filter]
-            
-            if subtema:
-                subtema_filter = filtered_df['subtema'].str.contains(subtema, case=False, na=False)
-                filtered_df = filtered_df[subtema_filter]
+            # Filtrar por tema y subtema (coincidencia parcial) con el índice de facetas
+            positions = vector_db.facets.positions({'tema': theme, 'subtema': subtema}, contains=True)
             
-            if filtered_df.empty:
+            if len(positions) == 0:
                 return f"No se encontraron artículos para el tema '{theme}'{f' y subtema {subtema}' if subtema else ''}."
             
-            # Generar respuesta estructurada
+            # Generar respuesta estructurada con las tarjetas precalculadas
             response = f"📋 **Artículos sobre {theme.upper()}:**\n\n"
+            response += "".join(vector_db.cards[pos].theme_line for pos in positions[:10])  # Limitar a 10 resultados
             
-            for idx, row in filtered_df.head(10).iterrows():  # Limitar a 10 resultados
-                article_num = row['articulo']
-                source = row['fuente']
-                summary = row['resumen_explicativo']
-                subtema_info = row['subtema']
-                
-                response += f"• **Art. {article_num}** ({source})"
-                if subtema_info and subtema_info.strip():
-                    response += f" - *{subtema_info}*"
-                response += f"\n  {summary}\n\n"
-            
-            if len(filtered_df) > 10:
-                response += f"... y {len(filtered_df) - 10} artículo{'s' if len(filtered_df) - 10 > 1 else ''} más.\n\n"
+            remaining = len(positions) - 10
+            if remaining > 0:
+                response += f"... y {remaining} artículo{'s' if remaining > 1 else ''} más.\n\n"
             
             response += "¿Necesitas información más detallada de algún artículo específico?"
             
             return response
             
         except Exception as e:
-            logging.error(f"Error en search_by_theme: {str(e)}")
+            logger.error("Error en search_by_theme: %s", str(e))
             return f"Error al buscar por tema: {str(e)}"
     
     def get_article_details(self, article_number: str) -> str:
         """Obtiene los detalles completos de un artículo específico."""
         try:
-            if not hasattr(vector_db, 'df') or vector_db.df is None:
+            corpus = getattr(vector_db, 'corpus', None)
+            if corpus is None:
                 return "❌ **Error de Base de Datos**\n\nLa base de datos no está disponible en este momento. Por favor, intenta más tarde."
             
-            has_new_structure = all(col in vector_db.df.columns for col in ['fuente', 'articulo', 'tema', 'subtema', 'texto_del_articulo', 'categorias', 'resumen_explicativo'])
+            has_new_structure = all(col in corpus.columns for col in ['fuente', 'articulo', 'tema', 'subtema', 'texto_del_articulo', 'categorias', 'resumen_explicativo'])
             
             if not has_new_structure:
                 return "❌ **Funcionalidad No Disponible**\n\nEsta funcionalidad requiere la nueva estructura de base de datos que aún no está implementada."
             
-            # Buscar el artículo
-            article_filter = vector_db.df['articulo'].astype(str).str.contains(str(article_number), case=False, na=False)
-            article_df = vector_db.df[article_filter]
+            # Buscar el artículo (coincidencia parcial sobre los números distintos de la columna)
+            positions = corpus.matching(re.compile(str(article_number), re.IGNORECASE), ['articulo'])
             
-            if article_df.empty:
+            if len(positions) == 0:
                 return f"❌ **Artículo No Encontrado**\n\nNo se encontró el artículo {article_number} en mi base de datos.\n\n**Posibles razones:**\n• El artículo no existe en la normativa cargada\n• El número de artículo es incorrecto\n• El artículo no está incluido en mi base de datos actual\n\n💡 **Sugerencia:** Verifica el número del artículo o consulta la lista completa de artículos disponibles."
             
             # Tomar el primer resultado si hay múltiples
-            article = article_df.iloc[0]
+            article = corpus.row(positions[0])
             
             # Verificar si el artículo tiene contenido válido
             if not article['texto_del_articulo'] or str(article['texto_del_articulo']).strip() in ['', 'nan', 'None']:
@@ -816,342 +781,112 @@ class QueryRAGSystem:
             return response
             
         except Exception as e:
-            logging.error(f"Error en get_article_details: {str(e)}")
+            logger.error("Error en get_article_details: %s", str(e))
             return f"❌ **Error Técnico**\n\nOcurrió un error al obtener los detalles del artículo: {str(e)}\n\nPor favor, intenta nuevamente o contacta al administrador del sistema."
 
-    def get_context_from_history(self) -> str:
-        """Obtiene contexto relevante del historial de conversación."""
-        if not conversation_history:
-            return ""
-        
-        # Tomar las últimas 3 interacciones
-        recent_history = conversation_history[-6:]
-        context = "\n".join([f"{'Usuario' if msg['role'] == 'user' else 'Asistente'}: {msg['content']}" 
-                           for msg in recent_history])
-        return context
+    def get_context_from_history(self, max_tokens=None) -> str:
+        """Obtiene contexto relevante del historial de conversación dentro del presupuesto de tokens."""
+        return format_history(conversation_history, max_tokens)
 
     def _prepare_context_from_results(self, results):
         """Prepara el contexto basado en los resultados de la búsqueda."""
-        context_parts = []
-        context_parts.append("INFORMACIÓN RELEVANTE DE LA BASE DE DATOS:")
-        
-        for i, result in enumerate(results[:3]):  # Usar solo los 3 más relevantes
-            data = result['data']
-            similarity = result['similarity']
-            
-            context_parts.append(f"\n--- Resultado {i+1} (Similitud: {similarity:.3f}) ---")
-            context_parts.append(f"Artículo: {data.get('articulo', 'N/A')}")
-            context_parts.append(f"Fuente: {data.get('fuente', 'N/A')}")
-            context_parts.append(f"Tema: {data.get('tema', 'N/A')}")
-            context_parts.append(f"Subtema: {data.get('subtema', 'N/A')}")
-            
-            # Incluir resumen si está disponible
-            if data.get('resumen_explicativo') and str(data.get('resumen_explicativo')).strip() not in ['', 'nan', 'None', 'null']:
-                context_parts.append(f"Resumen: {data.get('resumen_explicativo')}")
-            
-            # Incluir texto del artículo si está disponible
-            if data.get('texto_del_articulo') and str(data.get('texto_del_articulo')).strip() not in ['', 'nan', 'None', 'null']:
-                text = data.get('texto_del_articulo')
-                # Limitar el texto para no sobrecargar el contexto
-                if len(text) > 500:
-                    text = text[:500] + "..."
-                context_parts.append(f"Texto del artículo: {text}")
-        
-        return "\n".join(context_parts)
+        return format_article_context(results)
+
+    def query_openai_with_context(self, query_text: str, context_info: str, timeout=None) -> str:
+        """Consulta OpenAI con contexto específico de la base de datos.
 
-    def query_openai_with_context(self, query_text: str, context_info: str) -> str:
-        """Consulta OpenAI con contexto específico de la base de datos."""
+        Si la llamada agota timeout (LLMTimeoutError) o el circuito del LLM está
+        abierto (LLMCircuitOpenError) la excepción se propaga para que el llamador
+        responda solo con la base de conocimientos.
+        """
         try:
-            logging.info("Iniciando consulta a OpenAI con contexto específico")
+            logger.info("Iniciando consulta al LLM (%s) con contexto específico", self.llm.name)
             
-            # Verificar que la API key esté configurada
-            if not Config.OPENAI_API_KEY or Config.OPENAI_API_KEY == "KEY_NO_DEFINIDA":
-                logging.error("API Key de OpenAI no configurada")
+            # Verificar que el backend esté configurado
+            if not self.llm.is_available():
+                logger.error("Backend LLM no configurado")
                 return "Lo siento, no puedo procesar tu consulta en este momento. La configuración de OpenAI no está disponible."
             
-            import openai
-            openai.api_key = Config.OPENAI_API_KEY
-            
-            system_prompt = """Eres AzuSENA, asistente virtual del SENA de Colombia.
+            system_prompt = SYSTEM_PROMPT_CONTEXT
 
-INSTRUCCIONES CRÍTICAS:
-1. Responde de manera natural y conversacional, como si fueras un experto humano.
-2. No menciones que eres una IA ni detalles técnicos del sistema.
-3. Evita formatos rígidos; prioriza texto fluido y claro.
-4. Usa la información proporcionada como base principal; no inventes.
-5. Si la información no es suficiente, pide aclaraciones específicas.
-6. Si el usuario solicita "en tus palabras" o "tu opinión", ofrece una explicación interpretativa y neutral, sin juicios de valor.
-
-FORMATO DE RESPUESTA:
-- Respuesta directa y natural
-- Explicación clara del procedimiento o información solicitada
-- Menciona las referencias legales de forma natural en el texto
-- Termina preguntando si necesita más información específica
-
-PROHIBIDO:
-- Usar listas con viñetas (•)
-- Usar formatos estructurados rígidos
-- Mencionar "base de datos" o "sistema"
-- Decir "según mi base de datos"
-- Usar emojis excesivos"""
-
-            history_ctx = self.get_context_from_history()
-            user_prompt = f"""Pregunta del usuario: {query_text}
-
-{context_info}
-
-"""
-            if history_ctx:
-                user_prompt += f"Contexto reciente:\n{history_ctx}\n\n"
             if self.is_opinion_request(query_text):
-                user_prompt += "Explica en tus palabras de forma neutral y clara, sin inventar información."
+                instructions = "Explica en tus palabras de forma neutral y clara, sin inventar información."
             else:
-                user_prompt += "Responde de manera natural basándote en la información proporcionada. Si no es suficiente, explica qué información adicional necesitarías."
+                instructions = "Responde de manera natural basándote en la información proporcionada. Si no es suficiente, explica qué información adicional necesitarías."
+            messages, _ = build_messages(system_prompt, query_text, instructions,
+                                         context=context_info, history=conversation_history, kind="context")
 
-            # Configurar cliente OpenAI
-            client = OpenAI(api_key=Config.OPENAI_API_KEY)
-            
-            if not Config.OPENAI_API_KEY or Config.OPENAI_API_KEY == "KEY_NO_DEFINIDA":
-                logging.error("API Key de OpenAI no configurada")
-                return "Lo siento, el servicio de consulta no está disponible en este momento."
-
-            response = client.chat.completions.create(
-                model=Config.OPENAI_MODEL,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
+            ai_response = self.llm.complete(
+                messages,
                 max_tokens=800,
-                temperature=0.7
+                temperature=0.7,
+                timeout=timeout
             )
-            
-            ai_response = response.choices[0].message.content.strip()
-            logging.info("Respuesta de OpenAI generada exitosamente")
+            logger.info("Respuesta del LLM generada exitosamente")
             return ai_response
             
+        except LLMCircuitOpenError:
+            raise
+        except LLMTimeoutError as e:
+            logger.warning("LLM sin respuesta dentro del plazo: %s", e)
+            raise
         except Exception as e:
-            logging.error(f"Error consultando OpenAI con contexto: {str(e)}")
+            logger.error("Error consultando OpenAI con contexto: %s", str(e))
             return f"Lo siento, no pude procesar tu consulta en este momento. Por favor, intenta reformular tu pregunta o consulta más tarde."
 
-    def query_openai(self, query_text: str, context: str = "") -> str:
+    def query_openai(self, query_text: str, context: str = "", timeout=None) -> str:
         """Consulta OpenAI para respuestas generales sin contexto específico."""
         try:
-            logging.info("Iniciando consulta a OpenAI sin contexto específico")
+            logger.info("Iniciando consulta al LLM (%s) sin contexto específico", self.llm.name)
             
-            # Verificar que la API key esté configurada
-            if not Config.OPENAI_API_KEY:
-                logging.error("API Key de OpenAI no configurada")
+            # Verificar que el backend esté configurado
+            if not self.llm.is_available():
+                logger.error("Backend LLM no configurado")
                 return "Lo siento, no puedo procesar tu consulta en este momento. La configuración de OpenAI no está disponible."
             
-            # Configurar cliente OpenAI
-            client = OpenAI(api_key=Config.OPENAI_API_KEY)
-            
-            system_prompt = """Eres AzuSENA, asistente virtual del SENA de Colombia.
-
-INSTRUCCIONES CRÍTICAS:
-1. Responde de manera natural y conversacional, como si fueras un experto humano.
-2. No menciones que eres una IA ni detalles técnicos del sistema.
-3. Ofrece información general sobre procedimientos administrativos colombianos y temas relacionados.
-4. Si no tienes información específica, sé honesto y sugiere fuentes oficiales.
-5. Mantén un tono profesional y amigable.
-6. Si el usuario pide "en tus palabras" o "tu opinión", explica de forma interpretativa y neutral, sin juicios de valor.
-
-FORMATO DE RESPUESTA:
-- Respuesta directa y natural
-- Información general disponible
-- Sugerencias de fuentes oficiales si es necesario
-- Pregunta si necesita más ayuda específica
-
-PROHIBIDO:
-- Inventar información específica de leyes o artículos
-- Dar información incorrecta
-- Usar formatos excesivamente estructurados"""
-
-            history_ctx = self.get_context_from_history()
-            user_prompt = f"""Pregunta del usuario: {query_text}
+            system_prompt = SYSTEM_PROMPT_GENERAL
 
-{context if context else ""}
-
-"""
-            if history_ctx:
-                user_prompt += f"Contexto reciente:\n{history_ctx}\n\n"
             if self.is_opinion_request(query_text):
-                user_prompt += "Explica en tus palabras de forma neutral y clara, evitando juicios de valor."
+                instructions = "Explica en tus palabras de forma neutral y clara, evitando juicios de valor."
             else:
-                user_prompt += "Responde de manera natural con la información general disponible. Si no tienes detalles específicos, sugiere fuentes oficiales apropiadas."
+                instructions = "Responde de manera natural con la información general disponible. Si no tienes detalles específicos, sugiere fuentes oficiales apropiadas."
+            # El historial lo agrega build_messages; 'context' es solo información adicional
+            messages, _ = build_messages(system_prompt, query_text, instructions,
+                                         context=context, history=conversation_history, kind="general")
 
-            response = client.chat.completions.create(
-                 model=Config.OPENAI_MODEL,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
+            ai_response = self.llm.complete(
+                messages,
                 max_tokens=600,
-                temperature=0.7
+                temperature=0.7,
+                timeout=timeout
             )
-            
-            ai_response = response.choices[0].message.content.strip()
-            logging.info("Respuesta de OpenAI generada exitosamente")
+            logger.info("Respuesta del LLM generada exitosamente")
             return ai_response
             
+        except LLMCircuitOpenError:
+            degrade("llm_circuit_open")
+            degrade("rejected")
+            return LLM_UNAVAILABLE_RESPONSE
+        except LLMTimeoutError as e:
+            logger.warning("LLM sin respuesta dentro del plazo: %s", e)
+            degrade("llm_timeout")
+            return NO_TIME_RESPONSE
         except Exception as e:
-            logging.error(f"Error consultando OpenAI: {str(e)}")
+            logger.error("Error consultando OpenAI: %s", str(e))
             return f"Lo siento, no pude procesar tu consulta en este momento. Por favor, intenta más tarde o consulta directamente con las oficinas del SENA."
 
     def query_openai_with_context_full(self, query_text: str, context: str = "") -> str:
         """Consulta OpenAI con contexto mejorado."""
         try:
-            logging.info("Iniciando consulta a OpenAI")
-            logging.info(f"API Key actual: {Config.OPENAI_API_KEY[:10]}...")
-
-            system_prompt = """Nombre: AzuSENA
-Rol: Asistente virtual del Servicio Nacional de Aprendizaje (SENA) de Colombia.
-Función Principal: Proporcionar respuestas precisas y confiables sobre temas administrativos, jurídicos, y académicos del SENA (y en general del contexto jurídico, legal y normativo colombiano) a aprendices, instructores, y funcionarios del SENA (Servicio nacional de aprendizaje), institución educativa técnica y tecnológica colombiana, y sabe que el énfasis de los temas administrativos que requiere el SENA esta en el contexto colombiano, por lo que entiende que las preguntas administrativas que le hacen los usuarios son referidas al contexto colombiano, o sea que el usuario es colombiano, y por eso al pedirle una pregunta jurídica o administrativa, espera respuestas en base al contexto jurídico colombiano, por ejemplo si piden algo sobre leyes o normativas sobre salud o educación, sabe se necesita responder en base a leyes o normativas colombianas, por eso busca responder en base a leyes, normas, decretos o documentos jurídico de Colombia, que se aplique en Colombia y que regulen esos aspectos en Colombia, excepto si el usuario aclara que necesita algún dato jurídico de un contexto jurídico de otro país que no sea Colombia.
+            logger.info("Iniciando consulta al LLM (%s)", self.llm.name)
 
-Directrices de Comportamiento:
-1. Identidad: Siempre preséntate como AzuSENA, asistente virtual del SENA (la institución colombiana).
-
-2. Fuentes de Información: 
-   - PRIORIDAD ABSOLUTA: Utiliza ÚNICAMENTE la información de tu base de datos RAG cuando se trate de artículos específicos, leyes, decretos o normativas.
-   - PROHIBIDO TERMINANTEMENTE: NO inventes, no crees, no generes artículos, números de artículos, contenido de leyes, decretos o normativas que no estén en tu base de datos RAG.
-   
-   **REGLAS CRÍTICAS PARA MOSTRAR TEXTO COMPLETO:**
-   - Si la función get_article_details() devuelve un artículo CON contenido en la sección "**Contenido:**", entonces TIENES el texto completo y DEBES mostrarlo completamente.
-   - NUNCA digas que "no tienes el texto completo disponible" si la función get_article_details() ya te proporcionó el contenido del artículo.
-   - Solo di que "no tienes el texto completo" si la función get_article_details() devuelve "❌ **Texto Completo No Disponible**".
-   
-   - CUANDO SÍ TIENES LA INFORMACIÓN: Si encuentras un artículo en tu base de datos Y la función te devuelve el contenido, DEBES proporcionarlo completamente. No seas evasivo.
-   - CUANDO NO TIENES LA INFORMACIÓN: Si no encuentras información específica en tu base de datos RAG, debes ser COMPLETAMENTE TRANSPARENTE y decir: "No encontré información específica sobre [tema] en mi base de datos."
-
-3. Precisión y Confiabilidad CRÍTICA:
-   - NUNCA inventes números de artículos, contenido de leyes, o información jurídica específica.
-   - Si la consulta es sobre artículos específicos de una ley y no los encuentras en tu base de datos, admite claramente esta limitación.
-   - Solo proporciona información general de tu conocimiento base cuando sea apropiado y SIEMPRE aclarando que no proviene de tu base de datos especializada.
-   - Si un usuario solicita el texto completo de un artículo y no está disponible, explica claramente las limitaciones de tu base de datos.
-
-4. Transparencia Obligatoria:
-   - Cuando uses información de tu base de datos RAG, indica: "Según mi base de datos especializada..."
-   - Cuando uses conocimiento general, indica: "Basándome en información general (no de mi base de datos especializada)..."
-   - Cuando no tengas información, indica claramente: "No dispongo de información verificada sobre este tema específico."
-   
-   **REGLA ABSOLUTA PARA TEXTO COMPLETO:**
-   - Si get_article_details() te devuelve contenido en la sección "**Contenido:**", ESO ES EL TEXTO COMPLETO y debes mostrarlo.
-   - NO inventes excusas sobre "texto no verificado" cuando la función ya te proporcionó el contenido.
-   - El contenido de tu base de datos YA ESTÁ VERIFICADO por definición.
-
-5. Limitaciones de Base de Datos:
-   - Sé transparente sobre qué tipo de información contiene tu base de datos (temas, resúmenes, referencias) versus lo que NO contiene.
-   - Sugiere fuentes oficiales SOLO cuando realmente no tengas la información solicitada.
-   - Nunca finjas tener acceso a información que no posees.
-   - IMPORTANTE: Si la información está en tu base de datos, proporciónala directamente sin excusas.
-
-6. Respuesta Directa y Concisa: Responde de manera detallada pero precisa, evitando información innecesaria.
-
-7. Tono: Mantén un tono formal pero amigable, profesional, y respetuoso. Sé amable y servicial.
-
-## 📋 FORMATO DE RESPUESTA OBLIGATORIO
-
-**SIEMPRE usa el siguiente formato HTML para estructurar tus respuestas:**
-
-### Para Respuestas Generales:
-```
-# 🎯 [Título Principal de la Respuesta]
-
-## 📖 Información Relevante
-
-[Contenido principal aquí]
-
-### 📌 Puntos Clave:
-- **Punto 1:** Descripción
-- **Punto 2:** Descripción  
-- **Punto 3:** Descripción
-
----
-
-💡 **Nota importante:** [Si aplica]
-
-¿Puedo ayudarte con algo más?
-```
-
-### Para Listados de Artículos/Normativas:
-```
-# 📚 [Título de la Consulta]
-
-Según mi base de datos especializada, encontré información sobre '[tema]' en los siguientes artículos:
-
-## 📄 Artículos Encontrados
-
-### 🔹 **ARTÍCULO [NÚMERO ESPECÍFICO]** - [NOMBRE DE LA LEY/NORMA]
-**Tema:** [Tema específico]
-**Subtema:** [Subtema específico]
-**Contenido:** [Descripción del contenido del artículo]
-
-### 🔹 **ARTÍCULO [NÚMERO ESPECÍFICO]** - [NOMBRE DE LA LEY/NORMA]  
-**Tema:** [Tema específico]
-**Subtema:** [Subtema específico]
-**Contenido:** [Descripción del contenido del artículo]
-
-### 🔹 **ARTÍCULO [NÚMERO ESPECÍFICO]** - [NOMBRE DE LA LEY/NORMA]
-**Tema:** [Tema específico] 
-**Subtema:** [Subtema específico]
-**Contenido:** [Descripción del contenido del artículo]
-
----
-
-💡 **¿Necesitas más detalles?** Puedo profundizar en cualquiera de estos artículos.
-
-¿Hay algo más en lo que pueda ayudarte?
-```
-
-### Para Información Técnica/Procedimental:
-```
-# ⚙️ [Título del Procedimiento]
-
-## 📋 Pasos a Seguir
-
-### 🔹 Paso 1: [Nombre del paso]
-[Descripción detallada]
-
-### 🔹 Paso 2: [Nombre del paso]
-[Descripción detallada]
-
-## 📌 Requisitos Importantes
-- ✅ **Requisito 1:** Descripción
-- ✅ **Requisito 2:** Descripción
-
-## ⚠️ Consideraciones Especiales
-[Si aplica]
-
----
-
-¿Te gustaría que profundice en algún paso específico?
-```
-
-6. Estructura de la Respuesta:
-   • SIEMPRE usa los formatos Markdown especificados arriba
-   • Incluye emojis apropiados para mejorar la legibilidad
-   • Usa negritas (**texto**) para resaltar información importante
-   • Separa secciones con líneas (---) cuando sea apropiado
-   • Usa #, ##, ### para títulos jerárquicos
-   • Usa párrafos normales y listas con guiones (-)
-   • Termina siempre con una pregunta amigable para continuar la conversación
-
-#NOVIEMBRE
-Restricciones CRÍTICAS:
-• PROHIBICIÓN ABSOLUTA: NO inventes, no crees, no generes información sobre artículos específicos, números de artículos, contenido de leyes, decretos o normativas que no estén en tu base de datos RAG.
-• TRANSPARENCIA OBLIGATORIA: Si no encuentras información específica en tu base de datos, admite claramente esta limitación con frases como: "No encontré información específica sobre [tema] en mi base de datos especializada" o "No dispongo de artículos verificados sobre este tema específico."
-• VERIFICACIÓN REQUERIDA: Solo proporciona números de artículos, contenido jurídico específico, o referencias normativas que estén CONFIRMADOS en tu base de datos RAG.
-• NÚMEROS DE ARTÍCULOS OBLIGATORIOS: Cuando encuentres artículos en tu base de datos RAG, SIEMPRE debes mostrar el número específico del artículo (ej: "ARTÍCULO 227", "ARTÍCULO 231") junto con el nombre completo de la ley o norma.
-• FORMATO ESPECÍFICO REQUERIDO: Para cada artículo encontrado, usa el formato: "**ARTÍCULO [NÚMERO EXACTO]** - [NOMBRE COMPLETO DE LA LEY]"
-• HONESTIDAD PROFESIONAL: Es mejor admitir limitaciones que proporcionar información potencialmente incorrecta o inventada.
-• No proporciones opiniones personales, juicios de valor o información no verificable.
-• Si te piden información que implique algún juicio de valor, informa que eres neutral y que tu labor es proporcionar información confiable y verificada.
-• Puedes mencionar tu modelo base, pero siempre enfatiza que para información jurídica específica dependes de tu base de datos RAG especializada."""
+            system_prompt = SYSTEM_PROMPT_FULL
 
             messages = [
                 {"role": "system", "content": system_prompt}
             ]
 
+            context = truncate_to_tokens(context, Config.CONTEXT_HISTORY_TOKENS)
             if context:
                 messages.append({
                     "role": "system",
@@ -1160,20 +895,18 @@ Restricciones CRÍTICAS:
 
             messages.append({"role": "user", "content": query_text})
 
-            logging.info("Enviando solicitud a OpenAI...")
-            response = self.client.chat.completions.create(
-                model=Config.OPENAI_MODEL,
-                messages=messages,
+            logger.info("Enviando solicitud al LLM...")
+            response = self.llm.complete(
+                messages,
                 temperature=0.7,
                 max_tokens=500
             )
-            logging.info("Respuesta recibida de OpenAI")
+            logger.info("Respuesta recibida del LLM")
 
-            return response.choices[0].message.content
+            return response
 
         except Exception as e:
-            logging.error(f"Error consultando OpenAI: {str(e)}")
-            logging.error(f"Traceback completo: {traceback.format_exc()}")
+            logger.exception("Error consultando OpenAI: %s", e)
             raise Exception(f"Error al consultar OpenAI: {str(e)}")
 
 # Instancia global
@@ -1,23 +1,58 @@
+import hashlib
+import hmac
 import logging
-from flask import Blueprint, request, jsonify
-from flask_socketio import emit
+import math
+import re
+import secrets
+from flask import Blueprint, Response, request, jsonify
+from flask_socketio import emit, join_room
 from .query import query_rag_system
 from app.models.vector_db import vector_db
+from app.models.facets import FACET_FIELDS
 from app import socketio
-import traceback
+from app import metrics
+from app.config import Config
+from app.tracing import start_trace
+from app.profiler import profiled, profiler, should_profile
+from app.admission import Overloaded
+
+logger = logging.getLogger(__name__)
 
 bp = Blueprint('routes', __name__)
 
+# Cabecera opcional con el plazo de la solicitud en ms (reemplaza REQUEST_BUDGET_MS)
+DEADLINE_HEADER = "X-Request-Deadline-Ms"
+
+
+def request_budget_ms():
+    """Plazo de la solicitud: cabecera X-Request-Deadline-Ms acotada, o REQUEST_BUDGET_MS.
+
+    Lanza ValueError si la cabecera no es un número positivo y finito.
+    """
+    return budget_ms_from(request.headers.get(DEADLINE_HEADER))
+
+
+def budget_ms_from(raw):
+    """Plazo pedido por el cliente (ms, texto o número) acotado a REQUEST_BUDGET_MAX_MS; vacío = configuración."""
+    if raw is None or (isinstance(raw, str) and not raw.strip()):
+        return Config.REQUEST_BUDGET_MS
+    budget = float(raw)
+    # "nan" e "inf" son números válidos para float(); un plazo así no acota nada
+    if not (budget > 0 and math.isfinite(budget)):
+        raise ValueError("El plazo debe ser un número positivo de milisegundos")
+    if Config.REQUEST_BUDGET_MAX_MS > 0:
+        budget = min(budget, Config.REQUEST_BUDGET_MAX_MS)
+    return budget
+
 @bp.route('/test', methods=['GET'])
 def test_endpoint():
-    print("[PRINT DEBUG] Test endpoint ejecutándose")
+    logger.debug("Test endpoint ejecutándose")
     return jsonify({"status": "OK", "message": "Test endpoint funcionando"})
 
 @bp.route('/debug-query', methods=['POST'])
 def debug_query():
-    print("[PRINT DEBUG] ===== DEBUG QUERY ENDPOINT INICIADO =====")
     data = request.get_json()
-    print(f"[PRINT DEBUG] Datos recibidos: {data}")
+    logger.debug("Debug query - datos recibidos: %s", data)
     return jsonify({
         "response": "Debug endpoint funcionando correctamente",
         "similarity": 0.95,
@@ -25,92 +60,351 @@ def debug_query():
         "received_data": data
     })
 
+@bp.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Métricas del proceso (CPU, memoria, hilos) y contadores de consultas."""
+    return jsonify(metrics.snapshot())
+
+@bp.route('/facets', methods=['GET'])
+def facets_endpoint():
+    """Navegación por facetas: conteos de fuente/tema/subtema/categorías y artículos del filtro.
+
+    Parámetros: fuente, tema, subtema, categorias (filtros, se intersectan),
+    match=exact|contains, limit (valores por faceta) y articles (artículos a devolver).
+    """
+    with vector_db.pinned() as db:
+        return _facets_response(db)
+
+def _facets_response(db):
+    facets = db.facets
+    if facets is None:
+        return jsonify({"error": "La base de datos no está disponible"}), 503
+    try:
+        filters = {field: request.args.get(field) for field in FACET_FIELDS if request.args.get(field)}
+        contains = request.args.get("match", "exact") == "contains"
+        limit = int(request.args.get("limit", 20))
+        articles = int(request.args.get("articles", 10))
+    except ValueError:
+        return jsonify({"error": "Parámetros inválidos: limit y articles deben ser enteros"}), 400
+
+    positions, counts = facets.browse(filters, limit=limit, contains=contains)
+    shown = [db.cards[pos] for pos in positions[:max(articles, 0)]]
+    return jsonify({
+        "filters": filters,
+        "total": int(len(positions)),
+        "facets": {field: [{"value": label, "count": count} for label, count in values]
+                   for field, values in counts.items()},
+        "articles": [{"articulo": c.articulo, "fuente": c.fuente, "tema": c.tema, "subtema": c.subtema}
+                     for c in shown],
+        "more": max(int(len(positions)) - len(shown), 0),
+    })
+
+def _admin_authorized():
+    """Valida la cabecera X-Admin-Token contra Config.ADMIN_TOKEN (sin token configurado no se autoriza)."""
+    token = request.headers.get("X-Admin-Token", "")
+    return bool(Config.ADMIN_TOKEN) and hmac.compare_digest(token, Config.ADMIN_TOKEN)
+
+@bp.route('/admin/reload', methods=['GET', 'POST'])
+def admin_reload():
+    """Estado de la base (GET) o recarga en caliente (POST; ?wait=true espera a que termine)."""
+    if not _admin_authorized():
+        return jsonify({"error": "No autorizado"}), 403
+    if request.method == 'GET':
+        return jsonify(vector_db.status())
+
+    if request.args.get("wait", "").lower() in ("1", "true", "yes"):
+        ok = vector_db.reload()
+        return jsonify({"reloaded": ok, **vector_db.status()}), (200 if ok else 500)
+    started = vector_db.reload_async()
+    logger.info("Recarga de la base solicitada por /admin/reload")
+    return jsonify({"started": started, "queued": not started, **vector_db.status()}), 202
+
+# Cabecera para perfilar una consulta a pedido (requiere además X-Admin-Token)
+PROFILE_HEADER = "X-Profile"
+
+
+def _profile_requested():
+    """True si la solicitud pide perfilado con X-Profile y trae un token de administración válido."""
+    if request.headers.get(PROFILE_HEADER, "").lower() not in ("1", "true", "yes"):
+        return False
+    if not _admin_authorized():
+        logger.warning("%s ignorada: falta un X-Admin-Token válido", PROFILE_HEADER)
+        return False
+    return True
+
+@bp.route('/admin/profiles', methods=['GET'])
+def admin_profiles():
+    """Perfiles recientes (resumen, del más reciente al más antiguo); ?limit=N."""
+    if not _admin_authorized():
+        return jsonify({"error": "No autorizado"}), 403
+    try:
+        limit = int(request.args.get("limit", 20))
+    except ValueError:
+        return jsonify({"error": "limit debe ser un entero"}), 400
+    return jsonify({
+        "sample_rate": Config.PROFILE_SAMPLE_RATE,
+        "interval_ms": Config.PROFILE_INTERVAL_MS,
+        "profiles": profiler.recent(max(limit, 0)),
+    })
+
+@bp.route('/admin/profiles/<trace_id>', methods=['GET'])
+def admin_profile(trace_id):
+    """Perfil de una consulta por su trace_id (único, asignado por el servidor): JSON con funciones
+    más muestreadas y pilas, o ?format=folded (texto para flamegraph.pl o speedscope)."""
+    if not _admin_authorized():
+        return jsonify({"error": "No autorizado"}), 403
+    profile = profiler.get(trace_id)
+    if profile is None:
+        return jsonify({"error": "No hay un perfil para ese trace_id"}), 404
+    if request.args.get("format") == "folded":
+        return Response(profile.folded() + "\n", mimetype="text/plain",
+                        headers={"Content-Disposition": f"inline; filename={trace_id}.folded"})
+    return jsonify({
+        **profile.summary(),
+        "interval_ms": Config.PROFILE_INTERVAL_MS,
+        "top_functions": profile.top_functions(),
+        "stacks": dict(profile.stacks.most_common()),
+    })
+
+# Sala Socket.IO del cliente: las respuestas de POST /query con X-Client-Id se entregan solo ahí
+CLIENT_ID_HEADER = "X-Client-Id"
+MAX_CLIENT_ID_CHARS = 128
+
+# Los tokens de sala los emite el servidor al conectar; la firma impide unirse a la sala de otro cliente
+_ROOM_SECRET = (Config.SOCKET_ROOM_SECRET or secrets.token_hex(32)).encode("utf-8")
+
+
+def client_room(client_id):
+    return f"client:{client_id}"
+
+
+def _client_id(value):
+    """Identificador de cliente válido (texto no vacío y acotado) o None."""
+    if isinstance(value, str) and 0 < len(value.strip()) <= MAX_CLIENT_ID_CHARS:
+        return value.strip()
+    return None
+
+
+def _room_signature(nonce):
+    return hmac.new(_ROOM_SECRET, nonce.encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+def issue_client_token():
+    """Token de sala nuevo: valor aleatorio y su firma HMAC con SOCKET_ROOM_SECRET."""
+    nonce = secrets.token_urlsafe(16)
+    return f"{nonce}.{_room_signature(nonce)}"
+
+
+def verified_client_token(value):
+    """El token si lo emitió este servidor (o uno con el mismo secreto); si no, None."""
+    token = _client_id(value)
+    if token is None:
+        return None
+    nonce, _, signature = token.rpartition(".")
+    if nonce and hmac.compare_digest(signature, _room_signature(nonce)):
+        return token
+    return None
+
+
+_undelivered_warned = False
+
+
+def _deliver(event, payload, to=None):
+    """Emite un evento solo a una sala o sid; sin destino no se emite (salvo SOCKET_BROADCAST).
+
+    Las respuestas sin destino se cuentan en socket_undelivered_total y la primera se
+    advierte en el log: antes se difundían a todos y un cliente que no envía
+    X-Client-Id dejaría de recibirlas sin otra señal.
+    """
+    global _undelivered_warned
+    if to is None and not Config.SOCKET_BROADCAST:
+        metrics.inc("socket_undelivered_total")
+        if not _undelivered_warned:
+            _undelivered_warned = True
+            logger.warning("Respuesta '%s' sin X-Client-Id: no se emite por Socket.IO (SOCKET_BROADCAST=False); "
+                           "los clientes deben enviar X-Client-Id o usar el evento 'query'", event)
+        return
+    try:
+        socketio.emit(event, payload, to=to)
+    except Exception as socket_error:
+        logger.debug("No se pudo enviar '%s' por WebSocket: %s", event, socket_error)
+
+
 @socketio.on("connect")
-def handle_connect():
-    """Manejo de conexión WebSocket."""
-    logging.info("Cliente conectado a WebSocket")
-    emit("connection_response", {"message": "Conectado exitosamente"})
+def handle_connect(auth=None):
+    """Manejo de conexión WebSocket: une la conexión a la sala de su token y lo envía en connection_response.
+
+    Un cliente que reconecta puede presentar su token anterior (auth o query string,
+    campo client_id) para volver a la misma sala; un valor que no firmó el servidor
+    se ignora y se emite un token nuevo.
+    """
+    presented = (auth.get("client_id") if isinstance(auth, dict) else None) or request.args.get("client_id")
+    client_id = verified_client_token(presented)
+    if presented and client_id is None:
+        metrics.inc("socket_invalid_client_id_total")
+    client_id = client_id or issue_client_token()
+    join_room(client_room(client_id))
+    logger.info("Cliente conectado a WebSocket", extra={"sid": request.sid})
+    emit("connection_response", {"message": "Conectado exitosamente", "sid": request.sid, "client_id": client_id})
+
+
+@socketio.on("query")
+def handle_query(data):
+    """Consulta por Socket.IO: la respuesta se emite solo a esta conexión; el ack lleva request_id y estado.
+
+    data: {"query": ..., "request_id": opcional (se devuelve en la respuesta), "deadline_ms": opcional}.
+    El trace_id de la respuesta y del ack lo asigna el servidor.
+    """
+    data = data if isinstance(data, dict) else {"query": data}
+    request_id = _client_id(data.get("request_id"))
+    query_text = data.get("query") or data.get("query_text")
+    if not query_text or not isinstance(query_text, str):
+        response = {"error": "No se proporcionó texto para la consulta", "request_id": request_id}
+        emit("final_response", response, to=request.sid)
+        return {"request_id": request_id, "trace_id": None, "status": 400}
+    try:
+        budget_ms = budget_ms_from(data.get("deadline_ms"))
+    except (TypeError, ValueError):
+        response = {"error": "deadline_ms debe ser un número positivo de milisegundos", "request_id": request_id}
+        emit("final_response", response, to=request.sid)
+        return {"request_id": request_id, "trace_id": None, "status": 400}
+
+    response, status = run_query(query_text, budget_ms, request_id=request_id, channel="socket")
+    emit("busy" if status == 429 else "final_response", response, to=request.sid)
+    # El ack solo confirma; la respuesta ya viaja en el evento
+    return {"request_id": response.get("request_id"), "trace_id": response.get("trace_id"), "status": status}
+
 
 @bp.route('/query', methods=['POST'])
 def query():
-    """Procesa la consulta del usuario utilizando el sistema RAG."""
-    print("[PRINT DEBUG] ===== ENDPOINT /query INICIADO =====")
-    print(f"[PRINT DEBUG] query_rag_system disponible: {query_rag_system}")
-    print(f"[PRINT DEBUG] Tipo de query_rag_system: {type(query_rag_system)}")
+    """Procesa la consulta del usuario utilizando el sistema RAG.
+
+    Con X-Client-Id (o "client_id" en el cuerpo) la respuesta también se emite por
+    Socket.IO, solo a las conexiones de ese cliente. El valor debe ser el token que el
+    servidor envió en connection_response; cualquier otro se rechaza con 400.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        data = {}
+    logger.debug("Datos recibidos: %s", data)
+
+    query_text = data.get("query") or data.get("query_text")
+
+    if not query_text:
+        logger.error("No se proporcionó texto para la consulta.")
+        return jsonify({"error": "No se proporcionó texto para la consulta"}), 400
+
     try:
-        logging.info("=== INICIO DE CONSULTA HTTP ===")
-        data = request.get_json()
-        print(f"[PRINT DEBUG] Datos recibidos: {data}")
-        logging.info(f"Datos recibidos: {data}")
-        
-        query_text = data.get("query") or data.get("query_text")
-        print(f"[PRINT DEBUG] Query extraído: '{query_text}'")
-        logging.info(f"Query text extraído: '{query_text}'")
-
-        if not query_text:
-            logging.error("No se proporcionó texto para la consulta.")
-            return jsonify({"error": "No se proporcionó texto para la consulta"}), 400
-
-        logging.info(f"Consulta recibida: '{query_text}'")
-        logging.info(f"Instancia query_rag_system: {query_rag_system}")
-        logging.info(f"Tipo de query_rag_system: {type(query_rag_system)}")
+        budget_ms = request_budget_ms()
+    except ValueError:
+        return jsonify({"error": f"{DEADLINE_HEADER} debe ser un número positivo de milisegundos"}), 400
+
+    presented = request.headers.get(CLIENT_ID_HEADER) or data.get("client_id")
+    client_id = verified_client_token(presented)
+    if presented and client_id is None:
+        metrics.inc("socket_invalid_client_id_total")
+        return jsonify({"error": f"{CLIENT_ID_HEADER} debe ser el client_id recibido en connection_response"}), 400
+    target = client_room(client_id) if client_id else None
+    response, status = run_query(query_text, budget_ms, request_id=_client_id(data.get("request_id")),
+                                 channel="http", profile=_profile_requested())
+    if status == 429:
+        _deliver("busy", response, to=target)
+        return jsonify(response), 429, {"Retry-After": str(response["retry_after"])}
+    _deliver("final_response", response, to=target)
+    return jsonify(response)
 
+
+def run_query(query_text, budget_ms, request_id=None, channel="http", profile=False):
+    """(respuesta, código HTTP) de una consulta; común a POST /query y al evento Socket.IO 'query'.
+
+    request_id es el del cliente y solo se devuelve tal cual (por defecto, el trace_id).
+    La traza, el perfil y la coalescencia usan el trace_id, que genera el servidor y
+    es único aunque dos clientes repitan request_id. Con profile (o por
+    PROFILE_SAMPLE_RATE) query_rag se perfila y el perfil queda en /admin/profiles/<trace_id>.
+    """
+    trace = None
+    try:
         # Procesar la consulta usando el sistema RAG
-        logging.info("Llamando a query_rag_system.query_rag...")
-        result = query_rag_system.query_rag(query_text)
-        print(f"[PRINT DEBUG] Resultado de query_rag: {result}")
-        logging.info(f"Resultado de query_rag: {type(result)} - {result}")
-        
+        try:
+            with start_trace(budget_ms=budget_ms) as trace:
+                if request_id:
+                    trace.meta["client_request_id"] = request_id
+                with profiled(trace, should_profile(profile)):
+                    result = query_rag_system.query_rag(query_text, budget_ms=budget_ms)
+        except Overloaded as e:
+            return _busy_payload(e, request_id or trace.request_id, trace.request_id), 429
+        metrics.inc("queries_total")
+        metrics.inc(f"queries_channel.{channel}")
+        metrics.inc(f"queries_route.{trace.route or 'unknown'}")
+        if trace.degradations:
+            metrics.inc("queries_degraded_total")
+        remaining = trace.remaining_ms()
+        if remaining is not None and remaining < 0:
+            metrics.inc("deadline_exceeded_total")
+
         if not isinstance(result, tuple) or len(result) != 3:
-            logging.error(f"ERROR: Resultado no es una tupla de 3 elementos: {result}")
-            raise Exception(f"Resultado inválido del sistema RAG: {result}")
-        
+            logger.error("Resultado no es una tupla de 3 elementos: %r", result)
+            raise Exception(f"Resultado inválido del sistema RAG: {type(result).__name__}")
+
         response_text, similarity_score, used_kb = result
-        print(f"[PRINT DEBUG] Desempaquetado - response: {response_text[:50]}..., similarity: {similarity_score}, used_kb: {used_kb}")
-        logging.info(f"Desempaquetado - response_text: {type(response_text)}, similarity_score: {similarity_score}, used_kb: {used_kb}")
-        
+        logger.info(
+            "Consulta procesada",
+            extra={
+                "request_id": trace.request_id,
+                "client_request_id": request_id,
+                "channel": channel,
+                "route": trace.route,
+                "similarity": similarity_score,
+                "used_kb": used_kb,
+                "total_ms": round(trace.elapsed_ms(), 1),
+                "budget_ms": trace.budget_ms,
+                "degradations": trace.degradations,
+                "response_chars": len(response_text) if isinstance(response_text, str) else None,
+            },
+        )
+        logger.debug("Respuesta completa de query_rag: %r", result)
+
         # Sanitizar posibles tokens 'undefined' al final
         try:
-            import re
             if isinstance(response_text, str):
                 response_text = re.sub(r"\s*undefined\s*$", "", response_text)
         except Exception as _san_err:
-            logging.debug(f"No se pudo sanitizar 'undefined': {_san_err}")
-        
-        # Preparar y enviar la respuesta
-        response = {
+            logger.debug("No se pudo sanitizar 'undefined': %s", _san_err)
+
+        return {
             "response": response_text,
             "similarity": similarity_score,
-            "used_knowledge_base": used_kb
-        }
-        # Enviar respuesta por WebSocket si hay conexión activa
-        try:
-            socketio.emit("final_response", response)
-        except Exception as socket_error:
-            print(f"[DEBUG] No se pudo enviar por WebSocket: {socket_error}")
-        
-        return jsonify(response)
+            "used_knowledge_base": used_kb,
+            # Etapas degradadas por el plazo de la solicitud (vacío si se completó todo)
+            "degradations": list(trace.degradations),
+            "request_id": request_id or trace.request_id,
+            "trace_id": trace.request_id,
+        }, 200
 
     except Exception as e:
-        error_msg = f"Error al procesar la consulta: {str(e)}"
-        print(f"[PRINT DEBUG ERROR] {error_msg}")
-        print(f"[PRINT DEBUG ERROR] Traceback: {traceback.format_exc()}")
-        logging.error(error_msg)
-        logging.error(f"Traceback completo: {traceback.format_exc()}")
-        
-        response = {
+        metrics.inc("query_errors_total")
+        logger.exception("Error al procesar la consulta: %s", e)
+        return {
             "response": f"Lo siento, hubo un problema al procesar tu consulta: {str(e)}",
             "similarity": 0.0,
-            "used_knowledge_base": False
-        }
-        print(f"[PRINT DEBUG ERROR] Devolviendo respuesta de error: {response}")
-        # Enviar respuesta de error por WebSocket si hay conexión activa
-        try:
-            socketio.emit("final_response", response)
-        except Exception as socket_error:
-            print(f"[DEBUG] No se pudo enviar error por WebSocket: {socket_error}")
-        
-        return jsonify(response)
+            "used_knowledge_base": False,
+            "request_id": request_id or (trace.request_id if trace else None),
+            "trace_id": trace.request_id if trace else None,
+        }, 200
+
+
+def _busy_payload(overloaded, request_id=None, trace_id=None):
+    """Cuerpo de la respuesta 429 / evento 'busy' para una consulta descartada por el control de admisión."""
+    logger.warning("Consulta descartada: %s", overloaded)
+    return {
+        "error": "El servidor está ocupado; intenta de nuevo en unos segundos",
+        "busy": True,
+        "reason": overloaded.reason,
+        "retry_after": overloaded.retry_after_s,
+        "request_id": request_id,
+        "trace_id": trace_id,
+    }
+
 
 def init_app(app):
     """Inicializa las rutas en la aplicación Flask."""
@@ -0,0 +1,99 @@
+import re
+
+# Rutas de procesamiento de query_rag; las comparten la herramienta de carga,
+# el control de admisión y la coalescencia de consultas.
+ROUTE_ARTICLE = "article"
+ROUTE_OPINION = "opinion"
+ROUTE_LIST = "list"
+ROUTE_LLM = "llm"
+ROUTES = (ROUTE_ARTICLE, ROUTE_OPINION, ROUTE_LIST, ROUTE_LLM)
+
+ARTICLE_PATTERN = re.compile(r'(?:artículo|articulo|art\.?)\s*(\d+)')
+
+ARTICLE_LIST_PATTERNS = [
+    r'qu[eé]\s+art[ií]culos',
+    r'cu[aá]les\s+art[ií]culos',
+    r'lista\s+de\s+art[ií]culos',
+    r'todos\s+los\s+art[ií]culos',
+    r'art[ií]culos\s+sobre',
+    r'art[ií]culos\s+relacionados',
+    r'qu[eé]\s+normas',
+    r'cu[aá]les\s+normas',
+    r'dime\s+que\s+art[ií]culos',
+    r'muestra\s+art[ií]culos',
+    r'busca\s+art[ií]culos',
+    # Nuevos patrones para consultas por número/rango
+    r'primeros?\s+\d+\s+art[ií]culos',
+    r'\d+\s+primeros?\s+art[ií]culos',
+    r'art[ií]culos?\s+del?\s+\d+\s+al?\s+\d+',
+    r'art[ií]culos?\s+\d+\s+al?\s+\d+',
+    r'art[ií]culos?\s+(?:del?\s+)?\d+\s+hasta(?:\s+el)?\s+\d+',
+    r'muestra\s+los?\s+\d+\s+primeros?\s+art[ií]culos',
+    r'muestra\s+los?\s+primeros?\s+\d+\s+art[ií]culos',
+    r'dame\s+los?\s+\d+\s+primeros?\s+art[ií]culos',
+    r'dame\s+los?\s+primeros?\s+\d+\s+art[ií]culos',
+    r'los?\s+\d+\s+primeros?\s+art[ií]culos',
+    r'los?\s+primeros?\s+\d+\s+art[ií]culos',
+    # Patrones con números escritos en palabras
+    r'diez\s+primeros?\s+art[ií]culos',
+    r'cinco\s+primeros?\s+art[ií]culos',
+    r'veinte\s+primeros?\s+art[ií]culos',
+    r'muestres?\s+los?\s+diez\s+primeros?\s+art[ií]culos',
+    r'muestres?\s+los?\s+cinco\s+primeros?\s+art[ií]culos',
+    r'muestres?\s+los?\s+veinte\s+primeros?\s+art[ií]culos',
+    r'que\s+me\s+muestres?\s+los?\s+diez\s+primeros?\s+art[ií]culos',
+    r'que\s+me\s+muestres?\s+los?\s+cinco\s+primeros?\s+art[ií]culos'
+]
+
+_ARTICLE_LIST_REGEX = [re.compile(p) for p in ARTICLE_LIST_PATTERNS]
+
+# Rango de artículos: "artículos del 10 al 20", "artículos 5 a 8", "artículos del 3 hasta el 9"
+ARTICLE_RANGE_PATTERN = re.compile(r'art[ií]culos?\s+(?:del?\s+)?(\d+)\s+(?:al?|hasta(?:\s+el)?)\s+(\d+)')
+
+OPINION_TRIGGERS = [
+    "en tus palabras", "con tus palabras", "tu opinión", "qué opinas",
+    "opina", "explicame con tus palabras", "explícame con tus palabras",
+    "dime tu opinión", "en tu criterio", "desde tu perspectiva"
+]
+
+
+def detect_article_number(query_text):
+    """Devuelve el número de artículo solicitado explícitamente (ej: 'artículo 186') o None."""
+    match = ARTICLE_PATTERN.search(query_text.lower())
+    return match.group(1) if match else None
+
+
+def detect_article_range(query_text):
+    """Devuelve (inicio, fin) si la consulta pide un rango de artículos, o None."""
+    match = ARTICLE_RANGE_PATTERN.search(query_text.lower())
+    if not match:
+        return None
+    start, end = int(match.group(1)), int(match.group(2))
+    return (start, end) if start <= end else (end, start)
+
+
+def is_article_list_query(query_text):
+    """Detecta si la consulta solicita una lista de artículos."""
+    query_lower = query_text.lower()
+    return any(rx.search(query_lower) for rx in _ARTICLE_LIST_REGEX)
+
+
+def is_opinion_request(query_text):
+    """Detecta si el usuario pide explicación en 'tus palabras' u opinión."""
+    q = query_text.lower()
+    return any(t in q for t in OPINION_TRIGGERS)
+
+
+def classify_query(query_text):
+    """Clasifica la consulta en la ruta que seguirá query_rag.
+
+    'article' para consultas por número de artículo, 'opinion' cuando se pide
+    explicación con el LLM, 'list' para listados y 'llm' para el resto.
+    """
+    if is_opinion_request(query_text):
+        return ROUTE_OPINION
+    if detect_article_number(query_text):
+        return ROUTE_ARTICLE
+    if is_article_list_query(query_text):
+        return ROUTE_LIST
+    return ROUTE_LLM
@@ -0,0 +1,70 @@
+"""Coalescencia de ejecuciones idénticas en vuelo ("single-flight").
+
+La primera solicitud con una clave ejecuta la función (líder); las que llegan
+con la misma clave mientras tanto esperan y reciben el mismo resultado (o la
+misma excepción) sin ejecutarla. Una vez terminada, la clave se libera: no es
+una caché, una solicitud posterior vuelve a ejecutar.
+
+Un seguidor espera a lo sumo su propio plazo (timeout); si el líder no terminó
+para entonces, ejecuta la función por su cuenta en lugar de quedar bloqueado.
+"""
+import threading
+
+from app import metrics
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+
+class SingleFlight:
+    """Grupo de ejecuciones en vuelo por clave, seguro entre hilos."""
+
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+        metrics.register_gauge(f"singleflight.{name}.in_flight", self.in_flight)
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+    def do(self, key, fn, timeout=None):
+        """(resultado de fn, compartido). compartido=True si se reutilizó la ejecución de otro hilo.
+
+        timeout: segundos que un seguidor espera al líder (None = sin límite); al
+        vencer, el seguidor ejecuta fn localmente.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.followers += 1
+
+        if not leader:
+            if not call.done.wait(None if timeout is None else max(timeout, 0.0)):
+                metrics.inc(f"singleflight.{self.name}.follower_timeouts")
+                return fn(), False
+            metrics.inc(f"singleflight.{self.name}.coalesced")
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        metrics.inc(f"singleflight.{self.name}.executions")
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
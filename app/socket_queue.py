@@ -0,0 +1,88 @@
+"""Cola de mensajes de Socket.IO para emitir entre varios procesos del servidor.
+
+Con SOCKETIO_MESSAGE_QUEUE vacío, cada proceso solo alcanza a sus propias
+conexiones. Con una URL, cada emisión (y cada alta en una sala) se publica en la
+cola y la entrega el proceso que tiene la conexión del cliente:
+
+  - resp://host:puerto  cliente RESP propio, sin dependencias: sirve contra Redis
+                        o contra el broker local (python -m app.pubsub_broker);
+  - redis://...         RedisManager de python-socketio (requiere el paquete redis);
+  - amqp://..., kafka://..., zmq+tcp://...  los demás gestores de python-socketio
+                        (requieren kombu, kafka-python o pyzmq).
+"""
+import logging
+import threading
+import time
+from urllib.parse import urlparse
+
+import socketio
+
+from app.config import Config
+from app.pubsub_broker import RespConnection, RespError
+
+logger = logging.getLogger(__name__)
+
+
+class RespPubSubManager(socketio.PubSubManager):
+    """PubSubManager de python-socketio sobre una conexión RESP (PUBLISH/SUBSCRIBE)."""
+
+    name = "resp"
+
+    def __init__(self, url="resp://localhost:6379", channel="socketio", write_only=False, logger=None, json=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger, json=json)
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self._publisher = None
+        self._publish_lock = threading.Lock()
+
+    def _publish(self, data):
+        payload = self.json.dumps(data)
+        with self._publish_lock:
+            for retries_left in (1, 0):
+                try:
+                    if self._publisher is None:
+                        self._publisher = RespConnection(self.host, self.port, timeout=10)
+                    return self._publisher.command("PUBLISH", self.channel, payload)
+                except (OSError, ConnectionError, RespError) as e:
+                    if self._publisher is not None:
+                        self._publisher.close()
+                        self._publisher = None
+                    if not retries_left:
+                        logger.error("No se pudo publicar en %s:%s: %s", self.host, self.port, e)
+
+    def _listen(self):
+        retry_sleep = 1
+        while True:
+            connection = None
+            try:
+                connection = RespConnection(self.host, self.port)
+                connection.send("SUBSCRIBE", self.channel)
+                while True:
+                    message = connection.read()
+                    if not isinstance(message, list) or len(message) != 3:
+                        continue
+                    if message[0] == b"subscribe":
+                        retry_sleep = 1
+                        logger.info("Suscrito a la cola Socket.IO %s:%s (%s)", self.host, self.port, self.channel)
+                    elif message[0] == b"message":
+                        yield message[2]
+            except (OSError, ConnectionError, RespError) as e:
+                logger.error("Sin conexión con la cola %s:%s (%s); reintento en %s s",
+                             self.host, self.port, e, retry_sleep)
+                time.sleep(retry_sleep)
+                retry_sleep = min(retry_sleep * 2, 60)
+            finally:
+                if connection is not None:
+                    connection.close()
+
+
+def socketio_options():
+    """Argumentos para SocketIO.init_app según SOCKETIO_MESSAGE_QUEUE ({} = un solo proceso)."""
+    url = Config.SOCKETIO_MESSAGE_QUEUE
+    if not url:
+        return {}
+    logger.info("Socket.IO con cola de mensajes %s (canal %s)", url, Config.SOCKETIO_CHANNEL)
+    if url.startswith("resp://"):
+        return {"client_manager": RespPubSubManager(url, channel=Config.SOCKETIO_CHANNEL)}
+    return {"message_queue": url, "channel": Config.SOCKETIO_CHANNEL}
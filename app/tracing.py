@@ -0,0 +1,129 @@
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from app import metrics
+
+# Traza de la solicitud activa en el hilo actual
+_local = threading.local()
+
+
+class RequestTrace:
+    """Registro de una ejecución de query_rag: tiempos por etapa, ruta tomada y artículos recuperados."""
+
+    def __init__(self, request_id=None, budget_ms=None):
+        self.request_id = request_id or uuid.uuid4().hex
+        self.started = time.perf_counter()
+        # Presupuesto de latencia de la solicitud (None = sin límite)
+        self.budget_ms = budget_ms or None
+        self.stages = {}
+        self.route = None
+        self.retrievals = []
+        self.meta = {}
+        # Degradaciones aplicadas por falta de presupuesto (en orden, sin repetir)
+        self.degradations = []
+
+    def add_stage(self, name, elapsed_ms):
+        """Acumula el tiempo de una etapa (una etapa puede ejecutarse varias veces)."""
+        self.stages[name] = self.stages.get(name, 0.0) + elapsed_ms
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.started) * 1000.0
+
+    def remaining_ms(self):
+        """Milisegundos que quedan del presupuesto; None si la solicitud no tiene presupuesto."""
+        if self.budget_ms is None:
+            return None
+        return self.budget_ms - self.elapsed_ms()
+
+    def to_dict(self):
+        return {
+            "request_id": self.request_id,
+            "route": self.route,
+            "stages_ms": {name: round(ms, 3) for name, ms in self.stages.items()},
+            "retrievals": [list(r) for r in self.retrievals],
+            "meta": dict(self.meta),
+            "degradations": list(self.degradations),
+            "total_ms": round(self.elapsed_ms(), 3),
+        }
+
+
+def current_trace():
+    """Devuelve la traza activa en este hilo o None."""
+    return getattr(_local, "trace", None)
+
+
+@contextmanager
+def start_trace(request_id=None, budget_ms=None):
+    """Abre una traza para el hilo actual; si ya existe una, la reutiliza (y le asigna el
+    presupuesto si aún no tiene)."""
+    trace = current_trace()
+    if trace is not None:
+        if trace.budget_ms is None and budget_ms:
+            trace.budget_ms = budget_ms
+        yield trace
+        return
+    trace = RequestTrace(request_id, budget_ms)
+    _local.trace = trace
+    try:
+        yield trace
+    finally:
+        _local.trace = None
+
+
+@contextmanager
+def stage(name):
+    """Mide el tiempo de una etapa dentro de la traza activa (sin costo si no hay traza)."""
+    trace = current_trace()
+    if trace is None:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add_stage(name, (time.perf_counter() - t0) * 1000.0)
+
+
+def set_route(route):
+    """Anota la ruta de procesamiento elegida por query_rag."""
+    trace = current_trace()
+    if trace is not None:
+        trace.route = route
+
+
+def record_retrieval(results):
+    """Anota los artículos (fuente:artículo) devueltos por una búsqueda."""
+    trace = current_trace()
+    if trace is not None:
+        trace.retrievals.append([
+            f"{r['data'].get('fuente', '')}:{r['data'].get('articulo', '')}" for r in results
+        ])
+
+
+def remaining_ms():
+    """Presupuesto restante de la solicitud activa en ms; None si no hay traza o presupuesto."""
+    trace = current_trace()
+    return trace.remaining_ms() if trace is not None else None
+
+
+def degrade(name):
+    """Registra una degradación deliberada (p. ej. 'skip_rerank', 'kb_only') en la traza y en métricas."""
+    metrics.inc(f"degradations.{name}")
+    trace = current_trace()
+    if trace is not None and name not in trace.degradations:
+        trace.degradations.append(name)
+
+
+def budget_allows(min_ms):
+    """True si la solicitud no tiene presupuesto o le quedan al menos min_ms."""
+    remaining = remaining_ms()
+    return remaining is None or remaining >= min_ms
+
+
+def annotate(key, value):
+    """Anota un dato adicional de la solicitud (p. ej. tokens del prompt) en la traza activa."""
+    trace = current_trace()
+    if trace is not None:
+        trace.meta[key] = value
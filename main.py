@@ -1,8 +1,7 @@
-from app import create_app
-from flask_socketio import SocketIO
+from app import create_app, socketio
 
+# Una sola instancia de SocketIO: la de app/__init__.py, donde se registran los eventos
 app = create_app()
-socketio = SocketIO(app, cors_allowed_origins="*")
 
 if __name__ == "__main__":
     socketio.run(app, host="0.0.0.0", port=5001, debug=True)
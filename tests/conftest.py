@@ -0,0 +1,39 @@
+"""Entorno de las pruebas, fijado antes de cualquier import de app.
+
+- sentence_transformers se sustituye por tests/fakes (sin descargar modelos ni red);
+- DATA_DIR apunta a una copia temporal de tests/data: los índices y el corpus
+  compacto se escriben ahí y no tocan data/ del repositorio;
+- backend LLM stub y registro en WARNING.
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+FAKES_DIR = os.path.join(TESTS_DIR, "fakes")
+
+sys.path.insert(0, FAKES_DIR)
+DATA_DIR = tempfile.mkdtemp(prefix="azusena-tests-")
+shutil.copy(os.path.join(TESTS_DIR, "data", "corpus.csv"), DATA_DIR)
+
+os.environ.update({
+    "DATA_DIR": DATA_DIR,
+    "LLM_BACKEND": "stub",
+    "LOG_LEVEL": "WARNING",
+    "KB_WATCH_INTERVAL_SECONDS": "0",
+    "PROFILE_SAMPLE_RATE": "0",
+    "HF_HUB_OFFLINE": "1",
+})
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(DATA_DIR, ignore_errors=True)
+
+
+@pytest.fixture(scope="session")
+def flask_app():
+    from app import create_app
+    return create_app()
@@ -0,0 +1,52 @@
+"""Sustituto de sentence_transformers para las pruebas: sin descargas ni red.
+
+SentenceTransformer codifica una bolsa de palabras con hash en 64 dimensiones
+(determinista; textos con palabras en común quedan cerca) y CrossEncoder puntúa
+por palabras compartidas.
+"""
+import hashlib
+import json
+import os
+
+import numpy as np
+
+DIMENSION = 64
+
+
+class SentenceTransformer:
+    def __init__(self, name, *args, **kwargs):
+        self.name = name
+        self.max_seq_length = 128
+
+    def get_sentence_embedding_dimension(self):
+        return DIMENSION
+
+    def encode(self, texts, convert_to_numpy=True, batch_size=32, show_progress_bar=False, **kwargs):
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        out = np.zeros((len(texts), DIMENSION), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for word in str(text).lower().split():
+                h = int(hashlib.md5(word.encode("utf-8")).hexdigest(), 16)
+                out[i, h % DIMENSION] += 1.0
+                out[i, (h >> 8) % DIMENSION] += 0.5
+        return out[0] if single else out
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, "config.json"), "w", encoding="utf-8") as f:
+            json.dump({"name": self.name}, f)
+
+
+class CrossEncoder:
+    def __init__(self, name, *args, **kwargs):
+        self.name = name
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, "config.json"), "w", encoding="utf-8") as f:
+            json.dump({"name": self.name}, f)
+
+    def predict(self, pairs, **kwargs):
+        return np.array([len(set(a.lower().split()) & set(b.lower().split())) for a, b in pairs],
+                        dtype=np.float32)
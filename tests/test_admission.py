@@ -0,0 +1,114 @@
+import threading
+
+import pytest
+
+from app import admission
+from app.admission import AdmissionPool, Overloaded
+
+
+def occupy(pool):
+    """Ocupa el único lugar del pool hasta llamar a la función devuelta."""
+    block = pool.admit()
+    block.__enter__()
+    return lambda: block.__exit__(None, None, None)
+
+
+def shed_reason(pool, **kwargs):
+    with pytest.raises(Overloaded) as info:
+        with pool.admit(**kwargs):
+            pass
+    return info.value
+
+
+def test_queue_full_sheds_immediately():
+    pool = AdmissionPool("t_full", max_concurrent=1, max_queue=0, max_queue_ms=1000)
+    release = occupy(pool)
+
+    error = shed_reason(pool)
+
+    assert (error.pool, error.reason) == ("t_full", "queue_full")
+    assert error.retry_after_s >= 1
+    assert pool.waiting == 0
+    release()
+
+
+def test_predicted_wait_sheds_without_queueing():
+    pool = AdmissionPool("t_predicted", max_concurrent=1, max_queue=4, max_queue_ms=100)
+    pool.service_ms = 1000.0
+    release = occupy(pool)
+
+    error = shed_reason(pool)
+
+    assert error.reason == "predicted_wait"
+    assert error.retry_after_s == 1
+    assert pool.waiting == 0
+    release()
+
+
+def test_queue_timeout_sheds_after_waiting_its_budget():
+    pool = AdmissionPool("t_timeout", max_concurrent=1, max_queue=4, max_queue_ms=1000)
+    release = occupy(pool)
+
+    # El plazo restante de la solicitud (50 ms) acota la espera por debajo de max_queue_ms
+    error = shed_reason(pool, max_wait_ms=50)
+
+    assert error.reason == "queue_timeout"
+    assert pool.waiting == 0
+    release()
+
+
+def test_queued_request_is_admitted_when_the_slot_frees():
+    pool = AdmissionPool("t_handoff", max_concurrent=1, max_queue=1, max_queue_ms=5000)
+    release = occupy(pool)
+    admitted = threading.Event()
+
+    def waiter():
+        with pool.admit():
+            admitted.set()
+
+    thread = threading.Thread(target=waiter)
+    thread.start()
+    assert not admitted.wait(0.05)
+    release()
+    thread.join(5)
+
+    assert admitted.is_set()
+    assert (pool.active, pool.waiting) == (0, 0)
+
+
+def test_slot_is_released_when_the_block_raises():
+    pool = AdmissionPool("t_release", max_concurrent=1, max_queue=0, max_queue_ms=0)
+
+    with pytest.raises(ValueError):
+        with pool.admit():
+            raise ValueError("falló la consulta")
+
+    assert pool.active == 0
+    with pool.admit() as queued_ms:
+        assert queued_ms < 1000
+    assert pool.service_ms is not None
+
+
+def test_query_returns_429_with_retry_after_when_the_pool_is_full(flask_app, monkeypatch):
+    from app.query import query_rag_system
+
+    pools = {name: AdmissionPool(f"t_route_{name}", max_concurrent=1, max_queue=0, max_queue_ms=1000)
+             for name in (admission.CHEAP, admission.LLM)}
+    monkeypatch.setattr(query_rag_system, "admission", pools)
+    query = "¿Qué dice el artículo 186 de la ley 100?"
+    pool = pools[query_rag_system.admission_pool(query)]
+    release = occupy(pool)
+    try:
+        response = flask_app.test_client().post("/query", json={"query": query})
+    finally:
+        release()
+
+    assert response.status_code == 429
+    body = response.get_json()
+    assert body["busy"] is True
+    assert body["reason"] == "queue_full"
+    assert response.headers["Retry-After"] == str(body["retry_after"])
+    assert pool.active == 0
+
+    # Liberado el lugar, la misma consulta se atiende
+    assert flask_app.test_client().post("/query", json={"query": query}).status_code == 200
@@ -0,0 +1,60 @@
+import os
+
+import pytest
+
+from app.models.article_cards import SNIPPET_CHARS, build_cards, make_card
+from app.models.corpus_store import CorpusStore
+from app.models.ingest import iter_corpus
+
+FIELDS = ("articulo", "numero", "fuente", "fuente_norm", "tema", "subtema", "reference", "related_line",
+          "list_line", "snippet", "text_snippet", "direct_body", "theme_line")
+
+
+@pytest.fixture(scope="module")
+def corpus():
+    rows = [row for row in iter_corpus(os.environ["DATA_DIR"])]
+    long_text = "palabra " * 100
+    rows.append({**rows[0], "articulo": "9a", "texto_del_articulo": long_text, "resumen_explicativo": "nan"})
+    return CorpusStore.build(rows)
+
+
+def test_cards_from_the_store_match_cards_from_rows(corpus):
+    cards = build_cards(corpus)
+
+    assert len(cards) == len(corpus)
+    for pos, card in enumerate(cards):
+        expected = make_card(corpus.row(pos))
+        assert [getattr(card, f) for f in FIELDS] == [getattr(expected, f) for f in FIELDS]
+
+
+def test_card_fragments(corpus):
+    card = build_cards(corpus)[0]
+    row = corpus.row(0)
+
+    assert card.numero == 1
+    assert card.list_line == f"• **ARTÍCULO 1** — {row['tema']} ({row['subtema']})"
+    assert card.reference == f"Artículo 1 - {row['fuente']} ({row['subtema']})"
+    assert card.related_line == f"• Art. 1 - {row['tema']} ({row['subtema']})"
+    assert card.direct_body == card.snippet == row['resumen_explicativo']
+    assert card.text_snippet == row['texto_del_articulo']
+    assert card.theme_line == (f"• **Art. 1** ({row['fuente']}) - *{row['subtema']}*\n"
+                               f"  {row['resumen_explicativo']}\n\n")
+
+
+def test_long_text_without_summary_is_truncated(corpus):
+    card = build_cards(corpus)[-1]
+
+    assert card.numero is None
+    assert card.list_line.startswith("• **ARTÍCULO 9a**")
+    assert card.snippet == card.text_snippet == card.direct_body
+    assert card.snippet.endswith("...") and len(card.snippet) == SNIPPET_CHARS + 3
+    assert card.theme_line.endswith("\n  \n\n")
+
+
+def test_cards_keep_no_long_text_and_share_store_labels(corpus):
+    cards = build_cards(corpus)
+
+    assert not hasattr(cards[0], "__dict__")
+    assert {"snippet", "text_snippet", "direct_body", "theme_line"}.isdisjoint(type(cards[0]).__slots__)
+    assert cards[0].fuente is corpus.labels_at(0)[0]
+    assert cards[0].fuente_norm is cards[1].fuente_norm
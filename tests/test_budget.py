@@ -0,0 +1,97 @@
+import pytest
+
+from app.config import Config
+from app.tracing import start_trace
+
+CONTEXT_QUERY = "¿Cuáles son los principios del servicio público de seguridad social?"
+# Sin coincidencias en la base: ruta general (solo LLM)
+GENERAL_QUERY = "xyzzy plugh"
+
+
+@pytest.fixture
+def rag():
+    import app.query as query_module
+
+    rag = query_module.query_rag_system
+    assert rag.llm.name == "stub"
+    return rag
+
+
+def run(rag, query_text, budget_ms):
+    with start_trace(budget_ms=budget_ms) as trace:
+        result = rag.query_rag(query_text)
+    return result, trace
+
+
+@pytest.mark.parametrize("raw", ["0", 0, "-250", -1.5, "nan", float("nan"), "inf", "-inf", "abc"])
+def test_budget_ms_from_rejects_non_positive_or_non_finite_values(raw):
+    from app.routes import budget_ms_from
+
+    with pytest.raises(ValueError):
+        budget_ms_from(raw)
+
+
+def test_budget_ms_from_defaults_and_caps(monkeypatch):
+    from app.routes import budget_ms_from
+
+    monkeypatch.setattr(Config, "REQUEST_BUDGET_MS", 0.0)
+    monkeypatch.setattr(Config, "REQUEST_BUDGET_MAX_MS", 5000.0)
+    assert budget_ms_from(None) == 0.0
+    assert budget_ms_from("  ") == 0.0
+    assert budget_ms_from("250") == 250.0
+    assert budget_ms_from(90000) == 5000.0
+
+
+@pytest.mark.parametrize("header", ["0", "-1", "nan", "inf"])
+def test_query_rejects_an_invalid_deadline_header(flask_app, header):
+    response = flask_app.test_client().post("/query", json={"query": CONTEXT_QUERY},
+                                            headers={"X-Request-Deadline-Ms": header})
+
+    assert response.status_code == 400
+    assert "X-Request-Deadline-Ms" in response.get_json()["error"]
+
+
+def test_without_budget_nothing_is_degraded(rag):
+    (response, _, used_kb), trace = run(rag, CONTEXT_QUERY, None)
+
+    assert trace.route == "llm_context"
+    assert trace.degradations == []
+    assert used_kb and response.startswith("Respuesta de referencia")
+
+
+def test_exhausted_budget_reduces_top_k_and_answers_from_the_kb(rag):
+    (response, _, used_kb), trace = run(rag, CONTEXT_QUERY, 1)
+
+    assert trace.route == "llm_context"
+    assert trace.degradations == ["reduced_top_k", "kb_only"]
+    assert "llm" not in trace.stages
+    assert used_kb and "Enumera los principios del servicio de seguridad social" in response
+
+
+def test_exhausted_budget_skips_the_llm_without_kb_context(rag):
+    from app.query import NO_TIME_RESPONSE
+
+    result, trace = run(rag, GENERAL_QUERY, 1)
+
+    assert trace.route == "llm_general"
+    assert trace.degradations == ["reduced_top_k", "skip_llm"]
+    assert result == (NO_TIME_RESPONSE, 0.0, False)
+
+
+def test_budget_left_for_the_llm_but_not_for_coherence(rag, monkeypatch):
+    monkeypatch.setattr(Config, "DEADLINE_LLM_MIN_MS", 0.0)
+    monkeypatch.setattr(Config, "DEADLINE_COHERENCE_MIN_MS", 10 ** 9)
+
+    (response, _, used_kb), trace = run(rag, CONTEXT_QUERY, 60000)
+
+    assert trace.degradations == ["skip_coherence"]
+    assert "llm" in trace.stages and "coherence" not in trace.stages
+    assert used_kb and response.startswith("Respuesta de referencia")
+
+
+def test_query_reports_degradations_for_a_short_deadline(flask_app):
+    response = flask_app.test_client().post("/query", json={"query": GENERAL_QUERY},
+                                            headers={"X-Request-Deadline-Ms": "1"})
+
+    assert response.status_code == 200
+    assert response.get_json()["degradations"] == ["reduced_top_k", "skip_llm"]
@@ -0,0 +1,168 @@
+import time
+
+import pytest
+
+from app import metrics
+from app.circuit_breaker import CLOSED, OPEN, CircuitBreaker, CircuitOpenError
+from app.llm_backend import GuardedBackend, LLMCircuitOpenError, StubBackend
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("la condición no se cumplió a tiempo")
+        time.sleep(0.001)
+
+
+class FailingStub(StubBackend):
+    """StubBackend que falla mientras `failing` es verdadero y cuenta sus llamadas."""
+
+    name = "stub_caido"
+
+    def __init__(self):
+        super().__init__(latency_ms=0, tokens_per_second=0)
+        self.failing = True
+        self.calls = 0
+
+    def complete(self, messages, max_tokens=500, temperature=0.7, timeout=None):
+        self.calls += 1
+        if self.failing:
+            raise RuntimeError("backend caído")
+        return super().complete(messages, max_tokens, temperature, timeout)
+
+
+def never_probed():
+    raise AssertionError("el sondeo no debía ejecutarse")
+
+
+def test_sliding_window_opens_only_when_the_failure_rate_is_reached():
+    breaker = CircuitBreaker("t_window", never_probed, window=4, min_calls=4, failure_rate=0.5,
+                             slow_ms=1000.0, probe_interval_s=3600)
+    error = RuntimeError("falla")
+
+    breaker.record(1, error)
+    for _ in range(3):
+        breaker.record(1)
+    assert breaker.state == CLOSED  # 1 de 4
+    breaker.record(1)
+    assert breaker.status()["window_failures"] == 0  # la falla salió de la ventana
+    breaker.record(1, error)
+    assert breaker.state == CLOSED  # 1 de 4
+    breaker.record(1000.0)  # lenta: cuenta como fallo aunque respondió
+    assert breaker.state == OPEN
+
+    rejected = metrics.get("circuit.t_window.rejected")
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+    assert metrics.get("circuit.t_window.rejected") == rejected + 1
+    assert "lenta" in breaker.last_failure
+
+
+def test_min_calls_keeps_the_circuit_closed():
+    breaker = CircuitBreaker("t_min_calls", never_probed, window=10, min_calls=3, failure_rate=0.5,
+                             probe_interval_s=3600)
+
+    breaker.record(1, RuntimeError("falla"))
+    breaker.record(1, RuntimeError("falla"))
+
+    assert breaker.state == CLOSED
+    breaker.check()
+
+
+def test_open_circuit_probes_and_closes_after_consecutive_successes():
+    probes = []
+
+    def probe():
+        probes.append(time.monotonic())
+        if len(probes) == 1:
+            raise RuntimeError("sigue caído")
+
+    breaker = CircuitBreaker("t_probe", probe, window=2, min_calls=2, failure_rate=0.5,
+                             probe_interval_s=0.01, probe_successes=2)
+    for _ in range(2):
+        breaker.record(1, RuntimeError("falla"))
+    assert breaker.state == OPEN
+
+    wait_until(lambda: breaker.state == CLOSED)
+
+    assert len(probes) == 3  # una falla reinicia la cuenta; luego dos éxitos seguidos
+    assert metrics.get("circuit.t_probe.probe_failures") == 1
+    assert metrics.get("circuit.t_probe.closed") == 1
+    assert breaker.status()["window_calls"] == 0
+    breaker.check()
+
+
+def test_guarded_backend_stops_calling_a_failing_backend():
+    backend = FailingStub()
+    guarded = GuardedBackend(backend, {"window": 2, "min_calls": 2, "probe_interval_s": 3600})
+    messages = [{"role": "user", "content": "hola"}]
+
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            guarded.complete(messages)
+    assert guarded.is_open()
+
+    with pytest.raises(LLMCircuitOpenError):
+        guarded.complete(messages)
+    assert backend.calls == 2
+
+
+def test_guarded_backend_probes_the_backend_until_it_recovers():
+    backend = FailingStub()
+    guarded = GuardedBackend(backend, {"window": 2, "min_calls": 2, "probe_interval_s": 0.01,
+                                       "probe_successes": 1})
+    messages = [{"role": "user", "content": "hola"}]
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            guarded.complete(messages)
+    assert guarded.is_open()
+
+    backend.failing = False
+    wait_until(lambda: not guarded.is_open())
+
+    assert guarded.complete(messages).startswith("Respuesta de referencia")
+
+
+@pytest.fixture
+def open_llm(monkeypatch):
+    """QueryRAGSystem con un backend LLM caído detrás de un circuito ya abierto."""
+    import app.query as query_module
+
+    rag = query_module.query_rag_system
+    backend = FailingStub()
+    guarded = GuardedBackend(backend, {"window": 2, "min_calls": 2, "probe_interval_s": 3600})
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            guarded.complete([{"role": "user", "content": "hola"}])
+    monkeypatch.setattr(rag, "llm", guarded)
+    return rag, backend
+
+
+def test_open_circuit_answers_from_the_kb_template(open_llm):
+    from app.tracing import start_trace
+
+    rag, backend = open_llm
+    with start_trace() as trace:
+        response, similarity, used_kb = rag.query_rag(
+            "¿Cuáles son los principios del servicio público de seguridad social?")
+
+    assert trace.route == "llm_context"
+    assert trace.degradations == ["llm_circuit_open", "kb_only"]
+    assert used_kb and similarity >= 0.55
+    assert "Enumera los principios del servicio de seguridad social" in response
+    assert backend.calls == 2
+
+
+def test_open_circuit_rejects_queries_without_a_kb_match(open_llm):
+    from app.query import LLM_UNAVAILABLE_RESPONSE
+    from app.tracing import start_trace
+
+    rag, backend = open_llm
+    with start_trace() as trace:
+        result = rag.query_rag("xyzzy plugh")
+
+    assert trace.route == "llm_general"
+    assert trace.degradations == ["llm_circuit_open", "rejected"]
+    assert result == (LLM_UNAVAILABLE_RESPONSE, 0.0, False)
+    assert backend.calls == 2
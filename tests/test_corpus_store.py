@@ -0,0 +1,48 @@
+import os
+import threading
+
+from app.models.corpus_store import CorpusStore
+from app.models.ingest import REQUIRED_COLUMNS
+
+
+def _rows(label, count):
+    return [{column: f"{label} {column} {i}" for column in REQUIRED_COLUMNS} for i in range(count)]
+
+
+def test_save_open_roundtrip(tmp_path):
+    path = str(tmp_path / "corpus.bin")
+    rows = _rows("a", 5)
+    CorpusStore.build(rows).save(path)
+    corpus = CorpusStore.open(path)
+    assert len(corpus) == 5
+    assert corpus.row(3)["texto_del_articulo"] == rows[3]["texto_del_articulo"]
+    assert corpus.row(3)["fuente"] == rows[3]["fuente"]
+
+
+def test_concurrent_saves_leave_a_complete_file(tmp_path):
+    path = str(tmp_path / "corpus.bin")
+    stores = {label: CorpusStore.build(_rows(label, 200 if label == "a" else 350)) for label in ("a", "b")}
+    for _ in range(20):
+        barrier = threading.Barrier(len(stores))
+        errors = []
+
+        def save(store):
+            try:
+                barrier.wait()
+                store.save(path)
+            except Exception as e:  # pragma: no cover - solo se registra para el assert
+                errors.append(e)
+
+        threads = [threading.Thread(target=save, args=(store,)) for store in stores.values()]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert errors == []
+
+        corpus = CorpusStore.open(path)
+        label = corpus.row(0)["fuente"].split()[0]
+        assert len(corpus) == len(stores[label])
+        last = len(corpus) - 1
+        assert corpus.row(last)["resumen_explicativo"] == f"{label} resumen_explicativo {last}"
+    assert os.listdir(tmp_path) == ["corpus.bin"]
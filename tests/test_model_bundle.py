@@ -0,0 +1,70 @@
+import json
+import os
+
+import pytest
+
+from app import model_bundle
+from app.config import Config
+from app.model_bundle import ModelBundleError
+from app.models import reranker
+
+RERANKER = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"
+EMBEDDER = "paraphrase-multilingual-mpnet-base-v2"
+
+
+@pytest.fixture
+def reranker_bundle(tmp_path):
+    return model_bundle.pack(RERANKER, "1", str(tmp_path), kind=model_bundle.CROSS_ENCODER)
+
+
+def test_cross_encoder_bundle_loads_from_the_bundle_directory(reranker_bundle):
+    model, info = model_bundle.load_cross_encoder(RERANKER, reranker_bundle, max_length=512)
+
+    assert model.name == os.path.join(reranker_bundle, model_bundle.MODEL_SUBDIR)
+    assert info["version"] == "1"
+    assert model_bundle.read_manifest(reranker_bundle)["kind"] == model_bundle.CROSS_ENCODER
+
+
+def test_cross_encoder_bundle_with_a_modified_file_is_rejected(reranker_bundle):
+    with open(os.path.join(reranker_bundle, model_bundle.MODEL_SUBDIR, "config.json"), "w") as f:
+        json.dump({"name": "otro"}, f)
+
+    with pytest.raises(ModelBundleError, match="modificados"):
+        model_bundle.load_cross_encoder(RERANKER, reranker_bundle)
+
+
+def test_bundle_of_another_kind_or_model_is_rejected(tmp_path, reranker_bundle):
+    embedding_bundle = model_bundle.pack(EMBEDDER, "1", str(tmp_path))
+
+    with pytest.raises(ModelBundleError, match="tipo 'embedding'"):
+        model_bundle.load_cross_encoder(EMBEDDER, embedding_bundle)
+    with pytest.raises(ModelBundleError, match="tipo 'cross-encoder'"):
+        model_bundle.load_embedding_model(RERANKER, reranker_bundle)
+    with pytest.raises(ModelBundleError, match="RERANKER_MODEL"):
+        model_bundle.load_cross_encoder("otro/reranker", reranker_bundle)
+
+
+def test_required_bundle_refuses_a_reranker_without_one(monkeypatch):
+    monkeypatch.setattr(Config, "RERANKER_MODEL", RERANKER)
+    monkeypatch.setattr(Config, "RERANKER_BUNDLE_PATH", "")
+    monkeypatch.setattr(Config, "MODEL_BUNDLE_REQUIRED", True)
+
+    with pytest.raises(ModelBundleError, match="RERANKER_BUNDLE_PATH"):
+        reranker.load_reranker()
+
+
+def test_load_reranker_uses_the_configured_bundle(monkeypatch, reranker_bundle):
+    monkeypatch.setattr(Config, "RERANKER_MODEL", RERANKER)
+    monkeypatch.setattr(Config, "RERANKER_BUNDLE_PATH", reranker_bundle)
+    monkeypatch.setattr(Config, "MODEL_BUNDLE_REQUIRED", True)
+
+    loaded = reranker.load_reranker()
+
+    assert loaded.model.name == os.path.join(reranker_bundle, model_bundle.MODEL_SUBDIR)
+
+
+def test_load_reranker_is_disabled_without_a_model(monkeypatch):
+    monkeypatch.setattr(Config, "RERANKER_MODEL", "")
+    monkeypatch.setattr(Config, "MODEL_BUNDLE_REQUIRED", True)
+
+    assert reranker.load_reranker() is None
@@ -0,0 +1,21 @@
+import os
+import subprocess
+import sys
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(TESTS_DIR)
+
+
+def test_harness_runs_without_info_records(tmp_path):
+    # LOG_LEVEL=INFO en el entorno, como al servir: el arnés debe bajarlo igual
+    env = dict(os.environ, LOG_LEVEL="INFO", LOG_FORMAT="json",
+               PYTHONPATH=os.pathsep.join([os.path.join(TESTS_DIR, "fakes"), ROOT]))
+    out = subprocess.run([sys.executable, "-m", "tools.regression", "--repeat", "1",
+                          "--baseline", str(tmp_path / "baseline.json")],
+                         capture_output=True, text=True, env=env, cwd=ROOT, timeout=300)
+
+    assert out.returncode == 0, out.stderr[-2000:]
+    assert "Primera ejecución" in out.stdout
+    output = out.stdout + out.stderr
+    assert '"level": "INFO"' not in output
+    assert '"level": "DEBUG"' not in output
@@ -0,0 +1,172 @@
+import threading
+import time
+
+import pytest
+
+from app import metrics
+from app.single_flight import SingleFlight
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("la condición no se cumplió a tiempo")
+        time.sleep(0.001)
+
+
+class BlockingCall:
+    """fn de prueba: bloquea hasta release() y cuenta sus ejecuciones."""
+
+    def __init__(self, result="líder", error=None):
+        self.result = result
+        self.error = error
+        self.calls = 0
+        self.started = threading.Event()
+        self._release = threading.Event()
+
+    def __call__(self):
+        self.calls += 1
+        self.started.set()
+        assert self._release.wait(5)
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+    def release(self):
+        self._release.set()
+
+
+def run_in_thread(fn):
+    outcome = {}
+
+    def target():
+        try:
+            outcome["value"] = fn()
+        except BaseException as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=target)
+    thread.start()
+    return thread, outcome
+
+
+def start_leader(group, key, call):
+    thread, outcome = run_in_thread(lambda: group.do(key, call))
+    assert call.started.wait(5)
+    return thread, outcome
+
+
+def followers_of(group, key):
+    with group._lock:
+        call = group._calls.get(key)
+        return call.followers if call else 0
+
+
+def test_followers_share_the_leader_result_and_key_is_released():
+    group = SingleFlight("test_share")
+    leader_call = BlockingCall()
+    leader, leader_out = start_leader(group, "k", leader_call)
+    followers = [run_in_thread(lambda: group.do("k", lambda: pytest.fail("el seguidor no debe ejecutar")))
+                 for _ in range(3)]
+    wait_until(lambda: followers_of(group, "k") == 3)
+    assert group.in_flight() == 1
+
+    leader_call.release()
+    leader.join(5)
+    for thread, _ in followers:
+        thread.join(5)
+
+    assert leader_out["value"] == ("líder", False)
+    assert [out["value"] for _, out in followers] == [("líder", True)] * 3
+    assert leader_call.calls == 1
+    assert group.in_flight() == 0
+    # Terminada, la clave se libera: la siguiente llamada vuelve a ejecutar
+    assert group.do("k", lambda: "otra") == ("otra", False)
+
+
+def test_leader_exception_propagates_to_followers():
+    group = SingleFlight("test_error")
+    leader_call = BlockingCall(error=ValueError("falló el líder"))
+    leader, leader_out = start_leader(group, "k", leader_call)
+    follower, follower_out = run_in_thread(lambda: group.do("k", lambda: "no"))
+    wait_until(lambda: followers_of(group, "k") == 1)
+
+    leader_call.release()
+    leader.join(5)
+    follower.join(5)
+
+    assert isinstance(leader_out["error"], ValueError)
+    assert follower_out["error"] is leader_out["error"]
+    assert group.in_flight() == 0
+
+
+def test_follower_timeout_executes_locally():
+    group = SingleFlight("test_timeout")
+    before = metrics.get("singleflight.test_timeout.follower_timeouts")
+    leader_call = BlockingCall()
+    leader, leader_out = start_leader(group, "k", leader_call)
+
+    t0 = time.perf_counter()
+    result = group.do("k", lambda: "local", timeout=0.05)
+    waited = time.perf_counter() - t0
+
+    assert result == ("local", False)
+    assert waited < 2
+    assert metrics.get("singleflight.test_timeout.follower_timeouts") == before + 1
+    # El líder sigue su curso y libera la clave al terminar
+    assert group.in_flight() == 1
+    leader_call.release()
+    leader.join(5)
+    assert leader_out["value"] == ("líder", False)
+    assert group.in_flight() == 0
+
+
+def test_different_keys_do_not_coalesce():
+    group = SingleFlight("test_keys")
+    leader_call = BlockingCall()
+    leader, _ = start_leader(group, "a", leader_call)
+
+    assert group.do("b", lambda: "b") == ("b", False)
+
+    leader_call.release()
+    leader.join(5)
+
+
+@pytest.fixture
+def rag(monkeypatch):
+    import app.query as query_module
+
+    rag = query_module.query_rag_system
+    monkeypatch.setattr(query_module.Config, "QUERY_COALESCING", True)
+    return rag
+
+
+def test_query_rag_coalesces_only_requests_with_the_same_budget(rag, monkeypatch):
+    call = BlockingCall()
+    summary = {"request_id": "líder", "route": "stub", "kb_version": 1, "degradations": ["skip_llm"]}
+    executions = []
+
+    def fake_admitted(query_text):
+        executions.append(query_text)
+        if len(executions) == 1:
+            call()
+        return ("respuesta", 1.0, True), summary
+
+    monkeypatch.setattr(rag, "_admitted_query_rag", fake_admitted)
+    assert rag.coalesce_key("Artículo 186", 5000) != rag.coalesce_key("Artículo 186", None)
+    assert rag.coalesce_key("Artículo 186", 5000) == rag.coalesce_key("  artículo 186 ", 5000)
+
+    leader, leader_out = run_in_thread(lambda: rag.query_rag("artículo 186", budget_ms=5000))
+    assert call.started.wait(5)
+    key = rag.coalesce_key("artículo 186", 5000)
+    same_budget, same_out = run_in_thread(lambda: rag.query_rag("artículo 186", budget_ms=5000))
+    wait_until(lambda: followers_of(rag.inflight, key) == 1)
+    # Sin plazo: no comparte la ejecución (posiblemente degradada) del líder con plazo
+    assert rag.query_rag("artículo 186", budget_ms=0) == ("respuesta", 1.0, True)
+
+    call.release()
+    leader.join(5)
+    same_budget.join(5)
+    assert same_out["value"] == leader_out["value"] == ("respuesta", 1.0, True)
+    assert len(executions) == 2
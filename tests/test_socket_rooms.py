@@ -0,0 +1,81 @@
+import pytest
+
+QUERY = "Artículo 186 de la LEY 100 DE 1993"
+
+
+@pytest.fixture
+def connect(flask_app):
+    from app import socketio
+
+    clients = []
+
+    def connect(auth=None):
+        client = socketio.test_client(flask_app, auth=auth)
+        clients.append(client)
+        return client, connection_client_id(client)
+
+    yield connect
+    for client in clients:
+        client.disconnect()
+
+
+def connection_client_id(client):
+    events = [e for e in client.get_received() if e["name"] == "connection_response"]
+    assert len(events) == 1
+    return events[0]["args"][0]["client_id"]
+
+
+def final_responses(client):
+    return [e["args"][0] for e in client.get_received() if e["name"] == "final_response"]
+
+
+def post_query(flask_app, client_id):
+    return flask_app.test_client().post("/query", json={"query": QUERY}, headers={"X-Client-Id": client_id})
+
+
+def test_each_connection_gets_its_own_server_issued_token(connect):
+    _, first = connect()
+    _, second = connect()
+
+    assert first and second and first != second
+
+
+def test_only_the_token_owner_receives_the_response(flask_app, connect):
+    owner, token = connect()
+    other, _ = connect()
+
+    response = post_query(flask_app, token)
+
+    assert response.status_code == 200
+    assert [r["trace_id"] for r in final_responses(owner)] == [response.get_json()["trace_id"]]
+    assert final_responses(other) == []
+
+
+def test_a_chosen_or_forged_client_id_does_not_join_another_room(flask_app, connect):
+    _, token = connect()
+    nonce = token.rpartition(".")[0]
+    chosen, chosen_id = connect(auth={"client_id": "cliente-7"})
+    forged, forged_id = connect(auth={"client_id": f"{nonce}.{'0' * 64}"})
+
+    assert chosen_id != "cliente-7"
+    assert forged_id != token
+    assert post_query(flask_app, token).status_code == 200
+    assert final_responses(chosen) == []
+    assert final_responses(forged) == []
+
+
+def test_reconnecting_with_an_issued_token_rejoins_its_room(flask_app, connect):
+    _, token = connect()
+    again, again_id = connect(auth={"client_id": token})
+
+    assert again_id == token
+    assert post_query(flask_app, token).status_code == 200
+    assert len(final_responses(again)) == 1
+
+
+@pytest.mark.parametrize("client_id", ["cliente-7", "abc.def"])
+def test_query_rejects_a_client_id_the_server_did_not_issue(flask_app, client_id):
+    response = post_query(flask_app, client_id)
+
+    assert response.status_code == 400
+    assert "X-Client-Id" in response.get_json()["error"]
@@ -0,0 +1,76 @@
+import importlib
+import json
+import os
+
+import pytest
+
+
+@pytest.fixture(scope="module")
+def vdb():
+    # Import diferido: construye el índice de prueba en DATA_DIR (ver conftest.py)
+    return importlib.import_module("app.models.vector_db")
+
+
+@pytest.fixture
+def rebuilds(vdb, monkeypatch):
+    calls = []
+    monkeypatch.setattr(vdb.VectorDB, "create_index_from_xlsx", lambda self: calls.append(self))
+    return calls
+
+
+def test_index_artifacts_live_under_data_dir(vdb):
+    assert vdb.DATA_DIR == os.environ["DATA_DIR"]
+    assert vdb.FAISS_INDEX_FILE.startswith(vdb.DATA_DIR)
+    assert os.path.exists(vdb.INDEX_MANIFEST_FILE)
+
+
+def test_second_start_with_matching_manifest_loads_saved_index(vdb, rebuilds):
+    serving = vdb.vector_db.current
+
+    db = vdb.VectorDB()
+
+    assert rebuilds == []
+    assert os.path.exists(vdb.FAISS_INDEX_FILE)
+    assert db.index.ntotal == serving.index.ntotal
+    assert len(db.corpus) == len(serving.corpus)
+
+
+def test_changed_data_fingerprint_rebuilds(vdb, rebuilds, monkeypatch):
+    signature = vdb.VectorDB._index_signature
+    monkeypatch.setattr(vdb.VectorDB, "_index_signature",
+                        lambda self: {**signature(self), "data": {"otro.xlsx": "0" * 64}})
+
+    vdb.VectorDB()
+
+    assert len(rebuilds) == 1
+
+
+def test_matching_manifest_reuses_corpus_file_without_reading_data(vdb, rebuilds, monkeypatch):
+    assert os.path.dirname(vdb.CORPUS_FILE) == vdb.INDEX_DIR
+    with open(vdb.INDEX_MANIFEST_FILE, encoding="utf-8") as f:
+        entry = json.load(f)["corpus"]
+    assert entry["file"] == "corpus.bin"
+    mtime = os.stat(vdb.CORPUS_FILE).st_mtime_ns
+
+    def no_reads(directory):
+        raise AssertionError("no se deben releer los archivos de datos")
+
+    monkeypatch.setattr(vdb, "iter_corpus", no_reads)
+    db = vdb.VectorDB()
+
+    assert rebuilds == []
+    assert db.corpus.path == vdb.CORPUS_FILE
+    assert len(db.corpus) == entry["rows"]
+    assert os.stat(vdb.CORPUS_FILE).st_mtime_ns == mtime
+
+
+def test_damaged_corpus_file_is_rebuilt_from_data(vdb, rebuilds):
+    with open(vdb.CORPUS_FILE, "ab") as f:
+        f.write(b"\0")
+
+    db = vdb.VectorDB()
+
+    assert rebuilds == []
+    assert len(db.corpus) == len(vdb.vector_db.current.corpus)
+    with open(vdb.INDEX_MANIFEST_FILE, encoding="utf-8") as f:
+        assert json.load(f)["corpus"]["bytes"] == os.path.getsize(vdb.CORPUS_FILE)
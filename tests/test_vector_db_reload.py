@@ -0,0 +1,129 @@
+import importlib
+import threading
+import time
+
+import pytest
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("la condición no se cumplió a tiempo")
+        time.sleep(0.001)
+
+
+class FakeIndex:
+    ntotal = 1
+
+
+class FakeSnapshot:
+    """Instantánea mínima que VectorDBHandle.reload acepta como válida."""
+
+    index = FakeIndex()
+    corpus = ["artículo"]
+
+    def expected_vectors(self):
+        return 1
+
+
+class Builds:
+    """Sustituto de VectorDB(): cuenta construcciones y puede bloquearlas hasta release()."""
+
+    def __init__(self, requests=None):
+        self.requests = requests
+        # Pedidos vistos al empezar cada construcción (la base lee los datos en ese momento)
+        self.seen = []
+        self.active = 0
+        self.max_active = 0
+        self.started = threading.Semaphore(0)
+        self._release = threading.Event()
+        self._release.set()
+        self._lock = threading.Lock()
+
+    def block(self):
+        self._release.clear()
+
+    def release(self):
+        self._release.set()
+
+    def __call__(self):
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            self.seen.append(self.requests[0] if self.requests else None)
+        self.started.release()
+        assert self._release.wait(5)
+        with self._lock:
+            self.active -= 1
+        return FakeSnapshot()
+
+
+@pytest.fixture(scope="module")
+def vdb():
+    # Import diferido: construye el índice de prueba en DATA_DIR (ver conftest.py)
+    return importlib.import_module("app.models.vector_db")
+
+
+@pytest.fixture
+def handle(vdb):
+    return vdb.VectorDBHandle(FakeSnapshot())
+
+
+def reload_threads_alive():
+    return any(t.name == "kb-reload" and t.is_alive() for t in threading.enumerate())
+
+
+def test_requests_during_a_reload_coalesce_into_one_more_reload(vdb, handle, monkeypatch):
+    builds = Builds()
+    monkeypatch.setattr(vdb, "VectorDB", builds)
+    builds.block()
+
+    assert handle.reload_async() is True
+    assert builds.started.acquire(timeout=5)
+    assert [handle.reload_async() for _ in range(5)] == [False] * 5
+    builds.release()
+    wait_until(lambda: not reload_threads_alive())
+
+    assert len(builds.seen) == 2
+    assert builds.max_active == 1
+    assert handle.version == 3
+    assert handle.reload_async() is True
+    wait_until(lambda: len(builds.seen) == 3)
+
+
+def test_request_before_the_worker_starts_building_does_not_start_another(vdb, handle, monkeypatch):
+    builds = Builds()
+    monkeypatch.setattr(vdb, "VectorDB", builds)
+    builds.block()
+
+    assert [handle.reload_async(), handle.reload_async()] == [True, False]
+    builds.release()
+    wait_until(lambda: not reload_threads_alive())
+
+    assert len(builds.seen) == 2
+    assert builds.max_active == 1
+
+
+def test_no_request_is_lost_when_it_races_the_end_of_a_reload(vdb, handle, monkeypatch):
+    requests = [0]
+    builds = Builds(requests)
+    monkeypatch.setattr(vdb, "VectorDB", builds)
+
+    def request_reloads(count):
+        for _ in range(count):
+            with lock:
+                requests[0] += 1
+            handle.reload_async()
+
+    lock = threading.Lock()
+    threads = [threading.Thread(target=request_reloads, args=(200,)) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(10)
+    wait_until(lambda: not reload_threads_alive(), timeout=10)
+
+    # La última construcción empezó después del último pedido y nunca hubo dos a la vez
+    assert builds.seen[-1] == requests[0] == 800
+    assert builds.max_active == 1
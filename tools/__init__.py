@@ -0,0 +1,4 @@
+"""Herramientas de línea de comandos para pruebas de regresión y rendimiento de AzuSENA.
+
+Se ejecutan desde la raíz del repositorio, por ejemplo: python -m tools.regression
+"""
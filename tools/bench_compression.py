@@ -0,0 +1,95 @@
+"""Memoria y recall de la compresión de vectores (VECTOR_COMPRESSION) con la batería de consultas.
+
+Construye la base en modo plano y, con los mismos vectores, un CompressedStore
+por cada combinación de --dtypes x --dims. Para cada consulta de
+data/regression/queries.json (enriquecida como en get_top_results) compara el
+top-k exacto del índice plano con:
+
+  - primera pasada: solo vectores comprimidos, sin reordenar;
+  - reordenado: primera pasada de top_k * --rescore-factor y reordenamiento exacto
+    con los vectores completos en memmap (lo que usa VectorDB).
+
+Uso:
+    python -m tools.bench_compression --dtypes fp16 int8 --dims 0 256 128 --top-k 10
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import faiss
+import numpy as np
+
+from app.models.compression import CompressedStore
+from app.models.vector_db import DATA_DIR, encode_queries, vector_db
+from tools.stats import summarize
+
+QUERIES_FILE = os.path.join(DATA_DIR, "regression", "queries.json")
+
+
+def query_embeddings(db, queries):
+    embeddings = encode_queries([db._enhance_query_with_keywords(q) for q in queries])
+    embeddings = np.ascontiguousarray(embeddings, dtype="float32")
+    faiss.normalize_L2(embeddings)
+    return embeddings
+
+
+def recall(truth, results):
+    k = len(truth[0])
+    return float(np.mean([len(set(t) & set(r)) / k for t, r in zip(truth, results)]))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Memoria ahorrada y recall de la compresión de vectores")
+    parser.add_argument("--dtypes", nargs="+", default=["fp16", "int8"])
+    parser.add_argument("--dims", type=int, nargs="+", default=[0, 256, 128], help="Dimensiones PCA (0 = sin PCA)")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--rescore-factor", type=int, default=4)
+    args = parser.parse_args(argv)
+
+    db = vector_db.current
+    if db.store is not None:
+        print("La base ya está comprimida; ejecutar con VECTOR_COMPRESSION vacío", file=sys.stderr)
+        return 1
+    with open(QUERIES_FILE, encoding="utf-8") as f:
+        queries = [item["query"] for item in json.load(f)]
+    embeddings = query_embeddings(db, queries)
+    k = min(args.top_k, db.index.ntotal)
+    _, exact = db.index.search(embeddings, k)
+    truth = [row.tolist() for row in exact]
+    full = db.index.reconstruct_n(0, db.index.ntotal)
+
+    print(f"{db.index.ntotal} vectores (dim {db.index.d}), {len(queries)} consultas, top-{k}, "
+          f"reordenamiento x{args.rescore_factor}")
+    print(f"{'tipo':<6}{'PCA':>6}{'RAM MB':>9}{'plano MB':>10}{'ahorro':>8}"
+          f"{'recall 1ª':>11}{'recall':>8}{'p50 µs':>9}{'p95 µs':>9}")
+    workdir = tempfile.mkdtemp(prefix="azusena_pca_")
+    try:
+        for dtype in args.dtypes:
+            for dim in args.dims:
+                store = CompressedStore.build(full, os.path.join(workdir, f"{dtype}_{dim}.npy"), dtype, dim,
+                                              args.rescore_factor)
+                report = store.memory_report()
+                reduced = store._reduce(embeddings, store.projection, center=False)
+                _, first_pass = store.index.search(reduced, k)
+                samples, rescored = [], []
+                for query in embeddings:
+                    t0 = time.perf_counter()
+                    _, ids = store.search(query[None, :], k)
+                    samples.append((time.perf_counter() - t0) * 1e6)
+                    rescored.append(ids[0].tolist())
+                stats = summarize(samples)
+                print(f"{dtype:<6}{store.index.d if store.projection is not None else '-':>6}"
+                      f"{report['compressed_bytes'] / 1e6:>9.2f}{report['flat_bytes'] / 1e6:>10.2f}"
+                      f"{report['saved_pct']:>7.1f}%{recall(truth, first_pass.tolist()):>11.3f}"
+                      f"{recall(truth, rescored):>8.3f}{stats['p50']:>9.1f}{stats['p95']:>9.1f}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
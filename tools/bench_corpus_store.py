@@ -0,0 +1,135 @@
+"""Memoria del corpus al servir: DataFrame de pandas vs almacén compacto (corpus_store.py).
+
+Genera un corpus sintético de --scale copias de data/*.xlsx (una "ley" distinta
+por copia, como tools.bench_ingest) y, en un subproceso por modo, carga las filas
+y mide el RSS que queda en uso una vez liberada la ingesta:
+
+  - dataframe: pd.DataFrame con todas las columnas como objetos str (patrón previo);
+  - ram:       CorpusStore en memoria (códigos categóricos + arena UTF-8);
+  - mmap:      CorpusStore escrito a disco y abierto con np.memmap (CORPUS_MMAP).
+
+RssAnon es memoria privada del proceso; RssFile son páginas del archivo mapeado,
+compartidas entre procesos y recuperables por el sistema. Se mide al cargar, con
+las tarjetas de artículo construidas (app/models/article_cards.py, como al servir;
+solo en los modos del almacén) y después de leer --touch filas al azar, junto con
+el costo por fila.
+
+Uso:
+    python -m tools.bench_corpus_store --scale 100
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from tools.bench_ingest import build_corpus
+
+CHILD_SNIPPET = r"""
+import ctypes, gc, json, os, sys, time
+import numpy as np
+mode, directory, store_path, touch = sys.argv[1], sys.argv[2], sys.argv[3], int(sys.argv[4])
+if mode == "dataframe":
+    import pandas as pd
+from app.models.corpus_store import CorpusStore
+from app.models.ingest import REQUIRED_COLUMNS, iter_corpus
+
+def rss():
+    gc.collect()
+    try:
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except OSError:
+        pass
+    status = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key in ("VmRSS", "RssAnon", "RssFile"):
+                status[key] = int(value.split()[0]) * 1024
+    return status
+
+base = rss()
+if mode == "dataframe":
+    rows = list(iter_corpus(directory))
+    corpus = pd.DataFrame(rows, columns=REQUIRED_COLUMNS)
+    del rows
+    read = lambda pos: corpus.iloc[pos]
+    size = len(corpus)
+else:
+    corpus = CorpusStore.build(iter_corpus(directory))
+    if mode == "mmap":
+        corpus.save(store_path)
+        del corpus
+        corpus = CorpusStore.open(store_path)
+    read = corpus.row
+    size = len(corpus)
+loaded = rss()
+cards = None
+if mode != "dataframe":
+    from app.models.article_cards import build_cards
+    cards = build_cards(corpus)
+carded = rss()
+
+positions = np.random.default_rng(0).integers(0, size, touch).tolist()
+t0 = time.perf_counter()
+for pos in positions:
+    row = read(pos)
+    row.get("texto_del_articulo")
+    if cards is not None:
+        cards[pos].snippet
+per_row_us = (time.perf_counter() - t0) / max(touch, 1) * 1e6
+touched = rss()
+print(json.dumps({"rows": size, "base": base, "loaded": loaded, "carded": carded, "touched": touched,
+                  "per_row_us": per_row_us, "cards": cards is not None}))
+"""
+
+MODES = ("dataframe", "ram", "mmap")
+
+
+def run_child(mode, directory, store_path, touch):
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    env = dict(os.environ, LOG_LEVEL="WARNING", PYTHONPATH=os.pathsep.join(filter(None, [root, os.environ.get("PYTHONPATH")])))
+    out = subprocess.run([sys.executable, "-c", CHILD_SNIPPET, mode, directory, store_path, str(touch)],
+                         capture_output=True, text=True, env=env, cwd=root)
+    if out.returncode != 0:
+        raise RuntimeError(out.stderr[-2000:])
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="RSS del corpus al servir: DataFrame vs almacén compacto")
+    parser.add_argument("--scale", type=int, default=100, help="Copias del corpus real (una ley por copia)")
+    parser.add_argument("--touch", type=int, default=5000, help="Filas leídas al azar después de cargar")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    args = parser.parse_args(argv)
+
+    from app.models.ingest import iter_corpus
+    from app.models.vector_db import DATA_DIR
+
+    rows_per_file = sum(1 for _ in iter_corpus(DATA_DIR))
+    directory = tempfile.mkdtemp(prefix="azusena_corpus_")
+    mb = 1024 * 1024
+    try:
+        build_corpus(directory, args.scale, rows_per_file, "csv")
+        store_path = os.path.join(directory, "corpus.bin")
+        print(f"{'modo':<11}{'filas':>9}{'RSS MB':>9}{'anon MB':>9}{'archivo MB':>12}{'tarjetas MB':>13}"
+              f"{'RSS tras leer':>15}{'anon tras leer':>16}{'µs/fila':>9}")
+        for mode in args.modes:
+            r = run_child(mode, directory, store_path, args.touch)
+            delta = {key: (r["loaded"][key] - r["base"][key]) / mb for key in r["base"]}
+            after = {key: (r["touched"][key] - r["base"][key]) / mb for key in r["base"]}
+            # Memoria privada que agregan las tarjetas sobre el corpus cargado
+            cards = f"{(r['carded']['RssAnon'] - r['loaded']['RssAnon']) / mb:.1f}" if r["cards"] else "-"
+            print(f"{mode:<11}{r['rows']:>9}{delta['VmRSS']:>9.1f}{delta['RssAnon']:>9.1f}{delta['RssFile']:>12.1f}"
+                  f"{cards:>13}{after['VmRSS']:>15.1f}{after['RssAnon']:>16.1f}{r['per_row_us']:>9.1f}")
+        if os.path.exists(store_path):
+            print(f"\ncorpus.bin: {os.path.getsize(store_path) / mb:.1f} MB")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,151 @@
+"""Benchmark de búsqueda vectorial restringida a una fuente (ley) en un corpus multi-ley.
+
+Genera un corpus sintético de --laws leyes con --articles artículos cada una.
+Todas las leyes comparten los mismos --topics temas, así que para una consulta
+sobre "calidad en la ley X" compiten los artículos de calidad de todas las
+leyes. Para cada consulta se conoce el top-k exacto dentro de la ley pedida y
+se compara:
+
+  - post-filtro: buscar top-k en todo el índice y descartar otras fuentes
+    (comportamiento previo de get_top_results);
+  - post-filtro xN: pedir top-k*N y luego filtrar;
+  - selector de ids: solo se puntúan los vectores de la fuente (VectorDB._search_params);
+  - sub-índice por fuente: un IndexFlatIP por ley.
+
+No depende del modelo de embeddings: los vectores se generan con numpy.
+
+Uso:
+    python -m tools.bench_filtered_search --laws 60 --articles 300 --queries 500
+"""
+import argparse
+import sys
+import time
+
+import faiss
+import numpy as np
+
+from app.models.facets import FacetIndex
+from tools.stats import summarize
+
+
+def build_corpus(laws, articles, topics, dim, law_weight, noise, seed):
+    """Embeddings normalizados: tema compartido + componente propio de la ley + ruido."""
+    rng = np.random.default_rng(seed)
+    topic_vecs = rng.standard_normal((topics, dim)).astype("float32")
+    law_vecs = rng.standard_normal((laws, dim)).astype("float32")
+    law_ids = np.repeat(np.arange(laws), articles)
+    topic_ids = rng.integers(0, topics, size=laws * articles)
+    vectors = (topic_vecs[topic_ids] + law_weight * law_vecs[law_ids]
+               + noise * rng.standard_normal((laws * articles, dim)).astype("float32"))
+    faiss.normalize_L2(vectors)
+    return vectors, law_ids, topic_ids, topic_vecs, law_vecs
+
+
+def build_queries(n, laws, topic_vecs, law_vecs, law_weight, noise, seed):
+    rng = np.random.default_rng(seed + 1)
+    target_laws = rng.integers(0, laws, size=n)
+    target_topics = rng.integers(0, len(topic_vecs), size=n)
+    dim = topic_vecs.shape[1]
+    queries = (topic_vecs[target_topics] + 0.5 * law_weight * law_vecs[target_laws]
+               + noise * rng.standard_normal((n, dim)).astype("float32"))
+    faiss.normalize_L2(queries)
+    return queries, target_laws
+
+
+def _timed(fn, queries, target_laws):
+    samples, outputs = [], []
+    for q, law in zip(queries, target_laws):
+        t0 = time.perf_counter()
+        outputs.append(fn(q[None, :], law))
+        samples.append((time.perf_counter() - t0) * 1e6)
+    return summarize(samples), outputs
+
+
+def run(args):
+    vectors, law_ids, _, topic_vecs, law_vecs = build_corpus(
+        args.laws, args.articles, args.topics, args.dim, args.law_weight, args.noise, args.seed)
+    queries, target_laws = build_queries(
+        args.queries, args.laws, topic_vecs, law_vecs, args.law_weight, args.noise, args.seed)
+    k = args.top_k
+
+    index = faiss.IndexFlatIP(args.dim)
+    index.add(vectors)
+
+    # Mismas estructuras que VectorDB: facetas -> selector de ids por fuente
+    sources = [f"ley {i} de 2020" for i in range(args.laws)]
+    facets = FacetIndex({"fuente": [sources[i] for i in law_ids], "tema": [""] * len(law_ids),
+                         "subtema": [""] * len(law_ids), "categorias": [""] * len(law_ids)}, len(law_ids))
+    selectors = {}
+    for law in range(args.laws):
+        ids = facets.positions({"fuente": sources[law]}).astype(np.int64)
+        selector = faiss.IDSelectorBatch(ids)
+        selectors[law] = (faiss.SearchParameters(sel=selector), selector)
+
+    sub_indexes = {}
+    for law in range(args.laws):
+        ids = np.flatnonzero(law_ids == law)
+        sub = faiss.IndexIDMap(faiss.IndexFlatIP(args.dim))
+        sub.add_with_ids(vectors[ids], ids.astype(np.int64))
+        sub_indexes[law] = sub
+
+    # Verdad de referencia: top-k exacto dentro de la ley pedida
+    truth = []
+    for q, law in zip(queries, target_laws):
+        ids = np.flatnonzero(law_ids == law)
+        scores = vectors[ids] @ q
+        truth.append(set(ids[np.argsort(-scores)[:k]].tolist()))
+
+    def post_filter(factor):
+        def search(q, law):
+            _, idx = index.search(q, k * factor)
+            return [i for i in idx[0] if i >= 0 and law_ids[i] == law][:k]
+        return search
+
+    def with_selector(q, law):
+        _, idx = index.search(q, k, params=selectors[law][0])
+        return [i for i in idx[0] if i >= 0]
+
+    def with_sub_index(q, law):
+        _, idx = sub_indexes[law].search(q, k)
+        return [i for i in idx[0] if i >= 0]
+
+    methods = [
+        ("post-filtro (previo)", post_filter(1)),
+        (f"post-filtro x{args.oversample}", post_filter(args.oversample)),
+        ("selector de ids (FAISS)", with_selector),
+        ("sub-índice por fuente", with_sub_index),
+    ]
+
+    results = []
+    for name, fn in methods:
+        stats, outputs = _timed(fn, queries, target_laws)
+        recall = np.mean([len(truth[i] & set(out)) / k for i, out in enumerate(outputs)])
+        returned = np.mean([len(out) for out in outputs])
+        results.append((name, stats, recall, returned))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Latencia y recall de búsqueda restringida por fuente")
+    parser.add_argument("--laws", type=int, default=60, help="Número de leyes (fuentes)")
+    parser.add_argument("--articles", type=int, default=300, help="Artículos por ley")
+    parser.add_argument("--topics", type=int, default=40, help="Temas compartidos entre leyes")
+    parser.add_argument("--dim", type=int, default=768, help="Dimensión de los embeddings")
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--oversample", type=int, default=10, help="Factor de sobre-muestreo del post-filtro")
+    parser.add_argument("--law-weight", type=float, default=0.2, help="Peso del componente propio de cada ley")
+    parser.add_argument("--noise", type=float, default=0.6)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    print(f"Corpus sintético: {args.laws} leyes x {args.articles} artículos = {args.laws * args.articles} vectores "
+          f"(dim {args.dim}), {args.queries} consultas restringidas a una ley, top-{args.top_k}")
+    print(f"{'método':<28}{'p50 µs':>10}{'p95 µs':>10}{'recall@k':>10}{'devueltos':>11}")
+    for name, stats, recall, returned in run(args):
+        print(f"{name:<28}{stats['p50']:>10.1f}{stats['p95']:>10.1f}{recall:>10.3f}{returned:>11.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
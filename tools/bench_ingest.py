@@ -0,0 +1,141 @@
+"""Benchmark de memoria de la ingesta: carga completa en pandas vs ingesta por bloques.
+
+Genera un corpus sintético de --files archivos (una "ley" por archivo) replicando
+las filas de data/*.xlsx y lo ingiere en un subproceso por modo, para medir el
+pico de RSS de cada uno:
+
+  - completo: pd.read_excel/read_csv de todos los archivos, texto_completo para
+    todas las filas y un solo model.encode (patrón previo);
+  - bloques: app.models.ingest.ingest (openpyxl read_only, bloques de
+    INGEST_CHUNK_SIZE filas agregados al índice y al almacén del corpus a
+    medida que llegan, como al servir).
+
+El índice plano crece con el corpus en ambos casos; la columna "transitorio"
+descuenta el tamaño del índice y muestra la memoria de la ingesta en sí.
+
+Con --encoder random los vectores son aleatorios (sin modelo), para aislar la
+memoria del pipeline de la del modelo de embeddings.
+
+Uso:
+    python -m tools.bench_ingest --files 1 10 50 --rows-per-file 300 --encoder random
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+CHILD_SNIPPET = r"""
+import json, resource, sys, time
+import numpy as np
+mode, directory, encoder_name, dim = sys.argv[1], sys.argv[2], sys.argv[3], int(sys.argv[4])
+
+if encoder_name == "random":
+    def encode(texts):
+        rng = np.random.default_rng(len(texts))
+        return rng.standard_normal((len(texts), dim)).astype("float32")
+else:
+    from sentence_transformers import SentenceTransformer
+    model = SentenceTransformer(encoder_name)
+    def encode(texts):
+        return model.encode(texts, convert_to_numpy=True, show_progress_bar=False)
+
+import faiss
+import pandas as pd
+from app.models.corpus_store import CorpusBuilder
+from app.models.ingest import REQUIRED_COLUMNS, data_files, embedding_text, ingest
+
+base_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+t0 = time.perf_counter()
+if mode == "completo":
+    frames = []
+    for path in data_files(directory):
+        frame = pd.read_csv(path) if path.endswith(".csv") else pd.read_excel(path)
+        frame.columns = [c.lower().strip().replace(" ", "_") for c in frame.columns]
+        frames.append(frame)
+    df = pd.concat(frames, ignore_index=True)
+    for col in REQUIRED_COLUMNS:
+        df[col] = df[col].astype(str).str.strip()
+    texts = [embedding_text(row) for row in df[REQUIRED_COLUMNS].to_dict("records")]
+    embeddings = np.ascontiguousarray(encode(texts), dtype="float32")
+    faiss.normalize_L2(embeddings)
+    index = faiss.IndexFlatIP(embeddings.shape[1])
+    index.add(embeddings)
+    rows = len(df)
+else:
+    builder = CorpusBuilder()
+    index, rows = ingest(directory, encode, on_chunk=lambda chunk, counts: builder.extend(chunk))
+    corpus = builder.build()
+elapsed = time.perf_counter() - t0
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+print(json.dumps({"rows": rows, "seconds": elapsed, "peak_rss": peak, "base_rss": base_rss,
+                  "index_bytes": index.ntotal * index.d * 4}))
+"""
+
+
+def build_corpus(directory, files, rows_per_file, fmt):
+    """Escribe `files` archivos con `rows_per_file` filas cada uno a partir de las filas reales."""
+    from openpyxl import Workbook
+    from app.models.ingest import REQUIRED_COLUMNS, iter_corpus
+    from app.models.vector_db import DATA_DIR
+
+    source_rows = list(iter_corpus(DATA_DIR))
+    for n in range(files):
+        rows = [source_rows[(n * rows_per_file + i) % len(source_rows)] for i in range(rows_per_file)]
+        path = os.path.join(directory, f"ley_{n:04d}.{fmt}")
+        if fmt == "csv":
+            import csv
+            with open(path, "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                writer.writerow(REQUIRED_COLUMNS)
+                for row in rows:
+                    writer.writerow([f"ley {n} de 2020" if col == "fuente" else row[col] for col in REQUIRED_COLUMNS])
+        else:
+            workbook = Workbook(write_only=True)
+            sheet = workbook.create_sheet()
+            sheet.append(REQUIRED_COLUMNS)
+            for row in rows:
+                sheet.append([f"ley {n} de 2020" if col == "fuente" else row[col] for col in REQUIRED_COLUMNS])
+            workbook.save(path)
+
+
+def run_child(mode, directory, encoder, dim):
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    env = dict(os.environ, LOG_LEVEL="WARNING", PYTHONPATH=os.pathsep.join(filter(None, [root, os.environ.get("PYTHONPATH")])))
+    out = subprocess.run([sys.executable, "-c", CHILD_SNIPPET, mode, directory, encoder, str(dim)],
+                         capture_output=True, text=True, env=env, cwd=root)
+    if out.returncode != 0:
+        raise RuntimeError(out.stderr[-2000:])
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pico de memoria de la ingesta completa vs por bloques")
+    parser.add_argument("--files", type=int, nargs="+", default=[1, 10, 50], help="Tamaños de corpus (archivos)")
+    parser.add_argument("--rows-per-file", type=int, default=300)
+    parser.add_argument("--format", choices=["xlsx", "csv"], default="xlsx")
+    parser.add_argument("--encoder", default="random",
+                        help="'random' (sin modelo) o el nombre de un modelo de sentence-transformers")
+    parser.add_argument("--dim", type=int, default=768, help="Dimensión con --encoder random")
+    args = parser.parse_args(argv)
+
+    mb = 1024 * 1024
+    print(f"{'archivos':>9}{'filas':>9}  {'modo':<10}{'seg':>8}{'pico MB':>10}{'índice MB':>11}{'transitorio MB':>16}")
+    for files in args.files:
+        directory = tempfile.mkdtemp(prefix="azusena_ingest_")
+        try:
+            build_corpus(directory, files, args.rows_per_file, args.format)
+            for mode in ("completo", "bloques"):
+                r = run_child(mode, directory, args.encoder, args.dim)
+                transient = (r["peak_rss"] - r["base_rss"] - r["index_bytes"]) / mb
+                print(f"{files:>9}{r['rows']:>9}  {mode:<10}{r['seconds']:>8.1f}{r['peak_rss'] / mb:>10.1f}"
+                      f"{r['index_bytes'] / mb:>11.1f}{transient:>16.1f}")
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,166 @@
+"""Benchmark de sobrecarga de registro por solicitud, antes y después del registro asíncrono.
+
+Reproduce el patrón de registro de una consulta a /query:
+  - antes: print y logging.info con f-strings síncronos, incluido el volcado completo
+    del resultado y de filas del DataFrame;
+  - después: logger con formato diferido, encolado en app.logging_setup.
+
+La salida se simula con un sumidero lento (--sink-latency-us por escritura) para
+reproducir una terminal o tubería bajo presión.
+
+Uso:
+    python -m tools.bench_logging --requests 2000 --sink-latency-us 50
+"""
+import argparse
+import io
+import logging
+import sys
+import time
+
+from app.config import Config
+from app import logging_setup
+from tools.stats import summarize
+
+
+class SlowSink(io.TextIOBase):
+    """Flujo de salida que bloquea un tiempo fijo por escritura (libera el GIL, como una E/S real)."""
+
+    def __init__(self, latency_us):
+        self.latency = latency_us / 1e6
+        self.writes = 0
+
+    def write(self, text):
+        self.writes += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+def _sample_payload():
+    text = ("El Sistema de Seguridad Social Integral tiene por objeto garantizar los derechos irrenunciables "
+            "de la persona y la comunidad para obtener la calidad de vida acorde con la dignidad humana. ") * 6
+    row = {
+        "fuente": "LEY 100 DE 1993", "articulo": "186", "tema": "Evaluación de calidad de IPS",
+        "subtema": "Información y mejoramiento", "texto_del_articulo": text,
+        "categorias": "calidad, acreditación, IPS", "resumen_explicativo": text[:300],
+        "texto_completo": text * 2,
+    }
+    try:
+        import pandas as pd
+        row = pd.Series(row)
+    except ImportError:
+        pass
+    result = (f"**Artículo 186**\n\n{text}", 1.0, True)
+    return result, row
+
+
+def legacy_request(log, sink, result, row):
+    """Patrón previo: prints y f-strings evaluados siempre, con volcado del resultado."""
+    query_text = "que dice exactamente el articulo 186 de la ley 100"
+    data = {"query": query_text}
+    print("[PRINT DEBUG] ===== ENDPOINT /query INICIADO =====", file=sink)
+    print(f"[PRINT DEBUG] Datos recibidos: {data}", file=sink)
+    log.info(f"Datos recibidos: {data}")
+    print(f"[PRINT DEBUG] Query extraído: '{query_text}'", file=sink)
+    log.info(f"Query text extraído: '{query_text}'")
+    log.info(f"Consulta recibida: '{query_text}'")
+    log.info(f"Consulta normalizada: {query_text}")
+    log.info("Solicitud de artículo específico detectada: 186")
+    for _ in range(3):
+        log.info(f"Artículo 186 validado correctamente: {row}")
+    log.info(f"Resultados para consulta '{query_text}': 5 encontrados")
+    print(f"[PRINT DEBUG] Resultado de query_rag: {result}", file=sink)
+    log.info(f"Resultado de query_rag: {type(result)} - {result}")
+    print(f"[PRINT DEBUG] Desempaquetado - response: {result[0][:50]}...", file=sink)
+    log.info(f"Desempaquetado - response_text: {type(result[0])}, similarity_score: {result[1]}")
+
+
+def structured_request(log, result, row):
+    """Patrón actual: formato diferido; el volcado del resultado solo existe en DEBUG."""
+    query_text = "que dice exactamente el articulo 186 de la ley 100"
+    data = {"query": query_text}
+    log.debug("Datos recibidos: %s", data)
+    log.info("Consulta normalizada: %s", query_text)
+    log.info("Solicitud de artículo específico detectada: %s", "186")
+    for _ in range(3):
+        log.info("Artículo %s validado correctamente", "186")
+        log.debug("Fila del artículo: %s", row)
+    log.debug("Resultados para consulta '%s': %s encontrados", query_text, 5)
+    log.info("Consulta HTTP procesada", extra={"route": "article", "similarity": result[1],
+                                               "used_kb": result[2], "response_chars": len(result[0])})
+    log.debug("Respuesta completa de query_rag: %r", result)
+
+
+def _time_requests(fn, n):
+    samples = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1e6)
+    return summarize(samples)
+
+
+def run_legacy(n, sink_latency_us, result, row):
+    sink = SlowSink(sink_latency_us)
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    handler = logging.StreamHandler(sink)
+    handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    root.addHandler(handler)
+    root.setLevel(logging.INFO)
+    log = logging.getLogger("bench.legacy")
+    stats = _time_requests(lambda: legacy_request(log, sink, result, row), n)
+    root.removeHandler(handler)
+    return stats
+
+
+def run_structured(n, sink_latency_us, result, row, level, sample_rate):
+    sink = SlowSink(sink_latency_us)
+    Config.LOG_LEVEL = level
+    Config.LOG_LEVELS = ""
+    Config.LOG_FORMAT = "json"
+    Config.LOG_DEBUG_SAMPLE_RATE = sample_rate
+    Config.LOG_QUEUE_SIZE = max(10000, n * 20)
+    logging_setup.setup_logging(stream=sink, force=True)
+    log = logging.getLogger("bench.structured")
+    stats = _time_requests(lambda: structured_request(log, result, row), n)
+    t0 = time.perf_counter()
+    logging_setup.shutdown_logging()
+    stats["drain_ms"] = round((time.perf_counter() - t0) * 1000.0, 1)
+    stats["dropped"] = logging_setup.dropped_records()
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sobrecarga de registro por solicitud")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--sink-latency-us", type=float, default=50.0,
+                        help="Costo simulado de cada escritura en la salida (µs)")
+    args = parser.parse_args(argv)
+
+    result, row = _sample_payload()
+    scenarios = [
+        ("antes: print + f-strings (INFO)", lambda: run_legacy(args.requests, args.sink_latency_us, result, row)),
+        ("después: cola asíncrona (INFO)",
+         lambda: run_structured(args.requests, args.sink_latency_us, result, row, "INFO", 1.0)),
+        ("después: cola asíncrona (DEBUG, muestreo 10%)",
+         lambda: run_structured(args.requests, args.sink_latency_us, result, row, "DEBUG", 0.1)),
+        ("después: cola asíncrona (DEBUG, sin muestreo)",
+         lambda: run_structured(args.requests, args.sink_latency_us, result, row, "DEBUG", 1.0)),
+    ]
+
+    print(f"{args.requests} solicitudes simuladas, sumidero de {args.sink_latency_us} µs por escritura")
+    print(f"{'escenario':<48}{'media µs':>10}{'p50 µs':>10}{'p95 µs':>10}{'p99 µs':>10}  drenado")
+    for name, run in scenarios:
+        stats = run()
+        drain = f"{stats['drain_ms']} ms" if "drain_ms" in stats else "-"
+        print(f"{name:<48}{stats['mean']:>10.1f}{stats['p50']:>10.1f}{stats['p95']:>10.1f}{stats['p99']:>10.1f}  {drain}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
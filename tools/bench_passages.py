@@ -0,0 +1,115 @@
+"""Compara el índice por artículo con el índice por pasajes (INDEX_MODE).
+
+Construye un VectorDB en cada modo sobre data/ y reporta:
+
+  - vectores, tamaño del índice y del mapa pasaje -> artículo, tiempo de construcción;
+  - latencia de get_top_results (embedding + búsqueda + agregación + ponderación)
+    con las consultas de data/regression/queries.json;
+  - cobertura de la cola: para cada artículo más largo que un pasaje se consulta
+    con sus últimas --tail-words palabras y se mide si el artículo aparece en el
+    top-k. En modo 'article' el modelo trunca el texto a su longitud máxima, así
+    que esas colas no se pueden encontrar.
+
+Uso:
+    python -m tools.bench_passages --top-k 5 --tail-queries 200
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import faiss
+import numpy as np
+
+from app.config import Config
+from app.models.ingest import embedding_text
+from app.models.vector_db import DATA_DIR, VectorDB, encode_queries
+from tools.stats import summarize
+
+QUERIES_FILE = os.path.join(DATA_DIR, "regression", "queries.json")
+
+
+def tail_queries(db, tail_words, limit, seed):
+    """(fila, consulta) con el final del texto de los artículos más largos que un pasaje."""
+    candidates = []
+    for pos in range(len(db.corpus)):
+        row = db.corpus.row(pos)
+        words = row['texto_del_articulo'].split()
+        if len(embedding_text(row).split()) > Config.PASSAGE_WORDS and len(words) > tail_words:
+            candidates.append((pos, " ".join(words[-tail_words:])))
+    rng = np.random.default_rng(seed)
+    if len(candidates) > limit:
+        candidates = [candidates[i] for i in sorted(rng.choice(len(candidates), limit, replace=False))]
+    return candidates
+
+
+def build(mode):
+    Config.INDEX_MODE = mode
+    t0 = time.perf_counter()
+    db = VectorDB()
+    return db, time.perf_counter() - t0
+
+
+def evaluate(db, build_s, queries, tails, top_k):
+    samples = []
+    for query in queries:
+        t = time.perf_counter()
+        db.get_top_results(query, top_k=top_k)
+        samples.append((time.perf_counter() - t) * 1000.0)
+
+    hits = 0
+    for pos, text in tails:
+        embedding = np.ascontiguousarray(encode_queries([text]), dtype="float32")
+        faiss.normalize_L2(embedding)
+        _, rows = db._search(embedding, top_k)
+        hits += int(pos in set(rows.tolist()))
+
+    map_bytes = 0 if db.vector_rows is None else db.vector_rows.nbytes + db.row_offsets.nbytes
+    return {
+        "mode": db.mode,
+        "vectors": db.index.ntotal,
+        "index_mb": db.index.ntotal * db.index.d * 4 / (1024 * 1024),
+        "map_kb": map_bytes / 1024,
+        "build_s": build_s,
+        "latency": summarize(samples),
+        "tail_recall": hits / len(tails) if tails else 0.0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Índice por artículo vs por pasajes: tamaño, latencia y cobertura")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=3, help="Repeticiones de la batería de consultas")
+    parser.add_argument("--tail-words", type=int, default=20, help="Palabras finales usadas como consulta de cola")
+    parser.add_argument("--tail-queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    with open(QUERIES_FILE, encoding="utf-8") as f:
+        queries = [item["query"] for item in json.load(f)] * args.repeat
+
+    original_mode = Config.INDEX_MODE
+    try:
+        results, tails = [], None
+        for mode in ("article", "passage"):
+            db, build_s = build(mode)
+            if tails is None:
+                # Dependen solo del corpus: las mismas consultas de cola para ambos modos
+                tails = tail_queries(db, args.tail_words, args.tail_queries, args.seed)
+            results.append(evaluate(db, build_s, queries, tails, args.top_k))
+    finally:
+        Config.INDEX_MODE = original_mode
+
+    print(f"Pasaje: {Config.PASSAGE_WORDS} palabras, solape {Config.PASSAGE_OVERLAP_WORDS}, "
+          f"sobre-muestreo x{Config.PASSAGE_OVERSAMPLE}; {len(queries)} consultas, {len(tails)} consultas de cola")
+    print(f"{'modo':<9}{'vectores':>10}{'índice MB':>11}{'mapa KB':>9}{'constr. s':>11}"
+          f"{'p50 ms':>9}{'p95 ms':>9}{'cola@k':>8}")
+    for r in results:
+        print(f"{r['mode']:<9}{r['vectors']:>10}{r['index_mb']:>11.2f}{r['map_kb']:>9.1f}{r['build_s']:>11.1f}"
+              f"{r['latency']['p50']:>9.2f}{r['latency']['p95']:>9.2f}{r['tail_recall']:>8.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""Sobrecarga del perfilado por muestreo (app/profiler.py) sobre query_rag.
+
+Reproduce la batería de regresión con el LLM stub, como tools.regression, en tres modos:
+
+  - off:     sin perfilar (PROFILE_SAMPLE_RATE=0; el camino de cada consulta en producción);
+  - check:   decisión de muestreo con una tasa > 0 que no elige ninguna consulta;
+  - sampled: todas las consultas perfiladas (el costo de un perfil capturado).
+
+Reporta latencia p50/p95 por modo y, del modo sampled, las funciones con más
+muestras acumuladas en toda la batería.
+
+Uso:
+    python -m tools.bench_profiler --repeat 10 --interval-ms 5
+"""
+import argparse
+import json
+import logging
+import sys
+import time
+from collections import Counter
+
+from tools.regression import DEFAULT_SUITE
+from tools.stats import summarize
+
+MODES = ("off", "check", "sampled")
+
+
+def run_mode(rag, query_module, suite, repeat, mode):
+    from app.profiler import profiled, should_profile
+    from app.tracing import start_trace
+
+    samples = []
+    request_ids = []
+    for _ in range(repeat):
+        for item in suite:
+            query_module.conversation_history = []
+            t0 = time.perf_counter()
+            with start_trace() as trace:
+                with profiled(trace, should_profile(mode == "sampled")):
+                    rag.query_rag(item["query"])
+            samples.append((time.perf_counter() - t0) * 1000.0)
+            request_ids.append(trace.request_id)
+    return summarize(samples), request_ids
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sobrecarga del perfilado por muestreo de query_rag")
+    parser.add_argument("--suite", default=DEFAULT_SUITE, help="Batería de consultas (JSON)")
+    parser.add_argument("--repeat", type=int, default=10, help="Pasadas sobre la batería por modo")
+    parser.add_argument("--interval-ms", type=float, default=5.0, help="Intervalo de muestreo de la pila")
+    parser.add_argument("--top", type=int, default=12, help="Funciones a mostrar del modo sampled")
+    args = parser.parse_args(argv)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    import app.query as query_module
+    from app import profiler as profiler_module
+    from app.config import Config
+    from app.llm_backend import StubBackend
+
+    rag = query_module.query_rag_system
+    rag.llm = StubBackend(latency_ms=0, tokens_per_second=0)
+    with open(args.suite, encoding="utf-8") as f:
+        suite = json.load(f)
+    profiler = profiler_module.profiler
+    profiler.interval_s = args.interval_ms / 1000.0
+    profiler.max_stored = len(suite) * args.repeat
+
+    # Calentamiento: cachés, primeras compilaciones de regex, etc.
+    run_mode(rag, query_module, suite, 1, "off")
+
+    print(f"{len(suite)} consultas x {args.repeat}; intervalo de muestreo {args.interval_ms} ms")
+    print(f"{'modo':<9}{'p50 ms':>9}{'p95 ms':>9}{'media ms':>10}")
+    sampled_ids = []
+    for mode in MODES:
+        Config.PROFILE_SAMPLE_RATE = 1e-12 if mode == "check" else 0.0
+        latency, request_ids = run_mode(rag, query_module, suite, args.repeat, mode)
+        if mode == "sampled":
+            sampled_ids = request_ids
+        print(f"{mode:<9}{latency['p50']:>9.3f}{latency['p95']:>9.3f}{latency['mean']:>10.3f}")
+
+    total, samples = Counter(), 0
+    for request_id in sampled_ids:
+        profile = profiler.get(request_id)
+        if profile is None:
+            continue
+        samples += profile.samples
+        for row in profile.top_functions(limit=None):
+            total[row["function"]] += row["total"]
+    print(f"\n{samples} muestras en {len(sampled_ids)} consultas perfiladas; funciones con más muestras acumuladas:")
+    for label, count in total.most_common(args.top):
+        print(f"  {100.0 * count / max(samples, 1):5.1f}%  {label}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+"""Asignaciones y latencia de los resultados de búsqueda según cómo se representa cada fila.
+
+Para cada consulta del log se hace la búsqueda vectorial una sola vez y luego se
+repite el trabajo por solicitud que depende de la fila ('data' de cada resultado):
+ponderación semántica, respuesta contextualizada (_generate_contextualized_response)
+y contexto del prompt (format_article_context), con tres representaciones:
+
+  - series: df.iloc[idx], una Series de pandas (patrón previo);
+  - dict:   CorpusStore.row(idx), un dict nuevo con todas las columnas decodificadas;
+  - record: CorpusStore.record(idx), ArticleRecord con __slots__ y textos perezosos.
+
+Reporta, por fila (crear la fila y leer sus campos como la ponderación y los
+generadores de respuesta), el costo en µs y las asignaciones que quedan vivas
+mientras dura la solicitud (tracemalloc); y por solicitud, latencia y pico de
+memoria transitoria.
+
+Uso:
+    python -m tools.bench_records --repeat 5
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+import faiss
+import pandas as pd
+
+from app.context_builder import format_article_context
+from app.models.vector_db import DATA_DIR, encode_queries, vector_db
+from tools.stats import summarize
+
+QUERIES_FILE = os.path.join(DATA_DIR, "regression", "queries.json")
+MODES = ("series", "dict", "record")
+
+
+def searches(db, queries, top_k):
+    """(consulta, similitudes, filas) de la búsqueda vectorial, calculada una vez por consulta."""
+    out = []
+    for query in queries:
+        embedding = encode_queries([db._enhance_query_with_keywords(query)])
+        faiss.normalize_L2(embedding)
+        distances, indices = db._search(embedding, top_k)
+        out.append((query, distances, indices))
+    return out
+
+
+def build_results(db, query, distances, indices, make):
+    """Lo que arma get_top_results, con la representación de fila `make`."""
+    results = []
+    for distance, idx in zip(distances, indices):
+        data = make(idx)
+        weighted = db._calculate_weighted_similarity(query, distance, data)
+        results.append({'index': idx, 'similarity': float(weighted), 'original_similarity': float(distance), 'data': data})
+    results.sort(key=lambda r: r['similarity'], reverse=True)
+    return results
+
+
+def consume(db, query, results):
+    db._generate_contextualized_response(results, query)
+    format_article_context(results)
+
+
+def touch(data):
+    for field in ('tema', 'subtema', 'categorias', 'texto_del_articulo', 'articulo', 'fuente', 'resumen_explicativo'):
+        data.get(field, '')
+
+
+def per_row(make, positions):
+    """(µs por fila, asignaciones vivas por fila, bytes vivos por fila) al crear y leer cada fila."""
+    t0 = time.perf_counter()
+    for pos in positions:
+        touch(make(pos))
+    elapsed = (time.perf_counter() - t0) / len(positions) * 1e6
+
+    held = [None] * len(positions)
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        for i, pos in enumerate(positions):
+            data = make(pos)
+            touch(data)
+            held[i] = data
+        stats = tracemalloc.take_snapshot().compare_to(before, "filename")
+    finally:
+        tracemalloc.stop()
+    blocks = sum(stat.count_diff for stat in stats)
+    size = sum(stat.size_diff for stat in stats)
+    return elapsed, blocks / len(positions), size / len(positions)
+
+
+def run_mode(db, make, items, repeat, positions):
+    row_us, row_blocks, row_bytes = per_row(make, positions)
+
+    # Latencia por solicitud, sin tracemalloc
+    latencies = []
+    for _ in range(repeat):
+        for query, distances, indices in items:
+            t0 = time.perf_counter()
+            consume(db, query, build_results(db, query, distances, indices, make))
+            latencies.append((time.perf_counter() - t0) * 1e6)
+
+    # Pico de memoria transitoria por solicitud
+    peaks = []
+    tracemalloc.start()
+    try:
+        for query, distances, indices in items:
+            tracemalloc.reset_peak()
+            current = tracemalloc.get_traced_memory()[0]
+            consume(db, query, build_results(db, query, distances, indices, make))
+            peaks.append((tracemalloc.get_traced_memory()[1] - current) / 1024)
+    finally:
+        tracemalloc.stop()
+    return {"row_us": row_us, "row_blocks": row_blocks, "row_bytes": row_bytes,
+            "latency_us": summarize(latencies), "peak_kb": summarize(peaks)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Series de pandas vs dict vs ArticleRecord en los resultados")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=5, help="Pasadas sobre el log para medir latencia")
+    parser.add_argument("--rows", type=int, default=2000, help="Filas al azar para la medición por fila")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    args = parser.parse_args(argv)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    db = vector_db.current
+    with open(QUERIES_FILE, encoding="utf-8") as f:
+        queries = [item["query"] for item in json.load(f)]
+    items = searches(db, queries, args.top_k)
+    makers = {"dict": db.corpus.row, "record": db.corpus.record}
+    if "series" in args.modes:
+        df = pd.DataFrame([db.corpus.row(pos) for pos in range(len(db.corpus))], columns=db.corpus.columns)
+        makers["series"] = lambda idx: df.iloc[idx]
+
+    rng = random.Random(0)
+    positions = [rng.randrange(len(db.corpus)) for _ in range(args.rows)]
+
+    print(f"{len(items)} consultas, top_k {args.top_k}; {args.rows} filas al azar")
+    print(f"{'modo':<8}{'µs/fila':>9}{'asign./fila':>13}{'bytes/fila':>12}"
+          f"{'solicitud p50 µs':>18}{'p95 µs':>9}{'pico KB p50':>13}")
+    for mode in args.modes:
+        r = run_mode(db, makers[mode], items, args.repeat, positions)
+        lat, peak = r["latency_us"], r["peak_kb"]
+        print(f"{mode:<8}{r['row_us']:>9.1f}{r['row_blocks']:>13.1f}{r['row_bytes']:>12.0f}"
+              f"{lat['p50']:>18.0f}{lat['p95']:>9.0f}{peak['p50']:>13.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
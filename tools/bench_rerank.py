@@ -0,0 +1,117 @@
+"""Latencia añadida por el cross-encoder frente al cambio en exactitud top-1.
+
+Consultas:
+  - la batería de data/regression/queries.json; las entradas con "expected"
+    (lista de "fuente:articulo") cuentan para la exactitud, el resto solo para
+    medir cuántas veces cambia el primer resultado;
+  - --generated consultas etiquetadas armadas desde el corpus: la primera frase
+    del resumen explicativo de un artículo, cuyo artículo correcto es ese.
+
+Para cada consulta se mide get_top_results sin reordenar y luego el
+reordenamiento de esos mismos resultados (en frío, sin caché, y con caché).
+
+Uso:
+    python -m tools.bench_rerank --model cross-encoder/mmarco-mMiniLMv2-L12-H384-v1 --generated 200
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+import numpy as np
+
+from app.config import Config
+from app.models.reranker import Reranker
+from app.models.vector_db import DATA_DIR, vector_db
+from tools.stats import summarize
+
+QUERIES_FILE = os.path.join(DATA_DIR, "regression", "queries.json")
+
+
+def suite_queries():
+    with open(QUERIES_FILE, encoding="utf-8") as f:
+        return [(item["query"], set(item.get("expected") or [])) for item in json.load(f)]
+
+
+def generated_queries(db, n, seed):
+    """(consulta, {fuente:articulo}) desde la primera frase del resumen de artículos al azar."""
+    rng = np.random.default_rng(seed)
+    rows = rng.permutation(len(db.cards))
+    queries = []
+    for pos in rows:
+        card = db.cards[int(pos)]
+        summary = db.corpus.value(int(pos), 'resumen_explicativo')
+        sentence = re.split(r"(?<=[.!?])\s+", summary.strip())[0]
+        if len(sentence.split()) >= 5:
+            queries.append((sentence, {f"{card.fuente}:{card.articulo}"}))
+        if len(queries) >= n:
+            break
+    return queries
+
+
+def row_key(result):
+    return int(result['index'])
+
+
+def top1(db, results):
+    if not results:
+        return None
+    card = db.card_for(results[0])
+    return f"{card.fuente}:{card.articulo}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Costo y efecto del reordenamiento con cross-encoder")
+    parser.add_argument("--model", default=Config.RERANKER_MODEL, help="Cross-encoder (id o ruta)")
+    parser.add_argument("--top-k", type=int, default=10, help="Resultados recuperados por consulta")
+    parser.add_argument("--top-n", type=int, default=Config.RERANK_TOP_N, help="Resultados reordenados")
+    parser.add_argument("--generated", type=int, default=200, help="Consultas etiquetadas generadas del corpus")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+    if not args.model:
+        print("Indica --model o RERANKER_MODEL", file=sys.stderr)
+        return 1
+
+    from sentence_transformers import CrossEncoder
+    reranker = Reranker(CrossEncoder(args.model, max_length=512), top_n=args.top_n, cache_size=100000,
+                        min_remaining_ms=0)
+    db = vector_db.current
+    queries = suite_queries() + generated_queries(db, args.generated, args.seed)
+
+    search_ms, cold_ms, warm_ms = [], [], []
+    labelled = base_hits = rerank_hits = changed = 0
+    for query, expected in queries:
+        t0 = time.perf_counter()
+        results = db.get_top_results(query, top_k=args.top_k, rerank=False)
+        search_ms.append((time.perf_counter() - t0) * 1000.0)
+
+        t0 = time.perf_counter()
+        reranked = reranker.rerank(query, [dict(r) for r in results], row_key)
+        cold_ms.append((time.perf_counter() - t0) * 1000.0)
+        t0 = time.perf_counter()
+        reranker.rerank(query, [dict(r) for r in results], row_key)
+        warm_ms.append((time.perf_counter() - t0) * 1000.0)
+
+        before, after = top1(db, results), top1(db, reranked)
+        changed += int(before != after)
+        if expected:
+            labelled += 1
+            base_hits += int(before in expected)
+            rerank_hits += int(after in expected)
+
+    search, cold, warm = summarize(search_ms), summarize(cold_ms), summarize(warm_ms)
+    print(f"{len(queries)} consultas ({labelled} etiquetadas), top-{args.top_k}, reordenando {args.top_n}")
+    print(f"  get_top_results      p50={search['p50']:8.2f} ms  p95={search['p95']:8.2f} ms")
+    print(f"  + reordenar (frío)   p50={cold['p50']:8.2f} ms  p95={cold['p95']:8.2f} ms")
+    print(f"  + reordenar (caché)  p50={warm['p50']:8.2f} ms  p95={warm['p95']:8.2f} ms")
+    if labelled:
+        print(f"  exactitud top-1: {base_hits / labelled:.3f} -> {rerank_hits / labelled:.3f} "
+              f"({(rerank_hits - base_hits) / labelled:+.3f})")
+    print(f"  primer resultado cambiado: {changed}/{len(queries)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
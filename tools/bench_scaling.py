@@ -0,0 +1,164 @@
+"""Escalado horizontal con varios procesos del servidor y una cola Socket.IO compartida.
+
+Inicia el broker pub/sub local (app/pubsub_broker.py) y, para cada cantidad de
+procesos en --workers, lanza esos procesos con el LLM stub y
+SOCKETIO_MESSAGE_QUEUE=resp://... Conecta --clients clientes Socket.IO repartidos
+entre los procesos y envía las consultas por HTTP (con X-Client-Id y un
+request_id único) a un proceso *distinto* del que tiene la conexión del cliente,
+de modo que cada respuesta tiene que cruzar la cola para llegar.
+
+Reporta throughput y latencia por cantidad de procesos y verifica que cada
+'final_response' llegó exactamente una vez y solo al cliente que la pidió.
+La carga crece con los procesos (--queries-per-worker, --concurrency-per-worker);
+la capacidad de cada proceso la fija ADMISSION_LLM_CONCURRENCY / latencia del stub.
+
+Uso:
+    python -m tools.bench_scaling --workers 1 2 4 --clients 200 --stub-latency-ms 300
+"""
+import argparse
+import os
+import secrets
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+from app.pubsub_broker import start_broker
+from tools.bench_socket_fanout import RawSocketClients
+from tools.load_test import DEFAULT_QUERY_LOG, load_query_log, spawn_server
+from tools.stats import summarize
+
+
+def run_workers(workers, args, pool, broker):
+    """Lanza `workers` procesos, envía la carga y devuelve throughput, latencias y entregas."""
+    processes, urls = [], []
+    clients = None
+    try:
+        for i in range(workers):
+            process, base_url = spawn_server(args.port + i, args.stub_latency_ms, 0, args.spawn_timeout)
+            processes.append(process)
+            urls.append(base_url)
+        clients = RawSocketClients(urls, args.clients)
+
+        total = args.queries_per_worker * workers
+        targets = {}
+        items = []
+        for i in range(total):
+            target = i % args.clients
+            request_id = f"scale-{workers}-{i}"
+            targets[request_id] = target
+            # Proceso HTTP distinto del que tiene la conexión del cliente (si hay más de uno)
+            http_url = urls[(target + 1) % workers]
+            items.append((pool[i % len(pool)], target, request_id, http_url))
+
+        latencies = []
+        statuses = {}
+        lock = threading.Lock()
+        local = threading.local()
+
+        def send(item):
+            query, target, request_id, http_url = item
+            client = getattr(local, "client", None)
+            if client is None:
+                client = local.client = httpx.Client(timeout=120)
+            t0 = time.perf_counter()
+            response = client.post(f"{http_url}/query", json={"query": query, "request_id": request_id},
+                                   headers={"X-Client-Id": clients.client_ids[target]})
+            elapsed = (time.perf_counter() - t0) * 1000.0
+            with lock:
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+                if response.status_code == 200:
+                    latencies.append(elapsed)
+
+        clients.reset()
+        published0 = broker.published
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency_per_worker * workers) as executor:
+            list(executor.map(send, items))
+        wall = time.perf_counter() - t0
+
+        # Margen para que terminen de llegar las respuestas que cruzan la cola
+        expected = statuses.get(200, 0)
+        limit = time.perf_counter() + 30
+        while time.perf_counter() < limit and len(clients.delivered) < expected:
+            time.sleep(0.1)
+        delivered = list(clients.delivered)
+    finally:
+        if clients:
+            clients.close()
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=30)
+
+    seen = {}
+    misdelivered = 0
+    for index, request_id in delivered:
+        seen[request_id] = seen.get(request_id, 0) + 1
+        if targets.get(request_id) != index:
+            misdelivered += 1
+    return {
+        "requests": total,
+        "statuses": statuses,
+        "throughput_rps": statuses.get(200, 0) / wall if wall else 0.0,
+        "latency_ms": summarize(latencies),
+        "delivered": len(delivered),
+        "expected": expected,
+        "misdelivered": misdelivered,
+        "duplicated": sum(count - 1 for count in seen.values() if count > 1),
+        "missing": max(expected - len(seen), 0),
+        "published": broker.published - published0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Throughput y entrega por cliente con varios procesos y cola Socket.IO")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="Cantidades de procesos a medir")
+    parser.add_argument("--clients", type=int, default=200, help="Clientes Socket.IO, repartidos entre los procesos")
+    parser.add_argument("--queries-per-worker", type=int, default=200)
+    parser.add_argument("--concurrency-per-worker", type=int, default=8)
+    parser.add_argument("--query-log", default=DEFAULT_QUERY_LOG)
+    parser.add_argument("--port", type=int, default=5070, help="Puerto del primer proceso (los demás, consecutivos)")
+    parser.add_argument("--broker-port", type=int, default=6399)
+    parser.add_argument("--stub-latency-ms", type=float, default=300.0)
+    parser.add_argument("--spawn-timeout", type=float, default=600.0)
+    args = parser.parse_args(argv)
+
+    pool = load_query_log(args.query_log)
+    broker = start_broker(port=args.broker_port)
+    os.environ["SOCKETIO_MESSAGE_QUEUE"] = f"resp://127.0.0.1:{args.broker_port}"
+    # El token de sala lo firma el proceso de la conexión y lo verifica el que recibe el POST
+    os.environ.setdefault("SOCKET_ROOM_SECRET", secrets.token_hex(32))
+    results = {}
+    try:
+        for workers in args.workers:
+            results[workers] = run_workers(workers, args, pool, broker)
+            print(f"[{workers} procesos] {results[workers]['throughput_rps']:.1f} req/s", flush=True)
+    finally:
+        broker.shutdown()
+        broker.server_close()
+
+    base = results[args.workers[0]]["throughput_rps"] / args.workers[0] if results else 0.0
+    print(f"\n{args.clients} clientes, stub {args.stub_latency_ms:.0f} ms, "
+          f"{args.queries_per_worker} consultas y concurrencia {args.concurrency_per_worker} por proceso")
+    print(f"{'procesos':>9}{'req/s':>9}{'escala':>8}{'p50 ms':>9}{'p95 ms':>9}"
+          f"{'entregas':>10}{'ajenas':>8}{'dupl.':>7}{'faltan':>8}{'429':>6}")
+    failed = False
+    for workers, r in results.items():
+        lat = r["latency_ms"]
+        scale = r["throughput_rps"] / base if base else 0.0
+        print(f"{workers:>9}{r['throughput_rps']:>9.1f}{scale:>7.2f}x{lat['p50']:>9.1f}{lat['p95']:>9.1f}"
+              f"{r['delivered']:>10}{r['misdelivered']:>8}{r['duplicated']:>7}{r['missing']:>8}"
+              f"{r['statuses'].get(429, 0):>6}")
+        failed = failed or bool(r["misdelivered"] or r["duplicated"] or r["missing"])
+    if failed:
+        print("FALLO: hubo respuestas entregadas a otro cliente, duplicadas o perdidas")
+        return 1
+    print("Cada respuesta llegó una sola vez y solo a su cliente")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
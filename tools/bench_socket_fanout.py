@@ -0,0 +1,230 @@
+"""CPU del servidor y ancho de banda Socket.IO con muchos clientes conectados.
+
+Conecta --clients clientes Socket.IO (Engine.IO v4 sobre websocket, todos
+atendidos por un solo hilo con selectors para no distorsionar la medición) a un
+servidor lanzado con el LLM stub, envía --queries consultas y compara:
+
+  - broadcast: POST /query con SOCKET_BROADCAST=True (comportamiento anterior:
+    cada respuesta se emite a todos los clientes);
+  - targeted:  POST /query con X-Client-Id; la respuesta va solo a la sala del cliente;
+  - socket:    evento Socket.IO 'query' desde el cliente; la respuesta va a su sid.
+
+Reporta eventos entregados, bytes recibidos por los clientes, CPU del servidor
+(GET /metrics) por consulta y latencia de la respuesta.
+
+Uso:
+    python -m tools.bench_socket_fanout --clients 1000 --queries 200
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import selectors
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import websocket
+
+from tools.load_test import DEFAULT_QUERY_LOG, load_query_log, spawn_server
+from tools.stats import summarize
+
+MODES = ("broadcast", "targeted", "socket")
+
+
+class RawSocketClients:
+    """N conexiones Socket.IO mínimas: responden pings, cuentan eventos y bytes, registran acks.
+
+    Con varias URL base, el cliente i se conecta a base_urls[i % len(base_urls)].
+    """
+
+    def __init__(self, base_urls, count):
+        base_urls = [base_urls] if isinstance(base_urls, str) else list(base_urls)
+        urls = [u.replace("http://", "ws://") + "/socket.io/?EIO=4&transport=websocket" for u in base_urls]
+        # client_id (token de sala) que el servidor asigna a cada conexión en connection_response
+        self.client_ids = []
+        self.events = {}
+        self.bytes = 0
+        self.acks = {}
+        # (índice del cliente, request_id) de cada 'final_response' recibido
+        self.delivered = []
+        self._lock = threading.Lock()
+        self._selector = selectors.DefaultSelector()
+        self._conns = []
+        for index in range(count):
+            conn = websocket.create_connection(urls[index % len(urls)], timeout=30, enable_multithread=True)
+            conn.recv()  # paquete OPEN de Engine.IO
+            conn.send("40")
+            self.client_ids.append(self._await_client_id(conn))
+            self._conns.append(conn)
+            self._selector.register(conn.sock, selectors.EVENT_READ, (conn, index))
+        self._running = True
+        self._pump = threading.Thread(target=self._pump_loop, name="socket-pump", daemon=True)
+        self._pump.start()
+
+    @staticmethod
+    def _await_client_id(conn):
+        """Lee la conexión hasta el evento connection_response y devuelve su client_id."""
+        while True:
+            data = conn.recv()
+            if data.startswith("42"):
+                event, *args = json.loads(data[2:])
+                if event == "connection_response":
+                    return args[0]["client_id"]
+
+    def _pump_loop(self):
+        while self._running:
+            for key, _ in self._selector.select(timeout=0.2):
+                conn, index = key.data
+                try:
+                    data = conn.recv()
+                except Exception:
+                    self._selector.unregister(key.fileobj)
+                    continue
+                self._handle(conn, index, data)
+
+    def _handle(self, conn, index, data):
+        if data == "2":
+            conn.send("3")
+            return
+        with self._lock:
+            self.bytes += len(data.encode("utf-8")) if isinstance(data, str) else len(data)
+            if data.startswith("42"):
+                event, *args = json.loads(data[2:])
+                self.events[event] = self.events.get(event, 0) + 1
+                if event == "final_response" and args and isinstance(args[0], dict):
+                    self.delivered.append((index, args[0].get("request_id")))
+            elif data.startswith("43"):
+                body = data[2:]
+                ack_id = int(body[:body.index("[")])
+                self.acks[ack_id] = time.perf_counter()
+
+    def counts(self):
+        with self._lock:
+            return dict(self.events), self.bytes
+
+    def reset(self):
+        with self._lock:
+            self.events.clear()
+            self.bytes = 0
+            self.delivered.clear()
+
+    def emit(self, index, event, payload, ack_id):
+        self._conns[index].send(f"42{ack_id}" + json.dumps([event, payload]))
+
+    def close(self):
+        self._running = False
+        self._pump.join()
+        for conn in self._conns:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+
+def server_cpu_s(base_url):
+    process = httpx.get(f"{base_url}/metrics", timeout=10).json()["process"]
+    return process["cpu_user_s"] + process["cpu_system_s"]
+
+
+def run_mode(mode, base_url, clients, queries, concurrency):
+    """Envía las consultas y espera a que terminen de llegar los eventos; devuelve las mediciones."""
+    rng = random.Random(7)
+    targets = [rng.randrange(len(clients.client_ids)) for _ in queries]
+    expected = len(queries) * (len(clients.client_ids) if mode == "broadcast" else 1)
+    ack_ids = itertools.count(1)
+    latencies = []
+    lock = threading.Lock()
+    local = threading.local()
+
+    def send(item):
+        query, target = item
+        t0 = time.perf_counter()
+        if mode == "socket":
+            ack_id = next(ack_ids)
+            clients.emit(target, "query", {"query": query}, ack_id)
+            while ack_id not in clients.acks:
+                time.sleep(0.001)
+            elapsed = clients.acks[ack_id] - t0
+        else:
+            client = getattr(local, "client", None)
+            if client is None:
+                client = local.client = httpx.Client(timeout=120)
+            headers = {"X-Client-Id": clients.client_ids[target]} if mode == "targeted" else {}
+            client.post(f"{base_url}/query", json={"query": query}, headers=headers)
+            elapsed = time.perf_counter() - t0
+        with lock:
+            latencies.append(elapsed * 1000.0)
+
+    clients.reset()
+    cpu0 = server_cpu_s(base_url)
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(send, zip(queries, targets)))
+    # Margen para que terminen de llegar los eventos emitidos
+    limit = time.perf_counter() + 60
+    while time.perf_counter() < limit:
+        events, _ = clients.counts()
+        if events.get("final_response", 0) >= expected:
+            break
+        time.sleep(0.1)
+    wall = time.perf_counter() - t0
+    cpu = server_cpu_s(base_url) - cpu0
+    events, received = clients.counts()
+    return {
+        "events": events.get("final_response", 0),
+        "expected": expected,
+        "bytes": received,
+        "cpu_s": cpu,
+        "wall_s": wall,
+        "latency_ms": summarize(latencies),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Costo de difundir respuestas frente a entregarlas al solicitante")
+    parser.add_argument("--clients", type=int, default=1000, help="Clientes Socket.IO conectados")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--query-log", default=DEFAULT_QUERY_LOG)
+    parser.add_argument("--port", type=int, default=5056)
+    parser.add_argument("--stub-latency-ms", type=float, default=0.0)
+    parser.add_argument("--spawn-timeout", type=float, default=600.0)
+    args = parser.parse_args(argv)
+
+    pool = load_query_log(args.query_log)
+    queries = [pool[i % len(pool)] for i in range(args.queries)]
+    results = {}
+    for mode in args.modes:
+        os.environ["SOCKET_BROADCAST"] = "True" if mode == "broadcast" else "False"
+        process, base_url = spawn_server(args.port, args.stub_latency_ms, 0, args.spawn_timeout)
+        clients = None
+        try:
+            t0 = time.perf_counter()
+            clients = RawSocketClients(base_url, args.clients)
+            print(f"[{mode}] {args.clients} clientes conectados en {time.perf_counter() - t0:.1f} s", flush=True)
+            results[mode] = run_mode(mode, base_url, clients, queries, args.concurrency)
+        finally:
+            if clients:
+                clients.close()
+            process.terminate()
+            process.wait(timeout=30)
+
+    print(f"\n{args.clients} clientes, {args.queries} consultas, concurrencia {args.concurrency}")
+    print(f"{'modo':<11}{'eventos':>10}{'MB recibidos':>14}{'KB/consulta':>13}"
+          f"{'CPU s':>8}{'CPU ms/consulta':>17}{'p50 ms':>9}{'p95 ms':>9}")
+    for mode, r in results.items():
+        lat = r["latency_ms"]
+        print(f"{mode:<11}{r['events']:>10}{r['bytes'] / 1e6:>14.2f}{r['bytes'] / 1e3 / args.queries:>13.1f}"
+              f"{r['cpu_s']:>8.2f}{r['cpu_s'] * 1000 / args.queries:>17.1f}{lat['p50']:>9.1f}{lat['p95']:>9.1f}")
+        if r["events"] < r["expected"]:
+            print(f"  aviso: llegaron {r['events']} de {r['expected']} eventos esperados")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,169 @@
+"""Comparación de modelos de embeddings candidatos: calidad relativa, latencia, tamaño y memoria.
+
+Para cada modelo (clave del registro de app/models/embedding_models.py o id de
+Hugging Face) lanza un subproceso con EMBEDDING_MODEL=<modelo>, que carga el
+modelo y construye su índice en data/indexes/<clave>/ como al arrancar el
+servidor, y mide:
+
+  - carga: segundos de carga del modelo + construcción del índice, y RSS resultante;
+  - codificación: ms por pasaje del corpus (lote) y por consulta (una a una, p50/p95);
+  - índice: dimensión, vectores y tamaño de index.faiss;
+  - búsqueda: latencia de get_top_results y, por consulta de la batería de
+    regresión, las filas del top-k vectorial y el artículo final en primer lugar.
+
+El acuerdo se calcula contra el modelo de referencia (el primero o --reference):
+solape@k de las filas recuperadas y coincidencia del primer resultado. No es una
+medida de exactitud (no hay etiquetas), sino de cuánto cambiaría lo que se sirve.
+
+Uso:
+    python -m tools.compare_embeddings --models mpnet minilm e5-small
+    python -m tools.compare_embeddings --models mpnet minilm --top-k 10 --json informe.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from tools.regression import DEFAULT_SUITE
+
+CHILD_SNIPPET = r"""
+import json, os, resource, sys, time
+import faiss
+import numpy as np
+suite_path, top_k, passages = sys.argv[1], int(sys.argv[2]), int(sys.argv[3])
+
+def rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+base_mb = rss_mb()
+t0 = time.perf_counter()
+import app.models.vector_db as vdb
+handle = vdb.vector_db
+load_s = time.perf_counter() - t0
+loaded_mb = rss_mb()
+from tools.stats import summarize
+
+db = handle.current
+texts = [db._texts_for(db.corpus.row(pos))[0] for pos in range(min(passages, len(db.corpus)))]
+t0 = time.perf_counter()
+vdb.encode_passages(texts, batch_size=vdb.Config.EMBEDDING_BATCH_SIZE, show_progress_bar=False)
+passage_ms = (time.perf_counter() - t0) * 1000.0 / max(len(texts), 1)
+
+with open(suite_path, encoding="utf-8") as f:
+    suite = json.load(f)
+encode_ms, search_ms, queries = [], [], {}
+for item in suite:
+    enhanced = db._enhance_query_with_keywords(item["query"])
+    t0 = time.perf_counter()
+    embedding = np.ascontiguousarray(vdb.encode_queries([enhanced]), dtype="float32")
+    encode_ms.append((time.perf_counter() - t0) * 1000.0)
+    faiss.normalize_L2(embedding)
+    _, rows = db._search(embedding, top_k)
+    t0 = time.perf_counter()
+    results = db.get_top_results(item["query"], top_k=top_k, rerank=False)
+    search_ms.append((time.perf_counter() - t0) * 1000.0)
+    top = results[0]["data"] if results else None
+    queries[item["id"]] = {
+        "rows": [int(r) for r in rows],
+        "top1": f"{top.get('fuente')}:{top.get('articulo')}" if top is not None else None,
+    }
+
+index_file = vdb.FAISS_INDEX_FILE
+print(json.dumps({
+    "key": vdb.EMBEDDING_SPEC.key,
+    "name": vdb.EMBEDDING_MODEL,
+    "dimension": vdb.model.get_sentence_embedding_dimension(),
+    "vectors": db.index.ntotal,
+    "index_mb": os.path.getsize(index_file) / (1024 * 1024) if os.path.exists(index_file) else 0.0,
+    "load_s": load_s,
+    "rss_mb": loaded_mb - base_mb,
+    "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "passage_ms": passage_ms,
+    "encode_ms": summarize(encode_ms),
+    "search_ms": summarize(search_ms),
+    "queries": queries,
+}))
+"""
+
+
+def run_child(model, suite_path, top_k, passages, timeout):
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    env = dict(os.environ, EMBEDDING_MODEL=model, LOG_LEVEL="WARNING",
+               PYTHONPATH=os.pathsep.join(filter(None, [root, os.environ.get("PYTHONPATH")])))
+    out = subprocess.run([sys.executable, "-c", CHILD_SNIPPET, suite_path, str(top_k), str(passages)],
+                         capture_output=True, text=True, env=env, cwd=root, timeout=timeout)
+    if out.returncode != 0:
+        raise RuntimeError(out.stderr[-2000:])
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def agreement(reference, report, top_k):
+    """(solape@k medio de las filas recuperadas, fracción de consultas con el mismo primer resultado)."""
+    overlaps, same_top = [], []
+    for query_id, ref in reference["queries"].items():
+        other = report["queries"].get(query_id)
+        if other is None:
+            continue
+        overlaps.append(len(set(ref["rows"][:top_k]) & set(other["rows"][:top_k])) / top_k)
+        same_top.append(ref["top1"] == other["top1"])
+    if not overlaps:
+        return 0.0, 0.0
+    return sum(overlaps) / len(overlaps), sum(same_top) / len(same_top)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compara modelos de embeddings con la batería de consultas")
+    parser.add_argument("--models", nargs="+", default=["mpnet", "minilm"],
+                        help="Claves del registro o ids de Hugging Face")
+    parser.add_argument("--reference", help="Modelo contra el que se mide el acuerdo (por defecto el primero)")
+    parser.add_argument("--suite", default=DEFAULT_SUITE, help="Batería de consultas (JSON)")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--passages", type=int, default=256, help="Pasajes del corpus para medir la codificación")
+    parser.add_argument("--timeout", type=float, default=3600, help="Segundos máximos por modelo")
+    parser.add_argument("--json", help="Guarda el informe completo en este archivo")
+    args = parser.parse_args(argv)
+
+    reference_model = args.reference or args.models[0]
+    models = list(dict.fromkeys([reference_model] + args.models))
+    reports = {}
+    for model in models:
+        print(f"Construyendo índice con {model}...", file=sys.stderr)
+        try:
+            reports[model] = run_child(model, args.suite, args.top_k, args.passages, args.timeout)
+        except (RuntimeError, subprocess.TimeoutExpired) as e:
+            print(f"  {model}: error\n{e}", file=sys.stderr)
+    if reference_model not in reports:
+        print(f"No se pudo evaluar el modelo de referencia {reference_model}", file=sys.stderr)
+        return 1
+
+    reference = reports[reference_model]
+    width = max([14] + [len(r["key"]) + 2 for r in reports.values()])
+    print(f"Referencia: {reference['key']} ({reference['name']}); {len(reference['queries'])} consultas, top_k {args.top_k}")
+    print(f"{'modelo':<{width}}{'dim':>5}{'carga s':>9}{'RSS MB':>8}{'índice MB':>11}{'ms/pasaje':>11}"
+          f"{'consulta p50':>14}{'p95':>7}{'búsqueda p50':>14}{f'solape@{args.top_k}':>11}{'top-1':>7}")
+    for model in models:
+        r = reports.get(model)
+        if r is None:
+            print(f"{model:<{width}}  (error)")
+            continue
+        overlap, top1 = agreement(reference, r, args.top_k)
+        r["agreement"] = {"overlap": overlap, "top1": top1}
+        print(f"{r['key']:<{width}}{r['dimension']:>5}{r['load_s']:>9.1f}{r['rss_mb']:>8.0f}{r['index_mb']:>11.2f}"
+              f"{r['passage_ms']:>11.2f}{r['encode_ms']['p50']:>14.2f}{r['encode_ms']['p95']:>7.2f}"
+              f"{r['search_ms']['p50']:>14.2f}{overlap:>11.2f}{top1:>7.2f}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"reference": reference_model, "top_k": args.top_k, "models": reports},
+                      f, ensure_ascii=False, indent=2)
+        print(f"Informe guardado en {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
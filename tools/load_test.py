@@ -0,0 +1,580 @@
+"""Generador de carga para /query (HTTP) y el canal Socket.IO.
+
+Reproduce tráfico mixto (consultas por artículo, listados, preguntas al LLM y
+solicitudes de opinión) en las proporciones observadas en un log de consultas,
+con concurrencia y tasa de llegada configurables. Reporta throughput, percentiles
+de latencia por ruta, tasa de error y uso de recursos del servidor (GET /metrics).
+
+Ejemplos:
+    # Contra un servidor ya iniciado con LLM_BACKEND=stub
+    python -m tools.load_test --url http://127.0.0.1:5001 --duration 60 --rate 20 --concurrency 16
+
+    # Iniciar el servidor con el LLM stub y medir también la entrega por Socket.IO
+    python -m tools.load_test --spawn --stub-latency-ms 400 --stub-tokens-per-second 40 --socket-clients 20
+
+    # La mitad de las consultas por el evento Socket.IO 'query' (ack y 'final_response')
+    python -m tools.load_test --spawn --socket-query-clients 16 --socket-share 0.5
+"""
+import argparse
+import bisect
+import itertools
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+from app import routing
+from tools.stats import summarize
+
+DEFAULT_QUERY_LOG = os.path.abspath(os.path.join(os.path.dirname(__file__), "../data/regression/queries.json"))
+
+# Servidor lanzado con --spawn: la aplicación de create_app() con su instancia de SocketIO, sin recargador
+SPAWN_SNIPPET = (
+    "import sys; from app import create_app, socketio; "
+    "socketio.run(create_app(), host='127.0.0.1', port=int(sys.argv[1]), allow_unsafe_werkzeug=True)"
+)
+
+
+def load_query_log(path):
+    """Lee consultas desde JSON (lista), JSONL ({"query": ...}) o texto plano (una por línea)."""
+    with open(path, encoding="utf-8") as f:
+        raw = f.read()
+    queries = []
+    stripped = raw.lstrip()
+    if stripped.startswith("["):
+        for item in json.loads(raw):
+            queries.append(item if isinstance(item, str) else item.get("query") or item.get("query_text"))
+    else:
+        for line in raw.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("{"):
+                item = json.loads(line)
+                queries.append(item.get("query") or item.get("query_text"))
+            else:
+                queries.append(line)
+    return [q for q in queries if q]
+
+
+def build_workload(queries, mix=None):
+    """Agrupa las consultas por ruta y calcula la proporción de cada una.
+
+    Si se indica `mix` ({ruta: peso}) reemplaza las proporciones del log.
+    """
+    pools = {}
+    for q in queries:
+        pools.setdefault(routing.classify_query(q), []).append(q)
+    if mix:
+        weights = {route: weight for route, weight in mix.items() if pools.get(route)}
+    else:
+        weights = {route: len(items) for route, items in pools.items()}
+    total = float(sum(weights.values())) or 1.0
+    return pools, {route: weight / total for route, weight in weights.items()}
+
+
+def parse_mix(text):
+    """'article=0.4,list=0.1,llm=0.4,opinion=0.1' -> dict."""
+    mix = {}
+    for part in (text or "").split(","):
+        if "=" in part:
+            route, weight = part.split("=", 1)
+            route = route.strip()
+            if route not in routing.ROUTES:
+                raise ValueError(f"Ruta desconocida en --mix: {route} (válidas: {', '.join(routing.ROUTES)})")
+            mix[route] = float(weight)
+    return mix
+
+
+class ServerMonitor(threading.Thread):
+    """Muestrea GET /metrics del servidor durante la prueba."""
+
+    def __init__(self, base_url, interval=1.0):
+        super().__init__(name="metrics-monitor", daemon=True)
+        self.base_url = base_url
+        self.interval = interval
+        self.samples = []
+        self._stop_event = threading.Event()
+
+    def sample(self):
+        try:
+            response = httpx.get(f"{self.base_url}/metrics", timeout=5)
+            if response.status_code == 200:
+                data = response.json()
+                data["_t"] = time.time()
+                self.samples.append(data)
+        except httpx.HTTPError:
+            pass
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self.sample()
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        self.sample()
+
+    def report(self):
+        if len(self.samples) < 2:
+            return {"available": False}
+        first, last = self.samples[0], self.samples[-1]
+        wall = max(last["_t"] - first["_t"], 1e-9)
+        p0, p1 = first["process"], last["process"]
+        report = {"available": True, "wall_s": round(wall, 3), "pid": p1.get("pid")}
+        if "cpu_user_s" in p0 and "cpu_user_s" in p1:
+            cpu = (p1["cpu_user_s"] + p1["cpu_system_s"]) - (p0["cpu_user_s"] + p0["cpu_system_s"])
+            report["cpu_s"] = round(cpu, 3)
+            report["cpu_percent"] = round(100.0 * cpu / wall, 1)
+        rss = [s["process"].get("rss_bytes") for s in self.samples if s["process"].get("rss_bytes")]
+        if rss:
+            report["rss_mb_start"] = round(rss[0] / 2**20, 1)
+            report["rss_mb_peak"] = round(max(rss) / 2**20, 1)
+            report["rss_mb_end"] = round(rss[-1] / 2**20, 1)
+        report["threads_peak"] = max(s["process"].get("threads", 0) for s in self.samples)
+        c0, c1 = first.get("counters", {}), last.get("counters", {})
+        report["counters_delta"] = {k: v - c0.get(k, 0) for k, v in c1.items() if isinstance(v, (int, float))}
+        report["gauges"] = last.get("gauges", {})
+        return report
+
+
+class SocketListeners:
+    """Clientes Socket.IO que registran la llegada de cada 'final_response'.
+
+    El servidor asigna a cada cliente un client_id (token de sala) en
+    connection_response; las consultas enviadas con ese X-Client-Id le llegan solo a él.
+    """
+
+    def __init__(self, base_url, count):
+        try:
+            import socketio
+        except ImportError:
+            raise SystemExit("--socket-clients requiere python-socketio[client] (pip install 'python-socketio[client]')")
+        self.clients = []
+        self.client_ids = [None] * count
+        self.received = []
+        self._lock = threading.Lock()
+        for i in range(count):
+            client = socketio.Client(reconnection=False)
+            connected = threading.Event()
+            client.on("connection_response", self._make_connect_handler(i, connected))
+            client.on("final_response", self._make_handler(i))
+            client.connect(base_url)
+            self.clients.append(client)
+            if not connected.wait(30):
+                raise SystemExit("El servidor no envió connection_response a un cliente Socket.IO")
+
+    def _make_connect_handler(self, index, connected):
+        def handler(data):
+            self.client_ids[index] = (data or {}).get("client_id")
+            connected.set()
+        return handler
+
+    def _make_handler(self, client_id):
+        def handler(data):
+            with self._lock:
+                self.received.append((client_id, time.time(), (data or {}).get("response")))
+        return handler
+
+    def close(self):
+        for client in self.clients:
+            try:
+                client.disconnect()
+            except Exception:
+                pass
+
+
+class SocketQueryClients:
+    """Clientes Socket.IO que envían consultas con el evento 'query' (el canal Socket.IO completo).
+
+    Cada consulta lleva un request_id único; se mide cuándo llega su
+    'final_response' (o 'busy') y cuándo llega el ack del servidor.
+    """
+
+    def __init__(self, base_url, count):
+        try:
+            import socketio
+        except ImportError:
+            raise SystemExit("--socket-query-clients requiere python-socketio[client] "
+                             "(pip install 'python-socketio[client]')")
+        self.clients = []
+        self._ids = itertools.count()
+        self._pending = {}
+        self._lock = threading.Lock()
+        for _ in range(count):
+            client = socketio.Client(reconnection=False)
+            client.on("final_response", self._on_response)
+            client.on("busy", self._on_response)
+            client.connect(base_url)
+            self.clients.append(client)
+
+    def _on_response(self, data):
+        request_id = data.get("request_id") if isinstance(data, dict) else None
+        with self._lock:
+            waiter = self._pending.get(request_id)
+        if waiter is not None:
+            waiter["arrived_at"] = time.time()
+            waiter["data"] = data
+            waiter["event"].set()
+
+    def send(self, index, query, timeout):
+        """(ack, llegada de la respuesta, cuerpo, momento del ack); llegada None si no llegó a tiempo."""
+        request_id = f"load-sock-{next(self._ids)}"
+        waiter = {"event": threading.Event(), "arrived_at": None, "data": None}
+        with self._lock:
+            self._pending[request_id] = waiter
+        try:
+            ack = self.clients[index % len(self.clients)].call(
+                "query", {"query": query, "request_id": request_id}, timeout=timeout)
+            acked_at = time.time()
+            # La respuesta se emite antes del ack por la misma conexión; se espera por si el
+            # cliente despacha el ack primero
+            waiter["event"].wait(timeout)
+        finally:
+            with self._lock:
+                self._pending.pop(request_id, None)
+        return ack, waiter["arrived_at"], waiter["data"], acked_at
+
+    def close(self):
+        for client in self.clients:
+            try:
+                client.disconnect()
+            except Exception:
+                pass
+
+
+class LoadRunner:
+    def __init__(self, base_url, pools, weights, concurrency, rate, duration, timeout, seed, client_ids=None,
+                 socket_clients=None, socket_share=0.0):
+        self.base_url = base_url
+        # Clientes Socket.IO a los que se asocian las consultas (X-Client-Id), al azar
+        self.client_ids = client_ids or []
+        # Fracción de consultas enviadas con el evento 'query' por socket_clients (SocketQueryClients)
+        self.socket_clients = socket_clients
+        self.socket_share = socket_share if socket_clients else 0.0
+        self.pools = pools
+        self.routes = list(weights.keys())
+        self.route_weights = [weights[r] for r in self.routes]
+        self.concurrency = concurrency
+        self.rate = rate
+        self.duration = duration
+        self.timeout = timeout
+        self.rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self.results = []
+        self._results_lock = threading.Lock()
+        self._local = threading.local()
+
+    def _client(self):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = httpx.Client(timeout=self.timeout)
+            self._local.client = client
+        return client
+
+    def _pick(self):
+        with self._rng_lock:
+            route = self.rng.choices(self.routes, weights=self.route_weights)[0]
+            return route, self.rng.choice(self.pools[route])
+
+    def _headers(self):
+        if not self.client_ids:
+            return {}
+        with self._rng_lock:
+            return {"X-Client-Id": self.rng.choice(self.client_ids)}
+
+    def _send(self, route, query, scheduled_at):
+        if self.socket_share > 0:
+            with self._rng_lock:
+                use_socket = self.rng.random() < self.socket_share
+                index = self.rng.randrange(len(self.socket_clients.clients))
+            if use_socket:
+                return self._send_socket(route, query, scheduled_at, index)
+        # La latencia se mide desde la llegada programada: incluye la espera por falta de workers
+        sent_at = time.time()
+        status = None
+        error = None
+        response_text = None
+        try:
+            response = self._client().post(f"{self.base_url}/query", json={"query": query}, headers=self._headers())
+            status = response.status_code
+            if status == 200:
+                response_text = response.json().get("response")
+            elif status != 429:
+                error = f"HTTP {status}"
+        except Exception as e:
+            error = type(e).__name__
+        finished_at = time.time()
+        with self._results_lock:
+            self.results.append({
+                "route": route,
+                "channel": "http",
+                "status": status,
+                "error": error,
+                "latency_ms": (finished_at - scheduled_at) * 1000.0,
+                "sent_at": sent_at,
+                "response": response_text,
+            })
+
+    def _send_socket(self, route, query, scheduled_at, index):
+        """Consulta por el evento 'query'; latencia hasta 'final_response' y, aparte, hasta el ack."""
+        sent_at = time.time()
+        status = None
+        error = None
+        ack_ms = None
+        finished_at = None
+        try:
+            ack, arrived_at, _, acked_at = self.socket_clients.send(index, query, self.timeout)
+            ack_ms = (acked_at - scheduled_at) * 1000.0
+            status = (ack or {}).get("status")
+            if arrived_at is None:
+                error = "sin final_response"
+            elif status not in (200, 429):
+                error = f"estado {status}"
+            finished_at = arrived_at
+        except Exception as e:
+            error = type(e).__name__
+        finished_at = finished_at or time.time()
+        with self._results_lock:
+            self.results.append({
+                "route": route,
+                "channel": "socket",
+                "status": status,
+                "error": error,
+                "latency_ms": (finished_at - scheduled_at) * 1000.0,
+                "ack_ms": ack_ms,
+                "sent_at": sent_at,
+                # La respuesta ya llegó por el evento: no cuenta para la entrega a SocketListeners
+                "response": None,
+            })
+
+    def run(self):
+        start = time.time()
+        deadline = start + self.duration
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="load") as pool:
+            if self.rate > 0:
+                # Lazo abierto: llegadas de Poisson a la tasa indicada
+                next_arrival = start
+                while True:
+                    with self._rng_lock:
+                        next_arrival += self.rng.expovariate(self.rate)
+                    if next_arrival >= deadline:
+                        break
+                    time.sleep(max(0.0, next_arrival - time.time()))
+                    route, query = self._pick()
+                    pool.submit(self._send, route, query, next_arrival)
+            else:
+                # Lazo cerrado: cada worker envía la siguiente consulta al recibir la respuesta
+                def worker():
+                    while time.time() < deadline:
+                        route, query = self._pick()
+                        self._send(route, query, time.time())
+                for _ in range(self.concurrency):
+                    pool.submit(worker)
+        return time.time() - start
+
+
+def summarize_results(results, elapsed):
+    per_route = {}
+    for r in results:
+        per_route.setdefault(r["route"], []).append(r)
+
+    def block(items):
+        ok = [i for i in items if i["error"] is None and i["status"] == 200]
+        return {
+            "requests": len(items),
+            "ok": len(ok),
+            "errors": sum(1 for i in items if i["error"] is not None),
+            "shed_429": sum(1 for i in items if i["status"] == 429),
+            "error_rate": round(sum(1 for i in items if i["error"] is not None) / len(items), 4) if items else 0.0,
+            "latency_ms": summarize([i["latency_ms"] for i in ok]),
+        }
+
+    overall = block(results)
+    overall["throughput_rps"] = round(overall["ok"] / elapsed, 3) if elapsed > 0 else 0.0
+    per_channel = {}
+    for r in results:
+        per_channel.setdefault(r.get("channel", "http"), []).append(r)
+    channels = {channel: block(items) for channel, items in sorted(per_channel.items())}
+    if "socket" in channels:
+        channels["socket"]["ack_ms"] = summarize([i["ack_ms"] for i in per_channel["socket"]
+                                                  if i["ack_ms"] is not None and i["error"] is None])
+    return {"elapsed_s": round(elapsed, 3), "overall": overall,
+            "routes": {route: block(items) for route, items in sorted(per_route.items())},
+            "channels": channels}
+
+
+def socket_delivery_report(results, listeners):
+    """Latencia de entrega por Socket.IO y número de eventos recibidos por cliente."""
+    # Respuestas idénticas se asocian al envío más reciente anterior a la recepción
+    sent = {}
+    for r in results:
+        if r["response"]:
+            sent.setdefault(r["response"], []).append(r["sent_at"])
+    for times in sent.values():
+        times.sort()
+    delays = []
+    for _, received_at, text in listeners.received:
+        times = sent.get(text)
+        if times:
+            pos = bisect.bisect_right(times, received_at)
+            if pos:
+                delays.append((received_at - times[pos - 1]) * 1000.0)
+    per_client = {}
+    for client_id, _, _ in listeners.received:
+        per_client[client_id] = per_client.get(client_id, 0) + 1
+    counts = list(per_client.values()) or [0]
+    return {
+        "clients": len(listeners.clients),
+        "events_received": len(listeners.received),
+        "events_per_client_mean": round(sum(counts) / max(len(listeners.clients), 1), 2),
+        "delivery_ms": summarize(delays),
+    }
+
+
+def spawn_server(port, stub_latency_ms, stub_tokens_per_second, startup_timeout):
+    env = dict(os.environ)
+    env.update({
+        "LLM_BACKEND": "stub",
+        "STUB_LATENCY_MS": str(stub_latency_ms),
+        "STUB_TOKENS_PER_SECOND": str(stub_tokens_per_second),
+    })
+    repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    process = subprocess.Popen([sys.executable, "-c", SPAWN_SNIPPET, str(port)], cwd=repo_root, env=env)
+    base_url = f"http://127.0.0.1:{port}"
+    limit = time.time() + startup_timeout
+    while time.time() < limit:
+        if process.poll() is not None:
+            raise SystemExit(f"El servidor terminó durante el arranque (código {process.returncode})")
+        try:
+            if httpx.get(f"{base_url}/test", timeout=2).status_code == 200:
+                return process, base_url
+        except httpx.HTTPError:
+            pass
+        time.sleep(1.0)
+    process.terminate()
+    raise SystemExit(f"El servidor no respondió en {startup_timeout} s")
+
+
+def print_report(report):
+    overall = report["overall"]
+    print(f"\nDuración: {report['elapsed_s']} s | solicitudes: {overall['requests']} | "
+          f"throughput: {overall['throughput_rps']} req/s | errores: {overall['error_rate']:.2%} | "
+          f"429: {overall['shed_429']}")
+    print(f"{'ruta':<10}{'n':>7}{'err%':>8}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}  (ms)")
+    for route, data in list(report["routes"].items()) + [("TOTAL", overall)]:
+        lat = data["latency_ms"]
+        print(f"{route:<10}{data['requests']:>7}{data['error_rate']:>8.2%}"
+              f"{lat['p50']:>10.1f}{lat['p95']:>10.1f}{lat['p99']:>10.1f}{lat['max']:>10.1f}")
+    channels = report.get("channels", {})
+    if len(channels) > 1 or "socket" in channels:
+        print(f"{'canal':<10}{'n':>7}{'err%':>8}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}  (ms)")
+        for channel, data in channels.items():
+            lat = data["latency_ms"]
+            print(f"{channel:<10}{data['requests']:>7}{data['error_rate']:>8.2%}"
+                  f"{lat['p50']:>10.1f}{lat['p95']:>10.1f}{lat['p99']:>10.1f}{lat['max']:>10.1f}")
+        if "socket" in channels:
+            ack = channels["socket"]["ack_ms"]
+            print(f"Socket.IO 'query': ack p50={ack['p50']} ms p95={ack['p95']} ms "
+                  f"(latencia del canal medida hasta 'final_response')")
+    server = report.get("server", {})
+    if server.get("available"):
+        print(f"Servidor pid {server.get('pid')}: CPU {server.get('cpu_percent')}% "
+              f"({server.get('cpu_s')} s), RSS {server.get('rss_mb_start')} -> pico {server.get('rss_mb_peak')} MB, "
+              f"hilos pico {server.get('threads_peak')}")
+    socket_report = report.get("socketio")
+    if socket_report:
+        lat = socket_report["delivery_ms"]
+        print(f"Socket.IO: {socket_report['clients']} clientes, {socket_report['events_received']} eventos "
+              f"({socket_report['events_per_client_mean']} por cliente), entrega p50={lat['p50']} ms p95={lat['p95']} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generador de carga para AzuSENA")
+    parser.add_argument("--url", default="http://127.0.0.1:5001", help="URL base del servidor")
+    parser.add_argument("--query-log", default=DEFAULT_QUERY_LOG,
+                        help="Log de consultas (JSON, JSONL o texto) del que se toman proporciones y textos")
+    parser.add_argument("--mix", help="Proporciones explícitas, ej: article=0.4,list=0.1,llm=0.4,opinion=0.1")
+    parser.add_argument("--duration", type=float, default=30.0, help="Duración de la prueba en segundos")
+    parser.add_argument("--concurrency", type=int, default=8, help="Solicitudes simultáneas máximas")
+    parser.add_argument("--rate", type=float, default=0.0,
+                        help="Tasa de llegada (req/s, Poisson); 0 = lazo cerrado a máxima velocidad")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Timeout por solicitud en segundos")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--socket-clients", type=int, default=0,
+                        help="Clientes Socket.IO conectados que miden la entrega de 'final_response'")
+    parser.add_argument("--socket-query-clients", type=int, default=0,
+                        help="Clientes Socket.IO que envían consultas con el evento 'query'")
+    parser.add_argument("--socket-share", type=float, default=0.5,
+                        help="Fracción de consultas enviadas por Socket.IO con --socket-query-clients (1 = todas)")
+    parser.add_argument("--metrics-interval", type=float, default=1.0, help="Muestreo de /metrics en segundos")
+    parser.add_argument("--spawn", action="store_true", help="Iniciar el servidor con el LLM stub")
+    parser.add_argument("--spawn-port", type=int, default=5055)
+    parser.add_argument("--spawn-timeout", type=float, default=600.0)
+    parser.add_argument("--stub-latency-ms", type=float, default=400.0)
+    parser.add_argument("--stub-tokens-per-second", type=float, default=40.0)
+    parser.add_argument("--output", help="Guardar el informe en JSON")
+    args = parser.parse_args(argv)
+
+    queries = load_query_log(args.query_log)
+    pools, weights = build_workload(queries, parse_mix(args.mix))
+    if not weights:
+        raise SystemExit("El log de consultas no contiene consultas utilizables")
+    print("Mezcla de tráfico: " + ", ".join(f"{r}={w:.0%} ({len(pools[r])} consultas)" for r, w in weights.items()))
+
+    process = None
+    base_url = args.url.rstrip("/")
+    if args.spawn:
+        process, base_url = spawn_server(args.spawn_port, args.stub_latency_ms,
+                                         args.stub_tokens_per_second, args.spawn_timeout)
+    listeners = None
+    senders = None
+    try:
+        if args.socket_clients:
+            listeners = SocketListeners(base_url, args.socket_clients)
+        if args.socket_query_clients:
+            senders = SocketQueryClients(base_url, args.socket_query_clients)
+        monitor = ServerMonitor(base_url, args.metrics_interval)
+        monitor.start()
+        runner = LoadRunner(base_url, pools, weights, args.concurrency, args.rate,
+                            args.duration, args.timeout, args.seed,
+                            client_ids=listeners.client_ids if listeners else None,
+                            socket_clients=senders, socket_share=args.socket_share)
+        elapsed = runner.run()
+        monitor.stop()
+        # Margen para que lleguen los últimos eventos Socket.IO
+        if listeners:
+            time.sleep(1.0)
+
+        report = summarize_results(runner.results, elapsed)
+        report["config"] = {"concurrency": args.concurrency, "rate": args.rate, "duration": args.duration,
+                            "mix": weights, "url": base_url,
+                            "socket_share": args.socket_share if senders else 0.0}
+        report["server"] = monitor.report()
+        if listeners:
+            report["socketio"] = socket_delivery_report(runner.results, listeners)
+    finally:
+        if listeners:
+            listeners.close()
+        if senders:
+            senders.close()
+        if process:
+            process.terminate()
+            process.wait(timeout=30)
+
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,218 @@
+"""Arnés de regresión offline para latencia y consistencia de respuestas.
+
+Reproduce una batería de consultas a través de QueryRAGSystem.query_rag con el
+backend LLM stub (determinista e instantáneo, ver app/llm_backend.py), registra
+latencias por etapa, ruta tomada, artículos recuperados y huella de cada
+respuesta, y los compara con una línea base guardada.
+
+Uso:
+    python -m tools.regression                     # comparar con la línea base
+    python -m tools.regression --record            # grabar (o regenerar) la línea base
+
+La línea base depende de la máquina (latencias) y del modelo de embeddings
+(artículos recuperados), así que no se versiona: la primera ejecución sin
+línea base la graba y termina con código 0.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+
+from tools.stats import summarize
+
+REGRESSION_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../data/regression"))
+DEFAULT_SUITE = os.path.join(REGRESSION_DIR, "queries.json")
+DEFAULT_BASELINE = os.path.join(REGRESSION_DIR, "baseline.json")
+
+
+def fingerprint(text):
+    """Huella estable de una respuesta (espacios normalizados)."""
+    normalized = " ".join(str(text).split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:16]
+
+
+def run_suite(suite, repeat=3, log_level="WARNING"):
+    """Ejecuta la batería y devuelve el informe con latencias, rutas, recuperación y huellas.
+
+    El registro del pipeline queda en log_level para no sumar su costo a las
+    latencias. Importar app instala el registro con LOG_LEVEL (ver
+    app/logging_setup.py), así que el nivel se fija después del import; main()
+    además exporta LOG_LEVEL antes de importar nada de app.
+    """
+    import app.query as query_module
+    from app.llm_backend import StubBackend
+    from app.tracing import start_trace
+
+    logging.getLogger().setLevel(log_level)
+
+    rag = query_module.query_rag_system
+    # Sin latencia simulada: la latencia medida es solo la del pipeline
+    rag.llm = StubBackend(latency_ms=0, tokens_per_second=0)
+
+    stage_samples = {}
+    total_samples = []
+    queries = {}
+    for item in suite:
+        runs = []
+        for _ in range(repeat):
+            # Cada consulta parte de un historial vacío para que el resultado sea reproducible
+            query_module.conversation_history = []
+            with start_trace() as trace:
+                t0 = time.perf_counter()
+                response, similarity, used_kb = rag.query_rag(item["query"])
+                total_ms = (time.perf_counter() - t0) * 1000.0
+            runs.append((trace, response, similarity, used_kb, total_ms))
+            total_samples.append(total_ms)
+            for name, ms in trace.stages.items():
+                stage_samples.setdefault(name, []).append(ms)
+
+        trace, response, similarity, used_kb, _ = runs[-1]
+        fingerprints = sorted({fingerprint(r[1]) for r in runs})
+        queries[item["id"]] = {
+            "query": item["query"],
+            "route": trace.route,
+            "retrieved": trace.retrievals[0] if trace.retrievals else [],
+            "fingerprint": fingerprints[0],
+            "stable": len(fingerprints) == 1,
+            "similarity": round(float(similarity), 4),
+            "used_kb": bool(used_kb),
+            "latency_ms": summarize([r[4] for r in runs]),
+        }
+
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "repeat": repeat,
+        "latency_ms": {
+            "total": summarize(total_samples),
+            "stages": {name: summarize(values) for name, values in sorted(stage_samples.items())},
+        },
+        "queries": queries,
+    }
+
+
+def _jaccard(a, b):
+    a, b = set(a), set(b)
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def compare(report, baseline, latency_tolerance=0.25, latency_floor_ms=5.0,
+            min_retrieval_overlap=0.8, fail_on_answer_change=False):
+    """Compara un informe con la línea base; devuelve (fallos, avisos)."""
+    failures = []
+    warnings = []
+
+    def check_latency(label, current, previous):
+        for key in ("p50", "p95"):
+            allowed = previous[key] * (1.0 + latency_tolerance) + latency_floor_ms
+            if current[key] > allowed:
+                failures.append(
+                    f"Latencia {label} {key}: {current[key]:.1f} ms > {allowed:.1f} ms "
+                    f"(línea base {previous[key]:.1f} ms)"
+                )
+
+    check_latency("total", report["latency_ms"]["total"], baseline["latency_ms"]["total"])
+    for name, previous in baseline["latency_ms"]["stages"].items():
+        current = report["latency_ms"]["stages"].get(name)
+        if current is not None:
+            check_latency(f"etapa '{name}'", current, previous)
+
+    for query_id, previous in baseline["queries"].items():
+        current = report["queries"].get(query_id)
+        if current is None:
+            warnings.append(f"[{query_id}] no está en la batería actual")
+            continue
+        if current["route"] != previous["route"]:
+            failures.append(f"[{query_id}] ruta cambió: {previous['route']} -> {current['route']}")
+        overlap = _jaccard(current["retrieved"], previous["retrieved"])
+        if overlap < min_retrieval_overlap:
+            failures.append(
+                f"[{query_id}] recuperación divergió (Jaccard {overlap:.2f} < {min_retrieval_overlap:.2f}): "
+                f"{previous['retrieved']} -> {current['retrieved']}"
+            )
+        if not current["stable"]:
+            failures.append(f"[{query_id}] respuesta no determinista entre repeticiones")
+        if current["fingerprint"] != previous["fingerprint"]:
+            message = f"[{query_id}] huella de respuesta cambió: {previous['fingerprint']} -> {current['fingerprint']}"
+            (failures if fail_on_answer_change else warnings).append(message)
+
+    return failures, warnings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Arnés de regresión de latencia y consistencia de AzuSENA")
+    parser.add_argument("--suite", default=DEFAULT_SUITE, help="Archivo JSON con la batería de consultas")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Archivo JSON de línea base")
+    parser.add_argument("--repeat", type=int, default=3, help="Repeticiones por consulta")
+    parser.add_argument("--record", "--update-baseline", dest="record", action="store_true",
+                        help="Guardar el resultado como nueva línea base")
+    parser.add_argument("--output", help="Guardar el informe completo en este archivo")
+    parser.add_argument("--latency-tolerance", type=float, default=0.25,
+                        help="Aumento relativo de p50/p95 permitido (0.25 = 25%%)")
+    parser.add_argument("--latency-floor-ms", type=float, default=5.0,
+                        help="Holgura absoluta en ms para latencias muy pequeñas")
+    parser.add_argument("--min-retrieval-overlap", type=float, default=0.8,
+                        help="Jaccard mínimo entre artículos recuperados y la línea base")
+    parser.add_argument("--fail-on-answer-change", action="store_true",
+                        help="Tratar cambios de huella de respuesta como fallo")
+    parser.add_argument("--log-level", default="WARNING", type=str.upper,
+                        help="Nivel de registro del pipeline durante la medición")
+    args = parser.parse_args(argv)
+    # Antes de cualquier import de app: app/__init__ instala el registro con LOG_LEVEL
+    os.environ["LOG_LEVEL"] = args.log_level
+
+    with open(args.suite, encoding="utf-8") as f:
+        suite = json.load(f)
+
+    report = run_suite(suite, repeat=args.repeat, log_level=args.log_level)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    first_run = not os.path.exists(args.baseline)
+    if args.record or first_run:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        if first_run and not args.record:
+            print(f"Primera ejecución: no había línea base; se grabó en {args.baseline} "
+                  f"({len(report['queries'])} consultas). Las siguientes ejecuciones comparan contra ella.")
+        else:
+            print(f"Línea base actualizada: {args.baseline} ({len(report['queries'])} consultas)")
+        return 0
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+
+    failures, warnings = compare(
+        report,
+        baseline,
+        latency_tolerance=args.latency_tolerance,
+        latency_floor_ms=args.latency_floor_ms,
+        min_retrieval_overlap=args.min_retrieval_overlap,
+        fail_on_answer_change=args.fail_on_answer_change,
+    )
+
+    total = report["latency_ms"]["total"]
+    print(f"Consultas: {len(report['queries'])} x {args.repeat} | total p50={total['p50']} ms p95={total['p95']} ms")
+    for name, values in report["latency_ms"]["stages"].items():
+        print(f"  {name:<16} p50={values['p50']:>9} ms  p95={values['p95']:>9} ms  p99={values['p99']:>9} ms")
+    for message in warnings:
+        print(f"AVISO: {message}")
+    for message in failures:
+        print(f"FALLO: {message}")
+
+    if failures:
+        print(f"Regresión detectada: {len(failures)} fallo(s)")
+        return 1
+    print("Sin regresiones respecto a la línea base")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())